@@ -9,3 +9,7 @@ class AiModelsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'ai_models'
     verbose_name = 'AI Models'
+
+    def ready(self):
+        from . import event_pipeline  # noqa: F401
+        from . import signals  # noqa: F401
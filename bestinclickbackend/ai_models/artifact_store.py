@@ -0,0 +1,210 @@
+"""
+Versioned on-disk store for model artifacts shared between workers.
+
+Each artifact (factor matrices, item embedding index, ...) is published as a
+new version directory of .npy arrays plus a small metadata.json under
+ML_ARTIFACTS_DIR/<name>/. The version is written to a temporary directory,
+renamed into place and then made current by atomically replacing the
+CURRENT pointer file, so readers never see a partially written version.
+
+Arrays are opened read-only with numpy memory mapping: every worker process
+on the host shares the same pages through the OS page cache instead of
+holding its own copy. ArtifactHandle checks the CURRENT pointer
+periodically and swaps a worker to a newly published version without a
+restart; old versions stay readable until pruned.
+"""
+
+import os
+import json
+import time
+import shutil
+import threading
+import logging
+from datetime import datetime, timezone as dt_timezone
+from typing import Callable, Dict, Generic, List, Optional, TypeVar
+import numpy as np
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+CURRENT_FILENAME = 'CURRENT'
+METADATA_FILENAME = 'metadata.json'
+
+T = TypeVar('T')
+
+
+class ArtifactVersion:
+    """
+    One published version of an artifact; arrays are memory-mapped on access.
+    """
+
+    def __init__(self, name: str, version: str, path: str):
+        self.name = name
+        self.version = version
+        self.path = path
+        with open(os.path.join(path, METADATA_FILENAME)) as metadata_file:
+            self.metadata = json.load(metadata_file)
+        self._arrays: Dict[str, np.ndarray] = {}
+
+    def keys(self) -> List[str]:
+        return list(self.metadata.get('arrays', []))
+
+    def __contains__(self, key: str) -> bool:
+        return key in self.metadata.get('arrays', [])
+
+    def __getitem__(self, key: str) -> np.ndarray:
+        array = self._arrays.get(key)
+        if array is None:
+            if key not in self:
+                raise KeyError(key)
+            array = np.load(os.path.join(self.path, f'{key}.npy'), mmap_mode='r', allow_pickle=False)
+            self._arrays[key] = array
+        return array
+
+
+class ArtifactStore:
+    """
+    Publishes and opens versions of named artifacts under a root directory.
+    """
+
+    keep_versions = 3
+
+    def __init__(self, root: Optional[str] = None):
+        self._root = root
+
+    @property
+    def root(self) -> str:
+        return self._root or str(settings.ML_ARTIFACTS_DIR)
+
+    def _artifact_dir(self, name: str) -> str:
+        return os.path.join(self.root, name)
+
+    def _new_version(self) -> str:
+        return f"{datetime.now(dt_timezone.utc).strftime('%Y%m%dT%H%M%S%f')}-{os.getpid()}"
+
+    def publish(self, name: str, arrays: Dict[str, np.ndarray], metadata: Optional[Dict] = None) -> ArtifactVersion:
+        """
+        Write arrays as a new version and make it current.
+        """
+        artifact_dir = self._artifact_dir(name)
+        os.makedirs(artifact_dir, exist_ok=True)
+        version = self._new_version()
+        staging = os.path.join(artifact_dir, f'.{version}.tmp')
+        os.makedirs(staging)
+        try:
+            for key, array in arrays.items():
+                np.save(os.path.join(staging, f'{key}.npy'), np.asarray(array), allow_pickle=False)
+            with open(os.path.join(staging, METADATA_FILENAME), 'w') as metadata_file:
+                json.dump(dict(metadata or {}, arrays=sorted(arrays), published_at=time.time()), metadata_file)
+            version_dir = os.path.join(artifact_dir, version)
+            os.rename(staging, version_dir)
+        except Exception:
+            shutil.rmtree(staging, ignore_errors=True)
+            raise
+
+        pointer = os.path.join(artifact_dir, f'.{CURRENT_FILENAME}.{version}.tmp')
+        with open(pointer, 'w') as pointer_file:
+            pointer_file.write(version)
+        os.replace(pointer, os.path.join(artifact_dir, CURRENT_FILENAME))
+
+        self.prune(name)
+        return ArtifactVersion(name, version, version_dir)
+
+    def current_version(self, name: str) -> Optional[str]:
+        try:
+            with open(os.path.join(self._artifact_dir(name), CURRENT_FILENAME)) as pointer_file:
+                return pointer_file.read().strip() or None
+        except OSError:
+            return None
+
+    def open(self, name: str, version: Optional[str] = None) -> Optional[ArtifactVersion]:
+        """Open a version (the current one by default), or None if absent."""
+        version = version or self.current_version(name)
+        if version is None:
+            return None
+        path = os.path.join(self._artifact_dir(name), version)
+        if not os.path.isdir(path):
+            return None
+        return ArtifactVersion(name, version, path)
+
+    def versions(self, name: str) -> List[str]:
+        try:
+            entries = os.listdir(self._artifact_dir(name))
+        except OSError:
+            return []
+        return sorted(
+            entry for entry in entries
+            if not entry.startswith('.') and entry != CURRENT_FILENAME
+            and os.path.isdir(os.path.join(self._artifact_dir(name), entry))
+        )
+
+    def prune(self, name: str, keep: Optional[int] = None):
+        """
+        Delete all but the newest versions. Workers still mapping a deleted
+        version keep reading it until they swap.
+        """
+        keep = keep or self.keep_versions
+        current = self.current_version(name)
+        for version in self.versions(name)[:-keep]:
+            if version != current:
+                shutil.rmtree(os.path.join(self._artifact_dir(name), version), ignore_errors=True)
+
+
+artifact_store = ArtifactStore()
+
+
+class ArtifactHandle(Generic[T]):
+    """
+    A worker's view of the current version of an artifact.
+
+    loader turns an ArtifactVersion into the object the worker serves (for
+    example an index wrapping the memory-mapped arrays). The CURRENT pointer
+    is re-read at most every check_interval seconds and a new version is
+    loaded and swapped in when it changes.
+    """
+
+    def __init__(self, name: str, loader: Callable[[ArtifactVersion], T],
+                 check_interval: float = 30.0, store: Optional[ArtifactStore] = None):
+        self.name = name
+        self.loader = loader
+        self.check_interval = check_interval
+        self.store = store or artifact_store
+        self.version: Optional[str] = None
+        self._value: Optional[T] = None
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+
+    def get(self) -> Optional[T]:
+        now = time.monotonic()
+        if now - self._checked_at < self.check_interval:
+            return self._value
+        with self._lock:
+            self._checked_at = now
+            version = self.store.current_version(self.name)
+            if version is None or version == self.version:
+                return self._value
+            try:
+                artifact = self.store.open(self.name, version)
+                if artifact is not None:
+                    self._value = self.loader(artifact)
+                    self.version = version
+            except Exception as e:
+                logger.error(f"Could not load {self.name} artifact version {version}: {str(e)}")
+            return self._value
+
+    def current(self) -> Optional[T]:
+        """The loaded value, without checking for a newer version."""
+        return self._value
+
+    def set(self, value: T, version: Optional[str] = None):
+        """Serve a value this worker built, e.g. a version it just published."""
+        with self._lock:
+            self._value = value
+            self.version = version
+            self._checked_at = time.monotonic()
+
+    def reset(self):
+        with self._lock:
+            self._value = None
+            self.version = None
+            self._checked_at = 0.0
@@ -0,0 +1,239 @@
+"""
+Ranked prefix index for search autocomplete.
+
+Suggestions are served from an in-memory sorted array of normalized phrases
+with popularity scores. Short prefixes, which match the most entries, have
+their top-k completions precomputed; longer prefixes are answered with a
+bisect range scan. The index is rebuilt periodically from aggregated search
+popularity and product names, and published to the Django cache as a
+compressed snapshot so other workers can load it without touching the
+database.
+"""
+
+import json
+import math
+import time
+import zlib
+import heapq
+import threading
+import logging
+from bisect import bisect_left
+from collections import defaultdict
+from typing import Dict, List, Optional, Tuple
+from django.core.cache import cache
+from django.db.models import Count
+
+logger = logging.getLogger(__name__)
+
+SNAPSHOT_CACHE_KEY = 'ai_models:autocomplete:snapshot'
+REBUILD_LOCK = 'rebuild_autocomplete_index'
+
+
+def normalize(text: str) -> str:
+    """Lowercase text and collapse whitespace."""
+    return ' '.join(str(text or '').lower().split())
+
+
+class AutocompleteIndex:
+    """
+    Immutable prefix index built from (phrase, score) entries.
+    """
+
+    cached_prefix_length = 3
+    cached_top_k = 10
+
+    def __init__(self, entries: List[Tuple[str, float]], built_at: Optional[float] = None):
+        self.entries = entries
+        self.built_at = built_at if built_at is not None else time.time()
+
+        # Index every word start so that "iphone" completes "apple iphone 15".
+        keyed = []
+        for entry_id, (phrase, _) in enumerate(entries):
+            normalized = normalize(phrase)
+            words = normalized.split(' ')
+            for i in range(len(words)):
+                keyed.append((' '.join(words[i:]), entry_id))
+        keyed.sort()
+        self._keys = [key for key, _ in keyed]
+        self._entry_ids = [entry_id for _, entry_id in keyed]
+
+        self._top_k: Dict[str, List[int]] = {}
+        candidates = defaultdict(set)
+        for key, entry_id in keyed:
+            for length in range(1, min(len(key), self.cached_prefix_length) + 1):
+                candidates[key[:length]].add(entry_id)
+        for prefix, entry_ids in candidates.items():
+            self._top_k[prefix] = self._rank(entry_ids, self.cached_top_k)
+
+    def _rank(self, entry_ids, limit: int) -> List[int]:
+        return heapq.nsmallest(
+            limit, entry_ids,
+            key=lambda entry_id: (-self.entries[entry_id][1], self.entries[entry_id][0])
+        )
+
+    def suggest(self, prefix: str, limit: int = 5) -> List[str]:
+        """Return up to limit phrases matching prefix, most popular first."""
+        prefix = normalize(prefix)
+        if not prefix:
+            return []
+
+        if len(prefix) <= self.cached_prefix_length and limit <= self.cached_top_k:
+            entry_ids = self._top_k.get(prefix, [])[:limit]
+        else:
+            start = bisect_left(self._keys, prefix)
+            matches = set()
+            for position in range(start, len(self._keys)):
+                if not self._keys[position].startswith(prefix):
+                    break
+                matches.add(self._entry_ids[position])
+            entry_ids = self._rank(matches, limit)
+
+        return [self.entries[entry_id][0] for entry_id in entry_ids]
+
+    def dumps(self) -> bytes:
+        payload = {'built_at': self.built_at, 'entries': self.entries}
+        return zlib.compress(json.dumps(payload).encode('utf-8'))
+
+    @classmethod
+    def loads(cls, data: bytes) -> 'AutocompleteIndex':
+        payload = json.loads(zlib.decompress(data).decode('utf-8'))
+        return cls([tuple(entry) for entry in payload['entries']], payload['built_at'])
+
+    def __len__(self):
+        return len(self.entries)
+
+
+def build_autocomplete_entries(search_weight: float = 2.0) -> List[Tuple[str, float]]:
+    """
+    Aggregate search popularity and product names into scored phrases.
+    """
+    from products.models import Product
+    from .models import UserBehaviorLog
+
+    scores: Dict[str, float] = {}
+    display: Dict[str, str] = {}
+
+    searches = UserBehaviorLog.objects.filter(
+        action_type='search',
+        metadata__search_query__isnull=False
+    ).values('metadata__search_query').annotate(count=Count('id'))
+    for item in searches.iterator():
+        phrase = normalize(item['metadata__search_query'])
+        if phrase:
+            scores[phrase] = scores.get(phrase, 0) + item['count'] * search_weight
+            display.setdefault(phrase, phrase)
+
+    products = Product.objects.filter(is_active=True).values_list('name', 'view_count')
+    for name, view_count in products.iterator():
+        phrase = normalize(name)
+        if phrase:
+            scores[phrase] = scores.get(phrase, 0) + 1 + math.log1p(view_count or 0)
+            display.setdefault(phrase, name.strip())
+
+    return [(display[phrase], score) for phrase, score in scores.items()]
+
+
+EMPTY_INDEX = AutocompleteIndex([], built_at=0.0)
+
+
+class AutocompleteService:
+    """
+    Holds the current index for this worker and keeps it fresh.
+    """
+
+    refresh_interval = 300  # seconds
+    snapshot_timeout = 3600
+    rebuild_lock_timeout = 300
+    retry_interval = 5  # seconds to wait while another worker rebuilds
+
+    def __init__(self):
+        self._index: Optional[AutocompleteIndex] = None
+        self._lock = threading.Lock()
+        self._refreshing = False
+        self._retry_at = 0.0
+
+    def _load_snapshot(self) -> Optional[AutocompleteIndex]:
+        try:
+            data = cache.get(SNAPSHOT_CACHE_KEY)
+        except Exception as e:
+            logger.warning(f"Could not read autocomplete snapshot: {str(e)}")
+            return None
+        if not data:
+            return None
+        try:
+            return AutocompleteIndex.loads(data)
+        except Exception as e:
+            logger.error(f"Invalid autocomplete snapshot: {str(e)}")
+            return None
+
+    def _publish_snapshot(self, index: AutocompleteIndex):
+        try:
+            cache.set(SNAPSHOT_CACHE_KEY, index.dumps(), self.snapshot_timeout)
+        except Exception as e:
+            logger.warning(f"Could not publish autocomplete snapshot: {str(e)}")
+
+    def _is_stale(self, index: Optional[AutocompleteIndex]) -> bool:
+        return index is None or time.time() - index.built_at >= self.refresh_interval
+
+    def rebuild(self) -> AutocompleteIndex:
+        """Build a new index from the database and publish it."""
+        index = AutocompleteIndex(build_autocomplete_entries())
+        self._publish_snapshot(index)
+        self._index = index
+        logger.info(f"Autocomplete index rebuilt with {len(index)} phrases")
+        return index
+
+    def _adopt_snapshot(self) -> bool:
+        snapshot = self._load_snapshot()
+        if self._is_stale(snapshot):
+            return False
+        if self._index is None or snapshot.built_at > self._index.built_at:
+            self._index = snapshot
+        return True
+
+    def refresh(self) -> Optional[AutocompleteIndex]:
+        """
+        Swap in a fresh index, preferring a snapshot published by another
+        worker over rebuilding from the database. Only one worker rebuilds
+        at a time; the others keep serving their current index and check
+        for the new snapshot shortly.
+        """
+        from .background import task_lock
+
+        with self._lock:
+            try:
+                if self._adopt_snapshot():
+                    return self._index
+                with task_lock(REBUILD_LOCK, timeout=self.rebuild_lock_timeout) as acquired:
+                    if not acquired:
+                        self._retry_at = time.monotonic() + self.retry_interval
+                        return self._index
+                    # Another worker may have published while we waited
+                    if self._adopt_snapshot():
+                        return self._index
+                    return self.rebuild()
+            finally:
+                self._refreshing = False
+
+    def get_index(self) -> AutocompleteIndex:
+        """
+        The current index. Never built inside the request: a cold worker
+        starts from the published snapshot, or serves an empty index while
+        the first build runs in the background.
+        """
+        index = self._index
+        if index is None:
+            index = self._index = self._load_snapshot()
+        if (self._is_stale(index) and not self._refreshing
+                and time.monotonic() >= self._retry_at):
+            from .background import run_in_background
+
+            self._refreshing = True
+            run_in_background(self.refresh, name='autocomplete-refresh')
+        return index or EMPTY_INDEX
+
+    def suggest(self, prefix: str, limit: int = 5) -> List[str]:
+        return self.get_index().suggest(prefix, limit)
+
+
+autocomplete_service = AutocompleteService()
@@ -0,0 +1,59 @@
+"""
+Helpers for running maintenance work off the request path.
+"""
+
+import threading
+import logging
+from contextlib import contextmanager
+from typing import Iterator, List, Sequence
+from django.core.cache import cache
+from django.db import connections
+
+logger = logging.getLogger(__name__)
+
+
+def run_in_background(func, *args, name: str = None, **kwargs) -> threading.Thread:
+    """
+    Run func in a daemon thread and close the thread's database connections
+    when it finishes.
+    """
+    def _target():
+        try:
+            func(*args, **kwargs)
+        except Exception as e:
+            logger.error(f"Background task {name or func.__name__} failed: {str(e)}")
+        finally:
+            connections.close_all()
+
+    thread = threading.Thread(target=_target, name=name or func.__name__, daemon=True)
+    thread.start()
+    return thread
+
+
+def chunked(items: Sequence, size: int) -> Iterator[List]:
+    """Split items into lists of at most size elements."""
+    for start in range(0, len(items), size):
+        yield list(items[start:start + size])
+
+
+def acquire_task_lock(name: str, timeout: int = 3600) -> bool:
+    """
+    Cache-based lock so a periodic job does not start while a previous run
+    is still going. Expires after timeout in case the holder dies.
+    """
+    return cache.add(f'task_lock:{name}', True, timeout)
+
+
+def release_task_lock(name: str):
+    cache.delete(f'task_lock:{name}')
+
+
+@contextmanager
+def task_lock(name: str, timeout: int = 3600):
+    """Hold the task lock for a block; yields whether it was acquired."""
+    acquired = acquire_task_lock(name, timeout)
+    try:
+        yield acquired
+    finally:
+        if acquired:
+            release_task_lock(name)
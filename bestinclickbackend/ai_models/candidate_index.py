@@ -0,0 +1,163 @@
+"""
+In-memory candidate lists for personalized recommendations.
+
+The index holds every active product as compact numpy arrays (ID, category,
+brand, rating, review count, views) together with a global popularity
+order and the top-N products of each category and brand in that order. It
+is loaded with a single query and refreshed in the background every few
+minutes, so generating recommendation candidates needs no product queries.
+It is never built inside a request: a cold worker gets no index, and its
+callers fall back to database queries, while the first build runs in the
+background. Builds hold a task lock so workers do not all scan the
+products table at the same moment.
+"""
+
+import time
+import threading
+import logging
+from typing import Dict, Iterable, Optional
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+BUILD_LOCK = 'build_candidate_index'
+
+
+def _group_top_n(keys: np.ndarray, order: np.ndarray, top_n: int) -> Dict[int, np.ndarray]:
+    """
+    Split positions in popularity order into per-key lists of at most top_n.
+    """
+    if not len(order):
+        return {}
+    ordered_keys = keys[order]
+    grouping = np.argsort(ordered_keys, kind='stable')
+    grouped_keys = ordered_keys[grouping]
+    boundaries = np.flatnonzero(np.diff(grouped_keys)) + 1
+    starts = np.concatenate(([0], boundaries))
+    ends = np.concatenate((boundaries, [len(grouped_keys)]))
+    return {
+        int(grouped_keys[start]): order[grouping[start:min(end, start + top_n)]]
+        for start, end in zip(starts, ends)
+    }
+
+
+class ProductCandidateIndex:
+    """
+    Popularity-ordered product arrays with per-category and per-brand lists.
+    """
+
+    def __init__(self, ids, categories, brands, ratings, reviews, views,
+                 top_n: int = 200, built_at: Optional[float] = None):
+        self.ids = np.asarray(ids, dtype=np.int64)
+        self.categories = np.asarray(categories, dtype=np.int64)
+        self.brands = np.asarray(brands, dtype=np.int64)
+        self.ratings = np.asarray(ratings, dtype=np.float64)
+        self.reviews = np.asarray(reviews, dtype=np.int64)
+        self.views = np.asarray(views, dtype=np.int64)
+        self.built_at = built_at or time.time()
+
+        # Same ordering as the popularity queries: rating, reviews, views
+        self.order = np.lexsort((-self.views, -self.reviews, -self.ratings))
+        self.rank = np.empty(len(self.ids), dtype=np.int64)
+        self.rank[self.order] = np.arange(len(self.ids))
+        self.top_n = top_n
+        self.by_category = _group_top_n(self.categories, self.order, top_n)
+        self.by_brand = _group_top_n(self.brands, self.order, top_n)
+
+    def __len__(self):
+        return len(self.ids)
+
+    def positions(self, product_ids: Iterable[int]) -> np.ndarray:
+        """Positions of the given product IDs that are in the index."""
+        product_ids = np.asarray(list(product_ids), dtype=np.int64)
+        if not len(product_ids) or not len(self.ids):
+            return np.empty(0, dtype=np.int64)
+        found = np.searchsorted(self.ids, product_ids)
+        found = np.minimum(found, len(self.ids) - 1)
+        return found[self.ids[found] == product_ids]
+
+    def popular(self, limit: Optional[int] = None) -> np.ndarray:
+        return self.order[:limit or self.top_n]
+
+    def candidates(self, category_ids=(), brand_ids=()) -> np.ndarray:
+        """
+        Union of the top lists for the given categories and brands and the
+        overall most popular products.
+        """
+        lists = [self.popular()]
+        lists.extend(self.by_category[c] for c in category_ids if c in self.by_category)
+        lists.extend(self.by_brand[b] for b in brand_ids if b in self.by_brand)
+        return np.unique(np.concatenate(lists))
+
+
+def build_candidate_index() -> ProductCandidateIndex:
+    """Load all active products into a candidate index."""
+    from products.models import Product
+
+    rows = list(
+        Product.objects.filter(is_active=True).order_by('id').values_list(
+            'id', 'category_id', 'brand_id', 'average_rating', 'total_reviews', 'view_count'
+        )
+    )
+    columns = list(zip(*rows)) if rows else [[]] * 6
+    return ProductCandidateIndex(*columns)
+
+
+class CandidateIndexService:
+    """
+    Holds the current candidate index for this worker.
+    """
+
+    refresh_interval = 300  # seconds
+    build_lock_timeout = 120
+    retry_interval = 5  # seconds to wait while another worker builds
+
+    def __init__(self):
+        self._index: Optional[ProductCandidateIndex] = None
+        self._lock = threading.Lock()
+        self._refreshing = False
+        self._retry_at = 0.0
+
+    def _is_stale(self, index: Optional[ProductCandidateIndex]) -> bool:
+        return index is None or time.time() - index.built_at >= self.refresh_interval
+
+    def refresh(self) -> Optional[ProductCandidateIndex]:
+        """
+        Rebuild the index from the database, unless another worker is
+        building its own right now; then keep the current one and retry
+        shortly.
+        """
+        from .background import task_lock
+
+        with self._lock:
+            try:
+                with task_lock(BUILD_LOCK, timeout=self.build_lock_timeout) as acquired:
+                    if not acquired:
+                        self._retry_at = time.monotonic() + self.retry_interval
+                        return self._index
+                    self._index = build_candidate_index()
+                    return self._index
+            finally:
+                self._refreshing = False
+
+    def get_index(self) -> Optional[ProductCandidateIndex]:
+        """
+        The current index, or None until this worker's first build has run
+        in the background.
+        """
+        index = self._index
+        if (self._is_stale(index) and not self._refreshing
+                and time.monotonic() >= self._retry_at):
+            from .background import run_in_background
+
+            self._refreshing = True
+            run_in_background(self.refresh, name='candidate-index-refresh')
+        return index
+
+    def invalidate(self):
+        """Drop the loaded index so it is rebuilt in the background."""
+        self._index = None
+        self._retry_at = 0.0
+
+
+candidate_index_service = CandidateIndexService()
@@ -0,0 +1,373 @@
+"""
+Buffered ingestion pipeline for user behavior events.
+
+Request handlers enqueue events into an in-process buffer instead of
+writing analytics rows themselves. Serving processes (web and Celery
+workers) start a background thread that flushes the buffer with
+bulk_create every few seconds, so events never wait for the next request;
+the buffer is also flushed when the process exits. A full buffer is never
+truncated: the request that fills it flushes it synchronously, and a batch
+the database rejects is retried row by row so one bad event only drops
+itself. Product score updates triggered by events are coalesced per
+product and run by the background flush, off the request path.
+"""
+
+import os
+import atexit
+import time
+import threading
+import logging
+from typing import Dict, List, Optional
+from django.db import close_old_connections, transaction
+from django.dispatch import Signal
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+BEHAVIOR_LOG = 'behavior_log'
+SESSION_INTERACTION = 'session_interaction'
+USER_BEHAVIOR = 'user_behavior'
+
+# Field stamped with the enqueue time for each event kind
+TIMESTAMP_FIELDS = {
+    BEHAVIOR_LOG: 'timestamp',
+    SESSION_INTERACTION: 'timestamp',
+    USER_BEHAVIOR: 'timestamp',
+}
+
+# Event kinds whose rows are meaningless without their product
+PRODUCT_REQUIRED = {USER_BEHAVIOR}
+
+# Sent when a behavior is accepted, before it is written (user_id, action)
+behavior_logged = Signal()
+
+# Sent after a batch of UserBehavior rows is written
+# (behaviors: list of (product_id, behavior_type, timestamp))
+behaviors_written = Signal()
+
+# Sent after a batch of UserBehaviorLog rows is written
+# (store_ids: set of the stores of the logged products)
+behavior_logs_written = Signal()
+
+
+def _get_models():
+    from recommendations.models import UserBehavior
+    from .models import UserBehaviorLog, UserSessionInteraction
+
+    return {
+        BEHAVIOR_LOG: UserBehaviorLog,
+        SESSION_INTERACTION: UserSessionInteraction,
+        USER_BEHAVIOR: UserBehavior,
+    }
+
+
+def _user_id(user) -> Optional[int]:
+    if user is None:
+        return None
+    if isinstance(user, int):
+        return user
+    return user.pk if getattr(user, 'is_authenticated', False) else None
+
+
+def _product_id(product) -> Optional[int]:
+    if product is None or product == '':
+        return None
+    if hasattr(product, 'pk'):
+        return product.pk
+    try:
+        return int(product)
+    except (TypeError, ValueError):
+        return None
+
+
+class BehaviorEventPipeline:
+    """
+    In-process buffer of behavior events with batched flushing.
+    """
+
+    max_buffer_size = 10000
+    batch_size = 500
+    flush_interval = 5.0  # seconds
+
+    # Behaviors that change a product's interaction score
+    score_behaviors = {'purchase', 'like', 'cart_add'}
+
+    def __init__(self):
+        self._buffer = []
+        self._dirty_products = set()
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._last_flush = time.monotonic()
+        self._background_flush = False
+        self._flusher: Optional[threading.Thread] = None
+        self._flusher_pid = None
+        self._stop = threading.Event()
+
+    # Ingestion API
+
+    def enqueue(self, kind: str, **fields):
+        """Buffer a single event row for the given event kind."""
+        self.enqueue_many([(kind, fields)])
+
+    def enqueue_many(self, events: List):
+        """Buffer several (kind, fields) event rows together."""
+        now = timezone.now()
+        for kind, fields in events:
+            timestamp_field = TIMESTAMP_FIELDS.get(kind)
+            if timestamp_field:
+                fields.setdefault(timestamp_field, now)
+        with self._lock:
+            self._buffer.extend(events)
+            full = len(self._buffer) >= self.max_buffer_size
+        self._ensure_flusher()
+        if full:
+            # Apply back-pressure instead of dropping events; score updates
+            # are left to the background flush
+            logger.warning("Behavior event buffer full, flushing in the request")
+            self.flush(update_scores=False)
+
+    def log_behavior(self, action_type: str, user=None, product=None,
+                     metadata: Dict = None, session_id: str = '',
+                     ip_address: str = None, user_agent: str = ''):
+        """Record a UserBehaviorLog event."""
+        user_id = _user_id(user)
+        self.enqueue(
+            BEHAVIOR_LOG,
+            user_id=user_id,
+            product_id=_product_id(product),
+            action_type=action_type,
+            metadata=metadata or {},
+            session_id=session_id or '',
+            ip_address=ip_address,
+            user_agent=user_agent or ''
+        )
+        if user_id:
+            behavior_logged.send(sender=self.__class__, user_id=user_id, action=action_type)
+
+    def log_session_interaction(self, session_id: str, interaction_type: str,
+                                user=None, product=None, page_url: str = '',
+                                referrer: str = '', interaction_data: Dict = None):
+        """Record a UserSessionInteraction event."""
+        self.enqueue(
+            SESSION_INTERACTION,
+            session_id=session_id,
+            user_id=_user_id(user),
+            product_id=_product_id(product),
+            interaction_type=interaction_type,
+            page_url=page_url or '',
+            referrer=referrer or '',
+            interaction_data=interaction_data or {}
+        )
+
+    def log_user_behavior(self, behavior_type: str, product, user=None,
+                          session_id: str = None, **extra):
+        """Record a recommendation UserBehavior event."""
+        product_id = _product_id(product)
+        if product_id is None:
+            return
+        user_id = _user_id(user)
+        self.enqueue(
+            USER_BEHAVIOR,
+            user_id=user_id,
+            product_id=product_id,
+            behavior_type=behavior_type,
+            session_id=session_id,
+            **extra
+        )
+        if behavior_type in self.score_behaviors:
+            self.mark_product_dirty(product_id)
+        if user_id:
+            behavior_logged.send(sender=self.__class__, user_id=user_id, action=behavior_type)
+
+    def mark_product_dirty(self, product_id: int):
+        """Schedule a coalesced score update for a product."""
+        with self._lock:
+            self._dirty_products.add(product_id)
+
+    # Flushing
+
+    def pending_count(self) -> int:
+        return len(self._buffer)
+
+    def is_due(self) -> bool:
+        if not self._buffer and not self._dirty_products:
+            return False
+        return (
+            len(self._buffer) >= self.batch_size or
+            time.monotonic() - self._last_flush >= self.flush_interval
+        )
+
+    def _drain(self, update_scores: bool = True):
+        with self._lock:
+            events, self._buffer = self._buffer, []
+            dirty_products = set()
+            if update_scores:
+                dirty_products, self._dirty_products = self._dirty_products, set()
+            self._last_flush = time.monotonic()
+        return events, dirty_products
+
+    def flush(self, update_scores: bool = True) -> int:
+        """
+        Write all buffered events and, unless update_scores is False, run
+        pending score updates. Returns the number of rows written.
+        """
+        with self._flush_lock:
+            events, dirty_products = self._drain(update_scores)
+            written = self._write_events(events) if events else 0
+            if dirty_products:
+                self._update_product_scores(dirty_products)
+            return written
+
+    def clear(self):
+        """Discard buffered events and pending score updates without writing them."""
+        with self._lock:
+            self._buffer = []
+            self._dirty_products = set()
+
+    def _write_events(self, events: List) -> int:
+        from django.contrib.auth import get_user_model
+        from products.models import Product
+
+        models = _get_models()
+        user_ids = {fields['user_id'] for _, fields in events if fields.get('user_id')}
+        product_ids = {fields['product_id'] for _, fields in events if fields.get('product_id')}
+
+        # Validate foreign keys with one query per model for the whole batch
+        valid_users = set(
+            get_user_model().objects.filter(id__in=user_ids).values_list('id', flat=True)
+        ) if user_ids else set()
+        product_stores = dict(
+            Product.objects.filter(id__in=product_ids).values_list('id', 'store_id')
+        ) if product_ids else {}
+
+        rows = {kind: [] for kind in models}
+        for kind, fields in events:
+            fields = dict(fields)
+            if 'user_id' in fields and fields['user_id'] not in valid_users:
+                fields['user_id'] = None
+            if 'product_id' in fields and fields['product_id'] not in product_stores:
+                if kind in PRODUCT_REQUIRED:
+                    logger.warning(f"Dropping {kind} event for missing product {fields.get('product_id')}")
+                    continue
+                fields['product_id'] = None
+            if kind == BEHAVIOR_LOG:
+                # Denormalized for store dashboards
+                fields['store_id'] = product_stores.get(fields['product_id'])
+            rows[kind].append(models[kind](**fields))
+
+        written = 0
+        for kind, objects in rows.items():
+            if not objects:
+                continue
+            objects = self._bulk_create(kind, models[kind], objects)
+            written += len(objects)
+            if not objects:
+                continue
+            try:
+                if kind == USER_BEHAVIOR:
+                    behaviors_written.send(
+                        sender=self.__class__,
+                        behaviors=[(obj.product_id, obj.behavior_type, obj.timestamp) for obj in objects]
+                    )
+                elif kind == BEHAVIOR_LOG:
+                    behavior_logs_written.send(
+                        sender=self.__class__,
+                        store_ids={obj.store_id for obj in objects if obj.store_id}
+                    )
+            except Exception as e:
+                logger.error(f"Error handling {len(objects)} written {kind} events: {str(e)}")
+        return written
+
+    def _bulk_create(self, kind: str, model, objects: List) -> List:
+        """
+        Insert rows in batches. A batch the database rejects is retried row
+        by row, so one bad event does not drop the others. Returns the rows
+        written.
+        """
+        written = []
+        for start in range(0, len(objects), self.batch_size):
+            batch = objects[start:start + self.batch_size]
+            try:
+                with transaction.atomic():
+                    model.objects.bulk_create(batch)
+                written.extend(batch)
+                continue
+            except Exception as e:
+                logger.warning(f"Error flushing {len(batch)} {kind} events, retrying one by one: {str(e)}")
+            for obj in batch:
+                try:
+                    with transaction.atomic():
+                        model.objects.bulk_create([obj])
+                    written.append(obj)
+                except Exception as e:
+                    logger.error(f"Dropping invalid {kind} event: {str(e)}")
+        return written
+
+    def _update_product_scores(self, product_ids):
+        from .interaction_analyzer import InteractionAnalyzer
+
+        try:
+            InteractionAnalyzer().update_product_scores(list(product_ids))
+        except Exception as e:
+            logger.error(f"Error updating product scores: {str(e)}")
+
+    def flush_if_due(self):
+        if self.is_due():
+            self.flush()
+
+    # Background flushing
+
+    def start_background_flush(self):
+        """
+        Flush from a daemon thread every flush_interval seconds. Called by
+        the serving processes; a forked child restarts the thread on its
+        first event.
+        """
+        self._background_flush = True
+        self._stop.clear()
+        self._ensure_flusher()
+
+    def stop_background_flush(self):
+        self._background_flush = False
+        self._stop.set()
+        flusher = self._flusher
+        if flusher is not None and flusher is not threading.current_thread():
+            flusher.join()
+        self._flusher = None
+
+    def _ensure_flusher(self):
+        if not self._background_flush:
+            return
+        if self._flusher_pid == os.getpid() and self._flusher is not None and self._flusher.is_alive():
+            return
+        with self._lock:
+            if self._flusher_pid == os.getpid() and self._flusher is not None and self._flusher.is_alive():
+                return
+            self._flusher_pid = os.getpid()
+            self._flusher = threading.Thread(
+                target=self._run_flusher, name='behavior-event-flush', daemon=True
+            )
+            self._flusher.start()
+
+    def _run_flusher(self):
+        while not self._stop.wait(self.flush_interval):
+            try:
+                close_old_connections()
+                self.flush_if_due()
+            except Exception as e:
+                logger.error(f"Error flushing behavior events: {str(e)}")
+            finally:
+                close_old_connections()
+
+
+event_pipeline = BehaviorEventPipeline()
+
+
+def _flush_at_exit():
+    try:
+        event_pipeline.flush()
+    except Exception as e:
+        logger.error(f"Error flushing behavior events at exit: {str(e)}")
+
+
+atexit.register(_flush_at_exit)
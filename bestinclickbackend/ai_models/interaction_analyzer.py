@@ -3,14 +3,17 @@ Interaction analyzer for updating product scores based on user behavior.
 """
 
 import numpy as np
-from django.db.models import Count, Avg, Sum, F, Q
+import pandas as pd
+from scipy import sparse
+from django.db.models import Count, Sum, F, Q
 from django.utils import timezone
 from datetime import timedelta
-from typing import Dict, List
+from typing import List
 import logging
 
 from recommendations.models import UserBehavior, ProductInteractionScore, UserSimilarity
 from products.models import Product
+from .event_pipeline import event_pipeline
 from django.contrib.auth import get_user_model
 
 User = get_user_model()
@@ -22,6 +25,25 @@ class InteractionAnalyzer:
     Analyzes user interactions and updates product scores.
     """
     
+    # ProductInteractionScore fields recomputed by update_product_scores
+    score_fields = [
+        'total_views', 'unique_views', 'avg_view_duration',
+        'total_likes', 'total_unlikes', 'like_ratio',
+        'total_cart_adds', 'total_purchases', 'conversion_rate',
+        'avg_rating', 'total_reviews', 'avg_sentiment',
+        'popularity_score', 'quality_score', 'trending_score', 'overall_score',
+    ]
+    count_fields = {
+        'total_views', 'unique_views', 'total_likes', 'total_unlikes',
+        'total_cart_adds', 'total_purchases', 'total_reviews',
+    }
+    
+    # User similarity settings
+    engagement_behaviors = ['like', 'purchase', 'cart_add']
+    similarity_threshold = 0.1  # Only store meaningful similarities
+    similarity_top_k = 50
+    min_common_products = 2
+    
     def __init__(self):
         self.behavior_weights = {
             'view': 1.0,
@@ -39,329 +61,353 @@ class InteractionAnalyzer:
             'search': 0.5
         }
     
-    def update_product_scores(self, product_ids: List[int] = None):
+    def update_product_scores(self, product_ids: List[int] = None, batch_size: int = 500,
+                              raise_errors: bool = False):
         """
         Update interaction scores for products.
+        
+        Products are scored in chunks of batch_size: each chunk reads its
+        behaviors in one streamed query, aggregates them with pandas and
+        writes the scores back with bulk_update. Errors are logged, or
+        re-raised with raise_errors so a calling task can fail.
         """
         try:
+            products = Product.objects.filter(is_active=True)
             if product_ids:
-                products = Product.objects.filter(id__in=product_ids, is_active=True)
-            else:
-                # Update all products (for batch processing)
-                products = Product.objects.filter(is_active=True)
+                products = products.filter(id__in=product_ids)
+            all_ids = list(products.order_by('id').values_list('id', flat=True))
             
-            for product in products:
-                self._update_single_product_score(product)
+            now = timezone.now()
+            for start in range(0, len(all_ids), batch_size):
+                self._update_score_batch(all_ids[start:start + batch_size], now)
                 
-            logger.info(f"Updated scores for {products.count()} products")
+            logger.info(f"Updated scores for {len(all_ids)} products")
             
         except Exception as e:
             logger.error(f"Error updating product scores: {str(e)}")
+            if raise_errors:
+                raise
     
-    def _update_single_product_score(self, product: Product):
+    def _update_score_batch(self, product_ids: List[int], now):
         """
-        Update interaction score for a single product.
+        Recompute and save interaction scores for one chunk of products.
         """
-        try:
-            # Get or create interaction score record
-            score_obj, created = ProductInteractionScore.objects.get_or_create(
-                product=product,
-                defaults={
-                    'total_views': 0,
-                    'unique_views': 0,
-                    'avg_view_duration': 0.0,
-                    'total_likes': 0,
-                    'total_unlikes': 0,
-                    'like_ratio': 0.0,
-                    'total_cart_adds': 0,
-                    'total_purchases': 0,
-                    'conversion_rate': 0.0,
-                    'avg_rating': 0.0,
-                    'total_reviews': 0,
-                    'avg_sentiment': 0.0,
-                    'popularity_score': 0.0,
-                    'quality_score': 0.0,
-                    'trending_score': 0.0,
-                    'overall_score': 0.0
-                }
-            )
-            
-            # Calculate metrics from user behaviors
-            behaviors = UserBehavior.objects.filter(product=product)
-            
-            # View metrics
-            view_behaviors = behaviors.filter(behavior_type='view')
-            score_obj.total_views = view_behaviors.count()
-            score_obj.unique_views = view_behaviors.values('user').distinct().count()
-            
-            # Calculate average view duration
-            durations = view_behaviors.filter(
-                duration_seconds__isnull=False
-            ).values_list('duration_seconds', flat=True)
-            if durations:
-                score_obj.avg_view_duration = np.mean(list(durations))
-            
-            # Engagement metrics
-            score_obj.total_likes = behaviors.filter(behavior_type='like').count()
-            score_obj.total_unlikes = behaviors.filter(behavior_type='unlike').count()
-            
-            total_reactions = score_obj.total_likes + score_obj.total_unlikes
-            if total_reactions > 0:
-                score_obj.like_ratio = score_obj.total_likes / total_reactions
-            
-            # Purchase metrics
-            score_obj.total_cart_adds = behaviors.filter(behavior_type='cart_add').count()
-            score_obj.total_purchases = behaviors.filter(behavior_type='purchase').count()
-            
-            if score_obj.total_views > 0:
-                score_obj.conversion_rate = score_obj.total_purchases / score_obj.total_views
-            
-            # Review metrics
-            review_behaviors = behaviors.filter(
-                behavior_type__in=['review_positive', 'review_negative'],
-                rating__isnull=False
-            )
-            if review_behaviors.exists():
-                score_obj.avg_rating = review_behaviors.aggregate(
-                    avg_rating=Avg('rating')
-                )['avg_rating'] or 0.0
-                score_obj.total_reviews = review_behaviors.count()
-                
-                # Calculate sentiment
-                sentiment_behaviors = review_behaviors.filter(review_sentiment__isnull=False)
-                if sentiment_behaviors.exists():
-                    score_obj.avg_sentiment = sentiment_behaviors.aggregate(
-                        avg_sentiment=Avg('review_sentiment')
-                    )['avg_sentiment'] or 0.0
-            
-            # Calculate composite scores
-            score_obj.popularity_score = self._calculate_popularity_score(score_obj)
-            score_obj.quality_score = self._calculate_quality_score(score_obj)
-            score_obj.trending_score = self._calculate_trending_score(product)
-            score_obj.overall_score = self._calculate_overall_score(score_obj)
-            
-            score_obj.save()
-            
-        except Exception as e:
-            logger.error(f"Error updating score for product {product.id}: {str(e)}")
+        ProductInteractionScore.objects.bulk_create(
+            [ProductInteractionScore(product_id=product_id) for product_id in product_ids],
+            ignore_conflicts=True
+        )
+        score_objs = list(ProductInteractionScore.objects.filter(product_id__in=product_ids))
+        
+        scores = pd.DataFrame.from_records(
+            [[getattr(obj, field) for field in ['product_id'] + self.score_fields] for obj in score_objs],
+            columns=['product_id'] + self.score_fields
+        ).set_index('product_id').astype(float)
+        
+        metrics = self._aggregate_behavior_metrics(product_ids, now)
+        scores = self._apply_behavior_metrics(scores, metrics)
+        
+        scores['popularity_score'] = self._calculate_popularity_scores(scores)
+        scores['quality_score'] = self._calculate_quality_scores(scores)
+        scores['trending_score'] = metrics['trending_score']
+        scores['overall_score'] = self._calculate_overall_scores(scores)
+        
+        for obj in score_objs:
+            row = scores.loc[obj.product_id]
+            for field in self.score_fields:
+                value = row[field]
+                setattr(obj, field, int(value) if field in self.count_fields else float(value))
+            obj.last_updated = now
+        
+        ProductInteractionScore.objects.bulk_update(score_objs, self.score_fields + ['last_updated'])
     
-    def _calculate_popularity_score(self, score_obj: ProductInteractionScore) -> float:
+    def _load_behaviors(self, product_ids: List[int]) -> pd.DataFrame:
         """
-        Calculate popularity score based on views and engagement.
+        Stream all behaviors for the given products into a DataFrame.
         """
-        try:
-            # Normalize metrics (0-1 scale)
-            view_score = min(score_obj.total_views / 1000.0, 1.0)  # Max at 1000 views
-            unique_view_score = min(score_obj.unique_views / 500.0, 1.0)  # Max at 500 unique views
-            like_score = score_obj.like_ratio
-            cart_score = min(score_obj.total_cart_adds / 100.0, 1.0)  # Max at 100 cart adds
-            
-            # Weighted combination
-            popularity = (
-                view_score * 0.3 +
-                unique_view_score * 0.3 +
-                like_score * 0.2 +
-                cart_score * 0.2
-            )
-            
-            return min(popularity, 1.0)
-            
-        except Exception as e:
-            logger.error(f"Error calculating popularity score: {str(e)}")
-            return 0.0
+        columns = ['product_id', 'behavior_type', 'duration_seconds', 'rating', 'review_sentiment', 'timestamp']
+        rows = UserBehavior.objects.filter(
+            product_id__in=product_ids
+        ).values_list(*columns).iterator(chunk_size=5000)
+        behaviors = pd.DataFrame.from_records(rows, columns=columns)
+        for column in ['duration_seconds', 'rating', 'review_sentiment']:
+            behaviors[column] = pd.to_numeric(behaviors[column], errors='coerce')
+        behaviors['timestamp'] = pd.to_datetime(behaviors['timestamp'], utc=True)
+        return behaviors
     
-    def _calculate_quality_score(self, score_obj: ProductInteractionScore) -> float:
+    def _aggregate_behavior_metrics(self, product_ids: List[int], now) -> pd.DataFrame:
         """
-        Calculate quality score based on ratings and sentiment.
+        Aggregate per-product behavior metrics with grouped operations.
+        
+        Optional metrics are NaN for products without the underlying data so
+        that the previously stored value is kept.
         """
-        try:
-            # Rating score (0-1 scale, 5-star rating)
-            rating_score = score_obj.avg_rating / 5.0 if score_obj.avg_rating > 0 else 0.5
-            
-            # Sentiment score (convert -1 to 1 range to 0-1 range)
-            sentiment_score = (score_obj.avg_sentiment + 1) / 2 if score_obj.avg_sentiment != 0 else 0.5
-            
-            # Conversion rate as quality indicator
-            conversion_score = min(score_obj.conversion_rate * 10, 1.0)  # Max at 10% conversion
-            
-            # Review count factor (more reviews = more reliable)
-            review_factor = min(score_obj.total_reviews / 50.0, 1.0)  # Max factor at 50 reviews
-            
-            # Weighted combination
-            quality = (
-                rating_score * 0.4 +
-                sentiment_score * 0.3 +
-                conversion_score * 0.2 +
-                review_factor * 0.1
-            )
-            
-            return min(quality, 1.0)
-            
-        except Exception as e:
-            logger.error(f"Error calculating quality score: {str(e)}")
-            return 0.5
+        behaviors = self._load_behaviors(product_ids)
+        metrics = pd.DataFrame(index=pd.Index(product_ids, name='product_id'))
+        
+        # Behavior counts
+        counts = behaviors.groupby(['product_id', 'behavior_type']).size().unstack(fill_value=0)
+        counts = counts.reindex(index=metrics.index, fill_value=0)
+        for field, behavior_type in [
+            ('total_likes', 'like'),
+            ('total_unlikes', 'unlike'),
+            ('total_cart_adds', 'cart_add'),
+            ('total_purchases', 'purchase'),
+        ]:
+            metrics[field] = counts[behavior_type] if behavior_type in counts else 0
+        
+        # View duration
+        views = behaviors[behaviors['behavior_type'] == 'view']
+        metrics['avg_view_duration'] = views.groupby('product_id')['duration_seconds'].mean()
+        
+        # Review metrics
+        reviews = behaviors[
+            behaviors['behavior_type'].isin(['review_positive', 'review_negative']) &
+            behaviors['rating'].notna()
+        ]
+        review_groups = reviews.groupby('product_id')
+        metrics['avg_rating'] = review_groups['rating'].mean()
+        metrics['total_reviews'] = review_groups.size()
+        metrics['avg_sentiment'] = review_groups['review_sentiment'].mean()
+        
+        # Trending: weighted recent activity with linear time decay
+        recent = behaviors[behaviors['timestamp'] >= pd.Timestamp(now - timedelta(days=7))]
+        days_ago = (pd.Timestamp(now) - recent['timestamp']).dt.days
+        time_factor = (1.0 - days_ago / 7.0).clip(lower=0.1)
+        weights = recent['behavior_type'].map(self.behavior_weights).fillna(1.0)
+        activity = (weights * time_factor).groupby(recent['product_id']).sum()
+        metrics['trending_score'] = (activity / 100.0).clip(upper=1.0)  # Max at 100 weighted points
+        metrics['trending_score'] = metrics['trending_score'].fillna(0.0)
+        
+        return metrics
     
-    def _calculate_trending_score(self, product: Product) -> float:
+    def _apply_behavior_metrics(self, scores: pd.DataFrame, metrics: pd.DataFrame) -> pd.DataFrame:
         """
-        Calculate trending score based on recent activity.
+        Merge aggregated metrics into the stored score rows.
         """
-        try:
-            # Get recent behaviors (last 7 days)
-            recent_behaviors = UserBehavior.objects.filter(
-                product=product,
-                timestamp__gte=timezone.now() - timedelta(days=7)
-            )
-            
-            if not recent_behaviors.exists():
-                return 0.0
-            
-            # Calculate weighted activity score
-            total_score = 0.0
-            for behavior in recent_behaviors:
-                weight = self.behavior_weights.get(behavior.behavior_type, 1.0)
-                
-                # Time decay factor (more recent = higher weight)
-                days_ago = (timezone.now() - behavior.timestamp).days
-                time_factor = max(0.1, 1.0 - (days_ago / 7.0))
-                
-                total_score += weight * time_factor
-            
-            # Normalize score
-            trending_score = min(total_score / 100.0, 1.0)  # Max at 100 weighted points
-            
-            return trending_score
-            
-        except Exception as e:
-            logger.error(f"Error calculating trending score for product {product.id}: {str(e)}")
-            return 0.0
+        scores = scores.copy()
+        for field in ['total_likes', 'total_unlikes', 'total_cart_adds', 'total_purchases']:
+            scores[field] = metrics[field]
+        for field in ['avg_view_duration', 'avg_rating', 'total_reviews', 'avg_sentiment']:
+            scores[field] = metrics[field].fillna(scores[field])
+        
+        reactions = scores['total_likes'] + scores['total_unlikes']
+        scores['like_ratio'] = np.where(
+            reactions > 0, scores['total_likes'] / reactions.where(reactions > 0, 1), scores['like_ratio']
+        )
+        views = scores['total_views']
+        scores['conversion_rate'] = np.where(
+            views > 0, scores['total_purchases'] / views.where(views > 0, 1), scores['conversion_rate']
+        )
+        return scores
     
-    def _calculate_overall_score(self, score_obj: ProductInteractionScore) -> float:
+    def _calculate_popularity_scores(self, scores: pd.DataFrame) -> pd.Series:
         """
-        Calculate overall score combining all metrics.
+        Calculate popularity scores based on views and engagement.
         """
-        try:
-            # Weighted combination of all scores
-            overall = (
-                score_obj.popularity_score * 0.35 +
-                score_obj.quality_score * 0.35 +
-                score_obj.trending_score * 0.30
-            )
-            
-            return min(overall, 1.0)
-            
-        except Exception as e:
-            logger.error(f"Error calculating overall score: {str(e)}")
-            return 0.0
+        # Normalize metrics (0-1 scale)
+        view_score = (scores['total_views'] / 1000.0).clip(upper=1.0)  # Max at 1000 views
+        unique_view_score = (scores['unique_views'] / 500.0).clip(upper=1.0)  # Max at 500 unique views
+        like_score = scores['like_ratio']
+        cart_score = (scores['total_cart_adds'] / 100.0).clip(upper=1.0)  # Max at 100 cart adds
+        
+        # Weighted combination
+        popularity = (
+            view_score * 0.3 +
+            unique_view_score * 0.3 +
+            like_score * 0.2 +
+            cart_score * 0.2
+        )
+        
+        return popularity.clip(upper=1.0)
+    
+    def _calculate_quality_scores(self, scores: pd.DataFrame) -> pd.Series:
+        """
+        Calculate quality scores based on ratings and sentiment.
+        """
+        # Rating score (0-1 scale, 5-star rating)
+        rating_score = (scores['avg_rating'] / 5.0).where(scores['avg_rating'] > 0, 0.5)
+        
+        # Sentiment score (convert -1 to 1 range to 0-1 range)
+        sentiment_score = ((scores['avg_sentiment'] + 1) / 2).where(scores['avg_sentiment'] != 0, 0.5)
+        
+        # Conversion rate as quality indicator
+        conversion_score = (scores['conversion_rate'] * 10).clip(upper=1.0)  # Max at 10% conversion
+        
+        # Review count factor (more reviews = more reliable)
+        review_factor = (scores['total_reviews'] / 50.0).clip(upper=1.0)  # Max factor at 50 reviews
+        
+        # Weighted combination
+        quality = (
+            rating_score * 0.4 +
+            sentiment_score * 0.3 +
+            conversion_score * 0.2 +
+            review_factor * 0.1
+        )
+        
+        return quality.clip(upper=1.0)
     
+    def _calculate_overall_scores(self, scores: pd.DataFrame) -> pd.Series:
+        """
+        Calculate overall scores combining all metrics.
+        """
+        overall = (
+            scores['popularity_score'] * 0.35 +
+            scores['quality_score'] * 0.35 +
+            scores['trending_score'] * 0.30
+        )
+        
+        return overall.clip(upper=1.0)
+    
+
     def calculate_user_similarities(self, user_ids: List[int] = None):
         """
         Calculate user similarity scores for collaborative filtering.
+        
+        Builds a sparse user x product matrix of weighted interactions from
+        one query, computes cosine similarities with sparse matrix products
+        in row chunks and keeps the top neighbours of each user.
         """
         try:
+            now = timezone.now()
+            behaviors = UserBehavior.objects.filter(
+                user__isnull=False,
+                timestamp__gte=now - timedelta(days=60)
+            )
             if user_ids:
-                users = User.objects.filter(id__in=user_ids)
-            else:
-                # Calculate for active users only
-                users = User.objects.filter(
-                    userbehavior__timestamp__gte=timezone.now() - timedelta(days=30)
-                ).distinct()[:1000]  # Limit to prevent performance issues
-            
-            user_list = list(users)
+                behaviors = behaviors.filter(user_id__in=user_ids)
+            rows = list(behaviors.values_list('user_id', 'product_id', 'behavior_type', 'timestamp').iterator(chunk_size=10000))
             
-            for i, user1 in enumerate(user_list):
-                for user2 in user_list[i+1:]:
-                    similarity_score = self._calculate_cosine_similarity(user1, user2)
-                    
-                    if similarity_score > 0.1:  # Only store meaningful similarities
-                        # Get common products count
-                        user1_products = set(UserBehavior.objects.filter(
-                            user=user1,
-                            behavior_type__in=['like', 'purchase', 'cart_add']
-                        ).values_list('product_id', flat=True))
-                        
-                        user2_products = set(UserBehavior.objects.filter(
-                            user=user2,
-                            behavior_type__in=['like', 'purchase', 'cart_add']
-                        ).values_list('product_id', flat=True))
-                        
-                        common_products = len(user1_products.intersection(user2_products))
-                        
-                        # Update or create similarity record
-                        UserSimilarity.objects.update_or_create(
-                            user1=user1,
-                            user2=user2,
-                            defaults={
-                                'similarity_score': similarity_score,
-                                'common_products': common_products
-                            }
-                        )
+            if user_ids:
+                active_user_ids = set(user_ids)
+            else:
+                # Calculate for users active in the last 30 days only
+                active_since = now - timedelta(days=30)
+                active_user_ids = {user_id for user_id, _, _, timestamp in rows if timestamp >= active_since}
+            rows = [row for row in rows if row[0] in active_user_ids]
+            if not rows:
+                logger.info("No user behaviors to calculate similarities from")
+                return
+            
+            user_index, weights, presence, engagement = self._build_interaction_matrices(rows)
+            firsts, seconds, scores, commons = self._top_similar_pairs(weights, presence, engagement)
+            
+            similarities = [
+                UserSimilarity(
+                    user1_id=int(user_index[i]),
+                    user2_id=int(user_index[j]),
+                    similarity_score=float(score),
+                    common_products=int(common)
+                )
+                for i, j, score, common in zip(firsts, seconds, scores, commons)
+            ]
+            UserSimilarity.objects.bulk_create(
+                similarities,
+                batch_size=1000,
+                update_conflicts=True,
+                unique_fields=['user1', 'user2'],
+                update_fields=['similarity_score', 'common_products', 'last_calculated']
+            )
             
-            logger.info(f"Updated similarities for {len(user_list)} users")
+            logger.info(f"Updated {len(similarities)} similarities for {len(user_index)} users")
             
         except Exception as e:
             logger.error(f"Error calculating user similarities: {str(e)}")
     
-    def _calculate_cosine_similarity(self, user1: User, user2: User) -> float:
+    def _build_interaction_matrices(self, rows):
         """
-        Calculate cosine similarity between two users based on their behaviors.
+        Build user x product CSR matrices from (user_id, product_id,
+        behavior_type, timestamp) rows.
+        
+        Returns the sorted user ids for the matrix rows, the weighted
+        interaction matrix, a binary matrix of products each user interacted
+        with and a binary matrix of liked, purchased or carted products.
         """
-        try:
-            # Get user behaviors with weights
-            user1_behaviors = self._get_user_behavior_vector(user1)
-            user2_behaviors = self._get_user_behavior_vector(user2)
-            
-            if not user1_behaviors or not user2_behaviors:
-                return 0.0
-            
-            # Find common products
-            common_products = set(user1_behaviors.keys()).intersection(set(user2_behaviors.keys()))
-            
-            if len(common_products) < 2:  # Need at least 2 common products
-                return 0.0
-            
-            # Calculate cosine similarity
-            dot_product = sum(user1_behaviors[product] * user2_behaviors[product] 
-                            for product in common_products)
-            
-            norm1 = np.sqrt(sum(score ** 2 for score in user1_behaviors.values()))
-            norm2 = np.sqrt(sum(score ** 2 for score in user2_behaviors.values()))
-            
-            if norm1 == 0 or norm2 == 0:
-                return 0.0
-            
-            similarity = dot_product / (norm1 * norm2)
-            return max(0.0, min(1.0, similarity))
-            
-        except Exception as e:
-            logger.error(f"Error calculating cosine similarity: {str(e)}")
-            return 0.0
+        user_ids = np.fromiter((row[0] for row in rows), dtype=np.int64, count=len(rows))
+        product_ids = np.fromiter((row[1] for row in rows), dtype=np.int64, count=len(rows))
+        behavior_types = [row[2] for row in rows]
+        
+        user_index, user_rows = np.unique(user_ids, return_inverse=True)
+        _, product_cols = np.unique(product_ids, return_inverse=True)
+        shape = (len(user_index), product_cols.max() + 1)
+        
+        data = np.array([self.behavior_weights.get(behavior_type, 1.0) for behavior_type in behavior_types])
+        weights = sparse.csr_matrix((data, (user_rows, product_cols)), shape=shape)
+        
+        presence = sparse.csr_matrix((np.ones(len(rows)), (user_rows, product_cols)), shape=shape)
+        presence.data[:] = 1.0
+        
+        engaged = np.isin(behavior_types, self.engagement_behaviors)
+        engagement = sparse.csr_matrix(
+            (np.ones(engaged.sum()), (user_rows[engaged], product_cols[engaged])), shape=shape
+        )
+        engagement.data[:] = 1.0
+        
+        return user_index, weights, presence, engagement
     
-    def _get_user_behavior_vector(self, user: User) -> Dict[int, float]:
+    def _top_similar_pairs(self, weights, presence, engagement, chunk_size: int = 1000):
         """
-        Get user's behavior vector (product_id -> weighted_score).
+        Find each user's most similar users.
+        
+        Returns arrays (first, second, similarity, common_products) of
+        matrix row index pairs with first < second.
         """
-        try:
-            behaviors = UserBehavior.objects.filter(
-                user=user,
-                timestamp__gte=timezone.now() - timedelta(days=60)
-            )
-            
-            behavior_vector = {}
-            
-            for behavior in behaviors:
-                product_id = behavior.product_id
-                weight = self.behavior_weights.get(behavior.behavior_type, 1.0)
-                
-                if product_id not in behavior_vector:
-                    behavior_vector[product_id] = 0.0
-                
-                behavior_vector[product_id] += weight
-            
-            return behavior_vector
-            
-        except Exception as e:
-            logger.error(f"Error getting user behavior vector: {str(e)}")
-            return {}
+        norms = np.sqrt(np.asarray(weights.multiply(weights).sum(axis=1)).ravel())
+        norms[norms == 0] = 1.0
+        normalized = sparse.diags(1.0 / norms) @ weights
+        normalized_t = normalized.T.tocsr()
+        presence_t = presence.T.tocsr()
+        engagement_t = engagement.T.tocsr()
+        
+        firsts, seconds, scores, commons = [], [], [], []
+        for start in range(0, normalized.shape[0], chunk_size):
+            stop = min(start + chunk_size, normalized.shape[0])
+            similarities = normalized[start:stop] @ normalized_t
+            # Need at least a few products in common for a meaningful score
+            overlap = (presence[start:stop] @ presence_t) >= self.min_common_products
+            similarities = similarities.multiply(overlap).tocoo()
+            
+            rows, cols, data = similarities.row, similarities.col, similarities.data
+            keep = (rows + start != cols) & (data > self.similarity_threshold)
+            rows, cols, data = rows[keep], cols[keep], data[keep]
+            
+            # Keep the top k neighbours of each user: sort by row, then by
+            # descending similarity, using one composite key
+            order = np.argsort(rows + (1.0 - np.minimum(data, 1.0)) / 2)
+            rows, cols, data = rows[order], cols[order], data[order]
+            row_starts = np.searchsorted(rows, rows, side='left')
+            keep = np.arange(len(rows)) - row_starts < self.similarity_top_k
+            rows, cols, data = rows[keep], cols[keep], data[keep]
+            
+            common = (engagement[start:stop] @ engagement_t).tocoo()
+            users = rows + start
+            firsts.append(np.minimum(users, cols))
+            seconds.append(np.maximum(users, cols))
+            scores.append(np.minimum(data, 1.0))
+            commons.append(self._lookup_entries(common, rows, cols))
+        
+        if not firsts:
+            return np.array([], dtype=int), np.array([], dtype=int), np.array([]), np.array([], dtype=int)
+        firsts, seconds = np.concatenate(firsts), np.concatenate(seconds)
+        scores, commons = np.concatenate(scores), np.concatenate(commons)
+        
+        # Mutual neighbours are found from both sides; store each pair once
+        _, unique = np.unique(firsts * normalized.shape[0] + seconds, return_index=True)
+        return firsts[unique], seconds[unique], scores[unique], commons[unique]
+    
+    @staticmethod
+    def _lookup_entries(matrix, rows, cols):
+        """
+        Read matrix[rows, cols] for a COO matrix, treating missing entries as 0.
+        """
+        if matrix.nnz == 0:
+            return np.zeros(len(rows), dtype=int)
+        width = matrix.shape[1]
+        keys = matrix.row.astype(np.int64) * width + matrix.col
+        order = np.argsort(keys)
+        keys, values = keys[order], matrix.data[order]
+        wanted = rows.astype(np.int64) * width + cols
+        positions = np.searchsorted(keys, wanted).clip(max=len(keys) - 1)
+        return np.where(keys[positions] == wanted, values[positions], 0).astype(int)
     
     def log_user_behavior(
         self,
@@ -379,41 +425,21 @@ class InteractionAnalyzer:
                 logger.warning("Missing required parameters for behavior logging")
                 return False
             
-            # Get user if provided
-            user = None
-            if user_id:
-                try:
-                    user = User.objects.get(id=user_id)
-                except User.DoesNotExist:
-                    logger.warning(f"User {user_id} not found")
-            
-            # Get product
-            try:
-                product = Product.objects.get(id=product_id)
-            except Product.DoesNotExist:
-                logger.warning(f"Product {product_id} not found")
-                return False
-            
-            # Create behavior record
-            behavior_data = {
-                'user': user,
-                'session_id': session_id,
-                'product': product,
-                'behavior_type': behavior_type,
-                'ip_address': kwargs.get('ip_address'),
-                'user_agent': kwargs.get('user_agent'),
-                'duration_seconds': kwargs.get('duration_seconds'),
-                'rating': kwargs.get('rating'),
-                'review_sentiment': kwargs.get('review_sentiment'),
-                'search_query': kwargs.get('search_query'),
-                'referrer_page': kwargs.get('referrer_page')
-            }
-            
-            UserBehavior.objects.create(**behavior_data)
-            
-            # Update product score immediately for important behaviors
-            if behavior_type in ['purchase', 'like', 'cart_add']:
-                self._update_single_product_score(product)
+            # Buffer the behavior; score updates for important behaviors
+            # are coalesced and run when the buffer is flushed
+            event_pipeline.log_user_behavior(
+                behavior_type,
+                product=product_id,
+                user=user_id,
+                session_id=session_id,
+                ip_address=kwargs.get('ip_address'),
+                user_agent=kwargs.get('user_agent'),
+                duration_seconds=kwargs.get('duration_seconds'),
+                rating=kwargs.get('rating'),
+                review_sentiment=kwargs.get('review_sentiment'),
+                search_query=kwargs.get('search_query'),
+                referrer_page=kwargs.get('referrer_page')
+            )
             
             return True
             
@@ -0,0 +1,60 @@
+"""
+Management command to fill in the denormalized store of behavior logs
+written before the column existed. Rows are updated in primary key ranges
+so each UPDATE stays short; run it once after migrating.
+"""
+
+from django.core.management.base import BaseCommand
+from django.db.models import Max, Min, OuterRef, Subquery
+from django.utils import timezone
+from ai_models.models import UserBehaviorLog
+from products.models import Product
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    help = 'Copy product stores onto behavior log rows that have none'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=50000,
+            help='Number of primary keys covered by each UPDATE (default: 50000)',
+        )
+
+    def handle(self, *args, **options):
+        start_time = timezone.now()
+        batch_size = options['batch_size']
+
+        try:
+            pending = UserBehaviorLog.objects.filter(store__isnull=True, product__isnull=False)
+            bounds = pending.aggregate(first=Min('id'), last=Max('id'))
+            if bounds['first'] is None:
+                self.stdout.write(self.style.SUCCESS('✓ All behavior logs already have a store'))
+                return
+
+            product_store = Product.objects.filter(id=OuterRef('product_id')).values('store_id')[:1]
+            updated = 0
+            for low in range(bounds['first'], bounds['last'] + 1, batch_size):
+                updated += pending.filter(id__gte=low, id__lt=low + batch_size).update(
+                    store_id=Subquery(product_store)
+                )
+                self.stdout.write(f'  {updated} rows updated (up to id {low + batch_size - 1})')
+
+            duration = timezone.now() - start_time
+            self.stdout.write(
+                self.style.SUCCESS(
+                    f'✓ Backfilled the store of {updated} behavior logs'
+                    f'\n⏱ Duration: {duration.total_seconds():.2f} seconds'
+                )
+            )
+
+        except Exception as e:
+            self.stdout.write(
+                self.style.ERROR(f'❌ Error backfilling behavior log stores: {str(e)}')
+            )
+            logger.error(f'Error in backfill_behavior_log_stores command: {str(e)}')
+            raise e
@@ -0,0 +1,232 @@
+"""
+Implicit-feedback matrix factorization for collaborative filtering.
+
+User behaviors are turned into a sparse user x product preference matrix
+using InteractionAnalyzer.behavior_weights, and factorized offline with
+alternating least squares (Hu, Koren and Volinsky's confidence-weighted
+formulation). The resulting user and item factor matrices are published
+to the artifact store and memory-mapped by every worker, so recommending
+for a user is one dense matrix-vector product over all items plus an
+argpartition top-k.
+"""
+
+import time
+import logging
+from typing import Dict, List, Optional, Sequence
+import numpy as np
+import pandas as pd
+from scipy import sparse
+
+from .artifact_store import ArtifactHandle, artifact_store
+
+logger = logging.getLogger(__name__)
+
+ARTIFACT_NAME = 'matrix_factorization'
+ARRAY_NAMES = ['user_ids', 'item_ids', 'user_factors', 'item_factors', 'seen_indptr', 'seen_indices', 'built_at']
+
+
+class ImplicitALS:
+    """
+    Alternating least squares for implicit feedback.
+    """
+
+    def __init__(self, factors: int = 32, regularization: float = 0.1,
+                 alpha: float = 10.0, iterations: int = 15, random_state: int = 42):
+        self.factors = factors
+        self.regularization = regularization
+        self.alpha = alpha
+        self.iterations = iterations
+        self.random_state = random_state
+
+    def fit(self, preferences: sparse.csr_matrix):
+        """
+        Factorize a users x items matrix of positive preference strengths.
+        Returns (user_factors, item_factors).
+        """
+        confidence = preferences.tocsr().astype(np.float64) * self.alpha
+        confidence_t = confidence.T.tocsr()
+        rng = np.random.default_rng(self.random_state)
+        users = rng.normal(scale=0.01, size=(confidence.shape[0], self.factors))
+        items = rng.normal(scale=0.01, size=(confidence.shape[1], self.factors))
+        for _ in range(self.iterations):
+            users = self._solve(confidence, items)
+            items = self._solve(confidence_t, users)
+        return users.astype(np.float32), items.astype(np.float32)
+
+    def _solve(self, confidence: sparse.csr_matrix, fixed: np.ndarray) -> np.ndarray:
+        """
+        Solve for each row's factors with the other side held fixed:
+        (YtY + Yt (Cu - I) Y + lambda I) x_u = Yt Cu p_u
+        """
+        gram = fixed.T @ fixed + self.regularization * np.eye(self.factors)
+        solved = np.zeros((confidence.shape[0], self.factors))
+        indptr, indices, data = confidence.indptr, confidence.indices, confidence.data
+        for row in range(confidence.shape[0]):
+            start, end = indptr[row], indptr[row + 1]
+            if start == end:
+                continue
+            factors = fixed[indices[start:end]]
+            weights = data[start:end]
+            solved[row] = np.linalg.solve(
+                gram + (factors.T * weights) @ factors,
+                factors.T @ (1.0 + weights)
+            )
+        return solved
+
+
+class MatrixFactorizationModel:
+    """
+    User and item factors with the items each user was trained on.
+    """
+
+    def __init__(self, user_ids, item_ids, user_factors, item_factors,
+                 seen_indptr, seen_indices, built_at=None):
+        self.user_ids = user_ids
+        self.item_ids = item_ids
+        self.user_factors = user_factors
+        self.item_factors = item_factors
+        self.seen_indptr = seen_indptr
+        self.seen_indices = seen_indices
+        self.built_at = float(np.asarray(built_at)) if built_at is not None else time.time()
+
+    def _user_row(self, user_id: int) -> Optional[int]:
+        row = int(np.searchsorted(self.user_ids, user_id))
+        if row < len(self.user_ids) and self.user_ids[row] == user_id:
+            return row
+        return None
+
+    def has_user(self, user_id: int) -> bool:
+        return self._user_row(user_id) is not None
+
+    def recommend(self, user_id: int, limit: int = 20, exclude_ids: Sequence[int] = (),
+                  allowed_ids: Optional[np.ndarray] = None) -> List[tuple]:
+        """
+        Top (product_id, score) pairs for a user, skipping products the user
+        already interacted with. allowed_ids restricts the result to a subset
+        of products (e.g. one category).
+        """
+        row = self._user_row(user_id)
+        if row is None or limit <= 0:
+            return []
+
+        scores = self.item_factors @ self.user_factors[row]
+        scores[self.seen_indices[self.seen_indptr[row]:self.seen_indptr[row + 1]]] = -np.inf
+        if len(exclude_ids):
+            scores[np.isin(self.item_ids, exclude_ids)] = -np.inf
+        if allowed_ids is not None:
+            scores[~np.isin(self.item_ids, allowed_ids)] = -np.inf
+
+        candidates = np.flatnonzero(np.isfinite(scores))
+        if len(candidates) > limit:
+            top = np.argpartition(-scores[candidates], limit - 1)[:limit]
+            candidates = candidates[top]
+        candidates = candidates[np.argsort(-scores[candidates], kind='stable')]
+        return [(int(self.item_ids[i]), float(scores[i])) for i in candidates]
+
+    def to_arrays(self) -> Dict[str, np.ndarray]:
+        arrays = {name: np.asarray(getattr(self, name)) for name in ARRAY_NAMES if name != 'built_at'}
+        arrays['built_at'] = np.array(self.built_at)
+        return arrays
+
+    @classmethod
+    def from_artifact(cls, artifact) -> 'MatrixFactorizationModel':
+        """Wrap the memory-mapped arrays of a published artifact version."""
+        return cls(**{name: artifact[name] for name in ARRAY_NAMES})
+
+
+def build_preference_matrix(rows, behavior_weights: Dict[str, float]):
+    """
+    Sum behavior weights per (user, product) and keep positive preferences.
+    Returns (user_ids, item_ids, csr preference matrix).
+    """
+    behaviors = pd.DataFrame.from_records(rows, columns=['user_id', 'product_id', 'behavior_type'])
+    behaviors['weight'] = behaviors['behavior_type'].map(behavior_weights).fillna(1.0)
+    preferences = behaviors.groupby(['user_id', 'product_id'])['weight'].sum()
+    preferences = preferences[preferences > 0].reset_index()
+
+    user_ids, user_rows = np.unique(preferences['user_id'].to_numpy(dtype=np.int64), return_inverse=True)
+    item_ids, item_cols = np.unique(preferences['product_id'].to_numpy(dtype=np.int64), return_inverse=True)
+    matrix = sparse.csr_matrix(
+        (preferences['weight'].to_numpy(dtype=np.float64), (user_rows, item_cols)),
+        shape=(len(user_ids), len(item_ids))
+    )
+    return user_ids, item_ids, matrix
+
+
+def train_matrix_factorization(**als_options) -> Optional[MatrixFactorizationModel]:
+    """
+    Train a model from all logged-in user behaviors on active products.
+    Returns None when there is nothing to train on.
+    """
+    from recommendations.models import UserBehavior
+    from .interaction_analyzer import InteractionAnalyzer
+
+    rows = list(
+        UserBehavior.objects.filter(user__isnull=False, product__is_active=True)
+        .values_list('user_id', 'product_id', 'behavior_type')
+        .iterator(chunk_size=5000)
+    )
+    if not rows:
+        return None
+
+    user_ids, item_ids, preferences = build_preference_matrix(rows, InteractionAnalyzer().behavior_weights)
+    if not preferences.nnz:
+        return None
+
+    user_factors, item_factors = ImplicitALS(**als_options).fit(preferences)
+    return MatrixFactorizationModel(
+        user_ids=user_ids,
+        item_ids=item_ids,
+        user_factors=user_factors,
+        item_factors=item_factors,
+        seen_indptr=preferences.indptr.astype(np.int64),
+        seen_indices=preferences.indices.astype(np.int64)
+    )
+
+
+class MatrixFactorizationService:
+    """
+    Serves the current published factorization model for this worker.
+    """
+
+    reload_check_interval = 300  # seconds
+
+    def __init__(self):
+        self.handle = ArtifactHandle(
+            ARTIFACT_NAME,
+            MatrixFactorizationModel.from_artifact,
+            check_interval=self.reload_check_interval
+        )
+
+    def train(self, **als_options) -> Optional[MatrixFactorizationModel]:
+        """Train a new model, publish it and start serving it."""
+        model = train_matrix_factorization(**als_options)
+        if model is None:
+            logger.info("No user behaviors to train the matrix factorization model on")
+            return None
+        artifact = artifact_store.publish(
+            ARTIFACT_NAME,
+            model.to_arrays(),
+            metadata={'users': len(model.user_ids), 'products': len(model.item_ids)}
+        )
+        published = MatrixFactorizationModel.from_artifact(artifact)
+        self.handle.set(published, artifact.version)
+        logger.info(
+            f"Matrix factorization model trained for {len(model.user_ids)} users "
+            f"and {len(model.item_ids)} products"
+        )
+        return published
+
+    def get_model(self) -> Optional[MatrixFactorizationModel]:
+        """The current model, swapped when a newer version is published."""
+        return self.handle.get()
+
+    def recommend(self, user_id: int, limit: int = 20, exclude_ids: Sequence[int] = (),
+                  allowed_ids: Optional[np.ndarray] = None) -> List[tuple]:
+        model = self.get_model()
+        if model is None:
+            return []
+        return model.recommend(user_id, limit, exclude_ids, allowed_ids)
+
+
+matrix_factorization_service = MatrixFactorizationService()
@@ -0,0 +1,24 @@
+# Generated by Django 5.0.14 on 2026-10-16 22:46
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ai_models', '0002_initial'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='userbehaviorlog',
+            name='timestamp',
+            field=models.DateTimeField(default=django.utils.timezone.now, editable=False),
+        ),
+        migrations.AlterField(
+            model_name='usersessioninteraction',
+            name='timestamp',
+            field=models.DateTimeField(default=django.utils.timezone.now, editable=False),
+        ),
+    ]
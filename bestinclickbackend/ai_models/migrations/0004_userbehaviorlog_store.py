@@ -0,0 +1,26 @@
+# Generated by Django 5.0.14 on 2026-10-17 00:45
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ai_models', '0003_alter_userbehaviorlog_timestamp_and_more'),
+        ('products', '0006_product_search_index'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='userbehaviorlog',
+            name='store',
+            field=models.ForeignKey(blank=True, db_index=False, help_text='Store of the product, copied from it so store dashboards need no join', null=True, on_delete=django.db.models.deletion.CASCADE, related_name='behavior_logs', to='products.store'),
+        ),
+        migrations.AddIndex(
+            model_name='userbehaviorlog',
+            index=models.Index(fields=['store', 'timestamp', 'action_type'], name='user_behavi_store_i_00f5b7_idx'),
+        ),
+    ]
@@ -3,8 +3,9 @@ Models for AI behavior tracking and machine learning data.
 """
 
 from django.db import models
+from django.utils import timezone
 from django.contrib.auth import get_user_model
-from products.models import Product
+from products.models import Product, Store
 
 User = get_user_model()
 
@@ -39,9 +40,18 @@ class UserBehaviorLog(models.Model):
         blank=True,
         help_text="Product involved in the action (null for non-product actions)"
     )
+    store = models.ForeignKey(
+        Store,
+        on_delete=models.CASCADE,
+        null=True,
+        blank=True,
+        db_index=False,
+        related_name='behavior_logs',
+        help_text="Store of the product, copied from it so store dashboards need no join"
+    )
     
     action_type = models.CharField(max_length=20, choices=ACTION_TYPES)
-    timestamp = models.DateTimeField(auto_now_add=True)
+    timestamp = models.DateTimeField(default=timezone.now, editable=False)
     
     # Additional context data
     metadata = models.JSONField(
@@ -62,8 +72,15 @@ class UserBehaviorLog(models.Model):
             models.Index(fields=['product', 'action_type']),
             models.Index(fields=['session_id', 'timestamp']),
             models.Index(fields=['action_type', 'timestamp']),
+            models.Index(fields=['store', 'timestamp', 'action_type']),
         ]
     
+    def save(self, *args, **kwargs):
+        """Copy the product's store if not set."""
+        if self.store_id is None and self.product_id is not None:
+            self.store_id = Product.objects.filter(id=self.product_id).values_list('store_id', flat=True).first()
+        super().save(*args, **kwargs)
+    
     def __str__(self):
         user_str = self.user.username if self.user else 'Guest'
         product_str = self.product.name if self.product else 'N/A'
@@ -98,7 +115,7 @@ class UserSessionInteraction(models.Model):
     )
     
     interaction_type = models.CharField(max_length=20, choices=INTERACTION_TYPES)
-    timestamp = models.DateTimeField(auto_now_add=True)
+    timestamp = models.DateTimeField(default=timezone.now, editable=False)
     
     # Context data for real-time analysis
     page_url = models.URLField(blank=True)
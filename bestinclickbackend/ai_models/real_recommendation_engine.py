@@ -1,17 +1,28 @@
 """
 Real recommendation engine that works with actual database data.
 No mock data - only real user behavior and product data.
+
+Personalized recommendations run in one of two modes, chosen with the
+RECOMMENDATION_ENGINE_MODE setting: 'single_pass' (the default) loads the
+user's interactions once and scores candidates from the in-memory candidate
+index in a single vectorized pass; 'strategies' runs the likes, reviews,
+behavior and category strategies one after another against the database.
 """
 
 import logging
 from typing import List, Dict, Optional, Set
+import numpy as np
+from django.conf import settings
 from django.contrib.auth import get_user_model
-from django.db.models import Q, Count, Avg, F
+from django.db.models import Q, Avg, F
 from django.utils import timezone
 from datetime import timedelta
 
 from products.models import Product, ProductLike, ProductReview, Category
 from recommendations.models import UserBehavior
+from recommendations.trending import trending_service
+from .similarity_index import similar_product_service
+from .candidate_index import ProductCandidateIndex, candidate_index_service
 
 User = get_user_model()
 logger = logging.getLogger(__name__)
@@ -22,7 +33,11 @@ class RealRecommendationEngine:
     Recommendation engine that works with real database data only.
     """
     
-    def __init__(self):
+    # Behaviors considered when profiling a user for recommendations
+    profile_days = 30
+
+    def __init__(self, mode: Optional[str] = None):
+        self.mode = mode or getattr(settings, 'RECOMMENDATION_ENGINE_MODE', 'single_pass')
         self.behavior_weights = {
             'view': 1.0,
             'like': 5.0,
@@ -53,6 +68,14 @@ class RealRecommendationEngine:
             if not user or not user.is_authenticated:
                 return self.get_general_recommendations(limit=limit, category_id=category_id, exclude_ids=exclude_ids)
             
+            if self.mode == 'single_pass':
+                index = candidate_index_service.get_index()
+                if index is not None:
+                    return self._get_single_pass_recommendations(
+                        user, limit, category_id, exclude_ids or [], index
+                    )
+                # No index in this worker yet: use the strategies below
+            
             exclude_ids = exclude_ids or []
             recommendations = []
             
@@ -204,6 +227,112 @@ class RealRecommendationEngine:
             except:
                 return []
     
+    def _load_interaction_profile(self, user: User) -> Dict[str, np.ndarray]:
+        """
+        Load the user's likes, reviews and recent behaviors as ID arrays.
+        """
+        liked = list(ProductLike.objects.filter(user=user).values_list('product_id', flat=True))
+        reviews = list(ProductReview.objects.filter(user=user).values_list('product_id', 'rating'))
+        behaviors = list(
+            UserBehavior.objects.filter(
+                user=user,
+                timestamp__gte=timezone.now() - timedelta(days=self.profile_days)
+            ).values_list('product_id', flat=True)
+        )
+        return {
+            'liked': np.array(liked, dtype=np.int64),
+            'reviewed': np.array([product_id for product_id, _ in reviews], dtype=np.int64),
+            'review_ratings': np.array([rating for _, rating in reviews], dtype=np.int64),
+            'behaviors': np.array(behaviors, dtype=np.int64),
+        }
+    
+    def _get_single_pass_recommendations(
+        self,
+        user: User,
+        limit: int,
+        category_id: Optional[int],
+        exclude_ids: List[int],
+        index: ProductCandidateIndex
+    ) -> List[Dict]:
+        """
+        Score candidates from the in-memory candidate index in one pass.
+
+        Uses the same signals and scores as the strategy mode: products in
+        the categories and brands the user liked, in the categories of
+        products they rated highly, in categories they recently interacted
+        with, and popular products to fill the rest. Each of the first three
+        contributes at most limit // 4 products.
+
+        Unlike the strategy mode, which only kept each strategy's own source
+        products out of that strategy, products the user liked, reviewed or
+        interacted with in the profile window are never recommended,
+        including as popular fill.
+        """
+        profile = self._load_interaction_profile(user)
+        if not len(index):
+            return []
+        
+        liked_pos = index.positions(profile['liked'])
+        high_rated_pos = index.positions(profile['reviewed'][profile['review_ratings'] >= 4])
+        behavior_pos = index.positions(profile['behaviors'])
+        
+        liked_categories = np.unique(index.categories[liked_pos])
+        liked_brands = np.unique(index.brands[liked_pos])
+        review_categories = np.unique(index.categories[high_rated_pos])
+        behavior_categories = np.unique(index.categories[behavior_pos])
+        
+        if category_id:
+            candidates = index.by_category.get(category_id, np.empty(0, dtype=np.int64))
+        else:
+            candidates = index.candidates(
+                category_ids=np.union1d(np.union1d(liked_categories, review_categories), behavior_categories).tolist(),
+                brand_ids=liked_brands.tolist()
+            )
+        
+        # Drop products the user already interacted with or asked to exclude
+        seen = np.concatenate((profile['liked'], profile['reviewed'], profile['behaviors'],
+                               np.asarray(exclude_ids, dtype=np.int64)))
+        candidates = candidates[~np.isin(index.ids[candidates], seen)]
+        if not len(candidates):
+            return []
+        candidates = candidates[np.argsort(index.rank[candidates])]
+        
+        categories = index.categories[candidates]
+        ratings = index.ratings[candidates]
+        scores = 0.6 + (ratings / 5.0) * 0.2
+        algorithms = np.full(len(candidates), 'category_based', dtype=object)
+        
+        # Personal signals in priority order, each with its own quota
+        quota = limit // 4
+        taken = np.zeros(len(candidates), dtype=bool)
+        strategies = [
+            ('based_on_likes',
+             np.isin(categories, liked_categories) & np.isin(index.brands[candidates], liked_brands),
+             np.full(len(candidates), 1.0)),
+            ('based_on_reviews',
+             np.isin(categories, review_categories) & (ratings >= 4.0),
+             0.75 + (ratings / 5.0) * 0.25),
+            ('based_on_behavior',
+             np.isin(categories, behavior_categories),
+             np.full(len(candidates), 0.8)),
+        ]
+        for algorithm, matches, strategy_scores in strategies:
+            selected = np.flatnonzero(matches & ~taken)[:quota]
+            taken[selected] = True
+            scores[selected] = strategy_scores[selected]
+            algorithms[selected] = algorithm
+        
+        # Stable sort keeps popularity order among equal scores
+        best = np.argsort(-scores, kind='stable')[:limit]
+        return [
+            {
+                'product_id': int(index.ids[candidates[i]]),
+                'score': float(min(scores[i], 1.0)),
+                'algorithm': algorithms[i]
+            }
+            for i in best
+        ]
+    
     def _get_recommendations_from_likes(
         self,
         user: User,
@@ -463,6 +592,22 @@ class RealRecommendationEngine:
         Get products similar to a specific product based on real data.
         """
         try:
+            # Serve from the in-memory item-embedding index when it covers the product
+            try:
+                matches = similar_product_service.similar(product_id, limit)
+            except Exception as e:
+                logger.warning(f"Similar product index unavailable: {str(e)}")
+                matches = []
+            if matches:
+                return [
+                    {
+                        'product_id': similar_id,
+                        'score': max(0.1, score),
+                        'algorithm': 'content_similarity'
+                    }
+                    for similar_id, score in matches
+                ]
+            
             # Get the base product
             try:
                 base_product = Product.objects.get(id=product_id, is_active=True)
@@ -510,35 +655,19 @@ class RealRecommendationEngine:
             logger.error(f"Error getting similar products: {str(e)}")
             return []
     
-    def get_trending_products(self, limit: int = 20) -> List[Dict]:
+    def get_trending_products(self, limit: int = 20, category_id: Optional[int] = None) -> List[Dict]:
         """
-        Get trending products based on recent activity.
+        Get trending products from the materialized trending ranking.
         """
         try:
-            # Get products with recent positive interactions
-            recent_date = timezone.now() - timedelta(days=7)
-            
-            trending_products = Product.objects.filter(
-                is_active=True,
-                userbehavior__timestamp__gte=recent_date,
-                userbehavior__behavior_type__in=['view', 'like', 'cart_add', 'purchase']
-            ).annotate(
-                recent_interactions=Count('userbehavior')
-            ).order_by('-recent_interactions', '-average_rating')[:limit]
-            
-            recommendations = []
-            for i, product in enumerate(trending_products):
-                # Score based on recent interactions and rating
-                interaction_score = min(product.recent_interactions / 50.0, 1.0)
-                rating_score = product.average_rating / 5.0 if product.average_rating > 0 else 0.5
-                
-                score = interaction_score * 0.7 + rating_score * 0.3
-                
-                recommendations.append({
-                    'product_id': product.id,
+            recommendations = [
+                {
+                    'product_id': product_id,
                     'score': score,
                     'algorithm': 'trending_analysis'
-                })
+                }
+                for product_id, score in trending_service.get_trending(limit, category_id)
+            ]
             
             # If not enough trending products, fill with highly rated recent products
             if len(recommendations) < limit:
@@ -548,11 +677,13 @@ class RealRecommendationEngine:
                 recent_products = Product.objects.filter(
                     is_active=True,
                     created_at__gte=timezone.now() - timedelta(days=30)
-                ).exclude(id__in=existing_ids).order_by('-average_rating')[:remaining]
+                ).exclude(id__in=existing_ids)
+                if category_id:
+                    recent_products = recent_products.filter(category_id=category_id)
                 
-                for product in recent_products:
+                for product_id in recent_products.order_by('-average_rating').values_list('id', flat=True)[:remaining]:
                     recommendations.append({
-                        'product_id': product.id,
+                        'product_id': product_id,
                         'score': 0.6,
                         'algorithm': 'recent_products'
                     })
@@ -17,6 +17,7 @@ from recommendations.models import (
     UserPreference, RecommendationSession, RecommendationResult
 )
 from django.contrib.auth import get_user_model
+from .matrix_factorization import matrix_factorization_service
 
 User = get_user_model()
 logger = logging.getLogger(__name__)
@@ -151,6 +152,22 @@ class SmartRecommendationEngine:
         Collaborative filtering based on user similarities.
         """
         try:
+            # Prefer the trained factor model when it knows this user
+            try:
+                matches = matrix_factorization_service.recommend(user.id, limit)
+            except Exception as e:
+                logger.warning(f"Matrix factorization model unavailable: {str(e)}")
+                matches = []
+            if matches:
+                return [
+                    {
+                        'product_id': product_id,
+                        'score': min(max(score, 0.0), 1.0),
+                        'algorithm': 'collaborative_filtering'
+                    }
+                    for product_id, score in matches
+                ]
+            
             # Find similar users
             similar_users = UserSimilarity.objects.filter(
                 Q(user1=user) | Q(user2=user),
@@ -13,6 +13,9 @@ from django.utils import timezone
 from datetime import timedelta
 from products.models import Product, Category, Store
 from .models import UserBehaviorLog, UserSessionInteraction
+from .spell_correction import get_spell_corrector
+from .autocomplete import autocomplete_service
+from .similarity_index import similar_product_service
 import random
 
 User = get_user_model()
@@ -52,21 +55,26 @@ class SearchService:
     
     def _spell_correct(self, query: str) -> str:
         """
-        Basic spell correction using common typos dictionary.
+        Spell correction using known typos and the catalog vocabulary.
         """
         words = query.split()
         corrected_words = []
         
         for word in words:
-            corrected = word
+            corrected = None
             for correct_word, typos in self.common_typos.items():
                 if word in typos:
                     corrected = correct_word
                     break
+            if corrected is None:
+                corrected = self._get_spell_corrector().correct(word)
             corrected_words.append(corrected)
         
         return ' '.join(corrected_words)
     
+    def _get_spell_corrector(self):
+        return get_spell_corrector(seed_words=self.common_typos.keys())
+    
     def _expand_synonyms(self, query: str) -> str:
         """
         Expand query with synonyms for better matching.
@@ -92,25 +100,7 @@ class SearchService:
         Get search suggestions based on partial query.
         """
         try:
-            # Get popular search terms from behavior logs
-            popular_searches = UserBehaviorLog.objects.filter(
-                action_type='search',
-                metadata__search_query__icontains=partial_query
-            ).values('metadata__search_query').annotate(
-                count=Count('id')
-            ).order_by('-count')[:limit]
-            
-            suggestions = [item['metadata__search_query'] for item in popular_searches]
-            
-            # Add product name suggestions
-            product_suggestions = Product.objects.filter(
-                name__icontains=partial_query,
-                is_active=True
-            ).values_list('name', flat=True)[:limit-len(suggestions)]
-            
-            suggestions.extend(product_suggestions)
-            
-            return suggestions[:limit]
+            return autocomplete_service.suggest(partial_query, limit)
             
         except Exception as e:
             logger.error(f"Error getting search suggestions: {str(e)}")
@@ -327,6 +317,25 @@ class RecommendationService:
         Get products similar to the given product.
         """
         try:
+            matches = similar_product_service.similar(product.id, limit)
+            if matches:
+                products = Product.objects.filter(
+                    id__in=[product_id for product_id, _ in matches],
+                    is_active=True
+                ).in_bulk()
+                return [
+                    {
+                        'product_id': product_id,
+                        'name': products[product_id].name,
+                        'price': float(products[product_id].get_final_price()),
+                        'rating': products[product_id].average_rating,
+                        'score': max(0.0, score),
+                        'algorithm': 'content_similarity',
+                        'reason': 'Similar features and bought by similar shoppers'
+                    }
+                    for product_id, score in matches if product_id in products
+                ]
+            
             # Find products in same category and brand
             similar_products = Product.objects.filter(
                 category=product.category,
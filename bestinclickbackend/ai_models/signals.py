@@ -0,0 +1,57 @@
+"""
+Signal handlers for ai_models app.
+"""
+
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+from products.models import Product, ProductReview
+from .similarity_index import similar_product_service
+from .store_insights import store_insights_cache
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+@receiver(post_save, sender=Product)
+def update_similar_product_index(sender, instance, **kwargs):
+    """
+    Insert new or edited products into the loaded similar-product index.
+    """
+    try:
+        similar_product_service.update_product(instance)
+    except Exception as e:
+        logger.error(f"Error updating similar product index for {instance.pk}: {str(e)}")
+
+
+@receiver(post_delete, sender=Product)
+def remove_from_similar_product_index(sender, instance, **kwargs):
+    """
+    Drop deleted products from the loaded similar-product index.
+    """
+    similar_product_service.remove_product(instance.pk)
+
+
+def _invalidate_store_insights(store_id):
+    try:
+        store_insights_cache.invalidate([store_id])
+    except Exception as e:
+        logger.error(f"Error invalidating insights for store {store_id}: {str(e)}")
+
+
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+def invalidate_insights_on_product_change(sender, instance, **kwargs):
+    """
+    Rebuild a store's cached insights after its products or stock change.
+    """
+    _invalidate_store_insights(instance.store_id)
+
+
+@receiver(post_save, sender=ProductReview)
+@receiver(post_delete, sender=ProductReview)
+def invalidate_insights_on_review(sender, instance, **kwargs):
+    """
+    Rebuild the cached insights of the store whose product was reviewed.
+    """
+    store_id = Product.objects.filter(id=instance.product_id).values_list('store_id', flat=True).first()
+    _invalidate_store_insights(store_id)
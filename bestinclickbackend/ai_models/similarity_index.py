@@ -0,0 +1,493 @@
+"""
+Item-embedding index for similar-product lookups.
+
+Each active product is embedded into a fixed-size unit vector built from
+TF-IDF of its name, description and attributes (reduced with truncated
+SVD), hashed category, brand and price-bucket features, and co-interaction
+factors learned from UserBehavior. Vectors are indexed with random-projection
+LSH; a lookup hashes the query vector, gathers the colliding products and
+re-ranks them by cosine similarity, all in process memory.
+
+The index is published to the artifact store, so workers memory-map the
+vectors instead of rebuilding them and swap to a version rebuilt by another
+worker. New or edited products are inserted incrementally using the fitted
+vocabulary and projections; their vectors are kept in a side buffer so the
+mapped array is never copied, and are merged into it at the next publish.
+"""
+
+import math
+import time
+import hashlib
+import threading
+import logging
+from collections import Counter
+from typing import Dict, List, Optional, Tuple
+import numpy as np
+from scipy import sparse
+
+from products.search_index import flatten_attributes, tokenize
+from .artifact_store import ArtifactHandle, artifact_store
+
+logger = logging.getLogger(__name__)
+
+ARTIFACT_NAME = 'similar_products'
+
+
+def _feature_bucket(feature: str, dims: int) -> int:
+    digest = hashlib.blake2b(feature.encode('utf-8'), digest_size=8).digest()
+    return int.from_bytes(digest, 'big') % dims
+
+
+def _unit(matrix: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(matrix, axis=-1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+
+def product_text(product) -> str:
+    return ' '.join([
+        product.name or '',
+        product.description or '',
+        flatten_attributes(product.attributes),
+    ])
+
+
+class ProductEmbedder:
+    """
+    Maps product features to unit vectors of a fixed dimension.
+    """
+
+    text_dims = 64
+    feature_dims = 32
+    interaction_dims = 16
+    max_vocabulary = 20000
+
+    text_weight = 1.0
+    category_weight = 0.8
+    brand_weight = 0.5
+    price_weight = 0.4
+    interaction_weight = 1.0
+
+    def __init__(self, vocabulary: Dict[str, int], idf: np.ndarray, text_components: np.ndarray,
+                 interaction_factors: Optional[Dict[int, np.ndarray]] = None):
+        self.vocabulary = vocabulary
+        self.idf = idf
+        self.text_components = text_components
+        self.interaction_factors = interaction_factors or {}
+
+    @property
+    def dims(self) -> int:
+        return self.text_components.shape[0] + self.feature_dims + self.interaction_dims
+
+    # Fitting
+
+    @classmethod
+    def fit(cls, texts: List[str], interactions=None) -> 'ProductEmbedder':
+        """
+        Fit the text vocabulary and projections. interactions is an optional
+        (product_ids, item x user sparse matrix) pair.
+        """
+        document_frequency = Counter()
+        for text in texts:
+            document_frequency.update(set(tokenize(text)))
+        terms = [term for term, _ in document_frequency.most_common(cls.max_vocabulary)]
+        vocabulary = {term: i for i, term in enumerate(sorted(terms))}
+        df = np.array([document_frequency[term] for term in sorted(terms)], dtype=np.float64)
+        # Smoothed inverse document frequency
+        idf = np.log((1 + len(texts)) / (1 + df)) + 1 if len(df) else np.zeros(0)
+
+        embedder = cls(vocabulary, idf, np.zeros((0, len(vocabulary)), dtype=np.float32))
+        tfidf = embedder._tfidf(texts)
+        embedder.text_components = cls._reduce(tfidf, cls.text_dims)
+        if interactions is not None:
+            embedder.interaction_factors = cls._interaction_factors(*interactions)
+        return embedder
+
+    @staticmethod
+    def _reduce(matrix: sparse.csr_matrix, dims: int) -> np.ndarray:
+        """Return a (k, n_features) projection with k <= dims."""
+        n_samples, n_features = matrix.shape
+        if n_features == 0:
+            return np.zeros((0, 0), dtype=np.float32)
+        if min(n_samples, n_features) <= dims:
+            return np.eye(n_features, dtype=np.float32)
+        from sklearn.decomposition import TruncatedSVD
+
+        svd = TruncatedSVD(n_components=dims, random_state=0)
+        svd.fit(matrix)
+        return svd.components_.astype(np.float32)
+
+    @classmethod
+    def _interaction_factors(cls, product_ids, item_user: sparse.csr_matrix) -> Dict[int, np.ndarray]:
+        """Factorize the item x user matrix into co-interaction item factors."""
+        if item_user.nnz == 0 or min(item_user.shape) <= cls.interaction_dims:
+            return {}
+        from sklearn.decomposition import TruncatedSVD
+
+        svd = TruncatedSVD(n_components=cls.interaction_dims, random_state=0)
+        factors = _unit(svd.fit_transform(item_user)).astype(np.float32)
+        has_interactions = np.diff(item_user.indptr) > 0
+        return {
+            int(product_id): factors[i]
+            for i, product_id in enumerate(product_ids) if has_interactions[i]
+        }
+
+    # Embedding
+
+    def _tfidf(self, texts: List[str]) -> sparse.csr_matrix:
+        rows, cols, values = [], [], []
+        for row, text in enumerate(texts):
+            counts = Counter(term for term in tokenize(text) if term in self.vocabulary)
+            for term, count in counts.items():
+                rows.append(row)
+                cols.append(self.vocabulary[term])
+                values.append((1 + math.log(count)) * self.idf[self.vocabulary[term]])
+        matrix = sparse.csr_matrix(
+            (values, (rows, cols)), shape=(len(texts), len(self.vocabulary)), dtype=np.float64
+        )
+        norms = np.sqrt(np.asarray(matrix.multiply(matrix).sum(axis=1)).ravel())
+        norms[norms == 0] = 1.0
+        return sparse.diags(1.0 / norms) @ matrix
+
+    def _features(self, category_id, brand_id, price) -> np.ndarray:
+        vector = np.zeros(self.feature_dims, dtype=np.float32)
+        if category_id:
+            vector[_feature_bucket(f'category:{category_id}', self.feature_dims)] += self.category_weight
+        if brand_id:
+            vector[_feature_bucket(f'brand:{brand_id}', self.feature_dims)] += self.brand_weight
+        if price and price > 0:
+            # Logarithmic price bands; the neighbouring band gets half weight
+            # so that products near a band edge still match
+            band = math.log2(float(price)) * 2
+            low = math.floor(band)
+            upper_share = band - low
+            vector[_feature_bucket(f'price:{low}', self.feature_dims)] += self.price_weight * (1 - upper_share / 2)
+            vector[_feature_bucket(f'price:{low + 1}', self.feature_dims)] += self.price_weight * (0.5 + upper_share / 2)
+        return vector
+
+    def embed(self, rows: List[Dict]) -> np.ndarray:
+        """
+        Embed products given as dicts with id, text, category_id, brand_id
+        and price keys.
+        """
+        if not rows:
+            return np.zeros((0, self.dims), dtype=np.float32)
+        text = self._tfidf([row['text'] for row in rows]) @ self.text_components.T
+        text = _unit(np.asarray(text, dtype=np.float32)) * self.text_weight
+        features = np.stack([
+            self._features(row['category_id'], row['brand_id'], row['price']) for row in rows
+        ])
+        interactions = np.stack([
+            self.interaction_factors.get(row['id'], np.zeros(self.interaction_dims, dtype=np.float32))
+            for row in rows
+        ]) * self.interaction_weight
+        return _unit(np.hstack([text, features, interactions])).astype(np.float32)
+
+    def to_arrays(self) -> Dict[str, np.ndarray]:
+        terms = sorted(self.vocabulary, key=self.vocabulary.get)
+        factor_ids = np.array(sorted(self.interaction_factors), dtype=np.int64)
+        return {
+            'embedder_terms': np.array(terms, dtype=str),
+            'embedder_idf': self.idf,
+            'embedder_text_components': self.text_components,
+            'embedder_factor_ids': factor_ids,
+            'embedder_factors': (
+                np.stack([self.interaction_factors[i] for i in factor_ids])
+                if len(factor_ids) else np.zeros((0, self.interaction_dims), dtype=np.float32)
+            ),
+        }
+
+    @classmethod
+    def from_arrays(cls, arrays) -> 'ProductEmbedder':
+        vocabulary = {str(term): i for i, term in enumerate(arrays['embedder_terms'])}
+        factors = {
+            int(product_id): arrays['embedder_factors'][i]
+            for i, product_id in enumerate(arrays['embedder_factor_ids'])
+        }
+        return cls(vocabulary, arrays['embedder_idf'], arrays['embedder_text_components'], factors)
+
+
+class SimilarProductIndex:
+    """
+    Random-projection LSH index over product embeddings.
+    """
+
+    num_tables = 8
+    num_bits = 10
+    seed = 42
+    initial_extra_capacity = 64
+
+    def __init__(self, embedder: ProductEmbedder, product_ids: np.ndarray, vectors: np.ndarray,
+                 built_at: Optional[float] = None):
+        self.embedder = embedder
+        self.built_at = built_at if built_at is not None else time.time()
+        self._lock = threading.Lock()
+
+        planes = np.random.RandomState(self.seed).standard_normal(
+            (self.num_tables * self.num_bits, embedder.dims)
+        ).astype(np.float32)
+        self._planes = planes
+        self._bit_weights = (1 << np.arange(self.num_bits)).astype(np.int64)
+
+        # The built (possibly memory-mapped) vectors are never copied;
+        # incremental inserts go to a side buffer with spare capacity, which
+        # is merged into the base array when the index is next published
+        self._vectors = np.asarray(vectors, dtype=np.float32)
+        self._extra = np.zeros((self.initial_extra_capacity, embedder.dims), dtype=np.float32)
+        self._extra_count = 0
+        self._product_ids: List[int] = []
+        self._positions: Dict[int, int] = {}
+        self._removed = set()
+        self._tables: List[Dict[int, List[int]]] = [{} for _ in range(self.num_tables)]
+        self._index(np.asarray(product_ids, dtype=np.int64), self._vectors)
+
+    def _codes(self, vectors: np.ndarray) -> np.ndarray:
+        bits = (vectors @ self._planes.T > 0).reshape(len(vectors), self.num_tables, self.num_bits)
+        return bits.astype(np.int64) @ self._bit_weights
+
+    def _rows(self, positions: np.ndarray) -> np.ndarray:
+        """Vectors at the given positions, from the base array or the side buffer."""
+        base = len(self._vectors)
+        in_base = positions < base
+        if in_base.all():
+            return self._vectors[positions]
+        rows = np.empty((len(positions), self.embedder.dims), dtype=np.float32)
+        rows[in_base] = self._vectors[positions[in_base]]
+        rows[~in_base] = self._extra[positions[~in_base] - base]
+        return rows
+
+    def _insert(self, product_ids: np.ndarray, vectors: np.ndarray):
+        needed = self._extra_count + len(vectors)
+        if needed > len(self._extra):
+            # Double the side buffer so inserts stay amortized O(1)
+            grown = np.zeros((max(needed, 2 * len(self._extra)), self.embedder.dims), dtype=np.float32)
+            grown[:self._extra_count] = self._extra[:self._extra_count]
+            self._extra = grown
+        self._extra[self._extra_count:needed] = vectors
+        self._extra_count = needed
+        self._index(product_ids, vectors)
+
+    def _index(self, product_ids: np.ndarray, vectors: np.ndarray):
+        start = len(self._product_ids)
+        for offset, (product_id, codes) in enumerate(zip(product_ids, self._codes(vectors))):
+            position = start + offset
+            self._product_ids.append(int(product_id))
+            self._positions[int(product_id)] = position
+            for table, code in zip(self._tables, codes):
+                table.setdefault(int(code), []).append(position)
+
+    def add(self, product_id: int, vector: np.ndarray):
+        """Insert or replace a product's vector."""
+        with self._lock:
+            old_position = self._positions.get(product_id)
+            if old_position is not None:
+                self._removed.add(old_position)
+            self._insert(np.array([product_id]), vector.reshape(1, -1))
+
+    def remove(self, product_id: int):
+        with self._lock:
+            position = self._positions.pop(product_id, None)
+            if position is not None:
+                self._removed.add(position)
+
+    def __contains__(self, product_id: int) -> bool:
+        return product_id in self._positions
+
+    def __len__(self):
+        return len(self._positions)
+
+    def _candidates(self, codes: np.ndarray, wanted: int) -> set:
+        candidates = set()
+        for table, code in zip(self._tables, codes):
+            candidates.update(table.get(int(code), ()))
+        if len(candidates) < wanted:
+            # Multi-probe: also visit buckets one bit away
+            for table, code in zip(self._tables, codes):
+                for bit in range(self.num_bits):
+                    candidates.update(table.get(int(code) ^ (1 << bit), ()))
+        return candidates
+
+    def similar(self, product_id: int, limit: int = 10) -> List[Tuple[int, float]]:
+        """Return up to limit (product_id, similarity) pairs, most similar first."""
+        position = self._positions.get(product_id)
+        if position is None:
+            return []
+        query = self._rows(np.array([position]))[0]
+        candidates = self._candidates(self._codes(query.reshape(1, -1))[0], limit * 4)
+        candidates -= self._removed
+        candidates.discard(position)
+        if not candidates:
+            return []
+
+        candidates = np.fromiter(candidates, dtype=np.int64, count=len(candidates))
+        scores = self._rows(candidates) @ query
+        if len(candidates) > limit:
+            top = np.argpartition(-scores, limit)[:limit]
+            candidates, scores = candidates[top], scores[top]
+        order = np.argsort(-scores)
+        return [(self._product_ids[candidates[i]], float(scores[i])) for i in order]
+
+    # Artifacts
+
+    def to_arrays(self) -> Dict[str, np.ndarray]:
+        live = sorted(self._positions.values())
+        arrays = self.embedder.to_arrays()
+        arrays.update({
+            'built_at': np.array(self.built_at),
+            'product_ids': np.array([self._product_ids[i] for i in live], dtype=np.int64),
+            'vectors': self._rows(np.array(live, dtype=np.int64)),
+        })
+        return arrays
+
+    @classmethod
+    def from_artifact(cls, artifact) -> 'SimilarProductIndex':
+        """Wrap the memory-mapped arrays of a published artifact version."""
+        return cls(
+            ProductEmbedder.from_arrays(artifact),
+            artifact['product_ids'],
+            artifact['vectors'],
+            float(artifact['built_at'])
+        )
+
+
+def _product_rows(products) -> List[Dict]:
+    return [
+        {
+            'id': product.id,
+            'text': product_text(product),
+            'category_id': product.category_id,
+            'brand_id': product.brand_id,
+            'price': product.get_final_price(),
+        }
+        for product in products
+    ]
+
+
+def build_similar_product_index(interaction_days: int = 180) -> SimilarProductIndex:
+    """
+    Embed all active products and index them.
+    """
+    from datetime import timedelta
+    from django.utils import timezone
+    from products.models import Product
+    from recommendations.models import UserBehavior
+    from .interaction_analyzer import InteractionAnalyzer
+
+    products = list(Product.objects.filter(is_active=True).only(
+        'id', 'name', 'description', 'attributes', 'category_id', 'brand_id',
+        'price', 'discount_percentage'
+    ).order_by('id'))
+    rows = _product_rows(products)
+    product_ids = np.array([row['id'] for row in rows], dtype=np.int64)
+
+    # Co-interaction matrix: products interacted with by the same users
+    weights = InteractionAnalyzer().behavior_weights
+    behaviors = UserBehavior.objects.filter(
+        user__isnull=False,
+        product_id__in=product_ids.tolist(),
+        timestamp__gte=timezone.now() - timedelta(days=interaction_days)
+    ).values_list('product_id', 'user_id', 'behavior_type')
+    item_rows, user_ids, values = [], [], []
+    positions = {int(product_id): i for i, product_id in enumerate(product_ids)}
+    for product_id, user_id, behavior_type in behaviors.iterator(chunk_size=10000):
+        weight = weights.get(behavior_type, 1.0)
+        if weight > 0:
+            item_rows.append(positions[product_id])
+            user_ids.append(user_id)
+            values.append(weight)
+    _, user_columns = np.unique(np.array(user_ids, dtype=np.int64), return_inverse=True)
+    item_user = sparse.csr_matrix(
+        (values, (item_rows, user_columns)),
+        shape=(len(product_ids), int(user_columns.max()) + 1 if len(user_columns) else 0)
+    )
+
+    embedder = ProductEmbedder.fit([row['text'] for row in rows], (product_ids, item_user))
+    return SimilarProductIndex(embedder, product_ids, embedder.embed(rows))
+
+
+class SimilarProductService:
+    """
+    Holds the current similar-product index for this worker.
+    """
+
+    refresh_interval = 6 * 3600  # seconds
+    reload_check_interval = 60
+
+    def __init__(self):
+        self.handle = ArtifactHandle(
+            ARTIFACT_NAME,
+            SimilarProductIndex.from_artifact,
+            check_interval=self.reload_check_interval
+        )
+        self._lock = threading.Lock()
+        self._refreshing = False
+
+    def _is_stale(self, index: Optional[SimilarProductIndex]) -> bool:
+        return index is None or time.time() - index.built_at >= self.refresh_interval
+
+    def rebuild(self) -> SimilarProductIndex:
+        """Build a new index from the database and publish it."""
+        index = build_similar_product_index()
+        version = None
+        try:
+            artifact = artifact_store.publish(ARTIFACT_NAME, index.to_arrays(), metadata={'products': len(index)})
+            index, version = SimilarProductIndex.from_artifact(artifact), artifact.version
+        except Exception as e:
+            logger.warning(f"Could not publish similar product index: {str(e)}")
+        self.handle.set(index, version)
+        logger.info(f"Similar product index rebuilt with {len(index)} products")
+        return index
+
+    def refresh(self) -> SimilarProductIndex:
+        """
+        Swap in a fresh index, preferring a version published by another
+        worker over rebuilding from the database.
+        """
+        with self._lock:
+            try:
+                index = self.handle.get()
+                if not self._is_stale(index):
+                    return index
+                return self.rebuild()
+            finally:
+                self._refreshing = False
+
+    def get_index(self) -> Optional[SimilarProductIndex]:
+        """
+        The current index, loaded from the published artifact. Never built
+        inside the request: without a published version, None is returned
+        while the first build runs in the background.
+        """
+        index = self.handle.get()
+        if self._is_stale(index) and not self._refreshing:
+            from .background import run_in_background
+
+            self._refreshing = True
+            run_in_background(self.refresh, name='similar-products-refresh')
+        return index
+
+    def similar(self, product_id: int, limit: int = 10) -> List[Tuple[int, float]]:
+        """Similar products, or an empty list until an index is available."""
+        index = self.get_index()
+        if index is None:
+            return []
+        return index.similar(product_id, limit)
+
+    def update_product(self, product):
+        """Insert, refresh or drop a product in the loaded index."""
+        index = self.handle.current()
+        if index is None:
+            return
+        if not product.is_active:
+            index.remove(product.id)
+            return
+        vector = index.embedder.embed(_product_rows([product]))[0]
+        index.add(product.id, vector)
+
+    def remove_product(self, product_id: int):
+        index = self.handle.current()
+        if index is not None:
+            index.remove(product_id)
+
+
+similar_product_service = SimilarProductService()
@@ -0,0 +1,272 @@
+"""
+Typo-tolerant spell correction built from the live catalog vocabulary.
+
+Uses a SymSpell-style symmetric deletion index: every dictionary word is
+stored under all of its deletions (within the maximum edit distance), so a
+lookup only needs to generate the deletions of the query term and verify
+the few candidates that share one. Ties on edit distance are broken by
+word frequency.
+"""
+
+import re
+import time
+from datetime import timedelta
+import threading
+import logging
+from collections import Counter, defaultdict
+from typing import Dict, Iterable, Optional, Set
+
+logger = logging.getLogger(__name__)
+
+WORD_PATTERN = re.compile(r'\w+', re.UNICODE)
+
+
+def tokenize(text: str):
+    """Split text into lowercase words."""
+    return WORD_PATTERN.findall((text or '').lower())
+
+
+def edit_distance(source: str, target: str, max_distance: int) -> int:
+    """
+    Optimal string alignment distance between two words, or
+    max_distance + 1 once the distance is known to exceed max_distance.
+    """
+    if source == target:
+        return 0
+    if abs(len(source) - len(target)) > max_distance:
+        return max_distance + 1
+
+    previous_previous = None
+    previous = list(range(len(target) + 1))
+    for i in range(1, len(source) + 1):
+        current = [i] + [0] * len(target)
+        row_min = current[0]
+        for j in range(1, len(target) + 1):
+            cost = 0 if source[i - 1] == target[j - 1] else 1
+            current[j] = min(
+                previous[j] + 1,
+                current[j - 1] + 1,
+                previous[j - 1] + cost
+            )
+            if (i > 1 and j > 1 and previous_previous is not None
+                    and source[i - 1] == target[j - 2]
+                    and source[i - 2] == target[j - 1]):
+                current[j] = min(current[j], previous_previous[j - 2] + 1)
+            row_min = min(row_min, current[j])
+        if row_min > max_distance:
+            return max_distance + 1
+        previous_previous, previous = previous, current
+
+    return previous[-1] if previous[-1] <= max_distance else max_distance + 1
+
+
+class SpellCorrector:
+    """
+    Frequency-weighted SymSpell dictionary over the catalog vocabulary.
+
+    Word frequencies come from product names (one per product), brand and
+    category names, and past search queries. A searched word only counts
+    as a spelling once it has been searched min_search_count times, so
+    searched typos are still corrected. The dictionary is built in a
+    background thread on first use and refreshed incrementally after that;
+    until the first build finishes, queries are returned unchanged.
+    """
+
+    max_edit_distance = 2
+    prefix_length = 7
+    refresh_interval = 300  # seconds
+    # Catalog rows are re-read this far behind the newest updated_at seen,
+    # so rows committed late with an earlier timestamp are not skipped
+    late_update_margin = timedelta(minutes=10)
+    min_search_count = 20
+
+    brand_weight = 5
+    category_weight = 5
+    seed_weight = 10
+
+    def __init__(self, seed_words: Optional[Iterable[str]] = None):
+        self.seed_words = set(seed_words or [])
+        self._frequencies: Counter = Counter()
+        self._deletes: Dict[str, Set[str]] = defaultdict(set)
+        # Per-source token sets so that edits and deactivations can be
+        # subtracted again on incremental refresh.
+        self._source_tokens: Dict[tuple, Counter] = {}
+        self._last_updated = {'product': None, 'brand': None, 'category': None}
+        self._last_search_log_id = 0
+        self._search_counts: Counter = Counter()
+        self._built_at = None
+        self._lock = threading.Lock()
+        self._refreshing = False
+
+    # Dictionary maintenance
+
+    def _add_word(self, word: str, count: int):
+        if word not in self._frequencies:
+            for delete in self._generate_deletes(word[:self.prefix_length]):
+                self._deletes[delete].add(word)
+        self._frequencies[word] += count
+
+    def _remove_word(self, word: str, count: int):
+        self._frequencies[word] -= count
+        if self._frequencies[word] <= 0:
+            del self._frequencies[word]
+            for delete in self._generate_deletes(word[:self.prefix_length]):
+                words = self._deletes.get(delete)
+                if words is not None:
+                    words.discard(word)
+                    if not words:
+                        del self._deletes[delete]
+
+    def _generate_deletes(self, word: str) -> Set[str]:
+        deletes = {word}
+        frontier = {word}
+        for _ in range(self.max_edit_distance):
+            next_frontier = set()
+            for item in frontier:
+                for i in range(len(item)):
+                    next_frontier.add(item[:i] + item[i + 1:])
+            deletes |= next_frontier
+            frontier = next_frontier
+        return deletes
+
+    def _set_source(self, key: tuple, text: Optional[str], weight: int):
+        """Replace the words contributed by one source object."""
+        old_tokens = self._source_tokens.pop(key, None)
+        if old_tokens:
+            for word, count in old_tokens.items():
+                self._remove_word(word, count)
+        if text:
+            tokens = Counter({
+                word: weight for word in set(tokenize(text))
+                if len(word) > 1 and not word.isdigit()
+            })
+            for word, count in tokens.items():
+                self._add_word(word, count)
+            self._source_tokens[key] = tokens
+
+    def _load_catalog(self, model, source: str, text_field: str, weight: int):
+        queryset = model.objects.all()
+        last_updated = self._last_updated[source]
+        if last_updated is not None:
+            queryset = queryset.filter(updated_at__gt=last_updated - self.late_update_margin)
+
+        rows = queryset.values_list('id', text_field, 'is_active', 'updated_at')
+        for object_id, text, is_active, updated_at in rows.iterator():
+            self._set_source((source, object_id), text if is_active else None, weight)
+            if self._last_updated[source] is None or updated_at > self._last_updated[source]:
+                self._last_updated[source] = updated_at
+
+    def _load_search_terms(self):
+        from .models import UserBehaviorLog
+
+        rows = UserBehaviorLog.objects.filter(
+            action_type='search',
+            id__gt=self._last_search_log_id
+        ).values_list('id', 'metadata').order_by('id')
+
+        counts = Counter()
+        for log_id, metadata in rows.iterator():
+            self._last_search_log_id = log_id
+            query = (metadata or {}).get('search_query') if isinstance(metadata, dict) else None
+            if query:
+                counts.update(word for word in tokenize(str(query)) if len(word) > 1)
+
+        for word, count in counts.items():
+            previous = self._search_counts[word]
+            self._search_counts[word] = previous + count
+            if previous + count >= self.min_search_count:
+                # Crossing the threshold adds the searches counted so far
+                self._add_word(word, count if previous >= self.min_search_count else previous + count)
+
+    def refresh(self):
+        """
+        Pull catalog and search-log changes since the last refresh into the
+        dictionary. The first call performs the full build.
+        """
+        from products.models import Product, Brand, Category
+
+        with self._lock:
+            if self._built_at is None:
+                for word in self.seed_words:
+                    self._add_word(word, self.seed_weight)
+            self._load_catalog(Product, 'product', 'name', 1)
+            self._load_catalog(Brand, 'brand', 'name', self.brand_weight)
+            self._load_catalog(Category, 'category', 'name', self.category_weight)
+            self._load_search_terms()
+            self._built_at = time.monotonic()
+
+        logger.info(f"Spell correction dictionary refreshed: {len(self._frequencies)} words")
+
+    def _ensure_fresh(self):
+        if self._refreshing:
+            return
+        if self._built_at is not None and time.monotonic() - self._built_at < self.refresh_interval:
+            return
+
+        from .background import run_in_background
+
+        self._refreshing = True
+        run_in_background(self._background_refresh, name='spell-correction-refresh')
+
+    def _background_refresh(self):
+        try:
+            self.refresh()
+        finally:
+            self._refreshing = False
+
+    # Lookup
+
+    def _allowed_distance(self, word: str) -> int:
+        if len(word) <= 2:
+            return 0
+        if len(word) <= 5:
+            return min(1, self.max_edit_distance)
+        return self.max_edit_distance
+
+    def correct_word(self, word: str) -> str:
+        """Return the best dictionary match for a single word."""
+        if word in self._frequencies or word.isdigit():
+            return word
+
+        max_distance = self._allowed_distance(word)
+        if max_distance == 0:
+            return word
+
+        best_word = word
+        best_key = (max_distance + 1, 0)
+        checked = set()
+        for delete in self._generate_deletes(word[:self.prefix_length]):
+            if len(word[:self.prefix_length]) - len(delete) > max_distance:
+                continue
+            for candidate in tuple(self._deletes.get(delete, ())):
+                if candidate in checked:
+                    continue
+                checked.add(candidate)
+                distance = edit_distance(word, candidate, max_distance)
+                if distance > max_distance:
+                    continue
+                key = (distance, -self._frequencies[candidate])
+                if key < best_key:
+                    best_key = key
+                    best_word = candidate
+
+        return best_word
+
+    def correct(self, text: str) -> str:
+        """Correct every word of a query string."""
+        self._ensure_fresh()
+        return ' '.join(self.correct_word(word) for word in text.lower().split())
+
+    def __len__(self):
+        return len(self._frequencies)
+
+
+spell_corrector = None
+
+
+def get_spell_corrector(seed_words: Optional[Iterable[str]] = None) -> SpellCorrector:
+    """Return the process-wide spell corrector."""
+    global spell_corrector
+    if spell_corrector is None:
+        spell_corrector = SpellCorrector(seed_words)
+    return spell_corrector
@@ -0,0 +1,111 @@
+"""
+Store metrics and cached insight documents.
+
+Both the dashboard insights and StoreInsightsEngine are built from the same
+per-store product metrics, computed with one grouped aggregate over the
+products table (for one store or a whole batch of stores). The finished
+insight documents are cached under a per-store insight version, which the
+receivers in ai_models/signals.py bump only when the store's products
+(including their stock) or reviews change, so a changed store is rebuilt
+on its next request while the others keep being served from the cache.
+View counts and behavior logs do not invalidate them; the nightly task
+that precomputes the documents for all stores picks those up.
+"""
+
+import logging
+from decimal import Decimal
+from typing import Callable, Dict, Iterable, Optional
+from django.core.cache import cache
+from django.db.models import Avg, Count, Exists, OuterRef, Q, Sum
+
+from products.data_versions import StoreDataVersions
+from products.models import Product, ProductImage
+
+logger = logging.getLogger(__name__)
+
+KEY_PREFIX = 'store_insights'
+
+store_insight_versions = StoreDataVersions(KEY_PREFIX)
+
+
+def _store_metric_expressions() -> Dict:
+    """Aggregates over a store's active products."""
+    has_images = Exists(ProductImage.objects.filter(product=OuterRef('pk')))
+    return {
+        'total_products': Count('id'),
+        'in_stock_products': Count('id', filter=Q(in_stock=True)),
+        'out_of_stock': Count('id', filter=Q(in_stock=False)),
+        'low_stock_products': Count('id', filter=Q(stock_quantity__lt=5, stock_quantity__gt=0)),
+        'no_image_products': Count('id', filter=Q(image_urls__isnull=True) | Q(image_urls=[])),
+        'no_gallery_products': Count('id', filter=~has_images),
+        'rarely_viewed_products': Count('id', filter=Q(view_count__lt=5)),
+        'low_view_products': Count('id', filter=Q(view_count__lt=10)),
+        'high_view_products': Count('id', filter=Q(view_count__gte=50)),
+        'high_rated_products': Count('id', filter=Q(average_rating__gte=4.5)),
+        'discounted_products': Count('id', filter=Q(discount_percentage__gt=0)),
+        'no_description_products': Count('id', filter=Q(description__isnull=True) | Q(description='')),
+        'placeholder_description_products': Count('id', filter=Q(description__icontains='description')),
+        'total_views': Sum('view_count'),
+        'total_reviews': Sum('total_reviews'),
+        'avg_rating': Avg('average_rating'),
+        'avg_price': Avg('price'),
+    }
+
+
+def empty_store_metrics() -> Dict:
+    metrics = dict.fromkeys(_store_metric_expressions(), 0)
+    metrics.update(avg_rating=0.0, avg_price=Decimal('0'))
+    return metrics
+
+
+def store_metrics(store_ids: Iterable[int]) -> Dict[int, Dict]:
+    """
+    Product metrics for each of the given stores, in one query. Stores
+    without active products get zero metrics.
+    """
+    store_ids = list(store_ids)
+    metrics = {store_id: empty_store_metrics() for store_id in store_ids}
+    rows = Product.objects.filter(
+        store_id__in=store_ids, is_active=True
+    ).order_by().values('store_id').annotate(**_store_metric_expressions())
+    for row in rows:
+        store_metrics_row = metrics[row.pop('store_id')]
+        store_metrics_row.update({key: value for key, value in row.items() if value is not None})
+    return metrics
+
+
+class StoreInsightsCache:
+    """
+    Insight documents cached per store and kind.
+    """
+
+    timeout = 25 * 3600  # outlives the nightly precompute
+
+    def key(self, kind: str, store_id: int) -> str:
+        """
+        Cache key under the store's current insight version. Take it before
+        reading the data a document is built from, so a change made during
+        the build is not hidden under the new version.
+        """
+        version = store_insight_versions.version(store_id)
+        return f'{KEY_PREFIX}:{kind}:{store_id}:v{version}'
+
+    def set(self, key: str, document: Dict):
+        """Cache a document; error documents are not cached."""
+        if 'error' not in document:
+            cache.set(key, document, self.timeout)
+
+    def get_or_build(self, kind: str, store_id: int, build: Callable[[], Dict]) -> Dict:
+        key = self.key(kind, store_id)
+        document = cache.get(key)
+        if document is None:
+            document = build()
+            self.set(key, document)
+        return document
+
+    def invalidate(self, store_ids: Iterable[Optional[int]]):
+        """Make the cached insights of these stores stale."""
+        store_insight_versions.invalidate(set(store_ids) - {None})
+
+
+store_insights_cache = StoreInsightsCache()
@@ -6,11 +6,11 @@ Analyzes store performance and provides actionable recommendations
 import logging
 from datetime import datetime, timedelta
 from typing import Dict, List, Optional
-from django.db.models import Count, Avg, Sum, Q
+from decimal import Decimal
 from django.utils import timezone
 
 from products.models import Product, Store
-from users.models import User
+from .store_insights import store_insights_cache, store_metrics
 
 logger = logging.getLogger(__name__)
 
@@ -20,12 +20,24 @@ class StoreInsightsEngine:
     AI engine for generating store insights and recommendations
     """
     
-    def __init__(self):
-        self.insights_cache = {}
-        
+    cache_kind = 'engine'
+    
     def generate_store_insights(self, store_id: int, days: int = 30) -> Dict:
         """
-        Generate comprehensive insights for a store
+        Generate comprehensive insights for a store, cached until the
+        store's products, reviews or stock change
+        """
+        insights = store_insights_cache.get_or_build(
+            self.cache_kind, store_id, lambda: self._build_store_insights(store_id, days)
+        )
+        # The period only labels the document
+        if 'analysis_period' in insights:
+            insights = dict(insights, analysis_period=f'{days} days')
+        return insights
+    
+    def _build_store_insights(self, store_id: int, days: int) -> Dict:
+        """
+        Build the insights document of a store
         """
         try:
             store = Store.objects.get(id=store_id)
@@ -93,22 +105,20 @@ class StoreInsightsEngine:
     
     def _collect_store_data(self, store: Store, start_date, end_date) -> Dict:
         """
-        Collect all relevant store data for analysis
+        Collect all relevant store data for analysis (one aggregate query)
         """
-        products = Product.objects.filter(store=store, is_active=True)
+        metrics = store_metrics([store.id])[store.id]
         
-        return {
-            'store': store,
-            'products': products,
-            'total_products': products.count(),
-            'active_products': products.filter(in_stock=True).count(),
-            'out_of_stock': products.filter(in_stock=False).count(),
-            'total_views': sum(p.view_count or 0 for p in products),
-            'avg_rating': products.aggregate(avg_rating=Avg('average_rating'))['avg_rating'] or 0,
-            'total_reviews': sum(p.total_reviews or 0 for p in products),
-            'start_date': start_date,
-            'end_date': end_date
-        }
+        return dict(
+            metrics,
+            store=store,
+            active_products=metrics['in_stock_products'],
+            total_views=metrics['total_views'] or 0,
+            avg_rating=metrics['avg_rating'] or 0,
+            total_reviews=metrics['total_reviews'] or 0,
+            start_date=start_date,
+            end_date=end_date
+        )
     
     def _analyze_product_performance(self, data: Dict) -> Dict:
         """
@@ -117,12 +127,8 @@ class StoreInsightsEngine:
         insights = []
         score = 50  # Base score
         
-        products = data['products']
-        total_views = data['total_views']
-        total_reviews = data['total_reviews']
-        
         # Low-performing products
-        low_view_products = products.filter(view_count__lt=5).count()
+        low_view_products = data['rarely_viewed_products']
         if low_view_products > 0:
             percentage = (low_view_products / data['total_products']) * 100
             if percentage > 50:
@@ -138,7 +144,7 @@ class StoreInsightsEngine:
                 score -= 15
         
         # Products without images
-        no_image_products = products.filter(images__isnull=True).count()
+        no_image_products = data['no_gallery_products']
         if no_image_products > 0:
             insights.append({
                 'type': 'product_images',
@@ -152,7 +158,7 @@ class StoreInsightsEngine:
             score -= 10
         
         # High-rated products opportunity
-        high_rated = products.filter(average_rating__gte=4.5).count()
+        high_rated = data['high_rated_products']
         if high_rated > 0:
             insights.append({
                 'type': 'product_promotion',
@@ -166,8 +172,10 @@ class StoreInsightsEngine:
             score += 10
         
         # Products needing price optimization
-        avg_price = products.aggregate(avg_price=Avg('price'))['avg_price'] or 0
-        expensive_products = products.filter(price__gt=avg_price * 1.5).count()
+        avg_price = data['avg_price'] or 0
+        expensive_products = Product.objects.filter(
+            store=data['store'], is_active=True, price__gt=avg_price * Decimal('1.5')
+        ).count()
         if expensive_products > data['total_products'] * 0.3:
             insights.append({
                 'type': 'pricing',
@@ -283,7 +291,7 @@ class StoreInsightsEngine:
                 score += 10
         
         # Low stock warnings (simplified)
-        low_stock_products = data['products'].filter(stock_quantity__lt=5, stock_quantity__gt=0).count()
+        low_stock_products = data['low_stock_products']
         if low_stock_products > 0:
             insights.append({
                 'type': 'inventory_warning',
@@ -304,10 +312,8 @@ class StoreInsightsEngine:
         insights = []
         score = 50
         
-        products = data['products']
-        
         # Discount analysis
-        discounted_products = products.filter(discount_percentage__gt=0).count()
+        discounted_products = data['discounted_products']
         total_products = data['total_products']
         
         if total_products > 0:
@@ -335,7 +341,7 @@ class StoreInsightsEngine:
                 })
         
         # Price competitiveness (simplified analysis)
-        avg_price = products.aggregate(avg_price=Avg('price'))['avg_price'] or 0
+        avg_price = data['avg_price'] or 0
         if avg_price > 0:
             insights.append({
                 'type': 'market_position',
@@ -356,13 +362,8 @@ class StoreInsightsEngine:
         insights = []
         score = 50
         
-        products = data['products']
-        views = data['views']
-        
         # SEO opportunities
-        products_without_description = products.filter(
-            Q(description__isnull=True) | Q(description__exact='')
-        ).count()
+        products_without_description = data['no_description_products']
         
         if products_without_description > 0:
             insights.append({
@@ -377,7 +378,7 @@ class StoreInsightsEngine:
             score -= 10
         
         # Social media opportunities
-        high_view_products = products.filter(view_count__gte=50).count()
+        high_view_products = data['high_view_products']
         if high_view_products > 0:
             insights.append({
                 'type': 'social_media',
@@ -2,14 +2,33 @@
 Tests for ai_models app.
 """
 
-from django.test import TestCase
+import threading
+from io import StringIO
+from unittest import mock
+import numpy as np
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import TestCase, override_settings
 from django.contrib.auth import get_user_model
 from rest_framework.test import APITestCase
 from rest_framework import status
 from django.urls import reverse
-from products.models import Product, Category, Brand, Store
+from products.models import Product, Category, Brand, Store, ProductLike, ProductReview
+from products.view_counter import ViewCounter
 from .models import UserBehaviorLog
 from .services import SearchService, SentimentAnalysisService
+from .spell_correction import SpellCorrector
+from .autocomplete import AutocompleteIndex, AutocompleteService
+from .event_pipeline import BehaviorEventPipeline, event_pipeline
+from .interaction_analyzer import InteractionAnalyzer
+from .similarity_index import SimilarProductIndex, SimilarProductService
+from .candidate_index import candidate_index_service
+from .real_recommendation_engine import RealRecommendationEngine
+from .matrix_factorization import ImplicitALS, MatrixFactorizationService
+from .artifact_store import ArtifactStore, ArtifactHandle
+from .background import acquire_task_lock, release_task_lock, task_lock
+from .store_insights_engine import StoreInsightsEngine
+from recommendations.models import UserBehavior, ProductInteractionScore, UserSimilarity
 
 User = get_user_model()
 
@@ -57,6 +76,920 @@ class SearchServiceTest(TestCase):
         self.assertTrue(len(enhanced) > 0)
 
 
+class SpellCorrectorTest(TestCase):
+    """
+    Test cases for the catalog spell corrector.
+    """
+    
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username='testuser',
+            email='test@example.com',
+            password='testpass123'
+        )
+        owner = User.objects.create_user(
+            username='owner',
+            email='owner@example.com',
+            password='testpass123',
+            role='store_owner'
+        )
+        store = Store.objects.create(
+            owner=owner,
+            name='Test Store',
+            email='store@example.com',
+            phone='1234567890',
+            address='Test Address'
+        )
+        self.category = Category.objects.create(name='Headphones')
+        self.brand = Brand.objects.create(name='Sennheiser')
+        self.product = Product.objects.create(
+            store=store,
+            category=self.category,
+            brand=self.brand,
+            name='Wireless Keyboard',
+            description='Test description',
+            sku='KB-001',
+            price=50
+        )
+    
+    def test_corrects_catalog_vocabulary(self):
+        """Test that names from the catalog are used for correction."""
+        corrector = SpellCorrector()
+        corrector.refresh()
+        self.assertEqual(corrector.correct('sennhiser keybaord'), 'sennheiser keyboard')
+        self.assertEqual(corrector.correct('headphnes'), 'headphones')
+        self.assertEqual(corrector.correct('wireless'), 'wireless')
+    
+    def test_frequency_breaks_ties(self):
+        """Test that more frequent words win at equal edit distance."""
+        for _ in range(3):
+            UserBehaviorLog.objects.create(
+                user=self.user,
+                action_type='search',
+                metadata={'search_query': 'mouse'}
+            )
+        corrector = SpellCorrector(seed_words=['house'])
+        corrector.refresh()
+        self.assertEqual(corrector.correct('rouse'), 'house')
+        
+        UserBehaviorLog.objects.bulk_create([
+            UserBehaviorLog(user=self.user, action_type='search', metadata={'search_query': 'mouse'})
+            for _ in range(20)
+        ])
+        corrector.refresh()
+        self.assertEqual(corrector.correct('rouse'), 'mouse')
+    
+    def test_searched_typos_are_still_corrected(self):
+        """Test that a typo only becomes a spelling after many searches."""
+        UserBehaviorLog.objects.bulk_create([
+            UserBehaviorLog(user=self.user, action_type='search', metadata={'search_query': 'keybord'})
+            for _ in range(SpellCorrector.min_search_count - 1)
+        ])
+        corrector = SpellCorrector()
+        corrector.refresh()
+        self.assertEqual(corrector.correct('keybord'), 'keyboard')
+        
+        UserBehaviorLog.objects.create(user=self.user, action_type='search', metadata={'search_query': 'keybord'})
+        corrector.refresh()
+        self.assertEqual(corrector.correct('keybord'), 'keybord')
+    
+    def test_first_build_runs_in_background(self):
+        """Test that the first lookup does not build the dictionary in the request."""
+        corrector = SpellCorrector()
+        with mock.patch('ai_models.background.run_in_background') as run_in_background:
+            with self.assertNumQueries(0):
+                self.assertEqual(corrector.correct('keybaord'), 'keybaord')
+            run_in_background.assert_called_once()
+    
+    def test_incremental_refresh(self):
+        """Test that catalog edits are picked up by a refresh."""
+        corrector = SpellCorrector()
+        corrector.refresh()
+        self.assertEqual(corrector.correct('monitr'), 'monitr')
+        
+        self.product.name = 'Gaming Monitor'
+        self.product.save()
+        corrector.refresh()
+        self.assertEqual(corrector.correct('monitr'), 'monitor')
+        self.assertEqual(corrector.correct('keybaord'), 'keybaord')
+
+
+LOCMEM_CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'ai-models-tests',
+    }
+}
+
+
+class AutocompleteIndexTest(TestCase):
+    """
+    Test cases for the autocomplete prefix index.
+    """
+    
+    def setUp(self):
+        self.index = AutocompleteIndex([
+            ('Apple iPhone 15', 3.0),
+            ('iphone case', 8.0),
+            ('iPad Pro', 5.0),
+            ('Samsung Galaxy Phone', 1.0),
+        ])
+    
+    def test_ranked_prefix_matches(self):
+        """Test that completions are ordered by score."""
+        self.assertEqual(self.index.suggest('i', 5), ['iphone case', 'iPad Pro', 'Apple iPhone 15'])
+        self.assertEqual(self.index.suggest('IPH', 1), ['iphone case'])
+        self.assertEqual(self.index.suggest('iphone 1'), ['Apple iPhone 15'])
+        self.assertEqual(self.index.suggest('phone'), ['Samsung Galaxy Phone'])
+        self.assertEqual(self.index.suggest('xyz'), [])
+    
+    def test_snapshot_round_trip(self):
+        """Test that a serialized snapshot restores the same index."""
+        restored = AutocompleteIndex.loads(self.index.dumps())
+        self.assertEqual(restored.built_at, self.index.built_at)
+        self.assertEqual(restored.suggest('ip', 5), self.index.suggest('ip', 5))
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class AutocompleteServiceTest(TestCase):
+    """
+    Test cases for building and sharing the autocomplete index.
+    """
+    
+    def setUp(self):
+        from django.core.cache import cache
+        cache.clear()
+        self.user = User.objects.create_user(
+            username='testuser',
+            email='test@example.com',
+            password='testpass123'
+        )
+        owner = User.objects.create_user(
+            username='owner',
+            email='owner@example.com',
+            password='testpass123',
+            role='store_owner'
+        )
+        store = Store.objects.create(
+            owner=owner,
+            name='Test Store',
+            email='store@example.com',
+            phone='1234567890',
+            address='Test Address'
+        )
+        Product.objects.create(
+            store=store,
+            category=Category.objects.create(name='Phones'),
+            brand=Brand.objects.create(name='Apple'),
+            name='Apple iPhone 15',
+            description='Test description',
+            sku='IP-015',
+            price=999
+        )
+        for _ in range(3):
+            UserBehaviorLog.objects.create(
+                user=self.user,
+                action_type='search',
+                metadata={'search_query': 'iPhone Case'}
+            )
+    
+    def test_builds_from_searches_and_products(self):
+        """Test that popular searches rank above product names."""
+        service = AutocompleteService()
+        service.refresh()
+        self.assertEqual(service.suggest('iph'), ['iphone case', 'Apple iPhone 15'])
+    
+    def test_cold_worker_builds_in_background(self):
+        """Test that a worker without an index answers without building one in the request."""
+        service = AutocompleteService()
+        with mock.patch('ai_models.background.run_in_background') as run_in_background:
+            with self.assertNumQueries(0):
+                self.assertEqual(service.suggest('iph'), [])
+            run_in_background.assert_called_once_with(service.refresh, name='autocomplete-refresh')
+    
+    def test_workers_share_snapshot(self):
+        """Test that a second worker loads the published snapshot without queries."""
+        AutocompleteService().rebuild()
+        
+        other_worker = AutocompleteService()
+        with self.assertNumQueries(0):
+            suggestions = other_worker.suggest('apple')
+        self.assertEqual(suggestions, ['Apple iPhone 15'])
+    
+    def test_one_worker_rebuilds_at_a_time(self):
+        """Test that a worker keeps its stale index while another one rebuilds."""
+        from django.core.cache import cache
+        from .autocomplete import REBUILD_LOCK
+        service = AutocompleteService()
+        stale = service.refresh()
+        stale.built_at -= service.refresh_interval
+        cache.clear()
+        
+        self.assertTrue(acquire_task_lock(REBUILD_LOCK))
+        self.addCleanup(release_task_lock, REBUILD_LOCK)
+        with self.assertNumQueries(0):
+            self.assertIs(service.refresh(), stale)
+        with mock.patch('ai_models.background.run_in_background') as run_in_background:
+            self.assertEqual(service.suggest('iph'), ['iphone case', 'Apple iPhone 15'])
+            run_in_background.assert_not_called()
+        
+        AutocompleteService().rebuild()
+        self.assertGreater(service.refresh().built_at, stale.built_at)
+
+
+class BehaviorEventPipelineTest(TestCase):
+    """
+    Test cases for buffered behavior event ingestion.
+    """
+    
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username='testuser',
+            email='test@example.com',
+            password='testpass123'
+        )
+        self.pipeline = BehaviorEventPipeline()
+    
+    def test_events_are_buffered_until_flush(self):
+        """Test that events are written in one batch on flush."""
+        with self.assertNumQueries(0):
+            for _ in range(3):
+                self.pipeline.log_behavior('view', user=self.user, metadata={'source': 'test'})
+        self.assertFalse(UserBehaviorLog.objects.exists())
+        
+        self.assertEqual(self.pipeline.flush(), 3)
+        self.assertEqual(UserBehaviorLog.objects.filter(user=self.user).count(), 3)
+        self.assertEqual(self.pipeline.pending_count(), 0)
+    
+    def test_missing_foreign_keys_are_cleared(self):
+        """Test that unknown users and products do not break the batch."""
+        self.pipeline.log_behavior('view', user=999999, product=999999)
+        self.pipeline.log_user_behavior('view', product=999999, user=self.user)
+        
+        self.assertEqual(self.pipeline.flush(), 1)
+        log = UserBehaviorLog.objects.get()
+        self.assertIsNone(log.user)
+        self.assertIsNone(log.product)
+
+    def test_full_buffer_is_flushed_not_dropped(self):
+        """Test that filling the buffer writes it instead of discarding events."""
+        self.pipeline.max_buffer_size = 3
+        for _ in range(5):
+            self.pipeline.log_behavior('view', user=self.user)
+
+        self.assertEqual(UserBehaviorLog.objects.count(), 3)
+        self.assertEqual(self.pipeline.pending_count(), 2)
+        self.pipeline.flush()
+        self.assertEqual(UserBehaviorLog.objects.count(), 5)
+
+    def test_rejected_row_does_not_drop_batch(self):
+        """Test that a row the database rejects is skipped and the rest are written."""
+        bulk_create = UserBehaviorLog.objects.bulk_create
+
+        def reject_bad_rows(objs, *args, **kwargs):
+            if any(obj.action_type == 'bad' for obj in objs):
+                raise ValueError('value too long')
+            return bulk_create(objs, *args, **kwargs)
+
+        for action_type in ('view', 'bad', 'click'):
+            self.pipeline.log_behavior(action_type, user=self.user)
+        with mock.patch.object(UserBehaviorLog.objects, 'bulk_create', side_effect=reject_bad_rows):
+            self.assertEqual(self.pipeline.flush(), 2)
+        self.assertEqual(
+            sorted(UserBehaviorLog.objects.values_list('action_type', flat=True)), ['click', 'view']
+        )
+
+    def test_background_flush_runs_without_requests(self):
+        """Test that the background thread flushes on its own."""
+        self.pipeline.flush_interval = 0.01
+        flushed = threading.Event()
+        with mock.patch.object(self.pipeline, 'flush_if_due', side_effect=flushed.set):
+            self.pipeline.start_background_flush()
+            try:
+                self.assertTrue(flushed.wait(5))
+            finally:
+                self.pipeline.stop_background_flush()
+
+
+class BehaviorLogStoreTest(TestCase):
+    """
+    Test cases for the store denormalized onto behavior logs.
+    """
+    
+    def setUp(self):
+        owner = User.objects.create_user(
+            username='storeowner',
+            email='owner@example.com',
+            password='testpass123',
+            role='store_owner'
+        )
+        self.store = Store.objects.create(
+            owner=owner,
+            name='Test Store',
+            email='store@example.com',
+            phone='1234567890',
+            address='Test Address'
+        )
+        self.product = Product.objects.create(
+            store=self.store,
+            category=Category.objects.create(name='Test Category'),
+            brand=Brand.objects.create(name='Test Brand'),
+            name='Test Product',
+            description='Test description',
+            sku='TEST001',
+            price=10
+        )
+    
+    def test_store_is_copied_from_product(self):
+        """Test that saved and pipeline-written logs get the product's store."""
+        log = UserBehaviorLog.objects.create(product=self.product, action_type='view')
+        self.assertEqual(log.store_id, self.store.id)
+        
+        pipeline = BehaviorEventPipeline()
+        pipeline.log_behavior('click', product=self.product)
+        pipeline.log_behavior('search', metadata={'query': 'phone'})
+        pipeline.flush()
+        self.assertEqual(UserBehaviorLog.objects.get(action_type='click').store_id, self.store.id)
+        self.assertIsNone(UserBehaviorLog.objects.get(action_type='search').store_id)
+    
+    def test_backfill_command(self):
+        """Test that the backfill command fills in missing stores in batches."""
+        logs = [UserBehaviorLog.objects.create(product=self.product, action_type='view') for _ in range(5)]
+        UserBehaviorLog.objects.create(action_type='search')
+        UserBehaviorLog.objects.update(store=None)
+        
+        call_command('backfill_behavior_log_stores', batch_size=2, stdout=StringIO())
+        
+        self.assertEqual(UserBehaviorLog.objects.filter(store=self.store).count(), len(logs))
+        self.assertIsNone(UserBehaviorLog.objects.get(action_type='search').store_id)
+
+
+class StoreInsightsEngineTest(TestCase):
+    """
+    Test cases for the cached store insights engine.
+    """
+    
+    def setUp(self):
+        cache.clear()
+        owner = User.objects.create_user(
+            username='storeowner',
+            email='owner@example.com',
+            password='testpass123',
+            role='store_owner'
+        )
+        self.store = Store.objects.create(
+            owner=owner,
+            name='Test Store',
+            email='store@example.com',
+            phone='1234567890',
+            address='Test Address'
+        )
+        self.product = Product.objects.create(
+            store=self.store,
+            category=Category.objects.create(name='Test Category'),
+            brand=Brand.objects.create(name='Test Brand'),
+            name='Test Product',
+            description='',
+            sku='TEST001',
+            price=10,
+            in_stock=False
+        )
+    
+    def test_insights_are_cached_and_invalidated(self):
+        """Test that insights come from the cache until a review is added."""
+        engine = StoreInsightsEngine()
+        insights = engine.generate_store_insights(self.store.id)
+        self.assertNotIn('error', insights)
+        self.assertEqual({'inventory', 'seo'} - {i['type'] for i in insights['insights']}, set())
+        
+        with self.assertNumQueries(0):
+            self.assertEqual(engine.generate_store_insights(self.store.id), insights)
+        
+        ProductReview.objects.create(product=self.product, user=self.store.owner, rating=5, comment='Great')
+        self.assertNotEqual(engine.generate_store_insights(self.store.id)['generated_at'], insights['generated_at'])
+    
+    def test_traffic_does_not_invalidate_insights(self):
+        """Test that flushed views and behavior logs keep the cached insights."""
+        engine = StoreInsightsEngine()
+        insights = engine.generate_store_insights(self.store.id)
+        
+        counter = ViewCounter()
+        counter.record_view(self.product.id, 'user:1')
+        counter.flush()
+        pipeline = BehaviorEventPipeline()
+        pipeline.log_behavior('view', product=self.product)
+        pipeline.flush()
+        self.assertEqual(engine.generate_store_insights(self.store.id), insights)
+    
+    def test_period_does_not_split_the_cache(self):
+        """Test that every analysis period is served from one cached document."""
+        engine = StoreInsightsEngine()
+        insights = engine.generate_store_insights(self.store.id)
+        with self.assertNumQueries(0):
+            weekly = engine.generate_store_insights(self.store.id, days=7)
+        self.assertEqual(weekly['analysis_period'], '7 days')
+        self.assertEqual(weekly['generated_at'], insights['generated_at'])
+
+
+class InteractionAnalyzerScoringTest(TestCase):
+    """
+    Test cases for batch product score updates.
+    """
+    
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username='testuser',
+            email='test@example.com',
+            password='testpass123'
+        )
+        owner = User.objects.create_user(
+            username='owner',
+            email='owner@example.com',
+            password='testpass123',
+            role='store_owner'
+        )
+        self.store = Store.objects.create(
+            owner=owner,
+            name='Test Store',
+            email='store@example.com',
+            phone='1234567890',
+            address='Test Address'
+        )
+        self.category = Category.objects.create(name='Phones')
+        self.brand = Brand.objects.create(name='Apple')
+        self.products = [self._create_product(i) for i in range(3)]
+    
+    def _create_product(self, index):
+        return Product.objects.create(
+            store=self.store,
+            category=self.category,
+            brand=self.brand,
+            name=f'Phone {index}',
+            description='Test description',
+            sku=f'PH-{index:03d}',
+            price=100 + index
+        )
+    
+    def test_scores_aggregate_behaviors(self):
+        """Test that behaviors are aggregated into the product score."""
+        product = self.products[0]
+        for behavior_type in ['like', 'like', 'unlike', 'cart_add', 'purchase']:
+            UserBehavior.objects.create(user=self.user, product=product, behavior_type=behavior_type)
+        UserBehavior.objects.create(
+            user=self.user, product=product, behavior_type='review_positive',
+            rating=4, review_sentiment=0.5
+        )
+        
+        InteractionAnalyzer().update_product_scores()
+        
+        score = ProductInteractionScore.objects.get(product=product)
+        self.assertEqual(score.total_likes, 2)
+        self.assertEqual(score.total_unlikes, 1)
+        self.assertAlmostEqual(score.like_ratio, 2 / 3)
+        self.assertEqual(score.total_cart_adds, 1)
+        self.assertEqual(score.total_purchases, 1)
+        self.assertEqual(score.total_reviews, 1)
+        self.assertAlmostEqual(score.avg_rating, 4.0)
+        self.assertAlmostEqual(score.trending_score, (3 + 3 - 2 + 4 + 10 + 5) / 100.0)
+        self.assertGreater(score.overall_score, 0)
+        
+        untouched = ProductInteractionScore.objects.get(product=self.products[1])
+        self.assertEqual(untouched.total_likes, 0)
+        self.assertEqual(untouched.trending_score, 0)
+    
+    def test_query_count_does_not_grow_with_products(self):
+        """Test that scoring a batch runs a fixed number of queries."""
+        analyzer = InteractionAnalyzer()
+        analyzer.update_product_scores()
+        with self.assertNumQueries(5):
+            analyzer.update_product_scores()
+        
+        self.products += [self._create_product(i) for i in range(3, 10)]
+        with self.assertNumQueries(5):
+            analyzer.update_product_scores()
+
+
+class UserSimilarityTest(TestCase):
+    """
+    Test cases for sparse user similarity computation.
+    """
+    
+    def setUp(self):
+        self.users = [
+            User.objects.create_user(
+                username=f'user{i}',
+                email=f'user{i}@example.com',
+                password='testpass123'
+            )
+            for i in range(3)
+        ]
+        owner = User.objects.create_user(
+            username='owner',
+            email='owner@example.com',
+            password='testpass123',
+            role='store_owner'
+        )
+        store = Store.objects.create(
+            owner=owner,
+            name='Test Store',
+            email='store@example.com',
+            phone='1234567890',
+            address='Test Address'
+        )
+        category = Category.objects.create(name='Phones')
+        brand = Brand.objects.create(name='Apple')
+        first, second, third = [
+            Product.objects.create(
+                store=store,
+                category=category,
+                brand=brand,
+                name=f'Phone {i}',
+                description='Test description',
+                sku=f'PH-{i:03d}',
+                price=100 + i
+            )
+            for i in range(3)
+        ]
+        # users[0] and users[1] share two liked products; users[2] overlaps with only one
+        for user in self.users[:2]:
+            UserBehavior.objects.create(user=user, product=first, behavior_type='like')
+            UserBehavior.objects.create(user=user, product=second, behavior_type='purchase')
+        UserBehavior.objects.create(user=self.users[2], product=first, behavior_type='view')
+        UserBehavior.objects.create(user=self.users[2], product=third, behavior_type='like')
+    
+    def test_similar_users_are_stored_once(self):
+        """Test that similar pairs are upserted with their common products."""
+        analyzer = InteractionAnalyzer()
+        analyzer.calculate_user_similarities()
+        analyzer.calculate_user_similarities()
+        
+        similarity = UserSimilarity.objects.get()
+        self.assertEqual(
+            {similarity.user1_id, similarity.user2_id},
+            {self.users[0].id, self.users[1].id}
+        )
+        self.assertLess(similarity.user1_id, similarity.user2_id)
+        self.assertAlmostEqual(similarity.similarity_score, 1.0)
+        self.assertEqual(similarity.common_products, 2)
+    
+    def test_query_count_is_constant(self):
+        """Test that similarities are read in one query and written in one upsert."""
+        with self.assertNumQueries(2):
+            InteractionAnalyzer().calculate_user_similarities()
+
+
+class ArtifactStoreTest(TestCase):
+    """
+    Test cases for the versioned memory-mapped artifact store.
+    """
+    
+    def setUp(self):
+        import tempfile
+        self.root = tempfile.mkdtemp()
+        self.store = ArtifactStore(self.root)
+    
+    def tearDown(self):
+        import shutil
+        shutil.rmtree(self.root, ignore_errors=True)
+    
+    def test_published_arrays_are_read_only_memory_maps(self):
+        """Test that published arrays are opened with numpy memmap."""
+        self.store.publish('factors', {'items': np.arange(6, dtype=np.float32).reshape(3, 2)}, {'rows': 3})
+        artifact = self.store.open('factors')
+        self.assertIsInstance(artifact['items'], np.memmap)
+        self.assertFalse(artifact['items'].flags.writeable)
+        self.assertEqual(artifact.metadata['rows'], 3)
+        np.testing.assert_array_equal(artifact['items'][2], [4, 5])
+    
+    def test_handle_hot_swaps_to_new_version(self):
+        """Test that workers pick up a newly published version."""
+        handle = ArtifactHandle('factors', lambda artifact: int(artifact['value']), check_interval=0, store=self.store)
+        self.assertIsNone(handle.get())
+        
+        self.store.publish('factors', {'value': np.array(1)})
+        self.assertEqual(handle.get(), 1)
+        self.store.publish('factors', {'value': np.array(2)})
+        self.assertEqual(handle.get(), 2)
+    
+    def test_unfinished_versions_are_ignored_and_old_ones_pruned(self):
+        """Test that staging directories are invisible and pruning keeps recent versions."""
+        import os
+        for value in range(5):
+            self.store.publish('factors', {'value': np.array(value)})
+        os.makedirs(os.path.join(self.root, 'factors', '.unfinished.tmp'))
+        
+        versions = self.store.versions('factors')
+        self.assertEqual(len(versions), self.store.keep_versions)
+        self.assertEqual(self.store.current_version('factors'), versions[-1])
+        self.assertEqual(int(self.store.open('factors')['value']), 4)
+
+
+class SimilarProductIndexTest(TestCase):
+    """
+    Test cases for the item-embedding similar-product index.
+    """
+    
+    def setUp(self):
+        import tempfile
+        self.artifacts_dir = tempfile.mkdtemp()
+        self.settings_override = override_settings(ML_ARTIFACTS_DIR=self.artifacts_dir)
+        self.settings_override.enable()
+        
+        owner = User.objects.create_user(
+            username='owner',
+            email='owner@example.com',
+            password='testpass123',
+            role='store_owner'
+        )
+        self.store = Store.objects.create(
+            owner=owner,
+            name='Test Store',
+            email='store@example.com',
+            phone='1234567890',
+            address='Test Address'
+        )
+        self.phones = Category.objects.create(name='Phones')
+        self.kitchen = Category.objects.create(name='Kitchen')
+        self.apple = Brand.objects.create(name='Apple')
+        self.chef = Brand.objects.create(name='Chef Co')
+        self.phone = self._create_product('iPhone 15 Pro', 'Smartphone with OLED display', self.phones, self.apple, 999)
+        self.other_phone = self._create_product('iPhone 15', 'Smartphone with LCD display', self.phones, self.apple, 899)
+        self.kettle = self._create_product('Steel Kettle', 'Electric kettle for the kitchen', self.kitchen, self.chef, 40)
+        self.service = SimilarProductService()
+    
+    def tearDown(self):
+        import shutil
+        self.settings_override.disable()
+        shutil.rmtree(self.artifacts_dir, ignore_errors=True)
+    
+    def _create_product(self, name, description, category, brand, price):
+        return Product.objects.create(
+            store=self.store,
+            category=category,
+            brand=brand,
+            name=name,
+            description=description,
+            sku=name.upper().replace(' ', '-'),
+            price=price
+        )
+    
+    def test_similar_products_ranked_by_features(self):
+        """Test that the closest product shares category, brand and text."""
+        index = self.service.rebuild()
+        matches = index.similar(self.phone.id, limit=2)
+        self.assertEqual(matches[0][0], self.other_phone.id)
+        
+        vectors = index.embedder.embed([
+            {'id': product.id, 'text': product.name + ' ' + product.description,
+             'category_id': product.category_id, 'brand_id': product.brand_id, 'price': product.price}
+            for product in [self.phone, self.other_phone, self.kettle]
+        ])
+        self.assertGreater(vectors[0] @ vectors[1], vectors[0] @ vectors[2])
+    
+    def test_lookup_runs_no_queries_after_loading_snapshot(self):
+        """Test that a second worker serves lookups from the published artifact."""
+        self.service.rebuild()
+        
+        other_worker = SimilarProductService()
+        with self.assertNumQueries(0):
+            matches = other_worker.similar(self.phone.id, limit=1)
+        self.assertEqual(matches[0][0], self.other_phone.id)
+    
+    def test_cold_worker_builds_in_background(self):
+        """Test that a worker without a published index does not build one in the request."""
+        with mock.patch('ai_models.background.run_in_background') as run_in_background:
+            self.assertEqual(self.service.similar(self.phone.id), [])
+            run_in_background.assert_called_once_with(self.service.refresh, name='similar-products-refresh')
+    
+    def test_new_products_are_inserted_incrementally(self):
+        """Test that saved products join the loaded index."""
+        from .similarity_index import similar_product_service
+        self.service.rebuild()
+        similar_product_service.handle.reset()
+        try:
+            index = similar_product_service.get_index()
+            mini = self._create_product('iPhone 15 Mini', 'Smartphone with OLED display', self.phones, self.apple, 799)
+            self.assertIn(mini.id, index)
+            self.assertEqual(index.similar(mini.id, limit=1)[0][0], self.phone.id)
+            
+            mini.is_active = False
+            mini.save()
+            self.assertNotIn(mini.id, index)
+        finally:
+            similar_product_service.handle.reset()
+    
+    def test_inserts_do_not_copy_the_mapped_vectors(self):
+        """Test that inserts go to the side buffer and are merged on publish."""
+        index = self.service.rebuild()
+        mapped = index._vectors
+        vector = index._rows(np.array([index._positions[self.phone.id]]))[0]
+        for product_id in range(10000, 10000 + index.initial_extra_capacity + 1):
+            index.add(product_id, vector)
+        self.assertIs(index._vectors, mapped)
+        self.assertIn(10000, index)
+        self.assertAlmostEqual(index.similar(10000, limit=1)[0][1], 1.0, places=5)
+        
+        arrays = index.to_arrays()
+        self.assertEqual(len(arrays['vectors']), len(index))
+        self.assertEqual(len(SimilarProductIndex(index.embedder, arrays['product_ids'], arrays['vectors'])), len(index))
+
+
+class SinglePassRecommendationTest(TestCase):
+    """
+    Test cases for single-pass personalized recommendations.
+    """
+    
+    def setUp(self):
+        candidate_index_service.invalidate()
+        self.user = User.objects.create_user(
+            username='testuser',
+            email='test@example.com',
+            password='testpass123'
+        )
+        owner = User.objects.create_user(
+            username='owner',
+            email='owner@example.com',
+            password='testpass123',
+            role='store_owner'
+        )
+        self.store = Store.objects.create(
+            owner=owner,
+            name='Test Store',
+            email='store@example.com',
+            phone='1234567890',
+            address='Test Address'
+        )
+        self.phones = Category.objects.create(name='Phones')
+        self.kitchen = Category.objects.create(name='Kitchen')
+        self.apple = Brand.objects.create(name='Apple')
+        self.chef = Brand.objects.create(name='Chef Co')
+        self.phone_products = [
+            self._create_product(f'Phone {i}', self.phones, self.apple, rating=3.0 + i * 0.4)
+            for i in range(4)
+        ]
+        self.kitchen_products = [
+            self._create_product(f'Kettle {i}', self.kitchen, self.chef, rating=4.9)
+            for i in range(4)
+        ]
+        ProductLike.objects.create(user=self.user, product=self.phone_products[0])
+        self.engine = RealRecommendationEngine(mode='single_pass')
+        candidate_index_service.refresh()
+    
+    def tearDown(self):
+        candidate_index_service.invalidate()
+    
+    def _create_product(self, name, category, brand, rating):
+        return Product.objects.create(
+            store=self.store,
+            category=category,
+            brand=brand,
+            name=name,
+            description=name,
+            sku=name.upper().replace(' ', '-'),
+            price=100,
+            average_rating=rating
+        )
+    
+    def test_liked_categories_come_first(self):
+        """Test that products like the user's likes outrank popular products."""
+        recommendations = self.engine.get_personalized_recommendations(self.user, limit=8)
+        product_ids = [rec['product_id'] for rec in recommendations]
+        
+        self.assertNotIn(self.phone_products[0].id, product_ids)
+        self.assertEqual(len(product_ids), len(set(product_ids)))
+        self.assertEqual(recommendations[0]['algorithm'], 'based_on_likes')
+        self.assertEqual(recommendations[0]['product_id'], self.phone_products[3].id)
+        self.assertEqual(recommendations[1]['algorithm'], 'based_on_likes')
+        self.assertEqual(recommendations[2]['algorithm'], 'category_based')
+    
+    def test_reviews_and_category_filter(self):
+        """Test review-based candidates and the category filter."""
+        ProductReview.objects.create(user=self.user, product=self.kitchen_products[0], rating=5, comment='Great')
+        recommendations = self.engine.get_personalized_recommendations(
+            self.user, limit=4, category_id=self.kitchen.id
+        )
+        self.assertEqual(
+            {rec['product_id'] for rec in recommendations},
+            {product.id for product in self.kitchen_products[1:]}
+        )
+        self.assertEqual(recommendations[0]['algorithm'], 'based_on_reviews')
+    
+    def test_recommendations_use_at_most_three_queries(self):
+        """Test that a warm index leaves only the profile queries."""
+        with self.assertNumQueries(3):
+            self.engine.get_personalized_recommendations(self.user, limit=8)
+    
+    def test_cold_worker_falls_back_and_builds_in_background(self):
+        """Test that a missing index is built off the request while strategies serve it."""
+        candidate_index_service.invalidate()
+        with mock.patch('ai_models.background.run_in_background') as run_in_background:
+            recommendations = self.engine.get_personalized_recommendations(self.user, limit=8)
+        run_in_background.assert_called_once_with(
+            candidate_index_service.refresh, name='candidate-index-refresh'
+        )
+        self.assertEqual(recommendations[0]['algorithm'], 'based_on_likes')
+    
+    def test_build_is_skipped_while_another_worker_builds(self):
+        """Test that the index build waits for the lock held by another worker."""
+        candidate_index_service.invalidate()
+        with task_lock('build_candidate_index'):
+            self.assertIsNone(candidate_index_service.refresh())
+        self.assertIsNotNone(candidate_index_service.refresh())
+
+
+class MatrixFactorizationTest(TestCase):
+    """
+    Test cases for the implicit-feedback matrix factorization model.
+    """
+    
+    def setUp(self):
+        import tempfile
+        self.artifacts_dir = tempfile.mkdtemp()
+        self.settings_override = override_settings(ML_ARTIFACTS_DIR=self.artifacts_dir)
+        self.settings_override.enable()
+        candidate_index_service.invalidate()
+        
+        owner = User.objects.create_user(
+            username='owner',
+            email='owner@example.com',
+            password='testpass123',
+            role='store_owner'
+        )
+        store = Store.objects.create(
+            owner=owner,
+            name='Test Store',
+            email='store@example.com',
+            phone='1234567890',
+            address='Test Address'
+        )
+        category = Category.objects.create(name='Electronics')
+        brand = Brand.objects.create(name='Test Brand')
+        self.products = [
+            Product.objects.create(
+                store=store,
+                category=category,
+                brand=brand,
+                name=f'Product {i}',
+                description='Test product',
+                sku=f'SKU-{i}',
+                price=100
+            )
+            for i in range(6)
+        ]
+        self.users = [
+            User.objects.create_user(username=f'user{i}', email=f'user{i}@example.com', password='testpass123')
+            for i in range(8)
+        ]
+        # Two taste groups; the first user has not seen the last product of theirs
+        for i, user in enumerate(self.users):
+            group = self.products[:3] if i < 4 else self.products[3:]
+            for product in group:
+                if user == self.users[0] and product == self.products[2]:
+                    continue
+                UserBehavior.objects.create(user=user, product=product, behavior_type='like')
+        self.service = MatrixFactorizationService()
+        candidate_index_service.refresh()
+    
+    def tearDown(self):
+        import shutil
+        candidate_index_service.invalidate()
+        self.settings_override.disable()
+        shutil.rmtree(self.artifacts_dir, ignore_errors=True)
+    
+    def test_als_recovers_group_structure(self):
+        """Test that factors score in-group items above other items."""
+        from scipy import sparse
+        preferences = sparse.csr_matrix(np.kron(np.eye(2), np.ones((4, 3))))
+        user_factors, item_factors = ImplicitALS(factors=4, iterations=10).fit(preferences)
+        scores = item_factors @ user_factors[0]
+        self.assertGreater(scores[:3].min(), scores[3:].max())
+    
+    def test_trained_model_is_memory_mapped_and_recommends_unseen_items(self):
+        """Test training, memory-mapped loading and top-k scoring."""
+        self.service.train(factors=4, iterations=10)
+        
+        other_worker = MatrixFactorizationService()
+        model = other_worker.get_model()
+        self.assertIsInstance(model.item_factors, np.memmap)
+        
+        matches = other_worker.recommend(self.users[0].id, limit=1)
+        self.assertEqual(matches[0][0], self.products[2].id)
+        self.assertEqual(other_worker.recommend(12345, limit=1), [])
+    
+    def test_selectable_in_recommendation_service(self):
+        """Test that the service serves the factor model when selected."""
+        from recommendations.services import SmartRecommendationService
+        from .matrix_factorization import matrix_factorization_service
+        matrix_factorization_service.train(factors=4, iterations=10)
+        try:
+            result = SmartRecommendationService()._get_matrix_factorization_recommendations(self.users[0], limit=3)
+        finally:
+            matrix_factorization_service.handle.reset()
+        self.assertEqual(result[0]['product_id'], self.products[2].id)
+        self.assertEqual(result[0]['algorithm'], 'matrix_factorization')
+        self.assertNotIn(self.products[0].id, [rec['product_id'] for rec in result])
+
+
 class SentimentAnalysisTest(TestCase):
     """
     Test cases for SentimentAnalysisService.
@@ -89,6 +1022,8 @@ class AIModelsAPITest(APITestCase):
     """
     
     def setUp(self):
+        event_pipeline.clear()
+        self.addCleanup(event_pipeline.clear)
         self.user = User.objects.create_user(
             username='testuser',
             email='test@example.com',
@@ -105,8 +1040,20 @@ class AIModelsAPITest(APITestCase):
         }
         response = self.client.post(url, data, format='json')
         self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        event_pipeline.flush()
         self.assertTrue(UserBehaviorLog.objects.filter(action_type='view').exists())
     
+    def test_log_user_behavior_rejects_invalid_fields(self):
+        """Test that values the log columns cannot hold are rejected."""
+        url = reverse('ai_models:log_behavior')
+        for data in (
+            {'action_type': 'x' * 50},
+            {'action_type': 'view', 'session_id': 's', 'page_url': 'https://example.com/' + 'a' * 300},
+        ):
+            response = self.client.post(url, data, format='json')
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(event_pipeline.pending_count(), 0)
+    
     def test_search_suggestions(self):
         """Test search suggestions endpoint."""
         url = reverse('ai_models:search_suggestions')
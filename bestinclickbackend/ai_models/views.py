@@ -7,9 +7,9 @@ from rest_framework.decorators import api_view, permission_classes
 from rest_framework.permissions import AllowAny, IsAuthenticated
 from rest_framework.response import Response
 from django.utils import timezone
-from products.models import Product
 from .models import UserBehaviorLog, UserSessionInteraction
 from .services import SearchService, RecommendationService, SentimentAnalysisService
+from .event_pipeline import event_pipeline
 from rest_framework.views import APIView
 import logging
 from textblob import TextBlob
@@ -34,34 +34,44 @@ def log_user_behavior(request):
                 status=status.HTTP_400_BAD_REQUEST
             )
         
-        # Create behavior log
-        behavior_log = UserBehaviorLog(
-            user=request.user if request.user.is_authenticated else None,
-            action_type=action_type,
+        if not isinstance(action_type, str) or action_type not in dict(UserBehaviorLog.ACTION_TYPES):
+            return Response(
+                {'error': 'Invalid action_type'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        # Rows are written in shared batches, so reject values the columns cannot hold
+        for field, model in (('session_id', UserBehaviorLog),
+                             ('page_url', UserSessionInteraction),
+                             ('referrer', UserSessionInteraction)):
+            value = data.get(field) or ''
+            if not isinstance(value, str) or len(value) > model._meta.get_field(field).max_length:
+                return Response(
+                    {'error': f'Invalid {field}'},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+        
+        user = request.user if request.user.is_authenticated else None
+        product_id = data.get('product_id')
+        
+        # Buffer behavior log; it is written after the response is sent
+        event_pipeline.log_behavior(
+            action_type,
+            user=user,
+            product=product_id,
             metadata=data.get('metadata', {}),
             session_id=data.get('session_id', ''),
             ip_address=request.META.get('REMOTE_ADDR'),
             user_agent=request.META.get('HTTP_USER_AGENT', '')
         )
         
-        # Add product if provided
-        product_id = data.get('product_id')
-        if product_id:
-            try:
-                product = Product.objects.get(id=product_id, is_active=True)
-                behavior_log.product = product
-            except Product.DoesNotExist:
-                pass
-        
-        behavior_log.save()
-        
-        # Also create session interaction for real-time personalization
+        # Also record session interaction for real-time personalization
         if data.get('session_id'):
-            UserSessionInteraction.objects.create(
+            event_pipeline.log_session_interaction(
                 session_id=data['session_id'],
-                user=request.user if request.user.is_authenticated else None,
-                product=behavior_log.product,
                 interaction_type=action_type,
+                user=user,
+                product=product_id,
                 page_url=data.get('page_url', ''),
                 referrer=data.get('referrer', ''),
                 interaction_data=data.get('metadata', {})
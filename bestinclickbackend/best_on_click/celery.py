@@ -4,6 +4,7 @@ Celery configuration for background tasks.
 
 import os
 from celery import Celery
+from celery.signals import worker_init
 
 # Set the default Django settings module for the 'celery' program.
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'best_on_click.settings')
@@ -18,6 +19,14 @@ app.config_from_object('django.conf:settings', namespace='CELERY')
 app.autodiscover_tasks()
 
 
+@worker_init.connect
+def start_event_flush(**kwargs):
+    """Flush behavior events buffered by tasks in the background."""
+    from ai_models.event_pipeline import event_pipeline
+
+    event_pipeline.start_background_flush()
+
+
 @app.task(bind=True)
 def debug_task(self):
     print(f'Request: {self.request!r}')
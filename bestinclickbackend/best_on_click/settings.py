@@ -7,6 +7,7 @@ import os
 from pathlib import Path
 from decouple import config
 from datetime import timedelta
+from celery.schedules import crontab
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
@@ -85,6 +86,7 @@ TEMPLATES = [
 
 WSGI_APPLICATION = 'best_on_click.wsgi.application'
 ASGI_APPLICATION = 'best_on_click.asgi.application'
+TEST_RUNNER = 'best_on_click.test_runner.BestOnClickTestRunner'
 
 # Database configuration
 USE_SQLITE = config('USE_SQLITE', default=True, cast=bool)
@@ -225,6 +227,59 @@ CELERY_ACCEPT_CONTENT = ['json']
 CELERY_TASK_SERIALIZER = 'json'
 CELERY_RESULT_SERIALIZER = 'json'
 CELERY_TIMEZONE = TIME_ZONE
+CELERY_TASK_ALWAYS_EAGER = config('CELERY_TASK_ALWAYS_EAGER', default=False, cast=bool)
+CELERY_TASK_ACKS_LATE = True
+CELERY_WORKER_PREFETCH_MULTIPLIER = 1
+
+# Periodic offline scoring jobs (run with `celery -A best_on_click beat`)
+CELERY_BEAT_SCHEDULE = {
+    'flush-product-views': {
+        'task': 'products.tasks.flush_product_views',
+        'schedule': timedelta(seconds=5),
+        # Drop flushes that waited past the next one; the lock skips overlaps
+        'options': {'expires': 5},
+    },
+    'rescore-products': {
+        'task': 'recommendations.tasks.rescore_products',
+        'schedule': timedelta(minutes=15),
+    },
+    'refresh-trending-products': {
+        'task': 'recommendations.tasks.refresh_trending_products',
+        'schedule': timedelta(minutes=15),
+    },
+    'calculate-user-similarities': {
+        'task': 'recommendations.tasks.calculate_user_similarities',
+        'schedule': timedelta(hours=6),
+    },
+    'rebuild-similar-products': {
+        'task': 'recommendations.tasks.rebuild_similar_products',
+        'schedule': timedelta(hours=24),
+    },
+    'train-matrix-factorization': {
+        'task': 'recommendations.tasks.train_matrix_factorization',
+        'schedule': timedelta(hours=24),
+    },
+    'backfill-sentiment': {
+        'task': 'comments.tasks.backfill_sentiment',
+        'schedule': timedelta(hours=1),
+    },
+    'rollup-analytics': {
+        'task': 'dashboard.tasks.rollup_analytics',
+        'schedule': timedelta(minutes=15),
+    },
+    'refresh-store-metrics': {
+        'task': 'dashboard.tasks.refresh_store_metrics',
+        'schedule': timedelta(hours=1),
+    },
+    'precompute-store-insights': {
+        'task': 'dashboard.tasks.precompute_store_insights',
+        'schedule': crontab(hour=3, minute=0),
+    },
+    'run-report-schedules': {
+        'task': 'reports.tasks.run_report_schedules',
+        'schedule': timedelta(minutes=1),
+    },
+}
 
 # Cache Configuration
 CACHES = {
@@ -236,6 +291,10 @@ CACHES = {
 
 # AI/ML Configuration
 OPENAI_API_KEY = config('OPENAI_API_KEY', default='')
+ML_ARTIFACTS_DIR = config('ML_ARTIFACTS_DIR', default=str(BASE_DIR / 'ml_artifacts'))
+RECOMMENDATION_ENGINE_MODE = config('RECOMMENDATION_ENGINE_MODE', default='single_pass')
+RECOMMENDATION_ALGORITHM = config('RECOMMENDATION_ALGORITHM', default='hybrid')
+REPORT_SCHEDULE_MAX_PER_STORE = config('REPORT_SCHEDULE_MAX_PER_STORE', default=2, cast=int)
 
 # Security Settings for Production
 if not DEBUG:
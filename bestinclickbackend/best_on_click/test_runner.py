@@ -0,0 +1,19 @@
+"""
+Test runner for best_on_click project.
+"""
+
+from django.test.runner import DiscoverRunner
+
+
+class BestOnClickTestRunner(DiscoverRunner):
+    """
+    Discards behavior events still buffered when the test databases are
+    destroyed, so the flush at interpreter exit can't write them to the
+    real database.
+    """
+
+    def teardown_databases(self, old_config, **kwargs):
+        from ai_models.event_pipeline import event_pipeline
+
+        event_pipeline.clear()
+        super().teardown_databases(old_config, **kwargs)
@@ -8,3 +8,8 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'best_on_click.settings')
 
 application = get_wsgi_application()
+
+# Flush buffered behavior events in the background of every worker
+from ai_models.event_pipeline import event_pipeline  # noqa: E402
+
+event_pipeline.start_background_flush()
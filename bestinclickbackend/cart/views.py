@@ -8,7 +8,7 @@ from rest_framework.permissions import AllowAny, IsAuthenticated
 from rest_framework.response import Response
 from django.shortcuts import get_object_or_404
 from products.models import Product
-from ai_models.models import UserBehaviorLog
+from ai_models.event_pipeline import event_pipeline
 from .models import Cart, CartItem, SavedItem
 from .serializers import (
     CartSerializer,
@@ -110,10 +110,10 @@ def add_to_cart(request):
         
         # Log user behavior
         if request.user.is_authenticated:
-            UserBehaviorLog.objects.create(
+            event_pipeline.log_behavior(
+                'add_to_cart',
                 user=request.user,
                 product=product,
-                action_type='add_to_cart',
                 metadata={'quantity': quantity, 'source': 'cart_api'}
             )
         
@@ -339,10 +339,10 @@ def save_item(request):
             saved_item.save()
         
         # Log user behavior
-        UserBehaviorLog.objects.create(
+        event_pipeline.log_behavior(
+            'like',
             user=request.user,
             product=product,
-            action_type='like',
             metadata={'source': 'wishlist', 'notes': notes}
         )
         
@@ -0,0 +1,85 @@
+"""
+Celery tasks for comment sentiment analysis.
+"""
+
+import logging
+from celery import chord, shared_task
+
+from ai_models.background import acquire_task_lock, chunked, release_task_lock
+from ai_models.services import SentimentAnalysisService
+from .models import Comment, AISentimentAnalysisResult
+
+logger = logging.getLogger(__name__)
+
+BACKFILL_LOCK = 'backfill_sentiment'
+BACKFILL_CHUNK_SIZE = 500
+
+
+@shared_task
+def backfill_sentiment(chunk_size: int = BACKFILL_CHUNK_SIZE):
+    """
+    Analyze active comments that have no sentiment result yet, in parallel
+    chunks. Returns the number of comments scheduled.
+    """
+    if not acquire_task_lock(BACKFILL_LOCK):
+        logger.info("Sentiment backfill already running, skipping")
+        return 0
+
+    try:
+        comment_ids = list(
+            Comment.objects.filter(is_active=True, sentiment_analysis__isnull=True)
+            .order_by('id').values_list('id', flat=True)
+        )
+        if not comment_ids:
+            finish_sentiment_backfill.delay([])
+            return 0
+
+        chord(
+            analyze_comment_chunk.s(chunk) for chunk in chunked(comment_ids, chunk_size)
+        )(finish_sentiment_backfill.s().on_error(sentiment_backfill_failed.s()))
+        return len(comment_ids)
+
+    except Exception as e:
+        release_task_lock(BACKFILL_LOCK)
+        logger.error(f"Error scheduling sentiment backfill: {str(e)}")
+        raise
+
+
+@shared_task
+def analyze_comment_chunk(comment_ids):
+    """
+    Store sentiment results for the comments of one chunk that still lack
+    one. Comments analyzed in the meantime are skipped.
+    """
+    comments = Comment.objects.filter(id__in=comment_ids, sentiment_analysis__isnull=True).only('id', 'text')
+    service = SentimentAnalysisService()
+    results = []
+    for comment in comments:
+        analysis = service.analyze_sentiment(comment.text)
+        results.append(AISentimentAnalysisResult(
+            comment_id=comment.id,
+            sentiment=analysis['sentiment'],
+            confidence_score=analysis['confidence_score'],
+            emotion_scores=analysis['emotion_scores'],
+            keywords=analysis['keywords']
+        ))
+    AISentimentAnalysisResult.objects.bulk_create(results, ignore_conflicts=True)
+    return len(results)
+
+
+@shared_task
+def finish_sentiment_backfill(chunk_counts):
+    release_task_lock(BACKFILL_LOCK)
+    total = sum(chunk_counts)
+    logger.info(f"Sentiment backfill analyzed {total} comments")
+    return total
+
+
+@shared_task
+def sentiment_backfill_failed(request, exc, traceback):
+    """
+    Chord error callback: release the lock so the next hourly run retries
+    the comments still without a result.
+    """
+    release_task_lock(BACKFILL_LOCK)
+    logger.error(f"Sentiment backfill failed: {str(exc)}")
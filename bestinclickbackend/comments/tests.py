@@ -2,13 +2,16 @@
 Tests for comments app.
 """
 
-from django.test import TestCase
+from unittest import mock
+from django.test import TestCase, override_settings
 from django.contrib.auth import get_user_model
 from rest_framework.test import APITestCase
 from rest_framework import status
 from django.urls import reverse
+from ai_models.background import acquire_task_lock
 from products.models import Product, Category, Brand, Store
-from .models import Comment
+from .models import Comment, AISentimentAnalysisResult
+from .tasks import backfill_sentiment, sentiment_backfill_failed
 
 User = get_user_model()
 
@@ -124,3 +127,74 @@ class CommentAPITest(APITestCase):
         response = self.client.get(url)
         self.assertEqual(response.status_code, status.HTTP_200_OK)
         self.assertEqual(len(response.data['results']), 1)
+
+
+@override_settings(
+    CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}},
+    CELERY_TASK_ALWAYS_EAGER=True,
+    CELERY_TASK_EAGER_PROPAGATES=True
+)
+class SentimentBackfillTaskTest(TestCase):
+    """
+    Test cases for the sentiment backfill Celery task, run eagerly.
+    """
+    
+    def setUp(self):
+        store_owner = User.objects.create_user(
+            username='storeowner',
+            email='owner@example.com',
+            password='testpass123',
+            role='store_owner'
+        )
+        store = Store.objects.create(
+            owner=store_owner,
+            name='Test Store',
+            email='store@example.com',
+            phone='1234567890',
+            address='Test Address'
+        )
+        self.product = Product.objects.create(
+            store=store,
+            category=Category.objects.create(name='Test Category'),
+            brand=Brand.objects.create(name='Test Brand'),
+            name='Test Product',
+            description='Test description',
+            sku='TEST001',
+            price=99.99
+        )
+        self.comments = [
+            Comment.objects.create(
+                user=User.objects.create_user(username=f'user{i}', email=f'user{i}@example.com', password='testpass123'),
+                product=self.product,
+                text=text,
+                rating=rating
+            )
+            for i, (text, rating) in enumerate([('Excellent, love it', 5), ('Terrible and broken', 1), ('It is fine', 3)])
+        ]
+    
+    def test_backfill_analyzes_missing_comments_once(self):
+        """Test that only comments without a sentiment result are analyzed."""
+        AISentimentAnalysisResult.objects.create(
+            comment=self.comments[2], sentiment='neutral', confidence_score=0.5
+        )
+        self.assertEqual(backfill_sentiment.delay(chunk_size=1).get(), 2)
+        sentiments = dict(AISentimentAnalysisResult.objects.values_list('comment_id', 'sentiment'))
+        self.assertEqual(sentiments[self.comments[0].id], 'positive')
+        self.assertEqual(sentiments[self.comments[1].id], 'negative')
+        
+        self.assertEqual(backfill_sentiment.delay().get(), 0)
+        self.assertEqual(AISentimentAnalysisResult.objects.count(), 3)
+    
+    def test_failed_backfill_releases_lock(self):
+        """Test that the chord error callback releases the backfill lock."""
+        with mock.patch('comments.tasks.chord') as backfill_chord:
+            backfill_sentiment.delay()
+        body = backfill_chord.return_value.call_args.args[0]
+        self.assertEqual(
+            [errback['task'] for errback in body.options['link_error']],
+            ['comments.tasks.sentiment_backfill_failed']
+        )
+        self.assertFalse(acquire_task_lock('backfill_sentiment'))
+        
+        sentiment_backfill_failed(None, RuntimeError('chunk failed'), None)
+        self.assertTrue(acquire_task_lock('backfill_sentiment'))
@@ -3,7 +3,7 @@ Admin configuration for dashboard app.
 """
 
 from django.contrib import admin
-from .models import StoreAnalytics, ProductPerformance
+from .models import StoreAnalytics, ProductPerformance, StoreMetrics
 
 
 @admin.register(StoreAnalytics)
@@ -26,3 +26,14 @@ class ProductPerformanceAdmin(admin.ModelAdmin):
     list_filter = ['date', 'product__store']
     search_fields = ['product__name', 'product__store__name']
     date_hierarchy = 'date'
+
+
+@admin.register(StoreMetrics)
+class StoreMetricsAdmin(admin.ModelAdmin):
+    """
+    Admin for materialized store metrics.
+    """
+    list_display = ['store', 'category', 'health_score', 'health_percentile', 'average_rating', 'product_count', 'computed_at']
+    list_filter = ['category']
+    search_fields = ['store__name']
+    readonly_fields = ['computed_at']
@@ -0,0 +1,345 @@
+"""
+Store AI insights for the dashboard.
+
+Insight documents are built from the store's product metrics (one grouped
+aggregate, see ai_models.store_insights) and cached per store until the
+store's products, reviews or stock change. The analysis period only labels
+the document, so one cached document serves every period.
+precompute_store_insights fills
+the cache for a batch of stores with one metrics query per batch; the
+nightly task runs the batches in parallel.
+"""
+
+import logging
+from typing import Iterable
+from django.utils import timezone
+
+from ai_models.store_insights import store_insights_cache, store_metrics
+from products.models import Store
+
+logger = logging.getLogger(__name__)
+
+INSIGHTS_KIND = 'dashboard'
+DEFAULT_DAYS = 30
+
+
+def get_store_insights(store, days=DEFAULT_DAYS):
+    """
+    The cached insight document of a store, built if missing or stale.
+    """
+    document = store_insights_cache.get_or_build(
+        INSIGHTS_KIND, store.id, lambda: build_store_insights(store, days)
+    )
+    if 'analysis_period' in document:
+        document = dict(document, analysis_period=f'{days} days')
+    return document
+
+
+def precompute_store_insights(store_ids: Iterable[int], days=DEFAULT_DAYS) -> int:
+    """
+    Build and cache the insight documents of a batch of stores. Returns the
+    number of documents cached.
+    """
+    stores = list(Store.objects.filter(id__in=store_ids))
+    keys = {store.id: store_insights_cache.key(INSIGHTS_KIND, store.id) for store in stores}
+    metrics = store_metrics(keys)
+    cached = 0
+    for store in stores:
+        document = build_store_insights(store, days, metrics[store.id])
+        if 'error' not in document:
+            store_insights_cache.set(keys[store.id], document)
+            cached += 1
+    return cached
+
+
+def build_store_insights(store, days=30, metrics=None):
+    """
+    Generate comprehensive AI insights for store improvement from the
+    store's product metrics (computed with one query if not given).
+    """
+    try:
+        # Collect store data
+        if metrics is None:
+            metrics = store_metrics([store.id])[store.id]
+        total_products = metrics['total_products']
+        
+        if total_products == 0:
+            return {
+                'store_id': store.id,
+                'store_name': store.name,
+                'analysis_period': f'{days} days',
+                'generated_at': timezone.now().isoformat(),
+                'insights': [{
+                    'type': 'setup',
+                    'priority': 'high',
+                    'title': 'Start Adding Products',
+                    'description': 'Your store is empty! You need to add products to start selling and attract customers.',
+                    'action': 'Add New Product',
+                    'impact': 'Begin your e-commerce journey',
+                    'icon': 'fa-plus'
+                }],
+                'performance_score': 10,
+                'performance_summary': 'Your store needs initial setup. Start by adding products!',
+                'total_insights': 1
+            }
+        
+        insights = []
+        score = 50  # Base score
+        
+        # Product Analysis
+        out_of_stock = metrics['out_of_stock']
+        no_image_products = metrics['no_image_products']
+        low_view_products = metrics['low_view_products']
+        high_rated_products = metrics['high_rated_products']
+        avg_rating = metrics['avg_rating'] or 0
+        total_views = metrics['total_views'] or 0
+        total_reviews = metrics['total_reviews'] or 0
+        
+        # 1. Inventory Management Insights
+        if out_of_stock > 0:
+            out_of_stock_rate = (out_of_stock / total_products) * 100
+            if out_of_stock_rate > 20:
+                insights.append({
+                    'type': 'inventory',
+                    'priority': 'high',
+                    'title': 'Critical Inventory Issue',
+                    'description': f'{out_of_stock_rate:.0f}% of your products are out of stock ({out_of_stock} products). This is causing you to lose potential sales.',
+                    'action': 'Restock Immediately',
+                    'impact': 'Prevent losing 30-50% of potential sales',
+                    'icon': 'fa-boxes'
+                })
+                score -= 20
+            elif out_of_stock_rate > 10:
+                insights.append({
+                    'type': 'inventory',
+                    'priority': 'medium',
+                    'title': 'Low Stock Warning',
+                    'description': f'{out_of_stock} products are out of stock. Monitor inventory levels regularly.',
+                    'action': 'Set Up Stock Alerts',
+                    'impact': 'Avoid sudden stockouts',
+                    'icon': 'fa-exclamation-triangle'
+                })
+                score -= 10
+        else:
+            insights.append({
+                'type': 'inventory',
+                'priority': 'low',
+                'title': 'Excellent Inventory Management',
+                'description': 'All your products are in stock! Keep up this great performance.',
+                'action': 'Maintain Continuous Monitoring',
+                'impact': 'Customer satisfaction and continuous sales',
+                'icon': 'fa-check-circle'
+            })
+            score += 15
+        
+        # 2. Product Images Insights
+        if no_image_products > 0:
+            no_image_rate = (no_image_products / total_products) * 100
+            insights.append({
+                'type': 'product_images',
+                'priority': 'high',
+                'title': 'Products Missing Images',
+                'description': f'{no_image_products} products ({no_image_rate:.0f}%) have no images. Products with images get 5x more views!',
+                'action': 'Add High-Quality Images',
+                'impact': 'Increase views by 400%',
+                'icon': 'fa-image'
+            })
+            score -= 15
+        
+        # 3. Product Performance Insights
+        if low_view_products > 0:
+            low_view_rate = (low_view_products / total_products) * 100
+            if low_view_rate > 50:
+                insights.append({
+                    'type': 'product_performance',
+                    'priority': 'high',
+                    'title': 'Low-Performing Products',
+                    'description': f'{low_view_rate:.0f}% of your products have low views. You need to improve titles and descriptions.',
+                    'action': 'Optimize Product Descriptions & Keywords',
+                    'impact': 'Increase search visibility by 60%',
+                    'icon': 'fa-eye'
+                })
+                score -= 15
+            elif low_view_rate > 25:
+                insights.append({
+                    'type': 'product_performance',
+                    'priority': 'medium',
+                    'title': 'Visibility Improvement Opportunity',
+                    'description': f'{low_view_products} products need better visibility. Consider improving titles.',
+                    'action': 'Review Product Titles',
+                    'impact': 'Increase views by 30%',
+                    'icon': 'fa-search'
+                })
+                score -= 8
+        
+        # 4. Customer Satisfaction Insights
+        if total_reviews > 0:
+            review_rate = (total_reviews / max(total_views, 1)) * 100
+            if avg_rating >= 4.5:
+                insights.append({
+                    'type': 'customer_satisfaction',
+                    'priority': 'low',
+                    'title': 'Extremely Happy Customers!',
+                    'description': f'Your excellent rating of {avg_rating:.1f}/5 shows customer satisfaction. Use this in marketing!',
+                    'action': 'Feature Reviews in Advertisements',
+                    'impact': 'Increase trust and sales by 25%',
+                    'icon': 'fa-star'
+                })
+                score += 20
+            elif avg_rating >= 4.0:
+                insights.append({
+                    'type': 'customer_satisfaction',
+                    'priority': 'low',
+                    'title': 'Good Customer Reviews',
+                    'description': f'Your rating of {avg_rating:.1f}/5 is good. It can be improved by focusing on quality details.',
+                    'action': 'Improve Product Quality & Service',
+                    'impact': 'Reach 4.5+ star rating',
+                    'icon': 'fa-thumbs-up'
+                })
+                score += 10
+            elif avg_rating < 3.5:
+                insights.append({
+                    'type': 'customer_satisfaction',
+                    'priority': 'high',
+                    'title': 'Customer Satisfaction Needs Improvement',
+                    'description': f'Your rating of {avg_rating:.1f}/5 is low. You must review product quality and service immediately.',
+                    'action': 'Comprehensive Quality & Service Review',
+                    'impact': 'Improve reputation and increase sales',
+                    'icon': 'fa-exclamation-triangle'
+                })
+                score -= 25
+            
+            if review_rate < 2:
+                insights.append({
+                    'type': 'customer_engagement',
+                    'priority': 'medium',
+                    'title': 'Low Customer Engagement',
+                    'description': f'Review rate is only {review_rate:.1f}%. Encourage customers to leave reviews.',
+                    'action': 'Create Review Encouragement Campaign',
+                    'impact': 'Increase trust and credibility',
+                    'icon': 'fa-comments'
+                })
+        else:
+            insights.append({
+                'type': 'customer_engagement',
+                'priority': 'medium',
+                'title': 'No Reviews Yet',
+                'description': 'Your store needs customer reviews to build trust. Encourage your first customers to review.',
+                'action': 'Request Reviews from Early Customers',
+                'impact': 'Build trust for new customers',
+                'icon': 'fa-star-half-alt'
+            })
+        
+        # 5. High-performing products opportunity
+        if high_rated_products > 0:
+            insights.append({
+                'type': 'marketing_opportunity',
+                'priority': 'medium',
+                'title': 'Star Products for Promotion',
+                'description': f'You have {high_rated_products} products with excellent ratings (4.5+ stars). Promote them more!',
+                'action': 'Create Promotional Campaign for Top Products',
+                'impact': 'Increase sales by 40%',
+                'icon': 'fa-rocket'
+            })
+            score += 10
+        
+        # 6. Pricing Strategy Insights
+        discounted_products = metrics['discounted_products']
+        if total_products > 0:
+            discount_rate = (discounted_products / total_products) * 100
+            if discount_rate < 10:
+                insights.append({
+                    'type': 'pricing_strategy',
+                    'priority': 'medium',
+                    'title': 'Opportunity for Attractive Offers',
+                    'description': 'Few of your products have discounts. Offers increase attractiveness and encourage purchases.',
+                    'action': 'Create Seasonal Offers or Limited Discounts',
+                    'impact': 'Increase conversion rate by 35%',
+                    'icon': 'fa-percent'
+                })
+            elif discount_rate > 60:
+                insights.append({
+                    'type': 'pricing_strategy',
+                    'priority': 'medium',
+                    'title': 'Review Discount Strategy',
+                    'description': f'{discount_rate:.0f}% of your products have discounts. Ensure you maintain profitability.',
+                    'action': 'Review Profit Margins and Pricing',
+                    'impact': 'Improve profitability while maintaining sales',
+                    'icon': 'fa-chart-line'
+                })
+        
+        # 7. SEO and Marketing Insights
+        products_without_description = (
+            metrics['no_description_products'] + metrics['placeholder_description_products']
+        )
+        
+        if products_without_description > 0:
+            insights.append({
+                'type': 'seo_marketing',
+                'priority': 'medium',
+                'title': 'Search Engine Optimization (SEO)',
+                'description': f'{products_without_description} products lack detailed descriptions. Good descriptions improve your search visibility.',
+                'action': 'Write Detailed and Attractive Descriptions',
+                'impact': 'Increase traffic from search engines',
+                'icon': 'fa-search'
+            })
+        
+        # 8. Store Verification Insight
+        if not store.is_verified:
+            insights.append({
+                'type': 'store_credibility',
+                'priority': 'high',
+                'title': 'Store Verification Required',
+                'description': 'Your store is not verified. Verified stores gain more customer trust.',
+                'action': 'Complete Store Verification Process',
+                'impact': 'Increase trust and sales by 50%',
+                'icon': 'fa-shield-alt'
+            })
+            score -= 15
+        
+        # 9. Social Media Marketing Opportunity
+        if total_views > 100:
+            insights.append({
+                'type': 'social_media',
+                'priority': 'low',
+                'title': 'Social Media Marketing Opportunity',
+                'description': f'Your products get {total_views} views. Share them on social media to double your reach!',
+                'action': 'Share Products on Facebook and Instagram',
+                'impact': 'Double potential visitor count',
+                'icon': 'fa-share-alt'
+            })
+        
+        # Calculate final performance score
+        performance_score = min(100, max(0, score))
+        
+        # Generate performance summary
+        high_priority_count = len([i for i in insights if i.get('priority') == 'high'])
+        if performance_score >= 80:
+            performance_summary = f"Excellent performance! Your store operates with high efficiency. You have {high_priority_count} points that need attention."
+        elif performance_score >= 60:
+            performance_summary = f"Good performance with room for improvement. Focus on {high_priority_count} important points to enhance performance."
+        elif performance_score >= 40:
+            performance_summary = f"Average performance. Your store needs improvements in {high_priority_count} important areas."
+        else:
+            performance_summary = f"Your store needs fundamental improvements. Start with {high_priority_count} high-priority points."
+        
+        return {
+            'store_id': store.id,
+            'store_name': store.name,
+            'analysis_period': f'{days} days',
+            'generated_at': timezone.now().isoformat(),
+            'insights': insights,
+            'performance_score': round(performance_score, 1),
+            'performance_summary': performance_summary,
+            'total_insights': len(insights),
+            'priority_insights': [i for i in insights if i.get('priority') == 'high']
+        }
+        
+    except Exception as e:
+        logger.error(f"Error generating comprehensive insights: {str(e)}")
+        return {
+            'error': 'Failed to generate insights',
+            'insights': [],
+            'performance_score': 0,
+            'performance_summary': 'Unable to analyze store performance at this time.'
+        }
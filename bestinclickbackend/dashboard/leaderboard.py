@@ -0,0 +1,200 @@
+"""
+Store health leaderboard backed by the materialized StoreMetrics table.
+
+Comparing a store with its competitors used to mean a handful of queries
+per store. Instead, a periodic task recomputes the metrics of every store
+in one pass: a few grouped queries per (store, category) over products,
+recent reviews and the ProductPerformance rollup are loaded into a pandas
+frame, stores' overall rows are summed from their category rows, and the
+health score and percentile ranks are computed column-wise for the whole
+table. Reports and the dashboard then read single indexed rows.
+"""
+
+import logging
+from datetime import datetime, timedelta
+from decimal import Decimal
+from typing import Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+from django.db import transaction
+from django.db.models import Count, Q, Sum
+from django.utils import timezone
+
+from products.models import Product, ProductReview, Store
+from .models import ProductPerformance, StoreMetrics
+
+logger = logging.getLogger(__name__)
+
+KEYS = ['store_id', 'category_id']
+COUNT_COLUMNS = [
+    'product_count', 'rating_sum', 'total_views', 'out_of_stock', 'price_sum',
+    'reviews', 'window_views', 'cart_adds',
+]
+
+# metric column: percentile column; every metric ranks higher-is-better
+# except the stock-out ratio, which is ranked on its negation
+PERCENTILES = {
+    'average_rating': 'rating_percentile',
+    'product_count': 'product_count_percentile',
+    'total_views': 'views_percentile',
+    'conversion_rate': 'conversion_percentile',
+    'stock_in_ratio': 'stock_percentile',
+    'review_velocity': 'review_velocity_percentile',
+    'health_score': 'health_percentile',
+}
+
+
+def _ratio(numerator: pd.Series, denominator: pd.Series) -> pd.Series:
+    return (numerator / denominator.where(denominator > 0)).fillna(0.0)
+
+
+def health_scores(average_rating, total_views, product_count):
+    """
+    Store health out of 100: rating (40%), views up to 100 (30%) and
+    active products up to 20 (30%).
+    """
+    return np.round(
+        np.asarray(average_rating) / 5 * 40
+        + np.minimum(np.asarray(total_views) / 100, 1) * 30
+        + np.minimum(np.asarray(product_count) / 20, 1) * 30,
+        1
+    )
+
+
+class StoreLeaderboard:
+    """
+    Recomputes StoreMetrics and answers ranking lookups from it.
+    """
+
+    window_days = 30  # period of the conversion rate and review velocity
+    batch_size = 1000
+
+    def refresh(self, now: Optional[datetime] = None) -> int:
+        """
+        Recompute the metrics and percentiles of all active stores. Returns
+        the number of rows written.
+        """
+        now = now or timezone.now()
+        frame = self.compute(self._load(now))
+        rows = [self._row(record, now) for record in frame.to_dict('records')]
+        with transaction.atomic():
+            StoreMetrics.objects.all().delete()
+            StoreMetrics.objects.bulk_create(rows, batch_size=self.batch_size)
+        logger.info(f"Store metrics refreshed: {len(rows)} rows for {frame['store_id'].nunique()} stores")
+        return len(rows)
+
+    def _load(self, now: datetime) -> pd.DataFrame:
+        """Per (store, category) counts from three grouped queries."""
+        since = now - timedelta(days=self.window_days)
+        active = {'is_active': True, 'store__is_active': True}
+
+        products = Product.objects.filter(**active).order_by().values(*KEYS).annotate(
+            product_count=Count('id'),
+            rating_sum=Sum('average_rating'),
+            total_views=Sum('view_count'),
+            out_of_stock=Count('id', filter=Q(in_stock=False)),
+            price_sum=Sum('price')
+        )
+        reviews = ProductReview.objects.filter(
+            created_at__gte=since, **{f'product__{key}': value for key, value in active.items()}
+        ).order_by().values('product__store_id', 'product__category_id').annotate(reviews=Count('id'))
+        performance = ProductPerformance.objects.filter(
+            date__gte=since.date(), **{f'product__{key}': value for key, value in active.items()}
+        ).order_by().values('product__store_id', 'product__category_id').annotate(
+            window_views=Sum('views'),
+            cart_adds=Sum('add_to_cart')
+        )
+
+        frame = pd.DataFrame.from_records(
+            list(products), columns=KEYS + ['product_count', 'rating_sum', 'total_views', 'out_of_stock', 'price_sum']
+        ).astype({key: 'int64' for key in KEYS})
+        for rows, columns in ((reviews, ['reviews']), (performance, ['window_views', 'cart_adds'])):
+            extra = pd.DataFrame.from_records(
+                list(rows), columns=['product__store_id', 'product__category_id'] + columns
+            ).rename(columns={'product__store_id': 'store_id', 'product__category_id': 'category_id'}).astype(
+                {key: 'int64' for key in KEYS}
+            )
+            frame = frame.merge(extra, on=KEYS, how='left')
+        frame[COUNT_COLUMNS] = frame[COUNT_COLUMNS].astype(float).fillna(0.0)
+
+        # Overall rows, including active stores without any active products
+        overall = frame.groupby('store_id')[COUNT_COLUMNS].sum().reindex(
+            Store.objects.filter(is_active=True).values_list('id', flat=True), fill_value=0.0
+        ).rename_axis('store_id').reset_index()
+        overall['category_id'] = np.nan
+        return pd.concat([frame, overall], ignore_index=True)
+
+    def compute(self, frame: pd.DataFrame) -> pd.DataFrame:
+        """Derive the metrics, health score and percentile ranks of every row."""
+        frame = frame.copy()
+        frame['average_rating'] = _ratio(frame['rating_sum'], frame['product_count'])
+        frame['average_price'] = _ratio(frame['price_sum'], frame['product_count'])
+        frame['stock_out_ratio'] = _ratio(frame['out_of_stock'], frame['product_count'])
+        frame['stock_in_ratio'] = 1 - frame['stock_out_ratio']
+        frame['conversion_rate'] = (_ratio(frame['cart_adds'], frame['window_views']) * 100).clip(upper=100.0)
+        frame['review_velocity'] = frame['reviews'] / self.window_days
+        frame['health_score'] = health_scores(frame['average_rating'], frame['total_views'], frame['product_count'])
+
+        # Rank within each category; overall rows (no category) form their own group
+        groups = frame.groupby(frame['category_id'].fillna(0), sort=False)
+        for metric, percentile in PERCENTILES.items():
+            frame[percentile] = (groups[metric].rank(pct=True, method='max') * 100).round(1)
+        return frame
+
+    def _row(self, record: Dict, now: datetime) -> StoreMetrics:
+        category_id = record['category_id']
+        return StoreMetrics(
+            store_id=int(record['store_id']),
+            category_id=None if pd.isna(category_id) else int(category_id),
+            average_rating=round(float(record['average_rating']), 2),
+            product_count=int(record['product_count']),
+            total_views=int(record['total_views']),
+            conversion_rate=round(float(record['conversion_rate']), 2),
+            stock_out_ratio=round(float(record['stock_out_ratio']), 4),
+            review_velocity=round(float(record['review_velocity']), 4),
+            average_price=Decimal(str(round(float(record['average_price']), 2))),
+            health_score=float(record['health_score']),
+            computed_at=now,
+            **{percentile: float(record[percentile]) for percentile in PERCENTILES.values()}
+        )
+
+    # Lookups
+
+    def get(self, store_id: int, category_id: Optional[int] = None) -> Optional[StoreMetrics]:
+        """A store's metrics overall, or within one category."""
+        return StoreMetrics.objects.filter(
+            store_id=store_id, **self._category_filter(category_id)
+        ).first()
+
+    def leaderboard(self, category_id: Optional[int] = None, limit: int = 20) -> List[StoreMetrics]:
+        """Healthiest stores overall, or within one category."""
+        return list(
+            StoreMetrics.objects.filter(**self._category_filter(category_id))
+            .select_related('store').order_by('-health_score', 'store_id')[:limit]
+        )
+
+    def competitors(self, store_id: int, limit: int = 5) -> List[StoreMetrics]:
+        """
+        Overall metrics of the healthiest active, verified stores selling in
+        any of this store's categories.
+        """
+        categories = StoreMetrics.objects.filter(
+            store_id=store_id, category__isnull=False
+        ).values('category_id')
+        return list(
+            StoreMetrics.objects.filter(
+                category__isnull=True,
+                store__is_active=True,
+                store__is_verified=True,
+                store_id__in=StoreMetrics.objects.filter(category_id__in=categories).values('store_id')
+            ).exclude(store_id=store_id).select_related('store').order_by('-health_score', 'store_id')[:limit]
+        )
+
+    def _category_filter(self, category_id: Optional[int]) -> Dict:
+        if category_id is None:
+            return {'category__isnull': True}
+        return {'category_id': category_id}
+
+
+store_leaderboard = StoreLeaderboard()
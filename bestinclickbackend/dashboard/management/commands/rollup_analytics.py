@@ -0,0 +1,45 @@
+"""
+Management command to roll up daily store and product analytics.
+Runs incrementally from the last high-water mark; use --days to rebuild
+a window of history (e.g. once after deploying).
+"""
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from dashboard.rollup import analytics_rollup
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    help = 'Aggregate behavior, cart and discount events into daily store and product analytics'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--days',
+            type=int,
+            help='Recount the last N days instead of only events since the last run',
+        )
+
+    def handle(self, *args, **options):
+        start_time = timezone.now()
+
+        try:
+            self.stdout.write('Rolling up analytics...')
+            result = analytics_rollup.run(days=options.get('days'))
+            duration = timezone.now() - start_time
+            self.stdout.write(
+                self.style.SUCCESS(
+                    f"✓ Wrote {result['store_rows']} store days and {result['product_rows']} product days "
+                    f"for {result['stores']} stores"
+                    f'\n⏱ Duration: {duration.total_seconds():.2f} seconds'
+                )
+            )
+
+        except Exception as e:
+            self.stdout.write(
+                self.style.ERROR(f'❌ Error rolling up analytics: {str(e)}')
+            )
+            logger.error(f'Error in rollup_analytics command: {str(e)}')
+            raise e
@@ -0,0 +1,45 @@
+# Generated by Django 5.0.14 on 2026-10-17 00:52
+
+import django.db.models.deletion
+from decimal import Decimal
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dashboard', '0001_initial'),
+        ('products', '0006_product_search_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StoreMetrics',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('average_rating', models.FloatField(default=0.0)),
+                ('product_count', models.PositiveIntegerField(default=0)),
+                ('total_views', models.PositiveBigIntegerField(default=0)),
+                ('conversion_rate', models.FloatField(default=0.0, help_text='Cart additions per 100 views over the window')),
+                ('stock_out_ratio', models.FloatField(default=0.0)),
+                ('review_velocity', models.FloatField(default=0.0, help_text='Reviews per day over the window')),
+                ('average_price', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=10)),
+                ('health_score', models.FloatField(default=0.0)),
+                ('rating_percentile', models.FloatField(default=0.0)),
+                ('product_count_percentile', models.FloatField(default=0.0)),
+                ('views_percentile', models.FloatField(default=0.0)),
+                ('conversion_percentile', models.FloatField(default=0.0)),
+                ('stock_percentile', models.FloatField(default=0.0)),
+                ('review_velocity_percentile', models.FloatField(default=0.0)),
+                ('health_percentile', models.FloatField(default=0.0)),
+                ('computed_at', models.DateTimeField()),
+                ('category', models.ForeignKey(blank=True, help_text='Null for the ranking across all stores', null=True, on_delete=django.db.models.deletion.CASCADE, related_name='store_metrics', to='products.category')),
+                ('store', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='metrics', to='products.store')),
+            ],
+            options={
+                'db_table': 'store_metrics',
+                'indexes': [models.Index(fields=['category', '-health_score'], name='store_metri_categor_96ca22_idx')],
+                'unique_together': {('store', 'category')},
+            },
+        ),
+    ]
@@ -5,7 +5,7 @@ Models for store owner dashboard analytics and management.
 from django.db import models
 from decimal import Decimal
 from django.contrib.auth import get_user_model
-from products.models import Store, Product
+from products.models import Store, Product, Category
 from django.utils import timezone
 from datetime import timedelta
 
@@ -81,3 +81,52 @@ class ProductPerformance(models.Model):
         indexes = [
             models.Index(fields=['product', 'date']),
         ]
+
+
+class StoreMetrics(models.Model):
+    """
+    Periodically materialized store metrics with percentile ranks.
+    
+    One row per store and category it sells in, ranked among the stores of
+    that category, plus one row with a null category ranked among all
+    stores. Percentiles are 0-100; higher is always better (a low stock-out
+    ratio ranks high).
+    """
+    store = models.ForeignKey(Store, on_delete=models.CASCADE, related_name='metrics')
+    category = models.ForeignKey(
+        Category,
+        on_delete=models.CASCADE,
+        null=True,
+        blank=True,
+        related_name='store_metrics',
+        help_text="Null for the ranking across all stores"
+    )
+    
+    # Metrics
+    average_rating = models.FloatField(default=0.0)
+    product_count = models.PositiveIntegerField(default=0)
+    total_views = models.PositiveBigIntegerField(default=0)
+    conversion_rate = models.FloatField(default=0.0, help_text="Cart additions per 100 views over the window")
+    stock_out_ratio = models.FloatField(default=0.0)
+    review_velocity = models.FloatField(default=0.0, help_text="Reviews per day over the window")
+    average_price = models.DecimalField(max_digits=10, decimal_places=2, default=Decimal('0.00'))
+    health_score = models.FloatField(default=0.0)
+    
+    # Percentile ranks within the category
+    rating_percentile = models.FloatField(default=0.0)
+    product_count_percentile = models.FloatField(default=0.0)
+    views_percentile = models.FloatField(default=0.0)
+    conversion_percentile = models.FloatField(default=0.0)
+    stock_percentile = models.FloatField(default=0.0)
+    review_velocity_percentile = models.FloatField(default=0.0)
+    health_percentile = models.FloatField(default=0.0)
+    
+    computed_at = models.DateTimeField()
+    
+    class Meta:
+        db_table = 'store_metrics'
+        unique_together = ['store', 'category']
+        indexes = [
+            models.Index(fields=['category', '-health_score']),
+        ]
+
@@ -0,0 +1,250 @@
+"""
+Daily store and product analytics rolled up from the event tables.
+
+UserBehaviorLog (views, clicks, visitors), CartItem (cart additions) and
+StoreDiscountUsage (validated orders and revenue) are aggregated into one
+StoreAnalytics row per store and day and one ProductPerformance row per
+product and day, so dashboards read pre-aggregated rows instead of
+counting raw events.
+
+Each run only looks at events past a high-water mark kept in the cache:
+it finds the (store, day) pairs those events fall on and recounts exactly
+those days from the event tables, then upserts the rows in bulk.
+Recounting whole days keeps distinct counts such as unique visitors
+correct and makes a repeated or overlapping run harmless. Behavior logs
+are written behind by the event pipeline, so a log can be inserted long
+after its timestamp; they are tracked by primary key, re-scanning a window
+of ids below the mark because ids are allocated before commit and a lower
+id can become visible after a higher one. Cart additions and orders are
+saved directly and tracked by time, with the mark moved back by a small
+margin to pick up rows committed late.
+"""
+
+import logging
+from collections import defaultdict
+from datetime import date, datetime, time, timedelta
+from decimal import Decimal
+from typing import Dict, Optional, Set, Tuple
+
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Count, Q
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from ai_models.background import chunked
+from ai_models.models import UserBehaviorLog
+from cart.models import CartItem
+from products.models import Product
+from promotions.models import StoreDiscountUsage
+from .models import ProductPerformance, StoreAnalytics
+
+logger = logging.getLogger(__name__)
+
+ROLLUP_CURSOR_KEY = 'dashboard:rollup_cursor'
+
+STORE_FIELDS = [
+    'total_views', 'unique_visitors', 'product_views', 'total_clicks', 'add_to_cart_count',
+    'conversion_rate', 'total_orders', 'total_revenue', 'average_order_value',
+]
+PRODUCT_FIELDS = ['views', 'clicks', 'add_to_cart', 'purchases']
+
+
+def _empty_store_row() -> Dict:
+    return {
+        'total_views': 0, 'unique_visitors': 0, 'product_views': 0, 'total_clicks': 0,
+        'add_to_cart_count': 0, 'total_orders': 0, 'total_revenue': Decimal('0.00'),
+    }
+
+
+def _empty_product_row() -> Dict:
+    return dict.fromkeys(PRODUCT_FIELDS, 0)
+
+
+class AnalyticsRollup:
+    """
+    Incrementally maintains StoreAnalytics and ProductPerformance.
+    """
+
+    initial_days = 90  # history rolled up on the first run
+    late_event_margin = timedelta(minutes=10)
+    late_behavior_ids = 10000  # ids below the mark re-scanned on each run
+    stores_per_pass = 200
+    batch_size = 1000
+
+    def run(self, days: Optional[int] = None, now: Optional[datetime] = None) -> Dict[str, int]:
+        """
+        Roll up events since the last run, or those of the last `days` days
+        (initial_days on the first run). Returns the number of rows written.
+        """
+        now = now or timezone.now()
+        # Taken before reading, so logs inserted during the run are seen next time
+        last_behavior_id = UserBehaviorLog.objects.order_by('-id').values_list('id', flat=True).first() or 0
+        cursor = None if days else cache.get(ROLLUP_CURSOR_KEY)
+        if isinstance(cursor, dict):
+            since = parse_datetime(cursor['time']) - self.late_event_margin
+            behavior_ids = (max(cursor['behavior_id'] - self.late_behavior_ids, 0), last_behavior_id)
+        else:
+            since = now - timedelta(days=days or self.initial_days)
+            behavior_ids = None
+
+        result = self.rollup(self.touched_days(since, now, behavior_ids))
+        cache.set(ROLLUP_CURSOR_KEY, {'behavior_id': last_behavior_id, 'time': now.isoformat()}, None)
+        logger.info(
+            f"Rolled up {result['store_rows']} store days and "
+            f"{result['product_rows']} product days since {since.isoformat()}"
+        )
+        return result
+
+    def touched_days(self, since: datetime, until: datetime,
+                     behavior_ids: Optional[Tuple[int, int]] = None) -> Dict[int, Set[date]]:
+        """
+        Days with new events, per store. Behavior logs are selected by the
+        (after, up to) id range when one is given, otherwise by timestamp.
+        """
+        behaviors = UserBehaviorLog.objects.filter(product__isnull=False)
+        if behavior_ids is not None:
+            behaviors = behaviors.filter(id__gt=behavior_ids[0], id__lte=behavior_ids[1])
+        else:
+            behaviors = behaviors.filter(timestamp__gte=since, timestamp__lt=until)
+        sources = [
+            behaviors.annotate(day=TruncDate('timestamp')).values_list('product__store_id', 'day'),
+            CartItem.objects.filter(
+                added_at__gte=since, added_at__lt=until
+            ).annotate(day=TruncDate('added_at')).values_list('product__store_id', 'day'),
+            StoreDiscountUsage.objects.filter(
+                is_used_by_store=True, used_at__gte=since, used_at__lt=until
+            ).annotate(day=TruncDate('used_at')).values_list('store_id', 'day'),
+        ]
+        store_days = defaultdict(set)
+        for rows in sources:
+            for store_id, day in rows.order_by().distinct():
+                store_days[store_id].add(day)
+        return store_days
+
+    def rollup(self, store_days: Dict[int, Set[date]]) -> Dict[str, int]:
+        """Recount and upsert the given days of the given stores."""
+        result = {'stores': len(store_days), 'store_rows': 0, 'product_rows': 0}
+        for store_ids in chunked(sorted(store_days), self.stores_per_pass):
+            store_rows, product_rows = self._aggregate({store_id: store_days[store_id] for store_id in store_ids})
+            with transaction.atomic():
+                StoreAnalytics.objects.bulk_create(
+                    [StoreAnalytics(store_id=store_id, date=day, **row) for (store_id, day), row in store_rows.items()],
+                    batch_size=self.batch_size,
+                    update_conflicts=True,
+                    unique_fields=['store', 'date'],
+                    update_fields=STORE_FIELDS
+                )
+                ProductPerformance.objects.bulk_create(
+                    [ProductPerformance(product_id=product_id, date=day, **row)
+                     for (product_id, day), row in product_rows.items()],
+                    batch_size=self.batch_size,
+                    update_conflicts=True,
+                    unique_fields=['product', 'date'],
+                    update_fields=PRODUCT_FIELDS
+                )
+            result['store_rows'] += len(store_rows)
+            result['product_rows'] += len(product_rows)
+            self._invalidate_store_data(store_ids)
+        return result
+
+    def _aggregate(self, store_days: Dict[int, Set[date]]):
+        """
+        Count the events of the given store days. Returns rows keyed by
+        (store_id, day) and by (product_id, day).
+        """
+        days = set().union(*store_days.values())
+        start, end = self._day_start(min(days)), self._day_start(max(days) + timedelta(days=1))
+        wanted = {(store_id, day) for store_id, store_dates in store_days.items() for day in store_dates}
+        store_rows = {key: _empty_store_row() for key in wanted}
+        product_rows = defaultdict(_empty_product_row)
+
+        behaviors = UserBehaviorLog.objects.filter(
+            product__store_id__in=store_days, timestamp__gte=start, timestamp__lt=end
+        ).annotate(day=TruncDate('timestamp')).order_by()
+        views, clicks = Q(action_type='view'), Q(action_type='click')
+
+        for row in behaviors.values('product__store_id', 'day').annotate(
+            views=Count('id', filter=views),
+            clicks=Count('id', filter=clicks),
+            products_viewed=Count('product_id', distinct=True, filter=views),
+            users=Count('user_id', distinct=True),
+            guests=Count('session_id', distinct=True, filter=Q(user__isnull=True) & ~Q(session_id=''))
+        ):
+            store_row = store_rows.get((row['product__store_id'], row['day']))
+            if store_row is not None:
+                store_row.update(
+                    total_views=row['views'],
+                    total_clicks=row['clicks'],
+                    product_views=row['products_viewed'],
+                    unique_visitors=row['users'] + row['guests']
+                )
+
+        for row in behaviors.values('product_id', 'product__store_id', 'day').annotate(
+            views=Count('id', filter=views),
+            clicks=Count('id', filter=clicks)
+        ):
+            if (row['product__store_id'], row['day']) in wanted:
+                product_row = product_rows[(row['product_id'], row['day'])]
+                product_row.update(views=row['views'], clicks=row['clicks'])
+
+        cart_adds = CartItem.objects.filter(
+            product__store_id__in=store_days, added_at__gte=start, added_at__lt=end
+        ).annotate(day=TruncDate('added_at')).order_by().values(
+            'product_id', 'product__store_id', 'day'
+        ).annotate(adds=Count('id'))
+        for row in cart_adds:
+            key = (row['product__store_id'], row['day'])
+            if key in wanted:
+                store_rows[key]['add_to_cart_count'] += row['adds']
+                product_rows[(row['product_id'], row['day'])]['add_to_cart'] = row['adds']
+
+        orders = StoreDiscountUsage.objects.filter(
+            store_id__in=store_days, is_used_by_store=True, used_at__gte=start, used_at__lt=end
+        ).annotate(day=TruncDate('used_at')).values_list(
+            'store_id', 'day', 'store_cart_total', 'discount_applied', 'discount_qr__digital_receipt_data'
+        )
+        purchases = defaultdict(int)
+        for store_id, day, cart_total, discount, receipt in orders:
+            if (store_id, day) not in wanted:
+                continue
+            store_rows[(store_id, day)]['total_orders'] += 1
+            store_rows[(store_id, day)]['total_revenue'] += cart_total - discount
+            for item in (receipt or {}).get('items', []):
+                try:
+                    if int(item['store_id']) == store_id:
+                        purchases[(int(item['product_id']), day)] += int(item['quantity'])
+                except (KeyError, TypeError, ValueError):
+                    continue
+
+        # Receipts are snapshots, so skip products that no longer exist in their store
+        existing = set(Product.objects.filter(
+            id__in={product_id for product_id, _ in purchases}, store_id__in=store_days
+        ).values_list('id', flat=True))
+        for (product_id, day), quantity in purchases.items():
+            if product_id in existing:
+                product_rows[(product_id, day)]['purchases'] = quantity
+
+        for row in store_rows.values():
+            orders_count, visitors = row['total_orders'], row['unique_visitors']
+            row['conversion_rate'] = round(min(orders_count / visitors * 100, 100.0), 2) if visitors else 0.0
+            row['average_order_value'] = (
+                (row['total_revenue'] / orders_count).quantize(Decimal('0.01')) if orders_count else Decimal('0.00')
+            )
+        return store_rows, product_rows
+
+    def _day_start(self, day: date) -> datetime:
+        return timezone.make_aware(datetime.combine(day, time.min))
+
+    def _invalidate_store_data(self, store_ids):
+        """Bulk upserts send no post_save, so these stores' data versions are bumped here."""
+        from products.data_versions import store_data_versions
+
+        try:
+            store_data_versions.invalidate(store_ids)
+        except Exception as e:
+            logger.error(f"Error invalidating store data after analytics rollup: {str(e)}")
+
+
+analytics_rollup = AnalyticsRollup()
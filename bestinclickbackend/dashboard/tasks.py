@@ -0,0 +1,74 @@
+"""
+Celery tasks for dashboard analytics.
+"""
+
+import logging
+from celery import chord, shared_task
+
+from ai_models.background import chunked, task_lock
+from products.models import Store
+
+logger = logging.getLogger(__name__)
+
+INSIGHTS_CHUNK_SIZE = 200
+
+
+@shared_task
+def rollup_analytics(days=None):
+    """
+    Roll new events up into StoreAnalytics and ProductPerformance; returns
+    the number of store days written.
+    """
+    from .rollup import analytics_rollup
+
+    with task_lock('rollup_analytics', timeout=3600) as acquired:
+        if not acquired:
+            logger.info("Analytics rollup already running, skipping")
+            return 0
+        return analytics_rollup.run(days=days)['store_rows']
+
+
+@shared_task
+def refresh_store_metrics():
+    """
+    Recompute StoreMetrics and its percentile ranks for all stores; returns
+    the number of rows written.
+    """
+    from .leaderboard import store_leaderboard
+
+    with task_lock('refresh_store_metrics', timeout=3600) as acquired:
+        if not acquired:
+            logger.info("Store metrics refresh already running, skipping")
+            return 0
+        return store_leaderboard.refresh()
+
+
+@shared_task
+def precompute_store_insights(chunk_size: int = INSIGHTS_CHUNK_SIZE):
+    """
+    Rebuild the cached insights of all stores in parallel chunks. Returns
+    the number of stores scheduled.
+    """
+    store_ids = list(Store.objects.filter(is_active=True).order_by('id').values_list('id', flat=True))
+    if not store_ids:
+        return 0
+
+    chord(
+        precompute_store_insights_chunk.s(chunk) for chunk in chunked(store_ids, chunk_size)
+    )(finish_store_insights_precompute.s())
+    return len(store_ids)
+
+
+@shared_task
+def precompute_store_insights_chunk(store_ids):
+    """Cache the insights of one chunk of stores, with one metrics query."""
+    from .insights import precompute_store_insights as precompute
+
+    return precompute(store_ids)
+
+
+@shared_task
+def finish_store_insights_precompute(chunk_counts):
+    total = sum(chunk_counts)
+    logger.info(f"Precomputed insights for {total} stores")
+    return total
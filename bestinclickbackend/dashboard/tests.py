@@ -2,13 +2,25 @@
 Tests for dashboard app.
 """
 
-from django.test import TestCase
+from datetime import timedelta
+from decimal import Decimal
+from unittest import mock
+from django.test import TestCase, override_settings
 from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.utils import timezone
 from rest_framework.test import APITestCase
 from rest_framework import status
 from django.urls import reverse
+from ai_models.models import UserBehaviorLog
+from cart.models import Cart, CartItem
 from products.models import Store, Product, Category, Brand
-from .models import StoreAnalytics
+from promotions.models import DiscountQR, Promotion, StoreDiscountUsage
+from .models import ProductPerformance, StoreAnalytics, StoreMetrics
+from .insights import build_store_insights, get_store_insights
+from .leaderboard import store_leaderboard
+from .rollup import ROLLUP_CURSOR_KEY, analytics_rollup
+from .tasks import precompute_store_insights, refresh_store_metrics
 
 User = get_user_model()
 
@@ -85,6 +97,111 @@ class DashboardAPITest(APITestCase):
         self.assertEqual(response.status_code, status.HTTP_200_OK)
         self.assertIn('store_info', response.data)
     
+    def test_store_analytics_rates_come_from_totals(self):
+        """Test that days without orders do not dilute the period rates."""
+        today = timezone.now().date()
+        for offset in range(10):
+            StoreAnalytics.objects.create(
+                store=self.store,
+                date=today - timedelta(days=offset),
+                unique_visitors=10,
+                total_orders=3 if offset == 0 else 0,
+                total_revenue=Decimal('150.00') if offset == 0 else Decimal('0.00'),
+                conversion_rate=30.0 if offset == 0 else 0.0,
+                average_order_value=Decimal('50.00') if offset == 0 else Decimal('0.00')
+            )
+        self.client.force_authenticate(user=self.store_owner)
+        url = reverse('dashboard:store_analytics', kwargs={'store_id': self.store.id})
+
+        response = self.client.get(url, {'days': 9, 'granularity': 'month'})
+        summary = response.data['summary_metrics']
+        self.assertEqual(summary['average_order_value'], 50.0)
+        self.assertEqual(summary['avg_conversion_rate'], 3.0)
+        for point in response.data['daily_analytics']:
+            if point['total_orders']:
+                self.assertEqual(point['average_order_value'], 50.0)
+
+    def test_store_analytics_aggregates_series(self):
+        """Test that analytics are summed by the database into period buckets."""
+        today = timezone.now().date()
+        for offset in range(200):
+            StoreAnalytics.objects.create(
+                store=self.store,
+                date=today - timedelta(days=offset),
+                total_views=10,
+                unique_visitors=25,
+                total_orders=1,
+                total_revenue=Decimal('20.00'),
+                conversion_rate=4.0,
+                average_order_value=Decimal('20.00')
+            )
+        self.client.force_authenticate(user=self.store_owner)
+        url = reverse('dashboard:store_analytics', kwargs={'store_id': self.store.id})
+
+        response = self.client.get(url, {'days': 365})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['granularity'], 'week')
+        self.assertLessEqual(len(response.data['daily_analytics']), 30)
+        self.assertEqual(response.data['summary_metrics']['total_views'], 2000)
+        self.assertEqual(response.data['summary_metrics']['total_revenue'], 4000.0)
+        self.assertEqual(sum(point['total_views'] for point in response.data['daily_analytics']), 2000)
+
+        response = self.client.get(url, {'days': 9, 'granularity': 'day'})
+        self.assertEqual(response.data['granularity'], 'day')
+        self.assertEqual(len(response.data['daily_analytics']), 10)
+        self.assertEqual(response.data['summary_metrics']['avg_conversion_rate'], 4.0)
+        self.assertEqual(response.data['summary_metrics']['average_order_value'], 20.0)
+
+        response = self.client.get(url, {'days': 365, 'granularity': 'month'})
+        self.assertEqual(response.data['granularity'], 'month')
+
+        response = self.client.get(url, {'granularity': 'hour'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+    
+    def test_store_performance_single_pass(self):
+        """Test that the overview and breakdown come from one grouped pass over the store's logs."""
+        other = Product.objects.create(
+            store=self.store,
+            category=self.category,
+            brand=self.brand,
+            name='Other Product',
+            description='Test description',
+            sku='TEST002',
+            price=10
+        )
+        for action_type in ['view', 'view', 'click', 'add_to_cart']:
+            UserBehaviorLog.objects.create(product=self.product, action_type=action_type)
+        for action_type in ['view', 'like', 'share']:
+            UserBehaviorLog.objects.create(product=other, action_type=action_type)
+        self.client.force_authenticate(user=self.store_owner)
+
+        response = self.client.get(reverse('dashboard:store_performance', kwargs={'store_id': self.store.id}))
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        overview = response.data['overview']
+        self.assertEqual(
+            (overview['total_views'], overview['total_clicks'], overview['total_cart_adds'], overview['total_likes']),
+            (3, 1, 1, 1)
+        )
+        self.assertEqual(overview['click_through_rate'], 33.33)
+        breakdown = response.data['product_performance']
+        self.assertEqual([row['product__name'] for row in breakdown], ['Test Product', 'Other Product'])
+        self.assertEqual(breakdown[0]['views'], 2)
+    
+    def test_product_performance_reads_rollup(self):
+        """Test that the product performance endpoint is served from the daily rows."""
+        yesterday = timezone.now().date() - timedelta(days=1)
+        ProductPerformance.objects.create(product=self.product, date=yesterday, views=40, clicks=8, add_to_cart=2)
+
+        self.client.force_authenticate(user=self.store_owner)
+        response = self.client.get(reverse('dashboard:product_performance', kwargs={'product_id': self.product.id}))
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        data = response.data
+        self.assertEqual(data['metrics']['total_views'], 40)
+        self.assertEqual(data['metrics']['total_cart_adds'], 2)
+        self.assertEqual(data['daily_breakdown'][0]['cart_adds'], 2)
+    
     def test_unauthorized_access(self):
         """Test unauthorized access to store analytics."""
         other_user = User.objects.create_user(
@@ -96,3 +213,339 @@ class DashboardAPITest(APITestCase):
         url = reverse('dashboard:store_analytics', kwargs={'store_id': self.store.id})
         response = self.client.get(url)
         self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+
+class AnalyticsRollupTest(TestCase):
+    """
+    Test cases for the daily analytics rollup.
+    """
+
+    def setUp(self):
+        cache.clear()
+        self.store_owner = User.objects.create_user(
+            username='storeowner',
+            email='owner@example.com',
+            password='testpass123',
+            role='store_owner'
+        )
+        self.customer = User.objects.create_user(
+            username='customer',
+            email='customer@example.com',
+            password='testpass123'
+        )
+        self.store = Store.objects.create(
+            owner=self.store_owner,
+            name='Test Store',
+            email='store@example.com',
+            phone='1234567890',
+            address='Test Address'
+        )
+        self.category = Category.objects.create(name='Test Category')
+        self.brand = Brand.objects.create(name='Test Brand')
+        self.product = Product.objects.create(
+            store=self.store,
+            category=self.category,
+            brand=self.brand,
+            name='Test Product',
+            description='Test description',
+            sku='TEST001',
+            price=50
+        )
+        self.now = timezone.now().replace(hour=12, minute=0, second=0, microsecond=0)
+        self.yesterday = self.now - timedelta(days=1)
+
+    def _log(self, action_type, timestamp, user=None, session_id=''):
+        return UserBehaviorLog.objects.create(
+            user=user,
+            product=self.product,
+            action_type=action_type,
+            session_id=session_id,
+            timestamp=timestamp
+        )
+
+    def _order(self, used_at, quantity=2):
+        promotion = Promotion.objects.create(
+            name='Test Promotion',
+            description='Test description',
+            discount_type='percentage',
+            value=10,
+            start_date=self.now - timedelta(days=7),
+            end_date=self.now + timedelta(days=7),
+            created_by=self.store_owner
+        )
+        qr_code = DiscountQR.objects.create(
+            promotion=promotion,
+            generated_by_user=self.customer,
+            expires_at=self.now + timedelta(days=1),
+            digital_receipt_data={'items': [
+                {'product_id': self.product.id, 'store_id': self.store.id, 'quantity': quantity, 'price': '50.00'}
+            ]}
+        )
+        return StoreDiscountUsage.objects.create(
+            discount_qr=qr_code,
+            store=self.store,
+            is_used_by_store=True,
+            used_at=used_at,
+            store_cart_total=Decimal('100.00'),
+            discount_applied=Decimal('10.00')
+        )
+
+    def test_rollup_counts_events_per_day(self):
+        """Test that behaviors, cart additions and orders are rolled up per store and product day."""
+        self._log('view', self.yesterday, user=self.customer)
+        self._log('view', self.yesterday, user=self.customer)
+        self._log('view', self.yesterday, session_id='guest-1')
+        self._log('click', self.yesterday, user=self.customer)
+        self._log('view', self.now - timedelta(minutes=5), session_id='guest-2')
+        cart_item = CartItem.objects.create(cart=Cart.objects.create(user=self.customer), product=self.product)
+        CartItem.objects.filter(id=cart_item.id).update(added_at=self.yesterday)
+        self._order(self.yesterday)
+
+        result = analytics_rollup.run(days=7, now=self.now)
+
+        self.assertEqual(result['store_rows'], 2)
+        analytics = StoreAnalytics.objects.get(store=self.store, date=self.yesterday.date())
+        self.assertEqual(analytics.total_views, 3)
+        self.assertEqual(analytics.unique_visitors, 2)
+        self.assertEqual(analytics.product_views, 1)
+        self.assertEqual(analytics.total_clicks, 1)
+        self.assertEqual(analytics.add_to_cart_count, 1)
+        self.assertEqual(analytics.total_orders, 1)
+        self.assertEqual(analytics.total_revenue, Decimal('90.00'))
+        self.assertEqual(analytics.average_order_value, Decimal('90.00'))
+        self.assertEqual(analytics.conversion_rate, 50.0)
+
+        performance = ProductPerformance.objects.get(product=self.product, date=self.yesterday.date())
+        self.assertEqual(
+            (performance.views, performance.clicks, performance.add_to_cart, performance.purchases),
+            (3, 1, 1, 2)
+        )
+
+    def test_incremental_run_recounts_only_new_days(self):
+        """Test that a run after the high-water mark only rewrites days with new events."""
+        self._log('view', self.yesterday, user=self.customer)
+        analytics_rollup.run(now=self.now)
+        StoreAnalytics.objects.filter(date=self.yesterday.date()).update(total_views=99)
+
+        later = self.now + timedelta(hours=1)
+        self._log('view', later - timedelta(minutes=1), session_id='guest-1')
+        self._log('view', later - timedelta(minutes=1), session_id='guest-1')
+        # Without the re-scanned id window, which would recount yesterday too
+        with mock.patch.object(analytics_rollup, 'late_behavior_ids', 0):
+            analytics_rollup.run(now=later)
+
+        self.assertEqual(StoreAnalytics.objects.get(date=self.yesterday.date()).total_views, 99)
+        today = StoreAnalytics.objects.get(date=later.date())
+        self.assertEqual(today.total_views, 2)
+        self.assertEqual(today.unique_visitors, 1)
+
+    def test_late_written_behavior_logs_are_rolled_up(self):
+        """Test that a log inserted after a run is counted despite its old timestamp."""
+        self._log('view', self.yesterday, user=self.customer)
+        analytics_rollup.run(now=self.now)
+
+        self._log('view', self.yesterday - timedelta(hours=1), session_id='guest-1')
+        analytics_rollup.run(now=self.now + timedelta(hours=1))
+
+        analytics = StoreAnalytics.objects.get(store=self.store, date=self.yesterday.date())
+        self.assertEqual(analytics.total_views, 2)
+        self.assertEqual(analytics.unique_visitors, 2)
+
+    def test_behavior_logs_committed_out_of_order_are_rolled_up(self):
+        """Test that a log with an id below the mark is counted by the next run."""
+        late = self._log('view', self.yesterday, user=self.customer)
+        early = self._log('view', self.now - timedelta(minutes=5), session_id='guest-1')
+        # The run saw the higher id before the lower one was committed
+        cache.set(ROLLUP_CURSOR_KEY, {'behavior_id': early.id, 'time': self.now.isoformat()}, None)
+
+        analytics_rollup.run(now=self.now + timedelta(hours=1))
+
+        analytics = StoreAnalytics.objects.get(store=self.store, date=late.timestamp.date())
+        self.assertEqual(analytics.total_views, 1)
+
+    def test_rerun_is_idempotent(self):
+        """Test that rolling up the same window twice upserts instead of adding."""
+        self._log('view', self.yesterday, user=self.customer)
+        StoreAnalytics.objects.create(store=self.store, date=self.yesterday.date(), ai_insights={'kept': True})
+
+        analytics_rollup.run(days=7, now=self.now)
+        analytics_rollup.run(days=7, now=self.now)
+
+        analytics = StoreAnalytics.objects.get(store=self.store, date=self.yesterday.date())
+        self.assertEqual(analytics.total_views, 1)
+        self.assertEqual(analytics.ai_insights, {'kept': True})
+        self.assertEqual(ProductPerformance.objects.count(), 1)
+
+
+class StoreInsightsTest(TestCase):
+    """
+    Test cases for cached store insights.
+    """
+
+    def setUp(self):
+        cache.clear()
+        owner = User.objects.create_user(
+            username='storeowner',
+            email='owner@example.com',
+            password='testpass123',
+            role='store_owner'
+        )
+        self.store = Store.objects.create(
+            owner=owner,
+            name='Test Store',
+            email='store@example.com',
+            phone='1234567890',
+            address='Test Address'
+        )
+        category = Category.objects.create(name='Test Category')
+        brand = Brand.objects.create(name='Test Brand')
+        self.products = [
+            Product.objects.create(
+                store=self.store,
+                category=category,
+                brand=brand,
+                name=f'Product {index}',
+                description='A product description',
+                sku=f'TEST{index:03d}',
+                price=10,
+                view_count=index * 20,
+                in_stock=index != 0
+            )
+            for index in range(4)
+        ]
+
+    def test_insights_built_from_one_metrics_query(self):
+        """Test that building insights reads the store metrics with a single query."""
+        with self.assertNumQueries(1):
+            insights = build_store_insights(self.store)
+        titles = [insight['title'] for insight in insights['insights']]
+        self.assertIn('Critical Inventory Issue', titles)
+        self.assertIn('Search Engine Optimization (SEO)', titles)
+
+    def test_insights_cached_until_store_changes(self):
+        """Test that insights are served from the cache until a product changes."""
+        first = get_store_insights(self.store)
+        with self.assertNumQueries(0):
+            self.assertEqual(get_store_insights(self.store), first)
+
+        for product in self.products:
+            product.in_stock = True
+            product.save(update_fields=['in_stock'])
+
+        titles = [insight['title'] for insight in get_store_insights(self.store)['insights']]
+        self.assertIn('Excellent Inventory Management', titles)
+
+    @override_settings(CELERY_TASK_ALWAYS_EAGER=True, CELERY_TASK_EAGER_PROPAGATES=True)
+    def test_precompute_task_fills_cache(self):
+        """Test that the nightly task caches the insights of every store."""
+        self.assertEqual(precompute_store_insights.delay(chunk_size=1).get(), 1)
+        with self.assertNumQueries(0):
+            insights = get_store_insights(self.store)
+        self.assertEqual(insights['store_id'], self.store.id)
+
+
+class StoreLeaderboardTest(APITestCase):
+    """
+    Test cases for materialized store metrics and the leaderboard.
+    """
+
+    def setUp(self):
+        self.owner = User.objects.create_user(
+            username='storeowner',
+            email='owner@example.com',
+            password='testpass123',
+            role='store_owner'
+        )
+        self.stores = [
+            Store.objects.create(
+                owner=self.owner if index == 0 else User.objects.create_user(
+                    username=f'owner{index}', email=f'owner{index}@example.com', password='testpass123'
+                ),
+                name=f'Store {index}',
+                email=f'store{index}@example.com',
+                phone='1234567890',
+                address='Test Address',
+                is_verified=True
+            )
+            for index in range(4)
+        ]
+        self.phones = Category.objects.create(name='Phones')
+        self.audio = Category.objects.create(name='Audio')
+        brand = Brand.objects.create(name='Test Brand')
+        # Store 0: two phones, one out of stock; store 1: one phone;
+        # store 2: one audio product; store 3: no products
+        for index, (store, category, rating, views, in_stock) in enumerate([
+            (self.stores[0], self.phones, 4.5, 60, True),
+            (self.stores[0], self.phones, 4.5, 60, False),
+            (self.stores[1], self.phones, 3.0, 10, True),
+            (self.stores[2], self.audio, 5.0, 500, True),
+        ]):
+            product = Product.objects.create(
+                store=store, category=category, brand=brand, name=f'Product {index}',
+                description='Test', sku=f'LB{index:03d}', price=100 * (index + 1),
+                average_rating=rating, view_count=views, in_stock=in_stock
+            )
+            if index == 0:
+                ProductPerformance.objects.create(
+                    product=product, date=timezone.now().date(), views=20, add_to_cart=5
+                )
+
+    def test_refresh_ranks_stores_per_category(self):
+        """Test that metrics and percentiles are computed per category and overall."""
+        self.assertEqual(store_leaderboard.refresh(), 7)  # 3 category rows, 4 overall rows
+
+        leader = store_leaderboard.get(self.stores[0].id, self.phones.id)
+        self.assertEqual(leader.health_score, 69.0)  # 4.5/5*40 + 30 + 2/20*30
+        self.assertEqual(leader.stock_out_ratio, 0.5)
+        self.assertEqual(leader.conversion_rate, 25.0)
+        self.assertEqual(leader.average_price, Decimal('150.00'))
+        self.assertEqual(leader.health_percentile, 100.0)
+        self.assertEqual(leader.stock_percentile, 50.0)
+        self.assertEqual(store_leaderboard.get(self.stores[1].id, self.phones.id).stock_percentile, 100.0)
+
+        empty = store_leaderboard.get(self.stores[3].id)
+        self.assertEqual((empty.product_count, empty.health_score, empty.health_percentile), (0, 0.0, 25.0))
+        self.assertIsNone(store_leaderboard.get(self.stores[3].id, self.phones.id))
+        self.assertEqual(
+            [metrics.store_id for metrics in store_leaderboard.leaderboard()],
+            [self.stores[2].id, self.stores[0].id, self.stores[1].id, self.stores[3].id]
+        )
+
+    def test_competitors_share_a_category(self):
+        """Test that competitors are verified stores selling in the same categories."""
+        store_leaderboard.refresh()
+        self.assertEqual(
+            [metrics.store_id for metrics in store_leaderboard.competitors(self.stores[0].id)],
+            [self.stores[1].id]
+        )
+        Store.objects.filter(id=self.stores[1].id).update(is_verified=False)
+        self.assertEqual(store_leaderboard.competitors(self.stores[0].id), [])
+
+    @override_settings(CELERY_TASK_ALWAYS_EAGER=True, CELERY_TASK_EAGER_PROPAGATES=True)
+    def test_refresh_task_replaces_rows(self):
+        """Test that the periodic task rewrites the whole table."""
+        refresh_store_metrics.delay().get()
+        Product.objects.filter(store=self.stores[2]).update(is_active=False)
+        self.assertEqual(refresh_store_metrics.delay().get(), 6)
+        self.assertFalse(StoreMetrics.objects.filter(category=self.audio).exists())
+
+    def test_leaderboard_endpoint(self):
+        """Test that the leaderboard ranks stores and reports the owner's standing."""
+        store_leaderboard.refresh()
+        self.client.force_authenticate(user=self.owner)
+        url = reverse('dashboard:store_leaderboard', kwargs={'store_id': self.stores[0].id})
+
+        response = self.client.get(url, {'category': self.phones.id, 'limit': 1})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['health_score'], 69.0)
+        self.assertEqual(len(response.data['leaderboard']), 1)
+        self.assertTrue(response.data['leaderboard'][0]['is_own_store'])
+        self.assertEqual(response.data['standing']['percentiles']['health'], 100.0)
+
+        response = self.client.get(url)
+        self.assertEqual(response.data['leaderboard'][0]['store_name'], 'Store 2')
+        self.assertEqual(response.data['standing']['percentiles']['health'], 75.0)
+
+        response = self.client.get(url, {'limit': 'all'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
@@ -15,6 +15,7 @@ urlpatterns = [
     path('stores/<int:store_id>/products/', views.StoreProductsView.as_view(), name='store_products'),
     path('stores/<int:store_id>/analytics/', views.store_analytics, name='store_analytics'),
     path('stores/<int:store_id>/performance/', views.store_performance, name='store_performance'),
+    path('stores/<int:store_id>/leaderboard/', views.store_leaderboard_view, name='store_leaderboard'),
 
     # Product management
     path('products/<int:product_id>/toggle-stock/', views.toggle_product_stock, name='toggle_product_stock'),
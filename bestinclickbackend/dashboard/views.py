@@ -45,14 +45,16 @@ from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
 from django.shortcuts import get_object_or_404
 from django.db.models import Count, Avg, Sum, F
+from django.db.models.functions import TruncDay, TruncWeek, TruncMonth
 from django.utils import timezone
 from datetime import timedelta
 from products.models import Store, Product
 from products.permissions import IsStoreOwner
 from ai_models.models import UserBehaviorLog
 from .models import StoreAnalytics, ProductPerformance
+from .insights import get_store_insights
+from .leaderboard import store_leaderboard
 from .serializers import (
-    StoreAnalyticsSerializer,
     ProductPerformanceSerializer,
     StoreProductSerializer
 )
@@ -60,6 +62,16 @@ import logging
 
 logger = logging.getLogger(__name__)
 
+# Time buckets for the store analytics series, finest first
+ANALYTICS_GRANULARITIES = {
+    'day': (TruncDay, 1),
+    'week': (TruncWeek, 7),
+    'month': (TruncMonth, 31),
+}
+MAX_ANALYTICS_DAYS = 3 * 365
+MAX_SERIES_POINTS = 120
+MAX_LEADERBOARD_SIZE = 100
+
 
 class StoreProductsView(generics.ListAPIView):
     """
@@ -79,35 +91,52 @@ class StoreProductsView(generics.ListAPIView):
 def store_analytics(request, store_id):
     """
     Get analytics data for a store.
+    
+    Query params: days (default 30) and granularity (auto, day, week or
+    month). daily_analytics holds one point per period, dated by the
+    period start; auto and over-fine granularities are coarsened so a
+    series never exceeds MAX_SERIES_POINTS points.
     """
     try:
         store = get_object_or_404(Store, id=store_id, owner=request.user)
         
-        # Get date range from query params
-        days = int(request.GET.get('days', 30))
+        # Get date range and series granularity from query params
+        try:
+            days = min(max(int(request.GET.get('days', 30)), 1), MAX_ANALYTICS_DAYS)
+        except ValueError:
+            return Response({'error': 'days must be an integer'}, status=status.HTTP_400_BAD_REQUEST)
+        requested_granularity = request.GET.get('granularity', 'auto')
+        if requested_granularity != 'auto' and requested_granularity not in ANALYTICS_GRANULARITIES:
+            return Response(
+                {'error': f"granularity must be one of: auto, {', '.join(ANALYTICS_GRANULARITIES)}"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        granularity = _analytics_granularity(days, requested_granularity)
         end_date = timezone.now().date()
         start_date = end_date - timedelta(days=days)
         
-        # Get or create analytics data
+        # Daily rows maintained by the analytics rollup
         analytics_data = StoreAnalytics.objects.filter(
             store=store,
             date__range=[start_date, end_date]
-        ).order_by('date')
-        
-        # If no data exists, generate sample data
-        if not analytics_data.exists():
-            analytics_data = _generate_sample_analytics(store, start_date, end_date)
-        
-        # Calculate summary metrics
-        total_views = sum(a.total_views for a in analytics_data)
-        unique_visitors = sum(a.unique_visitors for a in analytics_data)
-        product_views = sum(a.product_views for a in analytics_data)
-        total_clicks = sum(a.total_clicks for a in analytics_data)
-        add_to_cart_count = sum(a.add_to_cart_count for a in analytics_data)
-        total_orders = sum(a.total_orders for a in analytics_data)
-        total_revenue = sum(a.total_revenue for a in analytics_data)
-        avg_conversion_rate = sum(a.conversion_rate for a in analytics_data) / len(analytics_data) if analytics_data else 0
-        avg_order_value = sum(a.average_order_value for a in analytics_data) / len(analytics_data) if analytics_data else 0
+        )
+        metrics = {
+            'total_views': Sum('total_views'),
+            'unique_visitors': Sum('unique_visitors'),
+            'product_views': Sum('product_views'),
+            'total_clicks': Sum('total_clicks'),
+            'add_to_cart_count': Sum('add_to_cart_count'),
+            'total_orders': Sum('total_orders'),
+            'total_revenue': Sum('total_revenue'),
+        }
+
+        # Summary metrics and the bucketed series, both summed by the database;
+        # rates are derived from the period totals, not averaged over days
+        summary = analytics_data.aggregate(**metrics)
+        truncate = ANALYTICS_GRANULARITIES[granularity][0]
+        series = analytics_data.annotate(
+            period=truncate('date')
+        ).values('period').annotate(**metrics).order_by('period')
         
         # Get top performing products
         top_products = Product.objects.filter(
@@ -123,18 +152,19 @@ def store_analytics(request, store_id):
                 'total_products': store.products.filter(is_active=True).count()
             },
             'summary_metrics': {
-                'total_views': total_views,
-                'unique_visitors': unique_visitors,
-                'product_views': product_views,
-                'total_clicks': total_clicks,
-                'add_to_cart_count': add_to_cart_count,
-                'total_orders': total_orders,
-                'total_revenue': float(total_revenue),
-                'avg_conversion_rate': round(avg_conversion_rate, 2),
-                'average_order_value': float(avg_order_value),
+                'total_views': summary['total_views'] or 0,
+                'unique_visitors': summary['unique_visitors'] or 0,
+                'product_views': summary['product_views'] or 0,
+                'total_clicks': summary['total_clicks'] or 0,
+                'add_to_cart_count': summary['add_to_cart_count'] or 0,
+                'total_orders': summary['total_orders'] or 0,
+                'total_revenue': float(summary['total_revenue'] or 0),
+                'avg_conversion_rate': _conversion_rate(summary),
+                'average_order_value': _average_order_value(summary),
                 'date_range': f"{start_date} to {end_date}"
             },
-            'daily_analytics': StoreAnalyticsSerializer(analytics_data, many=True).data,
+            'granularity': granularity,
+            'daily_analytics': [_analytics_point(point) for point in series],
             'top_products': [
                 {
                     'id': p.id,
@@ -157,6 +187,58 @@ def store_analytics(request, store_id):
         )
 
 
+def _analytics_granularity(days, requested='auto'):
+    """
+    The requested series granularity, or the finest one that keeps the
+    series within MAX_SERIES_POINTS points.
+    """
+    names = list(ANALYTICS_GRANULARITIES)
+    first = 0 if requested == 'auto' else names.index(requested)
+    for name in names[first:]:
+        if days / ANALYTICS_GRANULARITIES[name][1] <= MAX_SERIES_POINTS:
+            return name
+    return names[-1]
+
+
+def _analytics_point(point):
+    """
+    One period of the store analytics series.
+    """
+    return {
+        'date': point['period'],
+        'total_views': point['total_views'],
+        'unique_visitors': point['unique_visitors'],
+        'product_views': point['product_views'],
+        'total_clicks': point['total_clicks'],
+        'add_to_cart_count': point['add_to_cart_count'],
+        'conversion_rate': _conversion_rate(point),
+        'total_orders': point['total_orders'],
+        'total_revenue': float(point['total_revenue'] or 0),
+        'average_order_value': _average_order_value(point)
+    }
+
+
+def _conversion_rate(totals):
+    """
+    Orders per unique visitor over a period, as a percentage capped at 100.
+    """
+    orders = totals['total_orders'] or 0
+    visitors = totals['unique_visitors'] or 0
+    if not visitors:
+        return 0.0
+    return round(min(orders / visitors * 100, 100.0), 2)
+
+
+def _average_order_value(totals):
+    """
+    Revenue per order over a period.
+    """
+    orders = totals['total_orders'] or 0
+    if not orders:
+        return 0.0
+    return round(float(totals['total_revenue'] or 0) / orders, 2)
+
+
 @api_view(['GET'])
 @permission_classes([IsAuthenticated, IsStoreOwner])
 def store_performance(request, store_id):
@@ -167,31 +249,45 @@ def store_performance(request, store_id):
     try:
         store = get_object_or_404(Store, id=store_id, owner=request.user)
 
-        # Get recent user behavior for this store's products
-        recent_behavior = UserBehaviorLog.objects.filter(
-            product__store=store,
-            timestamp__gte=timezone.now() - timedelta(days=30)
-        )
+        # Per-product action counts in one grouped pass over the store's
+        # own behavior rows (store_id is denormalized onto the log)
+        product_counts = list(UserBehaviorLog.objects.filter(
+            store=store,
+            timestamp__gte=timezone.now() - timedelta(days=30),
+            action_type__in=['view', 'click', 'add_to_cart', 'like']
+        ).values('product_id').annotate(
+            views=Count('id', filter=Q(action_type='view')),
+            clicks=Count('id', filter=Q(action_type='click')),
+            cart_adds=Count('id', filter=Q(action_type='add_to_cart')),
+            likes=Count('id', filter=Q(action_type='like'))
+        ).order_by())
 
         # Calculate performance metrics
-        total_views = recent_behavior.filter(action_type='view').count()
-        total_clicks = recent_behavior.filter(action_type='click').count()
-        total_cart_adds = recent_behavior.filter(action_type='add_to_cart').count()
-        total_likes = recent_behavior.filter(action_type='like').count()
+        total_views = sum(row['views'] for row in product_counts)
+        total_clicks = sum(row['clicks'] for row in product_counts)
+        total_cart_adds = sum(row['cart_adds'] for row in product_counts)
+        total_likes = sum(row['likes'] for row in product_counts)
 
         # Calculate conversion rates
         click_through_rate = (total_clicks / total_views * 100) if total_views > 0 else 0
         cart_conversion_rate = (total_cart_adds / total_clicks * 100) if total_clicks > 0 else 0
 
         # Get product performance breakdown
-        product_performance = recent_behavior.values(
-            'product__id', 'product__name'
-        ).annotate(
-            views=Count('id', filter=Q(action_type='view')),
-            clicks=Count('id', filter=Q(action_type='click')),
-            cart_adds=Count('id', filter=Q(action_type='add_to_cart')),
-            likes=Count('id', filter=Q(action_type='like'))
-        ).order_by('-views')[:10]
+        top_counts = sorted(product_counts, key=lambda row: (-row['views'], row['product_id'] or 0))[:10]
+        product_names = dict(
+            Product.objects.filter(id__in=[row['product_id'] for row in top_counts]).values_list('id', 'name')
+        )
+        product_performance = [
+            {
+                'product__id': row['product_id'],
+                'product__name': product_names.get(row['product_id']),
+                'views': row['views'],
+                'clicks': row['clicks'],
+                'cart_adds': row['cart_adds'],
+                'likes': row['likes']
+            }
+            for row in top_counts
+        ]
 
         performance_data = {
             'overview': {
@@ -202,7 +298,7 @@ def store_performance(request, store_id):
                 'click_through_rate': round(click_through_rate, 2),
                 'cart_conversion_rate': round(cart_conversion_rate, 2)
             },
-            'product_performance': list(product_performance),
+            'product_performance': product_performance,
             'recommendations': _generate_performance_recommendations(
                 click_through_rate, cart_conversion_rate, total_views
             )
@@ -266,27 +362,27 @@ def product_performance(request, product_id):
             store__owner=request.user
         )
         
-        # Get recent behavior for this product
+        # Daily rows maintained by the analytics rollup
         days = int(request.GET.get('days', 30))
-        recent_behavior = UserBehaviorLog.objects.filter(
-            product=product,
-            timestamp__gte=timezone.now() - timedelta(days=days)
+        since = timezone.now() - timedelta(days=days)
+        daily_metrics = list(
+            ProductPerformance.objects.filter(
+                product=product,
+                date__gte=since.date()
+            ).order_by('date').values(
+                'date', 'views', 'clicks', 'add_to_cart', 'purchases'
+            )
         )
         
         # Calculate metrics
-        views = recent_behavior.filter(action_type='view').count()
-        clicks = recent_behavior.filter(action_type='click').count()
-        cart_adds = recent_behavior.filter(action_type='add_to_cart').count()
-        likes = recent_behavior.filter(action_type='like').count()
-        
-        # Daily breakdown
-        daily_metrics = recent_behavior.extra(
-            select={'day': 'date(timestamp)'}
-        ).values('day').annotate(
-            views=Count('id', filter=Q(action_type='view')),
-            clicks=Count('id', filter=Q(action_type='click')),
-            cart_adds=Count('id', filter=Q(action_type='add_to_cart'))
-        ).order_by('day')
+        views = sum(day['views'] for day in daily_metrics)
+        clicks = sum(day['clicks'] for day in daily_metrics)
+        cart_adds = sum(day['add_to_cart'] for day in daily_metrics)
+        likes = UserBehaviorLog.objects.filter(
+            product=product,
+            action_type='like',
+            timestamp__gte=since
+        ).count()
         
         performance_data = {
             'product_info': {
@@ -304,7 +400,16 @@ def product_performance(request, product_id):
                 'click_through_rate': (clicks / views * 100) if views > 0 else 0,
                 'cart_conversion_rate': (cart_adds / clicks * 100) if clicks > 0 else 0
             },
-            'daily_breakdown': list(daily_metrics),
+            'daily_breakdown': [
+                {
+                    'day': day['date'],
+                    'views': day['views'],
+                    'clicks': day['clicks'],
+                    'cart_adds': day['add_to_cart'],
+                    'purchases': day['purchases']
+                }
+                for day in daily_metrics
+            ],
             'ai_insights': _generate_product_insights(product, views, clicks, cart_adds)
         }
         
@@ -330,8 +435,8 @@ def store_ai_insights(request, store_id):
         # Get analysis period from query params (default 30 days)
         days = int(request.GET.get('days', 30))
         
-        # Generate comprehensive AI insights using simplified analysis
-        insights = _generate_comprehensive_insights(store, days)
+        # Cached per store until its products, reviews or stock change
+        insights = get_store_insights(store, days)
         
         return Response(insights, status=status.HTTP_200_OK)
         
@@ -343,325 +448,51 @@ def store_ai_insights(request, store_id):
         )
 
 
-def _generate_comprehensive_insights(store, days=30):
+@api_view(['GET'])
+@permission_classes([IsAuthenticated, IsStoreOwner])
+def store_leaderboard_view(request, store_id):
     """
-    Generate comprehensive AI insights for store improvement
+    Rank a store against the other stores, overall or within a category.
+    
+    Query params: category (category id, default all stores) and limit
+    (default 20, at most MAX_LEADERBOARD_SIZE). Reads the store metrics
+    materialized by the refresh_store_metrics task.
     """
     try:
-        # Collect store data
-        products = store.products.filter(is_active=True)
-        total_products = products.count()
-        
-        if total_products == 0:
-            return {
-                'store_id': store.id,
-                'store_name': store.name,
-                'analysis_period': f'{days} days',
-                'generated_at': timezone.now().isoformat(),
-                'insights': [{
-                    'type': 'setup',
-                    'priority': 'high',
-                    'title': 'Start Adding Products',
-                    'description': 'Your store is empty! You need to add products to start selling and attract customers.',
-                    'action': 'Add New Product',
-                    'impact': 'Begin your e-commerce journey',
-                    'icon': 'fa-plus'
-                }],
-                'performance_score': 10,
-                'performance_summary': 'Your store needs initial setup. Start by adding products!',
-                'total_insights': 1
-            }
-        
-        insights = []
-        score = 50  # Base score
-        
-        # Product Analysis
-        out_of_stock = products.filter(in_stock=False).count()
-        no_image_products = products.filter(image_urls__isnull=True).count() + products.filter(image_urls__exact='[]').count()
-        low_view_products = products.filter(view_count__lt=10).count()
-        high_rated_products = products.filter(average_rating__gte=4.5).count()
-        avg_rating = products.aggregate(avg_rating=Avg('average_rating'))['avg_rating'] or 0
-        total_views = sum(p.view_count or 0 for p in products)
-        total_reviews = sum(p.total_reviews or 0 for p in products)
-        
-        # 1. Inventory Management Insights
-        if out_of_stock > 0:
-            out_of_stock_rate = (out_of_stock / total_products) * 100
-            if out_of_stock_rate > 20:
-                insights.append({
-                    'type': 'inventory',
-                    'priority': 'high',
-                    'title': 'Critical Inventory Issue',
-                    'description': f'{out_of_stock_rate:.0f}% of your products are out of stock ({out_of_stock} products). This is causing you to lose potential sales.',
-                    'action': 'Restock Immediately',
-                    'impact': 'Prevent losing 30-50% of potential sales',
-                    'icon': 'fa-boxes'
-                })
-                score -= 20
-            elif out_of_stock_rate > 10:
-                insights.append({
-                    'type': 'inventory',
-                    'priority': 'medium',
-                    'title': 'Low Stock Warning',
-                    'description': f'{out_of_stock} products are out of stock. Monitor inventory levels regularly.',
-                    'action': 'Set Up Stock Alerts',
-                    'impact': 'Avoid sudden stockouts',
-                    'icon': 'fa-exclamation-triangle'
-                })
-                score -= 10
-        else:
-            insights.append({
-                'type': 'inventory',
-                'priority': 'low',
-                'title': 'Excellent Inventory Management',
-                'description': 'All your products are in stock! Keep up this great performance.',
-                'action': 'Maintain Continuous Monitoring',
-                'impact': 'Customer satisfaction and continuous sales',
-                'icon': 'fa-check-circle'
-            })
-            score += 15
-        
-        # 2. Product Images Insights
-        if no_image_products > 0:
-            no_image_rate = (no_image_products / total_products) * 100
-            insights.append({
-                'type': 'product_images',
-                'priority': 'high',
-                'title': 'Products Missing Images',
-                'description': f'{no_image_products} products ({no_image_rate:.0f}%) have no images. Products with images get 5x more views!',
-                'action': 'Add High-Quality Images',
-                'impact': 'Increase views by 400%',
-                'icon': 'fa-image'
-            })
-            score -= 15
-        
-        # 3. Product Performance Insights
-        if low_view_products > 0:
-            low_view_rate = (low_view_products / total_products) * 100
-            if low_view_rate > 50:
-                insights.append({
-                    'type': 'product_performance',
-                    'priority': 'high',
-                    'title': 'Low-Performing Products',
-                    'description': f'{low_view_rate:.0f}% of your products have low views. You need to improve titles and descriptions.',
-                    'action': 'Optimize Product Descriptions & Keywords',
-                    'impact': 'Increase search visibility by 60%',
-                    'icon': 'fa-eye'
-                })
-                score -= 15
-            elif low_view_rate > 25:
-                insights.append({
-                    'type': 'product_performance',
-                    'priority': 'medium',
-                    'title': 'Visibility Improvement Opportunity',
-                    'description': f'{low_view_products} products need better visibility. Consider improving titles.',
-                    'action': 'Review Product Titles',
-                    'impact': 'Increase views by 30%',
-                    'icon': 'fa-search'
-                })
-                score -= 8
-        
-        # 4. Customer Satisfaction Insights
-        if total_reviews > 0:
-            review_rate = (total_reviews / max(total_views, 1)) * 100
-            if avg_rating >= 4.5:
-                insights.append({
-                    'type': 'customer_satisfaction',
-                    'priority': 'low',
-                    'title': 'Extremely Happy Customers!',
-                    'description': f'Your excellent rating of {avg_rating:.1f}/5 shows customer satisfaction. Use this in marketing!',
-                    'action': 'Feature Reviews in Advertisements',
-                    'impact': 'Increase trust and sales by 25%',
-                    'icon': 'fa-star'
-                })
-                score += 20
-            elif avg_rating >= 4.0:
-                insights.append({
-                    'type': 'customer_satisfaction',
-                    'priority': 'low',
-                    'title': 'Good Customer Reviews',
-                    'description': f'Your rating of {avg_rating:.1f}/5 is good. It can be improved by focusing on quality details.',
-                    'action': 'Improve Product Quality & Service',
-                    'impact': 'Reach 4.5+ star rating',
-                    'icon': 'fa-thumbs-up'
-                })
-                score += 10
-            elif avg_rating < 3.5:
-                insights.append({
-                    'type': 'customer_satisfaction',
-                    'priority': 'high',
-                    'title': 'Customer Satisfaction Needs Improvement',
-                    'description': f'Your rating of {avg_rating:.1f}/5 is low. You must review product quality and service immediately.',
-                    'action': 'Comprehensive Quality & Service Review',
-                    'impact': 'Improve reputation and increase sales',
-                    'icon': 'fa-exclamation-triangle'
-                })
-                score -= 25
-            
-            if review_rate < 2:
-                insights.append({
-                    'type': 'customer_engagement',
-                    'priority': 'medium',
-                    'title': 'Low Customer Engagement',
-                    'description': f'Review rate is only {review_rate:.1f}%. Encourage customers to leave reviews.',
-                    'action': 'Create Review Encouragement Campaign',
-                    'impact': 'Increase trust and credibility',
-                    'icon': 'fa-comments'
-                })
-        else:
-            insights.append({
-                'type': 'customer_engagement',
-                'priority': 'medium',
-                'title': 'No Reviews Yet',
-                'description': 'Your store needs customer reviews to build trust. Encourage your first customers to review.',
-                'action': 'Request Reviews from Early Customers',
-                'impact': 'Build trust for new customers',
-                'icon': 'fa-star-half-alt'
-            })
-        
-        # 5. High-performing products opportunity
-        if high_rated_products > 0:
-            insights.append({
-                'type': 'marketing_opportunity',
-                'priority': 'medium',
-                'title': 'Star Products for Promotion',
-                'description': f'You have {high_rated_products} products with excellent ratings (4.5+ stars). Promote them more!',
-                'action': 'Create Promotional Campaign for Top Products',
-                'impact': 'Increase sales by 40%',
-                'icon': 'fa-rocket'
-            })
-            score += 10
-        
-        # 6. Pricing Strategy Insights
-        discounted_products = products.filter(discount_percentage__gt=0).count()
-        if total_products > 0:
-            discount_rate = (discounted_products / total_products) * 100
-            if discount_rate < 10:
-                insights.append({
-                    'type': 'pricing_strategy',
-                    'priority': 'medium',
-                    'title': 'Opportunity for Attractive Offers',
-                    'description': 'Few of your products have discounts. Offers increase attractiveness and encourage purchases.',
-                    'action': 'Create Seasonal Offers or Limited Discounts',
-                    'impact': 'Increase conversion rate by 35%',
-                    'icon': 'fa-percent'
-                })
-            elif discount_rate > 60:
-                insights.append({
-                    'type': 'pricing_strategy',
-                    'priority': 'medium',
-                    'title': 'Review Discount Strategy',
-                    'description': f'{discount_rate:.0f}% of your products have discounts. Ensure you maintain profitability.',
-                    'action': 'Review Profit Margins and Pricing',
-                    'impact': 'Improve profitability while maintaining sales',
-                    'icon': 'fa-chart-line'
-                })
-        
-        # 7. SEO and Marketing Insights
-        products_without_description = products.filter(
-            Q(description__isnull=True) | Q(description__exact='') | Q(description__icontains='description')
-        ).count()
-        
-        if products_without_description > 0:
-            insights.append({
-                'type': 'seo_marketing',
-                'priority': 'medium',
-                'title': 'Search Engine Optimization (SEO)',
-                'description': f'{products_without_description} products lack detailed descriptions. Good descriptions improve your search visibility.',
-                'action': 'Write Detailed and Attractive Descriptions',
-                'impact': 'Increase traffic from search engines',
-                'icon': 'fa-search'
-            })
-        
-        # 8. Store Verification Insight
-        if not store.is_verified:
-            insights.append({
-                'type': 'store_credibility',
-                'priority': 'high',
-                'title': 'Store Verification Required',
-                'description': 'Your store is not verified. Verified stores gain more customer trust.',
-                'action': 'Complete Store Verification Process',
-                'impact': 'Increase trust and sales by 50%',
-                'icon': 'fa-shield-alt'
-            })
-            score -= 15
-        
-        # 9. Social Media Marketing Opportunity
-        if total_views > 100:
-            insights.append({
-                'type': 'social_media',
-                'priority': 'low',
-                'title': 'Social Media Marketing Opportunity',
-                'description': f'Your products get {total_views} views. Share them on social media to double your reach!',
-                'action': 'Share Products on Facebook and Instagram',
-                'impact': 'Double potential visitor count',
-                'icon': 'fa-share-alt'
-            })
+        store = get_object_or_404(Store, id=store_id, owner=request.user)
         
-        # Calculate final performance score
-        performance_score = min(100, max(0, score))
+        try:
+            category_id = int(request.GET['category']) if request.GET.get('category') else None
+            limit = min(max(int(request.GET.get('limit', 20)), 1), MAX_LEADERBOARD_SIZE)
+        except ValueError:
+            return Response({'error': 'category and limit must be integers'}, status=status.HTTP_400_BAD_REQUEST)
         
-        # Generate performance summary
-        high_priority_count = len([i for i in insights if i.get('priority') == 'high'])
-        if performance_score >= 80:
-            performance_summary = f"Excellent performance! Your store operates with high efficiency. You have {high_priority_count} points that need attention."
-        elif performance_score >= 60:
-            performance_summary = f"Good performance with room for improvement. Focus on {high_priority_count} important points to enhance performance."
-        elif performance_score >= 40:
-            performance_summary = f"Average performance. Your store needs improvements in {high_priority_count} important areas."
-        else:
-            performance_summary = f"Your store needs fundamental improvements. Start with {high_priority_count} high-priority points."
+        leaders = store_leaderboard.leaderboard(category_id, limit)
+        standing = store_leaderboard.get(store.id, category_id)
         
-        return {
+        return Response({
             'store_id': store.id,
-            'store_name': store.name,
-            'analysis_period': f'{days} days',
-            'generated_at': timezone.now().isoformat(),
-            'insights': insights,
-            'performance_score': round(performance_score, 1),
-            'performance_summary': performance_summary,
-            'total_insights': len(insights),
-            'priority_insights': [i for i in insights if i.get('priority') == 'high']
-        }
+            'category_id': category_id,
+            'health_score': _calculate_store_health_score(store),
+            'standing': _store_metrics_data(standing) if standing else None,
+            'leaderboard': [
+                {
+                    'rank': rank,
+                    'store_name': metrics.store.name,
+                    'is_own_store': metrics.store_id == store.id,
+                    **_store_metrics_data(metrics)
+                }
+                for rank, metrics in enumerate(leaders, start=1)
+            ],
+            'computed_at': leaders[0].computed_at if leaders else None,
+        }, status=status.HTTP_200_OK)
         
     except Exception as e:
-        logger.error(f"Error generating comprehensive insights: {str(e)}")
-        return {
-            'error': 'Failed to generate insights',
-            'insights': [],
-            'performance_score': 0,
-            'performance_summary': 'Unable to analyze store performance at this time.'
-        }
-
-
-def _generate_sample_analytics(store, start_date, end_date):
-    """
-    Generate sample analytics data for demonstration.
-    """
-    import random
-    from datetime import date, timedelta
-    
-    analytics_data = []
-    current_date = start_date
-    
-    while current_date <= end_date:
-        analytics = StoreAnalytics.objects.create(
-            store=store,
-            date=current_date,
-            total_views=random.randint(50, 200),
-            unique_visitors=random.randint(30, 150),
-            product_views=random.randint(40, 180),
-            total_clicks=random.randint(20, 100),
-            add_to_cart_count=random.randint(5, 30),
-            conversion_rate=random.uniform(2.0, 8.0),
-            total_orders=random.randint(1, 10),
-            total_revenue=random.uniform(100, 1000),
-            average_order_value=random.uniform(50, 200)
+        logger.error(f"Error getting store leaderboard: {str(e)}")
+        return Response(
+            {'error': 'Failed to get store leaderboard', 'details': str(e)},
+            status=status.HTTP_500_INTERNAL_SERVER_ERROR
         )
-        analytics_data.append(analytics)
-        current_date += timedelta(days=1)
-    
-    return analytics_data
 
 
 def _generate_performance_recommendations(ctr, conversion_rate, total_views):
@@ -718,16 +549,39 @@ def _generate_product_insights(product, views, clicks, cart_adds):
     return insights
 
 
-def _calculate_store_health_score(store, avg_rating, total_interactions):
+def _calculate_store_health_score(store):
     """
-    Calculate an overall health score for the store.
+    Overall health score of the store, from the materialized store metrics.
     """
-    rating_score = (avg_rating / 5) * 40  # 40% weight
-    interaction_score = min(total_interactions / 100, 1) * 30  # 30% weight
-    product_count_score = min(store.products.filter(is_active=True).count() / 20, 1) * 30  # 30% weight
-    
-    health_score = rating_score + interaction_score + product_count_score
-    return round(health_score, 1)
+    metrics = store_leaderboard.get(store.id)
+    return metrics.health_score if metrics else 0.0
+
+
+def _store_metrics_data(metrics):
+    """
+    Serialize a StoreMetrics row with its percentile ranks.
+    """
+    return {
+        'store_id': metrics.store_id,
+        'category_id': metrics.category_id,
+        'health_score': metrics.health_score,
+        'average_rating': metrics.average_rating,
+        'product_count': metrics.product_count,
+        'total_views': metrics.total_views,
+        'conversion_rate': metrics.conversion_rate,
+        'stock_out_ratio': metrics.stock_out_ratio,
+        'review_velocity': metrics.review_velocity,
+        'average_price': float(metrics.average_price),
+        'percentiles': {
+            'health': metrics.health_percentile,
+            'rating': metrics.rating_percentile,
+            'product_count': metrics.product_count_percentile,
+            'views': metrics.views_percentile,
+            'conversion': metrics.conversion_percentile,
+            'stock': metrics.stock_percentile,
+            'review_velocity': metrics.review_velocity_percentile,
+        },
+    }
 
 
 def _generate_store_recommendations(store, products, recent_behavior):
@@ -774,7 +628,7 @@ def _get_trending_categories_for_store(store):
     from django.db.models import Count
     
     trending = UserBehaviorLog.objects.filter(
-        product__store=store,
+        store=store,
         timestamp__gte=timezone.now() - timedelta(days=7)
     ).values(
         'product__category__name'
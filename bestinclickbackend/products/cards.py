@@ -0,0 +1,74 @@
+"""
+Precomputed product cards.
+
+Recommendation lists and other product feeds only need a compact card per
+product. Cards are serialized once with ProductCardSerializer and kept in
+the Django cache, so formatting a list of products costs one cache
+round-trip plus a single query for the cards that are missing. Cards are
+dropped from the cache when their product is saved or deleted.
+"""
+
+import logging
+from typing import Dict, Iterable
+from django.core.cache import cache
+
+logger = logging.getLogger(__name__)
+
+KEY_PREFIX = 'product_card'
+
+
+class ProductCardCache:
+    """
+    Cache of serialized product cards keyed by product ID.
+    """
+
+    timeout = 600  # seconds
+
+    def key(self, product_id: int) -> str:
+        return f'{KEY_PREFIX}:{product_id}'
+
+    def get_cards(self, product_ids: Iterable[int]) -> Dict[int, dict]:
+        """
+        Return cards for the active products among product_ids, keyed by ID.
+        """
+        product_ids = list(dict.fromkeys(product_ids))
+        if not product_ids:
+            return {}
+
+        keys = {self.key(product_id): product_id for product_id in product_ids}
+        try:
+            cached = cache.get_many(list(keys))
+        except Exception as e:
+            logger.warning(f"Product card cache unavailable: {str(e)}")
+            return self._build_cards(product_ids)
+
+        cards = {keys[key]: card for key, card in cached.items()}
+        missing = [product_id for product_id in product_ids if product_id not in cards]
+        if missing:
+            built = self._build_cards(missing)
+            cards.update(built)
+            try:
+                cache.set_many({self.key(product_id): card for product_id, card in built.items()}, self.timeout)
+            except Exception as e:
+                logger.warning(f"Could not cache product cards: {str(e)}")
+        return cards
+
+    def _build_cards(self, product_ids) -> Dict[int, dict]:
+        from .models import Product
+        from .serializers import ProductCardSerializer
+
+        products = (
+            Product.objects.filter(id__in=product_ids, is_active=True)
+            .select_related('category', 'brand', 'store')
+            .prefetch_related('images')
+        )
+        return {card['id']: card for card in ProductCardSerializer(products, many=True).data}
+
+    def invalidate(self, product_ids: Iterable[int]):
+        try:
+            cache.delete_many([self.key(product_id) for product_id in product_ids])
+        except Exception as e:
+            logger.warning(f"Could not invalidate product cards: {str(e)}")
+
+
+product_cards = ProductCardCache()
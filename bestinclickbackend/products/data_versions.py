@@ -0,0 +1,51 @@
+"""
+Per-store data versions for caches built from a store's data.
+
+Each store has a version number in the cache that is bumped whenever data
+about it changes (products, view counts, reviews, comments, behavior logs,
+daily analytics). Generated reports are reused for identical requests only
+while their store's version is current. The 'all' version covers
+cross-store reports such as market trends and is bumped by every change.
+Caches that should only follow some of these changes keep their own
+versions under another key prefix (see ai_models.store_insights).
+
+Model changes are picked up by the receivers in reports/signals.py; bulk
+writers that send no model signals (the view counter, the analytics
+rollup) invalidate the stores they touched themselves.
+"""
+
+import logging
+from typing import Iterable, Optional
+from django.core.cache import cache
+
+logger = logging.getLogger(__name__)
+
+KEY_PREFIX = 'store_data'
+
+
+class StoreDataVersions:
+    """
+    Per-store data version numbers kept in the cache under a key prefix.
+    """
+
+    def __init__(self, prefix: str = KEY_PREFIX):
+        self.prefix = prefix
+
+    def _key(self, store_id: Optional[int]) -> str:
+        return f'{self.prefix}:store:{store_id or "all"}:version'
+
+    def version(self, store_id: Optional[int]) -> int:
+        return cache.get_or_set(self._key(store_id), 1, None)
+
+    def invalidate(self, store_ids: Iterable[Optional[int]]):
+        """Make everything cached from these stores' data stale."""
+        for store_id in {*store_ids, None}:
+            key = self._key(store_id)
+            try:
+                cache.incr(key)
+            except ValueError:
+                # No version yet, so nothing was cached under it
+                cache.add(key, 1, None)
+
+
+store_data_versions = StoreDataVersions()
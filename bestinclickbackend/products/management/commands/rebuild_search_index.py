@@ -0,0 +1,28 @@
+"""
+Management command to rebuild the product full-text search index.
+"""
+
+from django.core.management.base import BaseCommand, CommandError
+from products.search_index import get_search_backend
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the full-text search index for all active products'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=500,
+            help='Number of products to index per batch',
+        )
+
+    def handle(self, *args, **options):
+        backend = get_search_backend()
+        if backend is None:
+            raise CommandError('The configured database has no supported full-text search backend')
+
+        total = backend.rebuild(batch_size=options['batch_size'])
+        self.stdout.write(
+            self.style.SUCCESS(f'Indexed {total} products using the {backend.vendor} backend')
+        )
@@ -0,0 +1,85 @@
+# Full-text search index for products (SQLite FTS5 / PostgreSQL tsvector + GIN)
+
+from django.db import migrations
+
+
+def create_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'sqlite':
+        schema_editor.execute(
+            "CREATE VIRTUAL TABLE IF NOT EXISTS product_search_index USING fts5("
+            "name, description, sku, attributes, "
+            "tokenize = 'unicode61 remove_diacritics 2', prefix = '2 3')"
+        )
+    elif vendor == 'postgresql':
+        schema_editor.execute(
+            "CREATE TABLE IF NOT EXISTS product_search_index ("
+            "product_id bigint PRIMARY KEY REFERENCES products(id) ON DELETE CASCADE, "
+            "document tsvector NOT NULL)"
+        )
+        schema_editor.execute(
+            "CREATE INDEX IF NOT EXISTS product_search_index_document_gin "
+            "ON product_search_index USING GIN (document)"
+        )
+    else:
+        return
+    index_existing_products(apps, schema_editor)
+
+
+def _flatten(value, parts):
+    if isinstance(value, dict):
+        for key, item in value.items():
+            parts.append(str(key))
+            _flatten(item, parts)
+    elif isinstance(value, (list, tuple)):
+        for item in value:
+            _flatten(item, parts)
+    elif value is not None:
+        parts.append(str(value))
+    return parts
+
+
+def index_existing_products(apps, schema_editor):
+    # Self-contained so later changes to the model or to products.search_index
+    # cannot break this migration; `manage.py rebuild_search_index` rebuilds
+    # the index with the current code.
+    Product = apps.get_model('products', 'Product')
+    if schema_editor.connection.vendor == 'sqlite':
+        sql = (
+            "INSERT INTO product_search_index (rowid, name, description, sku, attributes) "
+            "VALUES (%s, %s, %s, %s, %s)"
+        )
+    else:
+        sql = (
+            "INSERT INTO product_search_index (product_id, document) VALUES (%s, "
+            "setweight(to_tsvector('simple', %s), 'A') || "
+            "setweight(to_tsvector('simple', %s), 'B') || "
+            "setweight(to_tsvector('simple', %s), 'A') || "
+            "setweight(to_tsvector('simple', %s), 'C'))"
+        )
+    products = Product.objects.using(schema_editor.connection.alias).filter(is_active=True).values_list(
+        'id', 'name', 'description', 'sku', 'attributes'
+    )
+    rows = [
+        (product_id, name or '', description or '', sku or '', ' '.join(_flatten(attributes, [])))
+        for product_id, name, description, sku, attributes in products.iterator(chunk_size=500)
+    ]
+    with schema_editor.connection.cursor() as cursor:
+        for start in range(0, len(rows), 500):
+            cursor.executemany(sql, rows[start:start + 500])
+
+
+def drop_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor in ('sqlite', 'postgresql'):
+        schema_editor.execute("DROP TABLE IF EXISTS product_search_index")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0005_productreview_unique_user_product_review'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
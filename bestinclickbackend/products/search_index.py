@@ -0,0 +1,272 @@
+"""
+Full-text search index for the product catalog.
+
+Keeps an inverted index over product name, description, SKU and flattened
+attributes. The index lives in the database so every worker shares it:
+SQLite uses an FTS5 virtual table ranked with BM25, PostgreSQL uses a
+tsvector column with a GIN index ranked with ts_rank_cd (PostgreSQL has
+no built-in BM25). Both backends expose the same interface.
+"""
+
+import re
+import logging
+from typing import Iterable, List, Optional, Tuple
+from django.db import connection
+from django.db.models.expressions import RawSQL
+
+logger = logging.getLogger(__name__)
+
+SEARCH_INDEX_TABLE = 'product_search_index'
+
+TOKEN_PATTERN = re.compile(r'\w+', re.UNICODE)
+
+
+def tokenize(text: str) -> List[str]:
+    """Split text into lowercase search tokens."""
+    return TOKEN_PATTERN.findall((text or '').lower())
+
+
+def flatten_attributes(attributes) -> str:
+    """Flatten a product attributes JSON value into indexable text."""
+    parts = []
+
+    def _walk(value):
+        if isinstance(value, dict):
+            for key, item in value.items():
+                parts.append(str(key))
+                _walk(item)
+        elif isinstance(value, (list, tuple)):
+            for item in value:
+                _walk(item)
+        elif value is not None:
+            parts.append(str(value))
+
+    _walk(attributes)
+    return ' '.join(parts)
+
+
+def product_document(product) -> Tuple[str, str, str, str]:
+    """Build the (name, description, sku, attributes) document for a product."""
+    return (
+        product.name or '',
+        product.description or '',
+        product.sku or '',
+        flatten_attributes(product.attributes),
+    )
+
+
+class SearchBackend:
+    """
+    Interface shared by the database-specific search backends.
+    """
+    vendor = None
+
+    def index_products(self, products: Iterable) -> None:
+        raise NotImplementedError
+
+    def remove_products(self, product_ids: Iterable[int]) -> None:
+        raise NotImplementedError
+
+    def search(self, query: str, limit: int = 1000) -> List[Tuple[int, float]]:
+        """Return (product_id, score) pairs ordered from best to worst match."""
+        raise NotImplementedError
+
+    def match_sql(self, query: str) -> Optional[Tuple[str, str, List]]:
+        """
+        SQL selecting the ids of matching products, and a scalar subquery
+        scoring the outer products row (higher is better), with their shared
+        parameters. None if the query has no searchable tokens.
+        """
+        raise NotImplementedError
+
+    def rank_queryset(self, queryset, query: str):
+        """
+        Restrict a Product queryset to the matches of query and annotate
+        each product with its search_score. The match runs inside the
+        queryset's own SQL, so filters and pagination applied afterwards
+        see every match, not a truncated top list.
+        """
+        match = self.match_sql(query)
+        if match is None:
+            return queryset.none()
+        ids_sql, score_sql, params = match
+        return queryset.filter(id__in=RawSQL(ids_sql, params)).annotate(
+            search_score=RawSQL(score_sql, params)
+        )
+
+    def clear(self) -> None:
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {SEARCH_INDEX_TABLE}')
+
+    def index_product(self, product) -> None:
+        if product.is_active:
+            self.index_products([product])
+        else:
+            self.remove_products([product.pk])
+
+    def rebuild(self, batch_size: int = 500) -> int:
+        """Re-index every active product. Returns the number of products indexed."""
+        from .models import Product
+
+        self.clear()
+        total = 0
+        batch = []
+        queryset = Product.objects.filter(is_active=True).only(
+            'id', 'name', 'description', 'sku', 'attributes', 'is_active'
+        )
+        for product in queryset.iterator(chunk_size=batch_size):
+            batch.append(product)
+            if len(batch) >= batch_size:
+                self.index_products(batch)
+                total += len(batch)
+                batch = []
+        if batch:
+            self.index_products(batch)
+            total += len(batch)
+        return total
+
+
+class SQLiteFTSBackend(SearchBackend):
+    """
+    SQLite FTS5 backend ranked with the built-in bm25() function.
+    """
+    vendor = 'sqlite'
+
+    # bm25() column weights: name, description, sku, attributes
+    column_weights = (10.0, 1.0, 5.0, 2.0)
+
+    def index_products(self, products):
+        rows = [(product.pk, *product_document(product)) for product in products]
+        if not rows:
+            return
+        with connection.cursor() as cursor:
+            cursor.executemany(
+                f'DELETE FROM {SEARCH_INDEX_TABLE} WHERE rowid = %s',
+                [(row[0],) for row in rows]
+            )
+            cursor.executemany(
+                f'INSERT INTO {SEARCH_INDEX_TABLE} (rowid, name, description, sku, attributes) '
+                f'VALUES (%s, %s, %s, %s, %s)',
+                rows
+            )
+
+    def remove_products(self, product_ids):
+        product_ids = list(product_ids)
+        if not product_ids:
+            return
+        with connection.cursor() as cursor:
+            cursor.executemany(
+                f'DELETE FROM {SEARCH_INDEX_TABLE} WHERE rowid = %s',
+                [(product_id,) for product_id in product_ids]
+            )
+
+    def build_match_expression(self, query: str) -> str:
+        tokens = list(dict.fromkeys(tokenize(query)))
+        return ' OR '.join(f'"{token}"*' for token in tokens)
+
+    def match_sql(self, query):
+        match = self.build_match_expression(query)
+        if not match:
+            return None
+        weights = ', '.join(str(weight) for weight in self.column_weights)
+        return (
+            f'SELECT rowid FROM {SEARCH_INDEX_TABLE} WHERE {SEARCH_INDEX_TABLE} MATCH %s',
+            f'SELECT -bm25({SEARCH_INDEX_TABLE}, {weights}) FROM {SEARCH_INDEX_TABLE} '
+            f'WHERE {SEARCH_INDEX_TABLE} MATCH %s AND rowid = products.id',
+            [match]
+        )
+
+    def search(self, query, limit=1000):
+        match = self.build_match_expression(query)
+        if not match:
+            return []
+        weights = ', '.join(str(weight) for weight in self.column_weights)
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'SELECT rowid, bm25({SEARCH_INDEX_TABLE}, {weights}) AS score '
+                f'FROM {SEARCH_INDEX_TABLE} WHERE {SEARCH_INDEX_TABLE} MATCH %s '
+                f'ORDER BY score LIMIT %s',
+                [match, limit]
+            )
+            # bm25() returns lower values for better matches; negate it so
+            # that higher scores are better for every backend.
+            return [(row[0], -row[1]) for row in cursor.fetchall()]
+
+
+class PostgresSearchBackend(SearchBackend):
+    """
+    PostgreSQL backend using a weighted tsvector column with a GIN index.
+    """
+    vendor = 'postgresql'
+
+    document_sql = (
+        "setweight(to_tsvector('simple', %s), 'A') || "
+        "setweight(to_tsvector('simple', %s), 'B') || "
+        "setweight(to_tsvector('simple', %s), 'A') || "
+        "setweight(to_tsvector('simple', %s), 'C')"
+    )
+
+    def index_products(self, products):
+        rows = [(product.pk, *product_document(product)) for product in products]
+        if not rows:
+            return
+        with connection.cursor() as cursor:
+            cursor.executemany(
+                f'INSERT INTO {SEARCH_INDEX_TABLE} (product_id, document) '
+                f'VALUES (%s, {self.document_sql}) '
+                f'ON CONFLICT (product_id) DO UPDATE SET document = EXCLUDED.document',
+                rows
+            )
+
+    def remove_products(self, product_ids):
+        product_ids = list(product_ids)
+        if not product_ids:
+            return
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'DELETE FROM {SEARCH_INDEX_TABLE} WHERE product_id = ANY(%s)',
+                [product_ids]
+            )
+
+    def build_tsquery(self, query: str) -> str:
+        tokens = list(dict.fromkeys(tokenize(query)))
+        return ' | '.join(f'{token}:*' for token in tokens)
+
+    def match_sql(self, query):
+        tsquery = self.build_tsquery(query)
+        if not tsquery:
+            return None
+        return (
+            f"SELECT product_id FROM {SEARCH_INDEX_TABLE} WHERE document @@ to_tsquery('simple', %s)",
+            f"SELECT ts_rank_cd(document, to_tsquery('simple', %s)) FROM {SEARCH_INDEX_TABLE} "
+            f"WHERE product_id = products.id",
+            [tsquery]
+        )
+
+    def search(self, query, limit=1000):
+        tsquery = self.build_tsquery(query)
+        if not tsquery:
+            return []
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"SELECT product_id, ts_rank_cd(document, query) AS score "
+                f"FROM {SEARCH_INDEX_TABLE}, to_tsquery('simple', %s) AS query "
+                f"WHERE document @@ query ORDER BY score DESC LIMIT %s",
+                [tsquery, limit]
+            )
+            return [(row[0], row[1]) for row in cursor.fetchall()]
+
+
+SEARCH_BACKENDS = {
+    SQLiteFTSBackend.vendor: SQLiteFTSBackend,
+    PostgresSearchBackend.vendor: PostgresSearchBackend,
+}
+
+
+def get_search_backend() -> Optional[SearchBackend]:
+    """
+    Return the search backend for the active database, or None if the
+    database has no supported full-text engine.
+    """
+    backend_class = SEARCH_BACKENDS.get(connection.vendor)
+    return backend_class() if backend_class else None
@@ -2,16 +2,58 @@
 Serializers for products app.
 """
 
+from collections import defaultdict
+from django.db.models import Count
 from rest_framework import serializers
 from .models import Category, Brand, Store, Product, ProductImage, ProductLike, ProductReview
 
 
+class CategoryIndex:
+    """
+    In-memory view of the whole category tree, loaded with a single query.
+
+    Used by list serializers so that category paths and children can be
+    rendered without walking the tree through the database.
+    """
+
+    def __init__(self, categories):
+        self.by_id = {category.id: category for category in categories}
+        self.children = defaultdict(list)
+        for category in categories:
+            if category.parent_id is not None and category.is_active:
+                self.children[category.parent_id].append(category)
+        self._paths = {}
+
+    @classmethod
+    def load(cls):
+        return cls(list(Category.objects.order_by('id')))
+
+    def get_children(self, category_id):
+        return self.children.get(category_id, [])
+
+    def get_full_path(self, category_id):
+        if category_id in self._paths:
+            return self._paths[category_id]
+
+        names = []
+        seen = set()
+        current = self.by_id.get(category_id)
+        while current is not None and current.id not in seen:
+            seen.add(current.id)
+            names.append(current.name)
+            current = self.by_id.get(current.parent_id)
+
+        path = ' > '.join(reversed(names))
+        self._paths[category_id] = path
+        return path
+
+
 class CategorySerializer(serializers.ModelSerializer):
     """
     Serializer for product categories.
     """
     children = serializers.SerializerMethodField()
-    full_path = serializers.CharField(source='get_full_path', read_only=True)
+    full_path = serializers.SerializerMethodField()
     
     class Meta:
         model = Category
@@ -21,10 +63,20 @@ class CategorySerializer(serializers.ModelSerializer):
         ]
     
     def get_children(self, obj):
+        category_index = self.context.get('category_index')
+        if category_index is not None:
+            children = category_index.get_children(obj.id)
+            return CategorySerializer(children, many=True, context=self.context).data if children else []
         if obj.children.exists():
             return CategorySerializer(obj.children.filter(is_active=True), many=True).data
         return []
 
+    def get_full_path(self, obj):
+        category_index = self.context.get('category_index')
+        if category_index is not None:
+            return category_index.get_full_path(obj.id)
+        return obj.get_full_path()
+
 
 class BrandSerializer(serializers.ModelSerializer):
     """
@@ -56,6 +108,9 @@ class StoreSerializer(serializers.ModelSerializer):
         ]
     
     def get_product_count(self, obj):
+        store_product_counts = self.context.get('store_product_counts')
+        if store_product_counts is not None:
+            return store_product_counts.get(obj.id, 0)
         return obj.products.filter(is_active=True).count()
 
 
@@ -149,6 +204,45 @@ class ProductImageSerializer(serializers.ModelSerializer):
         fields = ['id', 'image', 'alt_text', 'is_primary', 'sort_order']
 
 
+class ProductListSerializer(serializers.ListSerializer):
+    """
+    List-mode serialization for products.
+
+    Loads the category tree, per-store active product counts and the
+    requesting user's liked product IDs once per page, so the number of
+    queries does not grow with the number of products serialized.
+    """
+
+    def to_representation(self, data):
+        products = list(data.all() if hasattr(data, 'all') else data)
+        if products:
+            self._precompute(products)
+        return super().to_representation(products)
+
+    def _precompute(self, products):
+        context = self.context
+        context['category_index'] = CategoryIndex.load()
+
+        store_ids = {product.store_id for product in products}
+        context['store_product_counts'] = dict(
+            Product.objects.filter(store_id__in=store_ids, is_active=True)
+            .values('store_id')
+            .annotate(product_count=Count('id'))
+            .values_list('store_id', 'product_count')
+        )
+
+        request = context.get('request')
+        if request and request.user.is_authenticated:
+            context['liked_product_ids'] = set(
+                ProductLike.objects.filter(
+                    user=request.user,
+                    product_id__in=[product.id for product in products]
+                ).values_list('product_id', flat=True)
+            )
+        else:
+            context['liked_product_ids'] = set()
+
+
 class ProductSerializer(serializers.ModelSerializer):
     """
     Serializer for products.
@@ -199,14 +293,63 @@ class ProductSerializer(serializers.ModelSerializer):
             'is_featured', 'created_at', 'updated_at', 'category',
             'brand', 'store', 'images', 'is_liked'
         ]
+        list_serializer_class = ProductListSerializer
     
     def get_is_liked(self, obj):
+        liked_product_ids = self.context.get('liked_product_ids')
+        if liked_product_ids is not None:
+            return obj.id in liked_product_ids
         request = self.context.get('request')
         if request and request.user.is_authenticated:
             return ProductLike.objects.filter(user=request.user, product=obj).exists()
         return False
 
 
+class ProductCardSerializer(serializers.ModelSerializer):
+    """
+    Compact product representation for recommendation and listing cards.
+
+    Leaves out the description-heavy and per-user fields of ProductSerializer
+    so a card can be built once and cached for every visitor.
+    """
+    category = serializers.SerializerMethodField()
+    brand = serializers.SerializerMethodField()
+    store = serializers.SerializerMethodField()
+    images = ProductImageSerializer(many=True, read_only=True)
+    final_price = serializers.DecimalField(
+        source='get_final_price',
+        max_digits=10,
+        decimal_places=2,
+        read_only=True
+    )
+    slug = serializers.SerializerMethodField()
+
+    class Meta:
+        model = Product
+        fields = [
+            'id', 'slug', 'name', 'price', 'discount_percentage',
+            'final_price', 'in_stock', 'stock_quantity', 'image_urls',
+            'average_rating', 'total_reviews', 'is_featured', 'category',
+            'brand', 'store', 'images'
+        ]
+
+    @staticmethod
+    def _related(obj):
+        return {'id': obj.id, 'name': obj.name, 'slug': obj.slug} if obj else None
+
+    def get_category(self, obj):
+        return self._related(obj.category)
+
+    def get_brand(self, obj):
+        return self._related(obj.brand)
+
+    def get_store(self, obj):
+        return self._related(obj.store)
+
+    def get_slug(self, obj):
+        return obj.slug or f'product-{obj.id}'
+
+
 class ProductCreateUpdateSerializer(serializers.ModelSerializer):
     slug = serializers.SerializerMethodField()
 
@@ -0,0 +1,49 @@
+"""
+Signal handlers for products app.
+"""
+
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+from .models import Product
+from .search_index import get_search_backend
+from .cards import product_cards
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+@receiver(post_save, sender=Product)
+def update_product_search_index(sender, instance, **kwargs):
+    """
+    Keep the full-text search index in sync with saved products.
+    """
+    backend = get_search_backend()
+    if backend is None:
+        return
+    try:
+        backend.index_product(instance)
+    except Exception as e:
+        logger.error(f"Error indexing product {instance.pk}: {str(e)}")
+
+
+@receiver(post_delete, sender=Product)
+def remove_product_from_search_index(sender, instance, **kwargs):
+    """
+    Drop deleted products from the full-text search index.
+    """
+    backend = get_search_backend()
+    if backend is None:
+        return
+    try:
+        backend.remove_products([instance.pk])
+    except Exception as e:
+        logger.error(f"Error removing product {instance.pk} from search index: {str(e)}")
+
+
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+def invalidate_product_card(sender, instance, **kwargs):
+    """
+    Drop the cached card of a saved or deleted product.
+    """
+    product_cards.invalidate([instance.pk])
@@ -0,0 +1,13 @@
+"""
+Celery tasks for the products app.
+"""
+
+from celery import shared_task
+
+from .view_counter import view_counter
+
+
+@shared_task
+def flush_product_views():
+    """Write product views counted in the cache to the database."""
+    return view_counter.flush()
@@ -0,0 +1,305 @@
+"""
+Tests for products app.
+"""
+
+from unittest import mock
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import override_settings
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APITestCase
+from recommendations.models import ProductInteractionScore
+from .models import Category, Brand, Store, Product, ProductLike
+from .search_index import get_search_backend
+from .tasks import flush_product_views
+from .view_counter import HyperLogLog, ViewCounter
+
+User = get_user_model()
+
+LOCMEM_CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'products-tests',
+    }
+}
+
+
+class ProductListQueryCountTest(APITestCase):
+    """
+    Test that the product list endpoint runs a bounded number of queries.
+    """
+
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username='testuser',
+            email='test@example.com',
+            password='testpass123'
+        )
+        self.parent_category = Category.objects.create(name='Electronics')
+        self.category = Category.objects.create(name='Smartphones', parent=self.parent_category)
+        self.brand = Brand.objects.create(name='Test Brand')
+        self.stores = []
+        for i in range(3):
+            owner = User.objects.create_user(
+                username=f'owner{i}',
+                email=f'owner{i}@example.com',
+                password='testpass123',
+                role='store_owner'
+            )
+            self.stores.append(Store.objects.create(
+                owner=owner,
+                name=f'Store {i}',
+                email=f'store{i}@example.com',
+                phone='1234567890',
+                address='Test Address'
+            ))
+
+    def _create_products(self, count, offset=0):
+        for i in range(offset, offset + count):
+            Product.objects.create(
+                store=self.stores[i % len(self.stores)],
+                category=self.category if i % 2 else self.parent_category,
+                brand=self.brand,
+                name=f'Product {i}',
+                description='Test description',
+                sku=f'SKU{i:04d}',
+                price=10 + i
+            )
+
+    def test_list_query_count_is_constant(self):
+        """Test that the query count does not depend on page size."""
+        self.client.force_authenticate(user=self.user)
+        url = reverse('products:product_list')
+
+        self._create_products(5)
+        ProductLike.objects.create(user=self.user, product=Product.objects.first())
+
+        # count, products page, images prefetch, category tree,
+        # store product counts, liked product IDs
+        with self.assertNumQueries(6):
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.data['results']), 5)
+
+        self._create_products(20, offset=5)
+        with self.assertNumQueries(6):
+            response = self.client.get(url)
+        self.assertEqual(len(response.data['results']), 25)
+
+    def test_list_output_matches_detail_serialization(self):
+        """Test that list mode renders the same nested data as detail mode."""
+        self._create_products(2)
+        liked = Product.objects.get(sku='SKU0001')
+        ProductLike.objects.create(user=self.user, product=liked)
+        self.client.force_authenticate(user=self.user)
+
+        response = self.client.get(reverse('products:product_list'))
+        results = {item['id']: item for item in response.data['results']}
+        item = results[liked.id]
+
+        self.assertTrue(item['is_liked'])
+        self.assertEqual(item['category']['full_path'], 'Electronics > Smartphones')
+        self.assertEqual(item['store']['product_count'], 1)
+
+        parent_item = results[Product.objects.get(sku='SKU0000').id]
+        self.assertFalse(parent_item['is_liked'])
+        self.assertEqual(
+            [child['name'] for child in parent_item['category']['children']],
+            ['Smartphones']
+        )
+
+
+class ProductSearchIndexTest(APITestCase):
+    """
+    Test the full-text product search index.
+    """
+
+    def setUp(self):
+        owner = User.objects.create_user(
+            username='owner',
+            email='owner@example.com',
+            password='testpass123',
+            role='store_owner'
+        )
+        self.store = Store.objects.create(
+            owner=owner,
+            name='Search Store',
+            email='store@example.com',
+            phone='1234567890',
+            address='Test Address'
+        )
+        self.category = Category.objects.create(name='Audio')
+        self.brand = Brand.objects.create(name='Sound Co')
+        self.headphones = Product.objects.create(
+            store=self.store,
+            category=self.category,
+            brand=self.brand,
+            name='Wireless Headphones',
+            description='Noise cancelling over-ear headphones',
+            sku='HP-001',
+            price=199,
+            attributes={'color': 'midnight', 'connectivity': ['bluetooth']}
+        )
+        self.speaker = Product.objects.create(
+            store=self.store,
+            category=self.category,
+            brand=self.brand,
+            name='Portable Speaker',
+            description='Speaker that pairs well with headphones',
+            sku='SP-001',
+            price=99
+        )
+        self.backend = get_search_backend()
+
+    def _search_ids(self, query):
+        return [product_id for product_id, _ in self.backend.search(query)]
+
+    def test_index_updates_on_save_and_delete(self):
+        """Test that saves and deletes are reflected in the index."""
+        self.assertEqual(self._search_ids('midnight'), [self.headphones.id])
+        self.assertEqual(self._search_ids('bluetooth'), [self.headphones.id])
+        self.assertEqual(self._search_ids('sp'), [self.speaker.id])
+
+        self.headphones.name = 'Studio Monitors'
+        self.headphones.save()
+        self.assertEqual(self._search_ids('monitors'), [self.headphones.id])
+
+        self.headphones.is_active = False
+        self.headphones.save()
+        self.assertEqual(self._search_ids('monitors'), [])
+
+        speaker_id = self.speaker.id
+        self.speaker.delete()
+        self.assertNotIn(speaker_id, self._search_ids('speaker'))
+
+    def test_name_matches_rank_above_description_matches(self):
+        """Test that results are ordered by relevance."""
+        self.assertEqual(
+            self._search_ids('headphones'),
+            [self.headphones.id, self.speaker.id]
+        )
+
+    def test_list_view_returns_ranked_results(self):
+        """Test that the product list search uses relevance order."""
+        url = reverse('products:product_list')
+
+        response = self.client.get(url, {'search': 'headphones'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            [item['id'] for item in response.data['results']],
+            [self.headphones.id, self.speaker.id]
+        )
+
+        response = self.client.get(url, {'search': 'headphones', 'ordering': 'price'})
+        self.assertEqual(
+            [item['id'] for item in response.data['results']],
+            [self.speaker.id, self.headphones.id]
+        )
+
+        response = self.client.get(url, {'search': 'nonexistentterm'})
+        self.assertEqual(response.data['results'], [])
+
+    def test_list_view_filters_all_matches_before_ranking(self):
+        """Test that list filters apply to every match, not a truncated top list."""
+        url = reverse('products:product_list')
+        with mock.patch.object(type(self.backend), 'search', side_effect=AssertionError):
+            response = self.client.get(url, {'search': 'headphones', 'price_max': 150})
+        self.assertEqual([item['id'] for item in response.data['results']], [self.speaker.id])
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class ViewCounterTest(APITestCase):
+    """
+    Test the write-behind product view counter.
+    """
+
+    def setUp(self):
+        cache.clear()
+        owner = User.objects.create_user(
+            username='owner',
+            email='owner@example.com',
+            password='testpass123',
+            role='store_owner'
+        )
+        store = Store.objects.create(
+            owner=owner,
+            name='View Store',
+            email='store@example.com',
+            phone='1234567890',
+            address='Test Address'
+        )
+        self.product = Product.objects.create(
+            store=store,
+            category=Category.objects.create(name='Audio'),
+            brand=Brand.objects.create(name='Sound Co'),
+            name='Wireless Headphones',
+            description='Test description',
+            sku='HP-001',
+            price=199
+        )
+        self.counter = ViewCounter()
+
+    def test_views_are_flushed_in_one_batch(self):
+        """Test that buffered views reach the product and its score row."""
+        with self.assertNumQueries(0):
+            for i in range(10):
+                self.counter.record_view(self.product.id, f'user:{i % 4}')
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.view_count, 0)
+
+        self.assertEqual(self.counter.flush(), 1)
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.view_count, 10)
+        score = self.product.ai_interaction_score
+        self.assertEqual(score.total_views, 10)
+        self.assertEqual(score.unique_views, 4)
+
+    def test_pending_views_are_shared_by_workers(self):
+        """Test that views counted by one worker are flushed by another."""
+        self.counter.record_view(self.product.id, 'user:1')
+        self.counter.flush()
+
+        restarted = ViewCounter()
+        restarted.record_view(self.product.id, 'user:1')
+        restarted.record_view(self.product.id, 'user:2')
+        self.assertEqual(self.counter.pending_views(self.product.id), 2)
+        self.assertEqual(flush_product_views(), 1)
+
+        score = ProductInteractionScore.objects.get(product=self.product)
+        self.assertEqual(score.total_views, 3)
+        self.assertEqual(score.unique_views, 2)
+        self.assertEqual(self.counter.pending_views(self.product.id), 0)
+        self.assertEqual(self.counter.flush(), 0)
+
+    def test_failed_flush_keeps_pending_views(self):
+        """Test that views survive a flush that fails to write."""
+        self.counter.record_view(self.product.id, 'user:1')
+        with mock.patch.object(ViewCounter, '_write_views', side_effect=Exception('database down')):
+            self.assertEqual(self.counter.flush(), 0)
+        self.assertEqual(self.counter.pending_views(self.product.id), 1)
+
+        self.counter.record_view(self.product.id, 'user:2')
+        self.assertEqual(self.counter.flush(), 1)
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.view_count, 2)
+        self.assertEqual(self.product.ai_interaction_score.unique_views, 2)
+
+    def test_hyperloglog_estimate(self):
+        """Test that the sketch estimates large cardinalities closely."""
+        sketch = HyperLogLog()
+        for i in range(20000):
+            sketch.add(f'viewer-{i}')
+        self.assertAlmostEqual(sketch.count(), 20000, delta=20000 * 0.05)
+
+    def test_detail_view_does_not_write_view_count(self):
+        """Test that the detail endpoint defers the view count update."""
+        from .view_counter import view_counter
+        url = reverse('products:product_detail', kwargs={'slug': self.product.slug})
+
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(view_counter.pending_views(self.product.id), 1)
+        view_counter.flush()
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.view_count, 1)
@@ -0,0 +1,262 @@
+"""
+Write-behind product view counter.
+
+Product page views are counted in the shared cache instead of updating the
+product row on every request: each view increments a per-product counter
+with cache.incr, so pending deltas are shared by all workers and survive
+worker restarts and crashes. A periodic task flushes the counters to
+Product.view_count and ProductInteractionScore.total_views with one UPDATE
+per table, bumps the data versions of the stores involved and then
+decrements the counters by the amounts written. Unique viewers are
+deduplicated in the cache and their hashes merged into the HyperLogLog
+sketch in ProductInteractionScore.unique_viewers_sketch on flush, so
+unique_views is shared by all workers.
+"""
+
+import hashlib
+import math
+import logging
+from typing import Dict, List, Optional, Set
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Case, F, IntegerField, Value, When
+
+from ai_models.background import task_lock
+from .data_versions import store_data_versions
+
+logger = logging.getLogger(__name__)
+
+KEY_PREFIX = 'view_counter'
+FLUSH_LOCK = 'flush_product_views'
+
+
+class HyperLogLog:
+    """
+    HyperLogLog cardinality sketch with 2**precision one-byte registers.
+    """
+
+    precision = 12
+    num_registers = 1 << precision
+
+    def __init__(self, registers: Optional[bytes] = None):
+        if registers and len(registers) == self.num_registers:
+            self.registers = bytearray(registers)
+        else:
+            self.registers = bytearray(self.num_registers)
+
+    @staticmethod
+    def _hash(value: str) -> int:
+        # Python's hash() is salted per process; sketches are shared between
+        # workers, so use a stable digest instead.
+        digest = hashlib.blake2b(value.encode('utf-8'), digest_size=8).digest()
+        return int.from_bytes(digest, 'big')
+
+    def add(self, value: str):
+        self.add_hash(self._hash(value))
+
+    def add_hash(self, hashed: int):
+        index = hashed >> (64 - self.precision)
+        remaining_bits = 64 - self.precision
+        rest = hashed & ((1 << remaining_bits) - 1)
+        rank = remaining_bits - rest.bit_length() + 1
+        if rank > self.registers[index]:
+            self.registers[index] = rank
+
+    def merge(self, other: 'HyperLogLog'):
+        self.registers = bytearray(map(max, self.registers, other.registers))
+
+    def count(self) -> int:
+        m = self.num_registers
+        alpha = 0.7213 / (1 + 1.079 / m)
+        estimate = alpha * m * m / sum(2.0 ** -register for register in self.registers)
+        zeros = self.registers.count(0)
+        if estimate <= 2.5 * m and zeros:
+            # Linear counting is more accurate for small cardinalities
+            estimate = m * math.log(m / zeros)
+        return int(round(estimate))
+
+    def to_bytes(self) -> bytes:
+        return bytes(self.registers)
+
+
+def _incr(key: str, delta: int = 1) -> int:
+    """Increment a persistent cache counter, creating it if needed."""
+    try:
+        return cache.incr(key, delta)
+    except ValueError:
+        if cache.add(key, delta, None):
+            return delta
+        return cache.incr(key, delta)
+
+
+def _key(*parts) -> str:
+    return ':'.join([KEY_PREFIX] + [str(part) for part in parts])
+
+
+class ViewCounter:
+    """
+    Cache-backed accumulator of product views.
+
+    Products with pending views are registered in a sequence of cache keys
+    so the flush reads only those products; a flushed product registers
+    again on its next view.
+    """
+
+    batch_size = 500
+    # A registration lost between the sequence increment and its write
+    # (e.g. a worker crash) is retried once the product's marker expires;
+    # its counters stay in the cache until then.
+    registration_timeout = 300  # seconds
+    # Registrations are deleted by the flush; the timeout only reclaims
+    # entries it never reached, whose products register again on a view
+    registered_timeout = 60 * 60 * 24  # seconds
+    viewer_timeout = 60 * 60 * 24  # seconds a viewer is deduplicated in the cache
+    lock_timeout = 300  # seconds
+
+    def record_view(self, product_id: int, viewer: Optional[str] = None):
+        """
+        Count one view of a product. viewer identifies the visitor for
+        unique-view tracking (user id, session key or IP address).
+        """
+        if cache.add(_key('dirty', product_id), True, self.registration_timeout):
+            cache.set(_key('registered', _incr(_key('seq'))), product_id, self.registered_timeout)
+        _incr(_key('views', product_id))
+        if viewer:
+            hashed = HyperLogLog._hash(viewer)
+            if cache.add(_key('seen', product_id, f'{hashed:x}'), True, self.viewer_timeout):
+                cache.set(_key('viewer', product_id, _incr(_key('viewers', product_id))), hashed, None)
+
+    def pending_views(self, product_id: int) -> int:
+        return cache.get(_key('views', product_id), 0)
+
+    def flush(self) -> int:
+        """
+        Write view deltas and unique viewers of registered products.
+        Returns the number of products updated. Only one flush runs at a
+        time; a failed batch is retried by the next flush.
+        """
+        with task_lock(FLUSH_LOCK, self.lock_timeout) as acquired:
+            if not acquired:
+                logger.info("Product view flush already running, skipping")
+                return 0
+
+            updated = 0
+            last_seq = cache.get(_key('seq'), 0)
+            first_seq = cache.get(_key('flushed_seq'), 0) + 1
+            for start in range(first_seq, last_seq + 1, self.batch_size):
+                seqs = range(start, min(start + self.batch_size, last_seq + 1))
+                registrations = cache.get_many([_key('registered', seq) for seq in seqs])
+                try:
+                    updated += self._flush_products(sorted(set(registrations.values())))
+                except Exception as e:
+                    logger.error(f"Error flushing views for {len(registrations)} products: {str(e)}")
+                    break
+                cache.set(_key('flushed_seq'), seqs[-1], None)
+                cache.delete_many(list(registrations))
+            return updated
+
+    def _flush_products(self, product_ids: List[int]) -> int:
+        # Views counted from here on register the product again
+        cache.delete_many([_key('dirty', product_id) for product_id in product_ids])
+
+        counts = cache.get_many([_key('views', product_id) for product_id in product_ids])
+        views = {
+            product_id: counts[_key('views', product_id)] for product_id in product_ids
+            if counts.get(_key('views', product_id))
+        }
+        viewer_counts = cache.get_many([_key('viewers', product_id) for product_id in views])
+        offsets = cache.get_many([_key('viewer_offset', product_id) for product_id in views])
+        entry_keys = {}
+        new_offsets = {}
+        for product_id in views:
+            count = viewer_counts.get(_key('viewers', product_id), 0)
+            offset = offsets.get(_key('viewer_offset', product_id), 0)
+            if count > offset:
+                new_offsets[_key('viewer_offset', product_id)] = count
+                for number in range(offset + 1, count + 1):
+                    entry_keys[_key('viewer', product_id, number)] = product_id
+
+        # Entries still being written by a concurrent view are skipped; the
+        # sketch is an estimate either way
+        viewers: Dict[int, HyperLogLog] = {}
+        for key, hashed in cache.get_many(list(entry_keys)).items():
+            product_id = entry_keys[key]
+            viewers.setdefault(product_id, HyperLogLog()).add_hash(hashed)
+
+        if not views:
+            return 0
+        with transaction.atomic():
+            store_ids = self._write_views(views, viewers)
+
+        for product_id, count in views.items():
+            cache.decr(_key('views', product_id), count)
+        cache.set_many(new_offsets, None)
+        cache.delete_many(list(entry_keys))
+        self._invalidate_store_data(store_ids)
+        return len(views)
+
+    def _write_views(self, views: Dict[int, int], viewers: Dict[int, HyperLogLog]) -> Set[int]:
+        """Apply the deltas; returns the stores of the updated products."""
+        from recommendations.models import ProductInteractionScore
+        from .models import Product
+
+        product_ids = list(views)
+        delta = Case(
+            *[When(pk=product_id, then=Value(count)) for product_id, count in views.items()],
+            default=Value(0),
+            output_field=IntegerField()
+        )
+        Product.objects.filter(pk__in=product_ids).update(view_count=F('view_count') + delta)
+
+        product_stores = dict(Product.objects.filter(pk__in=product_ids).values_list('pk', 'store_id'))
+        existing_ids = set(product_stores)
+        ProductInteractionScore.objects.bulk_create(
+            [ProductInteractionScore(product_id=product_id) for product_id in existing_ids],
+            ignore_conflicts=True
+        )
+        score_delta = Case(
+            *[When(product_id=product_id, then=Value(count)) for product_id, count in views.items()],
+            default=Value(0),
+            output_field=IntegerField()
+        )
+        ProductInteractionScore.objects.filter(product_id__in=existing_ids).update(
+            total_views=F('total_views') + score_delta
+        )
+
+        if not viewers:
+            return set(product_stores.values())
+        scores = list(
+            ProductInteractionScore.objects.select_for_update()
+            .filter(product_id__in=existing_ids & set(viewers))
+            .only('id', 'product_id', 'unique_viewers_sketch')
+        )
+        for score in scores:
+            sketch = HyperLogLog(score.unique_viewers_sketch)
+            sketch.merge(viewers[score.product_id])
+            score.unique_viewers_sketch = sketch.to_bytes()
+            score.unique_views = sketch.count()
+        ProductInteractionScore.objects.bulk_update(scores, ['unique_viewers_sketch', 'unique_views'])
+        return set(product_stores.values())
+
+    def _invalidate_store_data(self, store_ids: Set[int]):
+        """Bulk updates send no post_save, so these stores' data versions are bumped here."""
+        try:
+            store_data_versions.invalidate(store_ids)
+        except Exception as e:
+            logger.error(f"Error invalidating store data after view flush: {str(e)}")
+
+
+view_counter = ViewCounter()
+
+
+def viewer_key(request) -> Optional[str]:
+    """Identify the visitor behind a request for unique-view tracking."""
+    user = getattr(request, 'user', None)
+    if user is not None and user.is_authenticated:
+        return f'user:{user.pk}'
+    session = getattr(request, 'session', None)
+    if session is not None and session.session_key:
+        return f'session:{session.session_key}'
+    ip_address = request.META.get('REMOTE_ADDR')
+    return f'ip:{ip_address}' if ip_address else None
+
@@ -16,8 +16,10 @@ from rest_framework.permissions import AllowAny, IsAuthenticated
 from rest_framework.response import Response
 from django_filters.rest_framework import DjangoFilterBackend
 from django.shortcuts import get_object_or_404
-from django.db.models import Q, F, Avg, Count
+from django.db.models import Q, Avg, Count
 from ai_models.services import SearchService, RecommendationService
+from ai_models.event_pipeline import event_pipeline
+from .view_counter import view_counter, viewer_key
 from .models import Category, Brand, Store, Product, ProductLike, ProductReview
 from .serializers import (
     CategorySerializer,
@@ -31,6 +33,7 @@ from .serializers import (
 )
 from .filters import ProductFilter
 from .permissions import IsStoreOwnerOrReadOnly, IsStoreOwnerOfStore
+from .search_index import get_search_backend
 import logging
 
 logger = logging.getLogger(__name__)
@@ -157,13 +160,12 @@ class ProductListView(generics.ListAPIView):
     List products with filtering, searching, and sorting.
     """
     queryset = Product.objects.filter(is_active=True).select_related(
-        'category', 'brand', 'store'
+        'category', 'brand', 'store', 'store__owner'
     ).prefetch_related('images')
     serializer_class = ProductSerializer
     permission_classes = [AllowAny]
-    filter_backends = [DjangoFilterBackend, filters.SearchFilter, filters.OrderingFilter]
+    filter_backends = [DjangoFilterBackend, filters.OrderingFilter]
     filterset_class = ProductFilter
-    search_fields = ['name', 'description', 'sku']
     ordering_fields = ['name', 'price', 'average_rating', 'created_at']
     ordering = ['-created_at']
     
@@ -176,12 +178,26 @@ class ProductListView(generics.ListAPIView):
             search_service = SearchService()
             enhanced_query = search_service.enhance_search_query(search_query)
             
-            # Apply enhanced search
-            queryset = queryset.filter(
-                Q(name__icontains=enhanced_query) |
-                Q(description__icontains=enhanced_query) |
-                Q(attributes__icontains=enhanced_query)
-            )
+            search_backend = get_search_backend()
+            if search_backend is None:
+                return queryset.filter(
+                    Q(name__icontains=enhanced_query) |
+                    Q(description__icontains=enhanced_query) |
+                    Q(attributes__icontains=enhanced_query)
+                )
+            
+            # Match and rank in the database, before the list filters run
+            queryset = search_backend.rank_queryset(queryset, enhanced_query)
+        
+        return queryset
+    
+    def filter_queryset(self, queryset):
+        queryset = super().filter_queryset(queryset)
+        
+        # Search results keep relevance order unless an explicit ordering is requested
+        if self.request.query_params.get('search') and not self.request.query_params.get('ordering'):
+            if 'search_score' in queryset.query.annotations:
+                queryset = queryset.order_by('-search_score', 'id')
         
         return queryset
 
@@ -200,16 +216,15 @@ class ProductDetailView(generics.RetrieveAPIView):
     def retrieve(self, request, *args, **kwargs):
         instance = self.get_object()
         
-        # Increment view count
-        Product.objects.filter(pk=instance.pk).update(view_count=F('view_count') + 1)
+        # Count the view; deltas are flushed to the database in batches
+        view_counter.record_view(instance.pk, viewer_key(request))
         
         # Log user behavior for AI
         if hasattr(request, 'user') and request.user.is_authenticated:
-            from ai_models.models import UserBehaviorLog
-            UserBehaviorLog.objects.create(
+            event_pipeline.log_behavior(
+                'view',
                 user=request.user,
                 product=instance,
-                action_type='view',
                 metadata={'source': 'product_detail'}
             )
         
@@ -266,11 +281,10 @@ def toggle_product_like(request, slug):
             liked = True
         
         # Log user behavior for AI
-        from ai_models.models import UserBehaviorLog
-        UserBehaviorLog.objects.create(
+        event_pipeline.log_behavior(
+            'like' if liked else 'dislike',
             user=request.user,
             product=product,
-            action_type='like' if liked else 'dislike',
             metadata={'source': 'product_detail'}
         )
         
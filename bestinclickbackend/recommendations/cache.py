@@ -0,0 +1,129 @@
+"""
+Response cache for recommendation lists.
+
+General and trending lists are cached per category and limit; per-user lists
+are cached for a short time under a per-user version number, which is bumped
+whenever the user likes, reviews or adds a product to the cart so their next
+request is recomputed.
+
+Stampedes are avoided in two ways: a warm entry is recomputed slightly
+before it expires by one request chosen at random (probabilistic early
+expiration, weighted by how long the value took to compute), and on a cold
+miss only the request holding a short lock recomputes while the others wait
+for its result. Everything goes through the Django cache API, so it works
+with the Redis backend as well as local memory.
+"""
+
+import math
+import time
+import random
+import logging
+from typing import Callable, Optional
+from django.core.cache import cache
+
+logger = logging.getLogger(__name__)
+
+KEY_PREFIX = 'recommendations'
+
+
+class RecommendationCache:
+    """
+    Cache of recommendation responses with stampede protection.
+    """
+
+    general_timeout = 900  # seconds
+    trending_timeout = 900
+    personalized_timeout = 300
+
+    lock_timeout = 30
+    lock_wait = 2.0
+    lock_poll_interval = 0.05
+    early_expiry_beta = 1.0
+
+    # Behaviors that make a user's cached recommendations stale
+    invalidating_actions = {
+        'like', 'dislike', 'unlike', 'add_to_cart', 'cart_add',
+        'review', 'review_positive', 'review_negative', 'purchase',
+    }
+
+    # Keys
+
+    def general_key(self, category_id: Optional[int], limit: int) -> str:
+        return f'{KEY_PREFIX}:general:{category_id or "all"}:{limit}'
+
+    def trending_key(self, limit: int, category_id: Optional[int] = None) -> str:
+        return f'{KEY_PREFIX}:trending:{category_id or "all"}:{limit}'
+
+    def user_key(self, user_id: int, category_id: Optional[int], limit: int,
+                 algorithm: Optional[str] = None) -> str:
+        key = f'{KEY_PREFIX}:user:{user_id}:v{self._user_version(user_id)}:{category_id or "all"}:{limit}'
+        return f'{key}:{algorithm}' if algorithm else key
+
+    def _version_key(self, user_id: int) -> str:
+        return f'{KEY_PREFIX}:user:{user_id}:version'
+
+    def _user_version(self, user_id: int) -> int:
+        return cache.get_or_set(self._version_key(user_id), 1, None)
+
+    # Invalidation
+
+    def invalidate_user(self, user_id: int):
+        """Make all cached lists for a user stale."""
+        key = self._version_key(user_id)
+        try:
+            cache.incr(key)
+        except ValueError:
+            # No version yet, so nothing is cached for this user
+            cache.add(key, 1, None)
+
+    # Lookup
+
+    def _should_recompute_early(self, entry: dict) -> bool:
+        remaining = entry['expires_at'] - time.time()
+        # -log(U) is exponentially distributed: recomputation becomes likely
+        # only within a few compute durations of expiry
+        return entry['compute_time'] * self.early_expiry_beta * -math.log(1.0 - random.random()) >= remaining
+
+    def _compute_and_store(self, key: str, compute: Callable, timeout: int):
+        started = time.monotonic()
+        value = compute()
+        cache.set(key, {
+            'value': value,
+            'compute_time': time.monotonic() - started,
+            'expires_at': time.time() + timeout,
+        }, timeout)
+        return value
+
+    def get_or_compute(self, key: str, compute: Callable, timeout: int):
+        """
+        Return the cached value for key, computing and caching it if needed.
+        """
+        try:
+            entry = cache.get(key)
+        except Exception as e:
+            logger.warning(f"Recommendation cache unavailable: {str(e)}")
+            return compute()
+
+        if entry is not None and not self._should_recompute_early(entry):
+            return entry['value']
+
+        lock_key = f'{key}:lock'
+        if cache.add(lock_key, 1, self.lock_timeout):
+            try:
+                return self._compute_and_store(key, compute, timeout)
+            finally:
+                cache.delete(lock_key)
+
+        # Another request is recomputing; serve the old value if there is one
+        if entry is not None:
+            return entry['value']
+        deadline = time.monotonic() + self.lock_wait
+        while time.monotonic() < deadline:
+            time.sleep(self.lock_poll_interval)
+            entry = cache.get(key)
+            if entry is not None:
+                return entry['value']
+        return compute()
+
+
+recommendation_cache = RecommendationCache()
@@ -0,0 +1,51 @@
+"""
+Management command to refresh the materialized trending products ranking.
+Run this periodically (e.g., every 15 minutes); use --rebuild-buckets once
+after deploying to seed the hourly counters from existing behaviors.
+"""
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from recommendations.trending import trending_service
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    help = 'Refresh the trending products ranking from hourly activity counters'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--rebuild-buckets',
+            action='store_true',
+            help='Recount the hourly activity counters from user behaviors first',
+        )
+
+    def handle(self, *args, **options):
+        start_time = timezone.now()
+
+        try:
+            if options.get('rebuild_buckets'):
+                self.stdout.write('Rebuilding hourly activity counters...')
+                buckets = trending_service.rebuild_buckets()
+                self.stdout.write(
+                    self.style.SUCCESS(f'✓ Rebuilt {buckets} activity buckets')
+                )
+
+            self.stdout.write('Refreshing trending products...')
+            entries = trending_service.refresh()
+            duration = timezone.now() - start_time
+            self.stdout.write(
+                self.style.SUCCESS(
+                    f'✓ Materialized {entries} trending entries'
+                    f'\n⏱ Duration: {duration.total_seconds():.2f} seconds'
+                )
+            )
+
+        except Exception as e:
+            self.stdout.write(
+                self.style.ERROR(f'❌ Error refreshing trending products: {str(e)}')
+            )
+            logger.error(f'Error in refresh_trending_products command: {str(e)}')
+            raise e
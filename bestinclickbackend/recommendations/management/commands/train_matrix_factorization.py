@@ -0,0 +1,60 @@
+"""
+Management command to train the matrix factorization recommendation model.
+Run this periodically (e.g., nightly); workers pick up the new factors
+automatically.
+"""
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from ai_models.matrix_factorization import matrix_factorization_service
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    help = 'Train the implicit-feedback matrix factorization model from user behaviors'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--factors',
+            type=int,
+            default=32,
+            help='Number of latent factors (default: 32)',
+        )
+        parser.add_argument(
+            '--iterations',
+            type=int,
+            default=15,
+            help='Number of ALS iterations (default: 15)',
+        )
+
+    def handle(self, *args, **options):
+        start_time = timezone.now()
+        self.stdout.write('Training matrix factorization model...')
+
+        try:
+            model = matrix_factorization_service.train(
+                factors=options['factors'],
+                iterations=options['iterations']
+            )
+            if model is None:
+                self.stdout.write(
+                    self.style.WARNING('⚠ No user behaviors to train on')
+                )
+                return
+
+            duration = timezone.now() - start_time
+            self.stdout.write(
+                self.style.SUCCESS(
+                    f'✓ Trained on {len(model.user_ids)} users and {len(model.item_ids)} products'
+                    f'\n⏱ Duration: {duration.total_seconds():.2f} seconds'
+                )
+            )
+
+        except Exception as e:
+            self.stdout.write(
+                self.style.ERROR(f'❌ Error training matrix factorization model: {str(e)}')
+            )
+            logger.error(f'Error in train_matrix_factorization command: {str(e)}')
+            raise e
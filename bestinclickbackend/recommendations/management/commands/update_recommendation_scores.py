@@ -51,7 +51,10 @@ class Command(BaseCommand):
             # Update product scores
             self.stdout.write('Updating product interaction scores...')
             product_ids = options.get('products')
-            analyzer.update_product_scores(product_ids=product_ids)
+            analyzer.update_product_scores(
+                product_ids=product_ids,
+                batch_size=options['batch_size']
+            )
             self.stdout.write(
                 self.style.SUCCESS('✓ Product scores updated successfully')
             )
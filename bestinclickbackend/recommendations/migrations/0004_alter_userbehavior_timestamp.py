@@ -0,0 +1,19 @@
+# Generated by Django 5.0.14 on 2026-10-16 22:46
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recommendations', '0003_productinteractionscore_userbehavior_usersimilarity'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='userbehavior',
+            name='timestamp',
+            field=models.DateTimeField(default=django.utils.timezone.now, editable=False),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.0.14 on 2026-10-16 23:16
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recommendations', '0004_alter_userbehavior_timestamp'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='productinteractionscore',
+            name='unique_viewers_sketch',
+            field=models.BinaryField(blank=True, null=True),
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 5.0.14 on 2026-10-17 00:04
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recommendations', '0005_productinteractionscore_unique_viewers_sketch'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='recommendationsession',
+            name='created_at',
+            field=models.DateTimeField(default=django.utils.timezone.now, editable=False),
+        ),
+    ]
@@ -0,0 +1,46 @@
+# Generated by Django 5.0.14 on 2026-10-17 00:10
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0006_product_search_index'),
+        ('recommendations', '0006_alter_recommendationsession_created_at'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProductActivityBucket',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('bucket_start', models.DateTimeField()),
+                ('interactions', models.PositiveIntegerField(default=0)),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='activity_buckets', to='products.product')),
+            ],
+            options={
+                'db_table': 'product_activity_buckets',
+                'indexes': [models.Index(fields=['bucket_start'], name='product_act_bucket__ae9b5d_idx')],
+                'unique_together': {('product', 'bucket_start')},
+            },
+        ),
+        migrations.CreateModel(
+            name='TrendingProduct',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('rank', models.PositiveIntegerField()),
+                ('score', models.FloatField()),
+                ('recent_interactions', models.FloatField(help_text='Interactions with exponential time decay')),
+                ('computed_at', models.DateTimeField()),
+                ('category', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, to='products.category')),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='trending_entries', to='products.product')),
+            ],
+            options={
+                'db_table': 'trending_products',
+                'ordering': ['rank'],
+                'indexes': [models.Index(fields=['category', 'rank'], name='trending_pr_categor_330d21_idx')],
+            },
+        ),
+    ]
@@ -4,6 +4,7 @@ Tracks recommendation performance and user interactions.
 """
 
 from django.db import models
+from django.utils import timezone
 from decimal import Decimal
 from django.contrib.auth import get_user_model
 from products.models import Product
@@ -30,7 +31,7 @@ class RecommendationSession(models.Model):
             ('content_based', 'Content-Based Filtering'),
         ]
     )
-    created_at = models.DateTimeField(auto_now_add=True)
+    created_at = models.DateTimeField(default=timezone.now, editable=False)
     
     class Meta:
         db_table = 'recommendation_sessions'
@@ -119,7 +120,7 @@ class UserBehavior(models.Model):
     # Metadata
     ip_address = models.GenericIPAddressField(null=True, blank=True)
     user_agent = models.TextField(null=True, blank=True)
-    timestamp = models.DateTimeField(auto_now_add=True)
+    timestamp = models.DateTimeField(default=timezone.now, editable=False)
     
     class Meta:
         db_table = 'user_behaviors'
@@ -140,6 +141,7 @@ class ProductInteractionScore(models.Model):
     # View metrics
     total_views = models.PositiveIntegerField(default=0)
     unique_views = models.PositiveIntegerField(default=0)
+    unique_viewers_sketch = models.BinaryField(null=True, blank=True)  # HyperLogLog registers
     avg_view_duration = models.FloatField(default=0.0)
     
     # Engagement metrics
@@ -191,3 +193,38 @@ class UserSimilarity(models.Model):
             models.Index(fields=['user1', 'similarity_score']),
             models.Index(fields=['similarity_score']),
         ]
+
+
+class ProductActivityBucket(models.Model):
+    """
+    Hourly interaction counters per product, used for trending analysis.
+    """
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='activity_buckets')
+    bucket_start = models.DateTimeField()
+    interactions = models.PositiveIntegerField(default=0)  # views, likes, cart adds, purchases
+    
+    class Meta:
+        db_table = 'product_activity_buckets'
+        unique_together = ['product', 'bucket_start']
+        indexes = [
+            models.Index(fields=['bucket_start']),
+        ]
+
+
+class TrendingProduct(models.Model):
+    """
+    Materialized trending ranking, overall (no category) and per category.
+    """
+    category = models.ForeignKey('products.Category', on_delete=models.CASCADE, null=True, blank=True)
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='trending_entries')
+    rank = models.PositiveIntegerField()
+    score = models.FloatField()
+    recent_interactions = models.FloatField(help_text="Interactions with exponential time decay")
+    computed_at = models.DateTimeField()
+    
+    class Meta:
+        db_table = 'trending_products'
+        ordering = ['rank']
+        indexes = [
+            models.Index(fields=['category', 'rank']),
+        ]
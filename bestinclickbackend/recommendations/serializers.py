@@ -15,6 +15,7 @@ class RecommendationRequestSerializer(serializers.Serializer):
     session_id = serializers.CharField(max_length=255, required=False)
     limit = serializers.IntegerField(default=10, min_value=1, max_value=50)
     category_id = serializers.IntegerField(required=False)
+    algorithm = serializers.ChoiceField(choices=['hybrid', 'matrix_factorization'], required=False)
     exclude_products = serializers.ListField(
         child=serializers.IntegerField(),
         required=False,
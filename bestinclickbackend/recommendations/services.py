@@ -4,14 +4,19 @@ Smart recommendation service integrating AI-powered recommendation engine.
 
 import logging
 from typing import List, Dict, Optional
+from django.conf import settings
 from django.contrib.auth import get_user_model
+from django.db import transaction
 from django.db.models import Q
 from django.utils import timezone
 from datetime import timedelta
 
 from products.models import Product
 from products.serializers import ProductSerializer
+from products.cards import product_cards
 from ai_models.real_recommendation_engine import real_recommendation_engine
+from ai_models.candidate_index import candidate_index_service
+from ai_models.matrix_factorization import matrix_factorization_service
 from ai_models.interaction_analyzer import InteractionAnalyzer
 from .models import RecommendationSession, RecommendationResult
 
@@ -19,6 +24,11 @@ User = get_user_model()
 logger = logging.getLogger(__name__)
 
 
+def find_recommendation_result(session_id, product_id) -> Optional[RecommendationResult]:
+    """Look up a tracked recommendation result."""
+    return RecommendationResult.objects.filter(session_id=session_id, product_id=product_id).first()
+
+
 class SmartRecommendationService:
     """
     Service for generating intelligent product recommendations.
@@ -34,26 +44,56 @@ class SmartRecommendationService:
         session_id: str = None,
         limit: int = 20,
         category_id: Optional[int] = None,
-        request=None
+        request=None,
+        algorithm: Optional[str] = None
+    ) -> Dict:
+        """
+        Get personalized recommendations for user or session, tracked
+        under a new recommendation session.
+        """
+        result = self.build_personalized_recommendations(
+            user=user,
+            session_id=session_id,
+            limit=limit,
+            category_id=category_id,
+            algorithm=algorithm
+        )
+        return self.track_recommendations(result, user=user, session_id=session_id)
+    
+    def build_personalized_recommendations(
+        self,
+        user: User = None,
+        session_id: str = None,
+        limit: int = 20,
+        category_id: Optional[int] = None,
+        algorithm: Optional[str] = None
     ) -> Dict:
         """
-        Get personalized recommendations for user or session.
+        Build the recommendation list for user or session without tracking
+        it, so the result can be cached and shared between requests.
+        
+        algorithm selects how logged-in users are served: 'hybrid' (the
+        recommendation engine's strategies) or 'matrix_factorization'
+        (the trained factor model, falling back to hybrid for users it
+        does not know). Defaults to the RECOMMENDATION_ALGORITHM setting.
         """
+        algorithm = algorithm or getattr(settings, 'RECOMMENDATION_ALGORITHM', 'hybrid')
         try:
-            # Create recommendation session for tracking
-            session = self._create_recommendation_session(
-                user=user,
-                session_id=session_id,
-                recommendation_type='personalized'
-            )
-            
             if user and user.is_authenticated:
                 # Get personalized recommendations for authenticated user
-                recommendations = self.engine.get_personalized_recommendations(
-                    user=user,
-                    limit=limit,
-                    category_id=category_id
-                )
+                recommendations = []
+                if algorithm == 'matrix_factorization':
+                    recommendations = self._get_matrix_factorization_recommendations(
+                        user=user,
+                        limit=limit,
+                        category_id=category_id
+                    )
+                if not recommendations:
+                    recommendations = self.engine.get_personalized_recommendations(
+                        user=user,
+                        limit=limit,
+                        category_id=category_id
+                    )
                 
                 if not recommendations:
                     # Fallback to general recommendations
@@ -81,16 +121,12 @@ class SmartRecommendationService:
                     message = "توصيات عامة للمنتجات الشائعة."
             
             # Get product details and format response
-            formatted_recommendations = self._format_recommendations(
-                recommendations[:limit],
-                session=session
-            )
+            formatted_recommendations = self._format_recommendations(recommendations[:limit])
             
             return {
                 'recommendations': formatted_recommendations,
                 'message': message,
-                'total_count': len(formatted_recommendations),
-                'session_id': str(session.id) if session else None
+                'total_count': len(formatted_recommendations)
             }
             
         except Exception as e:
@@ -102,18 +138,37 @@ class SmartRecommendationService:
                 return {
                     'recommendations': formatted_fallback,
                     'message': "تم عرض توصيات عامة لحدوث خطأ في التوصيات الشخصية.",
-                    'total_count': len(formatted_fallback),
-                    'session_id': None
+                    'total_count': len(formatted_fallback)
                 }
             except Exception as e2:
                 logger.error(f"Error in fallback recommendations: {str(e2)}")
                 return {
                     'recommendations': [],
                     'message': "عذراً، حدث خطأ في جلب التوصيات.",
-                    'total_count': 0,
-                    'session_id': None
+                    'total_count': 0
                 }
     
+    def track_recommendations(
+        self,
+        result: Dict,
+        user: User = None,
+        session_id: str = None,
+        recommendation_type: str = 'personalized'
+    ) -> Dict:
+        """
+        Record a served recommendation list under a new recommendation
+        session and return the response with its session_id. Called on
+        every request, including those served from the cache.
+        """
+        session = self._create_recommendation_session(
+            user=user,
+            session_id=session_id,
+            recommendation_type=recommendation_type
+        )
+        if session and not self._log_impressions(session, result.get('recommendations', [])):
+            session = None
+        return dict(result, session_id=str(session.id) if session else None)
+    
     def get_similar_products(
         self,
         product_id: int,
@@ -160,13 +215,13 @@ class SmartRecommendationService:
                 'base_product': None
             }
     
-    def get_trending_products(self, limit: int = 20) -> Dict:
+    def get_trending_products(self, limit: int = 20, category_id: Optional[int] = None) -> Dict:
         """
         Get currently trending products using real recommendation engine.
         """
         try:
             # Get trending products from real engine
-            recommendations = self.engine.get_trending_products(limit=limit)
+            recommendations = self.engine.get_trending_products(limit=limit, category_id=category_id)
             
             # Format recommendations
             formatted_recs = self._format_recommendations(recommendations)
@@ -239,10 +294,7 @@ class SmartRecommendationService:
         """
         try:
             # Find the recommendation result
-            result = RecommendationResult.objects.filter(
-                session__id=session_id,
-                product_id=product_id
-            ).first()
+            result = find_recommendation_result(session_id, product_id)
             
             if not result:
                 logger.warning(f"Recommendation result not found for session {session_id}, product {product_id}")
@@ -273,10 +325,11 @@ class SmartRecommendationService:
         recommendation_type: str = 'general'
     ) -> RecommendationSession:
         """
-        Create a recommendation session for tracking.
+        Create an unsaved recommendation session for tracking. It is written
+        together with its results by _log_impressions.
         """
         try:
-            session = RecommendationSession.objects.create(
+            session = RecommendationSession(
                 user=user if user and user.is_authenticated else None,
                 session_id=session_id,
                 recommendation_type=recommendation_type
@@ -286,6 +339,34 @@ class SmartRecommendationService:
             logger.error(f"Error creating recommendation session: {str(e)}")
             return None
     
+    def _get_matrix_factorization_recommendations(
+        self,
+        user: User,
+        limit: int,
+        category_id: Optional[int] = None
+    ) -> List[Dict]:
+        """
+        Score all active products for a user with the factor model.
+        """
+        try:
+            index = candidate_index_service.get_index()
+            if index is None:
+                # No candidate index in this worker yet; the caller falls back to hybrid
+                return []
+            allowed_ids = index.ids[index.categories == category_id] if category_id else index.ids
+            matches = matrix_factorization_service.recommend(user.id, limit, allowed_ids=allowed_ids)
+            return [
+                {
+                    'product_id': product_id,
+                    'score': min(max(score, 0.0), 1.0),
+                    'algorithm': 'matrix_factorization'
+                }
+                for product_id, score in matches
+            ]
+        except Exception as e:
+            logger.error(f"Error getting matrix factorization recommendations: {str(e)}")
+            return []
+    
     def _get_session_based_recommendations(
         self,
         session_id: str,
@@ -475,79 +556,35 @@ class SmartRecommendationService:
         session: RecommendationSession = None
     ) -> List[Dict]:
         """
-        Format recommendations with full product data.
+        Format recommendations as product cards. When a session is given,
+        it and the shown products are tracked in one batch.
         """
         try:
             if not recommendations:
                 return []
             
-            # Get product IDs
-            product_ids = [rec['product_id'] for rec in recommendations]
-            
-            # Fetch products with related data
-            products = Product.objects.filter(
-                id__in=product_ids,
-                is_active=True
-            ).select_related('category', 'brand')
+            cards = product_cards.get_cards(rec['product_id'] for rec in recommendations)
             
-            # Create product lookup
-            product_lookup = {p.id: p for p in products}
-            
-            # Format results
             formatted_results = []
             
             for i, rec in enumerate(recommendations):
                 product_id = rec['product_id']
-                
-                if product_id not in product_lookup:
+                card = cards.get(product_id)
+                if card is None:
                     continue
                 
-                product = product_lookup[product_id]
-                
-                try:
-                    # Serialize product data
-                    product_data = ProductSerializer(product).data
-                    
-                    # Add recommendation metadata
-                    product_data.update({
-                        'score': rec.get('score', 0.5),
-                        'algorithm': rec.get('algorithm', 'unknown'),
-                        'position': i + 1
-                    })
-                    
-                    formatted_results.append(product_data)
-                except Exception as e:
-                    logger.warning(f"Error serializing product {product.id}: {str(e)}")
-                    # Fallback to basic product data
-                    try:
-                        basic_data = {
-                            'id': product.id,
-                            'name': product.name,
-                            'slug': product.slug or f'product-{product.id}',
-                            'price': str(product.price) if product.price else '0.00',
-                            'image_urls': product.image_urls or [],
-                            'average_rating': product.average_rating or 0.0,
-                            'score': rec.get('score', 0.5),
-                            'algorithm': rec.get('algorithm', 'unknown'),
-                            'position': i + 1
-                        }
-                        formatted_results.append(basic_data)
-                    except Exception as e2:
-                        logger.error(f"Error creating basic data for product {product.id}: {str(e2)}")
-                        continue
-                
-                # Save recommendation result for tracking
-                if session:
-                    try:
-                        RecommendationResult.objects.create(
-                            session=session,
-                            product=product,
-                            score=rec.get('score', 0.5),
-                            position=i + 1,
-                            algorithm_used=rec.get('algorithm', 'unknown')
-                        )
-                    except Exception as e:
-                        logger.warning(f"Could not save recommendation result: {str(e)}")
+                position = i + 1
+                score = rec.get('score', 0.5)
+                algorithm = rec.get('algorithm', 'unknown')
+                formatted_results.append(dict(
+                    card,
+                    score=score,
+                    algorithm=algorithm,
+                    position=position
+                ))
+            
+            if session:
+                self._log_impressions(session, formatted_results)
             
             return formatted_results
             
@@ -555,6 +592,32 @@ class SmartRecommendationService:
             logger.error(f"Error formatting recommendations: {str(e)}")
             return []
     
+    def _log_impressions(self, session: RecommendationSession, formatted_results: List[Dict]) -> bool:
+        """
+        Write a session and the products shown in it, the results with one
+        bulk_create. They are written before the response is returned so
+        feedback on them can be recorded right away. Returns whether the
+        session was saved.
+        """
+        tracked_results = {}
+        for item in formatted_results:
+            # A session can only record each product once
+            tracked_results.setdefault(item['id'], RecommendationResult(
+                session=session,
+                product_id=item['id'],
+                score=item['score'],
+                position=item['position'],
+                algorithm_used=item['algorithm']
+            ))
+        try:
+            with transaction.atomic():
+                session.save(force_insert=True)
+                RecommendationResult.objects.bulk_create(list(tracked_results.values()))
+            return True
+        except Exception as e:
+            logger.error(f"Error tracking recommendation session: {str(e)}")
+            return False
+    
     def _get_client_ip(self, request) -> str:
         """
         Get client IP address from request.
@@ -0,0 +1,50 @@
+"""
+Signal handlers for recommendations app.
+"""
+
+from django.db.models.signals import post_save
+from django.dispatch import receiver
+from ai_models.event_pipeline import behavior_logged, behaviors_written
+from products.models import ProductReview
+from .cache import recommendation_cache
+from .trending import trending_service
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+@receiver(behavior_logged)
+def invalidate_recommendations_on_behavior(sender, user_id, action, **kwargs):
+    """
+    Drop a user's cached recommendations when they like, review or add to cart.
+    """
+    if action not in recommendation_cache.invalidating_actions:
+        return
+    try:
+        recommendation_cache.invalidate_user(user_id)
+    except Exception as e:
+        logger.error(f"Error invalidating recommendations for user {user_id}: {str(e)}")
+
+
+@receiver(behaviors_written)
+def count_trending_activity(sender, behaviors, **kwargs):
+    """
+    Add newly written behaviors to the hourly trending counters.
+    """
+    try:
+        trending_service.record_behaviors(behaviors)
+    except Exception as e:
+        logger.error(f"Error counting trending activity: {str(e)}")
+
+
+@receiver(post_save, sender=ProductReview)
+def invalidate_recommendations_on_review(sender, instance, created, **kwargs):
+    """
+    Drop the reviewer's cached recommendations.
+    """
+    if not created:
+        return
+    try:
+        recommendation_cache.invalidate_user(instance.user_id)
+    except Exception as e:
+        logger.error(f"Error invalidating recommendations for user {instance.user_id}: {str(e)}")
@@ -0,0 +1,171 @@
+"""
+Celery tasks for the offline recommendation scoring jobs.
+
+The periodic schedule lives in CELERY_BEAT_SCHEDULE. Every task recomputes
+its results from the source tables, so running one twice (retries, a
+duplicate beat tick) produces the same state. Product rescoring is split
+into chunk tasks that run in parallel and are joined with a chord.
+"""
+
+import logging
+from typing import Dict, Optional
+from celery import chord, shared_task
+from django.core.cache import cache
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from ai_models.background import acquire_task_lock, chunked, release_task_lock, task_lock
+from ai_models.interaction_analyzer import InteractionAnalyzer
+from products.models import Product
+from .models import UserBehavior
+
+logger = logging.getLogger(__name__)
+
+RESCORE_CURSOR_KEY = 'recommendations:rescore_cursor'
+RESCORE_LOCK = 'rescore_products'
+RESCORE_CHUNK_SIZE = 500
+
+
+def products_to_rescore(cursor: Optional[Dict] = None):
+    """
+    IDs of active products with behaviors or product changes past the given
+    cursor, or of all active products when cursor is None.
+
+    Behaviors are tracked by primary key rather than timestamp: they are
+    written behind by the event pipeline, so a row stamped before the last
+    run may be inserted after it, but it always gets a higher id.
+    """
+    products = Product.objects.filter(is_active=True)
+    if cursor is not None:
+        changed = set(
+            UserBehavior.objects.filter(id__gt=cursor['behavior_id'])
+            .values_list('product_id', flat=True).distinct()
+        )
+        since = parse_datetime(cursor['updated_at'])
+        changed.update(products.filter(updated_at__gte=since).values_list('id', flat=True))
+        products = products.filter(id__in=changed)
+    return list(products.order_by('id').values_list('id', flat=True))
+
+
+def current_rescore_cursor() -> Dict:
+    """Cursor marking everything written so far as seen."""
+    last_behavior = UserBehavior.objects.order_by('-id').values_list('id', flat=True).first()
+    return {'behavior_id': last_behavior or 0, 'updated_at': timezone.now().isoformat()}
+
+
+@shared_task
+def rescore_products(full: bool = False, chunk_size: int = RESCORE_CHUNK_SIZE):
+    """
+    Recompute ProductInteractionScore for products that changed since the
+    last completed run (all products on the first run or with full=True).
+    """
+    if not acquire_task_lock(RESCORE_LOCK):
+        logger.info("Product rescoring already running, skipping")
+        return 0
+
+    try:
+        # Taken before reading the changes, so rows written during the run
+        # are picked up next time
+        next_cursor = current_rescore_cursor()
+        cursor = None if full else cache.get(RESCORE_CURSOR_KEY)
+        if not isinstance(cursor, dict):
+            cursor = None
+        product_ids = products_to_rescore(cursor)
+
+        finish = finish_product_rescoring.s(next_cursor)
+        if not product_ids:
+            finish.delay([])
+            return 0
+
+        chord(
+            rescore_product_chunk.s(chunk) for chunk in chunked(product_ids, chunk_size)
+        )(finish.on_error(rescore_products_failed.s()))
+        return len(product_ids)
+
+    except Exception as e:
+        release_task_lock(RESCORE_LOCK)
+        logger.error(f"Error scheduling product rescoring: {str(e)}")
+        raise
+
+
+@shared_task
+def rescore_product_chunk(product_ids):
+    """
+    Recompute the interaction scores of one chunk of products. Errors
+    propagate so the chord fails and the cursor is not advanced.
+    """
+    InteractionAnalyzer().update_product_scores(
+        product_ids=product_ids, batch_size=len(product_ids), raise_errors=True
+    )
+    return len(product_ids)
+
+
+@shared_task
+def finish_product_rescoring(chunk_counts, cursor: Dict):
+    """
+    Chord callback: advance the incremental cursor to the position taken
+    when the run started.
+    """
+    cache.set(RESCORE_CURSOR_KEY, cursor, None)
+    release_task_lock(RESCORE_LOCK)
+    total = sum(chunk_counts)
+    logger.info(f"Rescored {total} products in {len(chunk_counts)} chunks")
+    return total
+
+
+@shared_task
+def rescore_products_failed(request, exc, traceback):
+    """
+    Chord error callback: release the lock without advancing the cursor, so
+    the next run retries the same products.
+    """
+    release_task_lock(RESCORE_LOCK)
+    logger.error(f"Product rescoring failed: {str(exc)}")
+
+
+@shared_task
+def calculate_user_similarities(user_ids=None):
+    """
+    Recompute user similarities. The similarity matrix is computed in row
+    chunks inside one task because every chunk needs the full matrix.
+    """
+    with task_lock('calculate_user_similarities', timeout=6 * 3600) as acquired:
+        if not acquired:
+            logger.info("User similarity calculation already running, skipping")
+            return False
+        InteractionAnalyzer().calculate_user_similarities(user_ids=user_ids)
+        return True
+
+
+@shared_task
+def refresh_trending_products(rebuild_buckets: bool = False):
+    """Materialize the trending rankings; returns the number of entries."""
+    from .trending import trending_service
+
+    if rebuild_buckets:
+        trending_service.rebuild_buckets()
+    # refresh() takes the cross-process lock itself
+    return trending_service.refresh()
+
+
+@shared_task
+def rebuild_similar_products():
+    """Rebuild and publish the similar-product index."""
+    from ai_models.similarity_index import similar_product_service
+
+    with task_lock('rebuild_similar_products', timeout=6 * 3600) as acquired:
+        if not acquired:
+            return 0
+        return len(similar_product_service.rebuild())
+
+
+@shared_task
+def train_matrix_factorization(factors: int = 32, iterations: int = 15):
+    """Train and publish the matrix factorization model."""
+    from ai_models.matrix_factorization import matrix_factorization_service
+
+    with task_lock('train_matrix_factorization', timeout=6 * 3600) as acquired:
+        if not acquired:
+            return 0
+        model = matrix_factorization_service.train(factors=factors, iterations=iterations)
+        return len(model.user_ids) if model is not None else 0
@@ -0,0 +1,430 @@
+"""
+Tests for recommendations app.
+"""
+
+import uuid
+from datetime import timedelta
+from unittest import mock
+from django.core.cache import cache
+from django.contrib.auth import get_user_model
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from ai_models.background import acquire_task_lock, release_task_lock
+from ai_models.event_pipeline import BehaviorEventPipeline, event_pipeline
+from products.models import Category, Brand, Store, Product
+from .cache import RecommendationCache
+from .models import (
+    RecommendationSession, RecommendationResult, ProductActivityBucket, ProductInteractionScore,
+    TrendingProduct, UserBehavior
+)
+from .services import SmartRecommendationService, find_recommendation_result
+from .tasks import RESCORE_CURSOR_KEY, rescore_product_chunk, rescore_products, rescore_products_failed
+from .trending import TrendingService, bucket_start
+
+User = get_user_model()
+
+LOCMEM_CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'recommendations-tests',
+    }
+}
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class RecommendationCacheTest(TestCase):
+    """
+    Test cases for the recommendation response cache.
+    """
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(
+            username='testuser',
+            email='test@example.com',
+            password='testpass123'
+        )
+        self.cache = RecommendationCache()
+        self.calls = 0
+
+    def _compute(self):
+        self.calls += 1
+        return {'recommendations': [self.calls]}
+
+    def test_general_lists_are_cached_per_category_and_limit(self):
+        """Test that repeated requests reuse the cached list."""
+        key = self.cache.general_key(None, 10)
+        first = self.cache.get_or_compute(key, self._compute, 60)
+        second = self.cache.get_or_compute(key, self._compute, 60)
+        self.assertEqual(first, second)
+        self.assertEqual(self.calls, 1)
+
+        self.cache.get_or_compute(self.cache.general_key(3, 10), self._compute, 60)
+        self.assertEqual(self.calls, 2)
+
+    def test_user_lists_are_invalidated_by_behavior(self):
+        """Test that liking a product recomputes the user's recommendations."""
+        pipeline = BehaviorEventPipeline()
+
+        def compute():
+            return self.cache.get_or_compute(
+                self.cache.user_key(self.user.id, None, 10), self._compute, 60
+            )
+
+        compute()
+        pipeline.log_behavior('view', user=self.user)
+        compute()
+        self.assertEqual(self.calls, 1)
+
+        pipeline.log_behavior('like', user=self.user)
+        self.assertEqual(compute(), {'recommendations': [2]})
+
+    def test_single_flight_serves_stale_value_while_recomputing(self):
+        """Test that only the lock holder recomputes an expiring entry."""
+        key = self.cache.general_key(None, 10)
+        self.cache.get_or_compute(key, self._compute, 60)
+        cache.add(f'{key}:lock', 1, 30)
+
+        with mock.patch.object(self.cache, '_should_recompute_early', return_value=True):
+            value = self.cache.get_or_compute(key, self._compute, 60)
+        self.assertEqual(value, {'recommendations': [1]})
+        self.assertEqual(self.calls, 1)
+
+    def test_early_expiry_probability_grows_near_expiry(self):
+        """Test that entries far from expiry are not recomputed early."""
+        entry = {'compute_time': 0.1, 'expires_at': 0}
+        with mock.patch('recommendations.cache.time.time', return_value=-3600):
+            self.assertFalse(self.cache._should_recompute_early(entry))
+        with mock.patch('recommendations.cache.time.time', return_value=0):
+            self.assertTrue(self.cache._should_recompute_early(entry))
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class RecommendationTrackingTest(TestCase):
+    """
+    Test cases for recommendation formatting and impression tracking.
+    """
+
+    def setUp(self):
+        cache.clear()
+        event_pipeline.clear()
+        self.addCleanup(event_pipeline.clear)
+        self.user = User.objects.create_user(
+            username='testuser',
+            email='test@example.com',
+            password='testpass123'
+        )
+        owner = User.objects.create_user(
+            username='owner',
+            email='owner@example.com',
+            password='testpass123',
+            role='store_owner'
+        )
+        store = Store.objects.create(
+            owner=owner,
+            name='Test Store',
+            email='store@example.com',
+            phone='1234567890',
+            address='Test Address'
+        )
+        category = Category.objects.create(name='Electronics')
+        brand = Brand.objects.create(name='Test Brand')
+        self.products = [
+            Product.objects.create(
+                store=store,
+                category=category,
+                brand=brand,
+                name=f'Product {i}',
+                description='Test product',
+                sku=f'SKU-{i}',
+                price=100 + i
+            )
+            for i in range(5)
+        ]
+        self.service = SmartRecommendationService()
+        self.recommendations = [
+            {'product_id': product.id, 'score': 0.9, 'algorithm': 'test'}
+            for product in self.products
+        ]
+
+    def tearDown(self):
+        event_pipeline.flush()
+
+    def test_formatting_batches_card_queries(self):
+        """Test that formatting loads product cards in one batch and caches them."""
+        with self.assertNumQueries(2):
+            formatted = self.service._format_recommendations(self.recommendations)
+        self.assertEqual([item['id'] for item in formatted], [product.id for product in self.products])
+        self.assertEqual(formatted[0]['category']['name'], 'Electronics')
+        self.assertEqual(formatted[2]['position'], 3)
+        self.assertFalse(RecommendationSession.objects.exists())
+
+        # Cards are served from the cache afterwards
+        with self.assertNumQueries(0):
+            self.service._format_recommendations(self.recommendations)
+
+    def test_session_and_results_are_written_in_batch(self):
+        """Test that a session and its results are written with the response."""
+        self.service._format_recommendations(self.recommendations)
+        session = self.service._create_recommendation_session(user=self.user, recommendation_type='personalized')
+        # Savepoint, session insert, one results insert, release
+        with self.assertNumQueries(4):
+            self.service._format_recommendations(self.recommendations + self.recommendations[:1], session=session)
+
+        saved = RecommendationSession.objects.get(id=session.id)
+        self.assertEqual(saved.user, self.user)
+        self.assertEqual(RecommendationResult.objects.filter(session=saved).count(), 5)
+
+    def test_interaction_updates_result(self):
+        """Test that feedback right after a response updates its result row."""
+        session = self.service._create_recommendation_session(recommendation_type='general')
+        self.service._format_recommendations(self.recommendations, session=session)
+
+        url = reverse('recommendations:track')
+        for action in ('click', 'purchase'):
+            data = {'session_id': str(session.id), 'product_id': self.products[1].id, 'action': action}
+            self.assertEqual(self.client.post(url, data).status_code, 200)
+        result = find_recommendation_result(session.id, self.products[1].id)
+        self.assertEqual(result.position, 2)
+        self.assertTrue(result.was_clicked)
+        self.assertTrue(result.was_purchased)
+
+        unknown = {'session_id': str(uuid.uuid4()), 'product_id': self.products[1].id, 'action': 'click'}
+        self.assertEqual(self.client.post(url, unknown).status_code, 404)
+
+    def test_cached_lists_are_tracked_per_request(self):
+        """Test that responses served from the cache get their own session."""
+        url = reverse('recommendations:general')
+        with mock.patch.object(
+            self.service.engine, 'get_general_recommendations', return_value=self.recommendations
+        ) as get_general:
+            first = self.client.get(url, {'limit': 5}).json()
+            second = self.client.get(url, {'limit': 5}).json()
+        get_general.assert_called_once()
+        self.assertEqual(first['recommendations'], second['recommendations'])
+        self.assertNotEqual(first['session_id'], second['session_id'])
+        for response in (first, second):
+            self.assertEqual(RecommendationResult.objects.filter(session_id=response['session_id']).count(), 5)
+
+    def test_saving_product_refreshes_card(self):
+        """Test that editing a product invalidates its cached card."""
+        self.service._format_recommendations(self.recommendations)
+        product = self.products[0]
+        product.name = 'Renamed'
+        product.save()
+
+        formatted = self.service._format_recommendations(self.recommendations[:1])
+        self.assertEqual(formatted[0]['name'], 'Renamed')
+
+
+class TrendingServiceTest(TestCase):
+    """
+    Test cases for hourly activity counters and the trending ranking.
+    """
+
+    def setUp(self):
+        event_pipeline.clear()
+        self.addCleanup(event_pipeline.clear)
+        self.user = User.objects.create_user(
+            username='testuser',
+            email='test@example.com',
+            password='testpass123'
+        )
+        owner = User.objects.create_user(
+            username='owner',
+            email='owner@example.com',
+            password='testpass123',
+            role='store_owner'
+        )
+        store = Store.objects.create(
+            owner=owner,
+            name='Test Store',
+            email='store@example.com',
+            phone='1234567890',
+            address='Test Address'
+        )
+        self.phones = Category.objects.create(name='Phones')
+        self.kitchen = Category.objects.create(name='Kitchen')
+        brand = Brand.objects.create(name='Test Brand')
+        self.phone, self.other_phone, self.kettle = [
+            Product.objects.create(
+                store=store,
+                category=category,
+                brand=brand,
+                name=name,
+                description=name,
+                sku=name.upper().replace(' ', '-'),
+                price=100
+            )
+            for name, category in [('Phone', self.phones), ('Other Phone', self.phones), ('Kettle', self.kitchen)]
+        ]
+        self.service = TrendingService()
+        self.pipeline = BehaviorEventPipeline()
+
+    def _log(self, product, behavior_type, count):
+        for _ in range(count):
+            self.pipeline.log_user_behavior(behavior_type, product, user=self.user)
+
+    def test_flushed_behaviors_increment_hourly_counters(self):
+        """Test that written behaviors are counted per product and hour."""
+        self._log(self.phone, 'view', 3)
+        self._log(self.phone, 'search', 2)
+        self.pipeline.flush()
+        self._log(self.phone, 'like', 1)
+        self.pipeline.flush()
+
+        bucket = ProductActivityBucket.objects.get(product=self.phone)
+        self.assertEqual(bucket.interactions, 4)
+        self.assertEqual(bucket.bucket_start, bucket_start(timezone.now()))
+
+    def test_refresh_materializes_overall_and_category_rankings(self):
+        """Test decayed ranking overall and within each category."""
+        now = timezone.now()
+        self.service.record_behaviors(
+            [(self.phone.id, 'view', now - timedelta(hours=48))] * 8 +
+            [(self.other_phone.id, 'view', now)] * 3 +
+            [(self.kettle.id, 'purchase', now)] * 1
+        )
+        self.service.refresh(now)
+
+        overall = list(TrendingProduct.objects.filter(category=None).values_list('product_id', flat=True))
+        self.assertEqual(overall, [self.other_phone.id, self.phone.id, self.kettle.id])
+        phones = list(TrendingProduct.objects.filter(category=self.phones).values_list('product_id', 'rank'))
+        self.assertEqual(phones, [(self.other_phone.id, 1), (self.phone.id, 2)])
+
+        # Two half-lives old: 8 views count as about 2
+        entry = TrendingProduct.objects.get(category=None, product=self.phone)
+        self.assertAlmostEqual(entry.recent_interactions, 2.0, delta=0.1)
+
+    def test_reads_are_one_query_and_independent_of_behaviors(self):
+        """Test that trending reads only touch the materialized table."""
+        self.service.record_behaviors([(self.kettle.id, 'like', timezone.now())])
+        self.service.refresh()
+        with self.assertNumQueries(1):
+            trending = self.service.get_trending(limit=5, category_id=self.kitchen.id)
+        self.assertEqual([product_id for product_id, _ in trending], [self.kettle.id])
+
+    def test_refresh_is_skipped_while_another_process_refreshes(self):
+        """Test that a refresh does not rewrite the table under another one's lock."""
+        self.service.record_behaviors([(self.kettle.id, 'like', timezone.now())])
+        acquire_task_lock('refresh_trending_products')
+        self.addCleanup(release_task_lock, 'refresh_trending_products')
+        self.assertEqual(self.service.refresh(), 0)
+        self.assertFalse(TrendingProduct.objects.exists())
+
+    def test_cold_worker_refreshes_in_background(self):
+        """Test that an empty ranking is served while it is built off the request."""
+        self.service.record_behaviors([(self.kettle.id, 'like', timezone.now())])
+        with mock.patch('ai_models.background.run_in_background') as run:
+            self.assertEqual(self.service.get_trending(limit=5), [])
+        run.assert_called_once()
+        self.assertFalse(TrendingProduct.objects.exists())
+
+    def test_rebuild_buckets_matches_incremental_counts(self):
+        """Test that recounting from user behaviors gives the same buckets."""
+        self._log(self.phone, 'view', 2)
+        self._log(self.kettle, 'cart_add', 1)
+        self.pipeline.flush()
+        incremental = set(ProductActivityBucket.objects.values_list('product_id', 'bucket_start', 'interactions'))
+
+        self.assertEqual(self.service.rebuild_buckets(), 2)
+        rebuilt = set(ProductActivityBucket.objects.values_list('product_id', 'bucket_start', 'interactions'))
+        self.assertEqual(rebuilt, incremental)
+        self.assertEqual(UserBehavior.objects.count(), 3)
+
+
+@override_settings(CACHES=LOCMEM_CACHES, CELERY_TASK_ALWAYS_EAGER=True, CELERY_TASK_EAGER_PROPAGATES=True)
+class OfflineTasksTest(TestCase):
+    """
+    Test cases for the offline scoring Celery tasks, run eagerly.
+    """
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(
+            username='testuser',
+            email='test@example.com',
+            password='testpass123'
+        )
+        owner = User.objects.create_user(
+            username='owner',
+            email='owner@example.com',
+            password='testpass123',
+            role='store_owner'
+        )
+        store = Store.objects.create(
+            owner=owner,
+            name='Test Store',
+            email='store@example.com',
+            phone='1234567890',
+            address='Test Address'
+        )
+        category = Category.objects.create(name='Test Category')
+        brand = Brand.objects.create(name='Test Brand')
+        self.products = [
+            Product.objects.create(
+                store=store,
+                category=category,
+                brand=brand,
+                name=f'Product {i}',
+                description='Test description',
+                sku=f'TASK{i:03d}',
+                price=100
+            )
+            for i in range(3)
+        ]
+
+    def test_rescore_products_is_chunked_and_incremental(self):
+        """Test that rescoring runs in chunks and then only picks up changed products."""
+        self.assertEqual(rescore_products.delay(chunk_size=2).get(), 3)
+        self.assertEqual(ProductInteractionScore.objects.count(), 3)
+        self.assertIsNotNone(cache.get(RESCORE_CURSOR_KEY))
+
+        UserBehavior.objects.create(user=self.user, product=self.products[1], behavior_type='like')
+        self.assertEqual(rescore_products.delay(chunk_size=2).get(), 1)
+        self.assertEqual(ProductInteractionScore.objects.get(product=self.products[1]).total_likes, 1)
+
+        # Nothing changed: the run still completes and releases its lock
+        self.assertEqual(rescore_products.delay().get(), 0)
+        self.assertEqual(rescore_products.delay(full=True).get(), 3)
+
+    def test_behaviors_written_late_are_rescored(self):
+        """Test that a behavior flushed after a run is picked up despite its old timestamp."""
+        rescore_products.delay().get()
+        UserBehavior.objects.create(
+            user=self.user, product=self.products[2], behavior_type='like',
+            timestamp=timezone.now() - timedelta(hours=1)
+        )
+        self.assertEqual(rescore_products.delay().get(), 1)
+        self.assertEqual(ProductInteractionScore.objects.get(product=self.products[2]).total_likes, 1)
+
+    def test_failed_run_releases_lock(self):
+        """Test that the chord error callback releases the lock and keeps the cursor."""
+        with mock.patch('recommendations.tasks.chord') as rescore_chord:
+            rescore_products.delay()
+        body = rescore_chord.return_value.call_args.args[0]
+        self.assertEqual(
+            [errback['task'] for errback in body.options['link_error']],
+            ['recommendations.tasks.rescore_products_failed']
+        )
+        self.assertFalse(acquire_task_lock('rescore_products'))
+
+        rescore_products_failed(None, RuntimeError('chunk failed'), None)
+        self.assertIsNone(cache.get(RESCORE_CURSOR_KEY))
+        self.assertTrue(acquire_task_lock('rescore_products'))
+
+    def test_failed_chunk_fails_the_task(self):
+        """Test that a scoring error is raised from the chunk task instead of being logged."""
+        with mock.patch(
+            'ai_models.interaction_analyzer.InteractionAnalyzer._update_score_batch',
+            side_effect=RuntimeError('scoring failed')
+        ):
+            with self.assertRaises(RuntimeError):
+                rescore_product_chunk([product.id for product in self.products])
+
+    def test_overlapping_run_is_skipped(self):
+        """Test that a run is skipped while another one holds the lock."""
+        acquire_task_lock('rescore_products')
+        self.assertEqual(rescore_products.delay().get(), 0)
+        self.assertFalse(ProductInteractionScore.objects.exists())
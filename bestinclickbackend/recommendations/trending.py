@@ -0,0 +1,214 @@
+"""
+Trending products from hourly activity counters.
+
+Every batch of behavior events written by the event pipeline increments
+per-product hourly counters (ProductActivityBucket), so the trending
+computation never scans user_behaviors. A periodic refresh decays the
+counters of the last week exponentially, ranks products overall and within
+each category, and materializes the top N into TrendingProduct under a
+cross-process lock. Reading the trending list is a single indexed query on
+that table; a worker finding it empty serves nothing until a background
+refresh has filled it.
+"""
+
+import time
+import logging
+from collections import Counter
+from datetime import datetime, timedelta, timezone as dt_timezone
+from typing import Iterable, List, Optional, Tuple
+import pandas as pd
+from django.db import transaction
+from django.db.models import Case, Count, F, IntegerField, Value, When
+from django.db.models.functions import TruncHour
+from django.utils import timezone
+
+from .models import ProductActivityBucket, TrendingProduct, UserBehavior
+
+logger = logging.getLogger(__name__)
+
+REFRESH_LOCK = 'refresh_trending_products'
+
+
+def bucket_start(timestamp: datetime) -> datetime:
+    """Start of the hourly (UTC) bucket containing timestamp."""
+    if timezone.is_aware(timestamp):
+        timestamp = timestamp.astimezone(dt_timezone.utc)
+    return timestamp.replace(minute=0, second=0, microsecond=0)
+
+
+class TrendingService:
+    """
+    Maintains activity counters and the materialized trending ranking.
+    """
+
+    counted_behaviors = {'view', 'like', 'cart_add', 'purchase'}
+    window_hours = 7 * 24
+    half_life_hours = 24.0
+    top_n = 100
+    refresh_interval = 900  # seconds
+    interactions_for_full_score = 50.0
+
+    def __init__(self):
+        self._refreshing = False
+        self._last_refresh = None
+
+    # Counters
+
+    def record_behaviors(self, behaviors: Iterable[Tuple[int, str, datetime]]) -> int:
+        """
+        Add (product_id, behavior_type, timestamp) events to the hourly
+        counters. Returns the number of buckets touched.
+        """
+        counts = Counter(
+            (product_id, bucket_start(timestamp))
+            for product_id, behavior_type, timestamp in behaviors
+            if behavior_type in self.counted_behaviors
+        )
+        if not counts:
+            return 0
+
+        with transaction.atomic():
+            ProductActivityBucket.objects.bulk_create(
+                [ProductActivityBucket(product_id=product_id, bucket_start=start) for product_id, start in counts],
+                ignore_conflicts=True
+            )
+            delta = Case(
+                *[
+                    When(product_id=product_id, bucket_start=start, then=Value(count))
+                    for (product_id, start), count in counts.items()
+                ],
+                default=Value(0),
+                output_field=IntegerField()
+            )
+            ProductActivityBucket.objects.filter(
+                product_id__in={product_id for product_id, _ in counts},
+                bucket_start__in={start for _, start in counts}
+            ).update(interactions=F('interactions') + delta)
+        return len(counts)
+
+    def rebuild_buckets(self, now: Optional[datetime] = None) -> int:
+        """
+        Recount the buckets of the current window from user_behaviors, e.g.
+        after deploying or when counters have drifted.
+        """
+        since = self._window_start(now or timezone.now())
+        rows = (
+            UserBehavior.objects.filter(timestamp__gte=since, behavior_type__in=self.counted_behaviors)
+            .annotate(bucket=TruncHour('timestamp', tzinfo=dt_timezone.utc))
+            .values('product_id', 'bucket')
+            .annotate(interactions=Count('id'))
+        )
+        buckets = [
+            ProductActivityBucket(
+                product_id=row['product_id'],
+                bucket_start=row['bucket'],
+                interactions=row['interactions']
+            )
+            for row in rows
+        ]
+        with transaction.atomic():
+            ProductActivityBucket.objects.filter(bucket_start__gte=since).delete()
+            ProductActivityBucket.objects.bulk_create(buckets, batch_size=1000)
+        return len(buckets)
+
+    def _window_start(self, now: datetime) -> datetime:
+        return bucket_start(now) - timedelta(hours=self.window_hours)
+
+    # Ranking
+
+    def compute_scores(self, now: Optional[datetime] = None) -> pd.DataFrame:
+        """
+        Decayed interactions and trending score per active product, ordered
+        by decayed interactions and then rating.
+        """
+        now = now or timezone.now()
+        columns = ['product_id', 'category_id', 'average_rating', 'bucket_start', 'interactions']
+        rows = ProductActivityBucket.objects.filter(
+            bucket_start__gte=self._window_start(now),
+            product__is_active=True
+        ).values_list('product_id', 'product__category_id', 'product__average_rating', 'bucket_start', 'interactions')
+        buckets = pd.DataFrame.from_records(list(rows), columns=columns)
+        if buckets.empty:
+            return pd.DataFrame(columns=['product_id', 'category_id', 'recent_interactions', 'score'])
+
+        age_hours = (pd.Timestamp(now) - pd.to_datetime(buckets['bucket_start'], utc=True)).dt.total_seconds() / 3600.0
+        buckets['recent_interactions'] = buckets['interactions'] * 0.5 ** (age_hours.clip(lower=0) / self.half_life_hours)
+        products = buckets.groupby(
+            ['product_id', 'category_id', 'average_rating'], as_index=False
+        )['recent_interactions'].sum()
+
+        interaction_score = (products['recent_interactions'] / self.interactions_for_full_score).clip(upper=1.0)
+        rating_score = (products['average_rating'] / 5.0).where(products['average_rating'] > 0, 0.5)
+        products['score'] = interaction_score * 0.7 + rating_score * 0.3
+        return products.sort_values(
+            ['recent_interactions', 'average_rating', 'product_id'],
+            ascending=[False, False, True]
+        ).reset_index(drop=True)
+
+    def refresh(self, now: Optional[datetime] = None) -> int:
+        """
+        Recompute and materialize the trending rankings and drop expired
+        buckets. Returns the number of ranking rows written, or 0 when
+        another process is already refreshing.
+        """
+        from ai_models.background import task_lock
+
+        now = now or timezone.now()
+        with task_lock(REFRESH_LOCK, timeout=900) as acquired:
+            try:
+                if not acquired:
+                    logger.info("Trending refresh already running, skipping")
+                    return 0
+                products = self.compute_scores(now)
+                overall = products.head(self.top_n).assign(category_id=None)
+                per_category = products.groupby('category_id', sort=False).head(self.top_n)
+                entries = [
+                    TrendingProduct(
+                        category_id=None if pd.isna(row.category_id) else int(row.category_id),
+                        product_id=int(row.product_id),
+                        rank=int(rank),
+                        score=float(row.score),
+                        recent_interactions=float(row.recent_interactions),
+                        computed_at=now
+                    )
+                    for ranking in (overall, per_category)
+                    for row, rank in zip(
+                        ranking.itertuples(index=False),
+                        ranking.groupby('category_id', sort=False, dropna=False).cumcount() + 1
+                    )
+                ]
+                with transaction.atomic():
+                    TrendingProduct.objects.all().delete()
+                    TrendingProduct.objects.bulk_create(entries, batch_size=1000)
+                    ProductActivityBucket.objects.filter(bucket_start__lt=self._window_start(now)).delete()
+                return len(entries)
+            finally:
+                self._last_refresh = time.monotonic()
+                self._refreshing = False
+
+    def _refresh_in_background(self):
+        if self._refreshing:
+            return
+        from ai_models.background import run_in_background
+
+        self._refreshing = True
+        run_in_background(self.refresh, name='trending-refresh')
+
+    def get_trending(self, limit: int = 20, category_id: Optional[int] = None) -> List[Tuple[int, float]]:
+        """
+        Top (product_id, score) pairs overall or within a category.
+        """
+        entries = list(
+            TrendingProduct.objects.filter(category_id=category_id)
+            .values_list('product_id', 'score', 'computed_at')[:limit]
+        )
+        if entries:
+            if (timezone.now() - entries[0][2]).total_seconds() >= self.refresh_interval:
+                self._refresh_in_background()
+        elif self._last_refresh is None or time.monotonic() - self._last_refresh >= self.refresh_interval:
+            # Nothing materialized yet: serve an empty list while it is built
+            self._refresh_in_background()
+        return [(product_id, score) for product_id, score, _ in entries]
+
+
+trending_service = TrendingService()
@@ -7,14 +7,14 @@ from rest_framework.decorators import api_view, permission_classes
 from rest_framework.permissions import AllowAny, IsAuthenticated
 from rest_framework.response import Response
 from django.utils import timezone
-from django.core.cache import cache
-from .services import recommendation_service
+from .services import recommendation_service, find_recommendation_result
+from .cache import recommendation_cache
 from .serializers import (
     RecommendationRequestSerializer,
     RecommendationResponseSerializer,
     RecommendationFeedbackSerializer
 )
-from .models import RecommendationSession, RecommendationResult
+from .models import RecommendationSession
 import logging
 
 logger = logging.getLogger(__name__)
@@ -32,25 +32,30 @@ def general_recommendations(request):
         if not serializer.is_valid():
             return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
         
-        # Check cache first (disabled for now)
-        # cache_key = f"general_recommendations_{serializer.validated_data.get('limit', 10)}"
-        # cached_result = cache.get(cache_key)
-        # 
-        # if cached_result:
-        #     return Response(cached_result, status=status.HTTP_200_OK)
+        session_id = serializer.validated_data.get('session_id')
+        limit = serializer.validated_data.get('limit', 10)
+        category_id = serializer.validated_data.get('category_id')
         
-        # Generate general recommendations
-        result = recommendation_service.get_personalized_recommendations(
-            user=None,
-            session_id=serializer.validated_data.get('session_id'),
-            limit=serializer.validated_data.get('limit', 10),
-            category_id=serializer.validated_data.get('category_id'),
-            request=request
-        )
+        def compute():
+            return recommendation_service.build_personalized_recommendations(
+                user=None,
+                session_id=session_id,
+                limit=limit,
+                category_id=category_id
+            )
         
-        # Cache for 15 minutes (disabled for now)
-        # cache.set(cache_key, result, 900)
+        if session_id:
+            # Session-based lists are specific to this visitor
+            result = compute()
+        else:
+            result = recommendation_cache.get_or_compute(
+                recommendation_cache.general_key(category_id, limit),
+                compute,
+                recommendation_cache.general_timeout
+            )
         
+        # Only the list is cached; every response is tracked in its own session
+        result = recommendation_service.track_recommendations(result, session_id=session_id)
         return Response(result, status=status.HTTP_200_OK)
         
     except Exception as e:
@@ -74,27 +79,38 @@ def personalized_recommendations(request):
         if not serializer.is_valid():
             return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
-        # Check cache for this user (or anonymous) - disabled for now
-        # user_id = request.user.id if request.user.is_authenticated else 'anonymous'
-        # cache_key = f"personalized_recommendations_{user_id}_{serializer.validated_data.get('limit', 10)}"
-        # cached_result = cache.get(cache_key)
-        # if cached_result:
-        #     return Response(cached_result, status=status.HTTP_200_OK)
-
-        # Generate personalized recommendations
-        result = recommendation_service.get_personalized_recommendations(
-            user=request.user if request.user.is_authenticated else None,
-            session_id=serializer.validated_data.get('session_id'),
-            limit=serializer.validated_data.get('limit', 10),
-            category_id=serializer.validated_data.get('category_id'),
-            request=request
-        )
-        recommendations = result.get('recommendations', [])
-
-        # Cache for 5 minutes (shorter for personalized) - disabled for now
-        # cache.set(cache_key, result, 300)
+        user = request.user if request.user.is_authenticated else None
+        session_id = serializer.validated_data.get('session_id')
+        limit = serializer.validated_data.get('limit', 10)
+        category_id = serializer.validated_data.get('category_id')
+        algorithm = serializer.validated_data.get('algorithm')
+        
+        def compute():
+            return recommendation_service.build_personalized_recommendations(
+                user=user,
+                session_id=session_id,
+                limit=limit,
+                category_id=category_id,
+                algorithm=algorithm
+            )
         
-        # Return the complete result from service
+        if user:
+            result = recommendation_cache.get_or_compute(
+                recommendation_cache.user_key(user.id, category_id, limit, algorithm),
+                compute,
+                recommendation_cache.personalized_timeout
+            )
+        elif session_id:
+            result = compute()
+        else:
+            result = recommendation_cache.get_or_compute(
+                recommendation_cache.general_key(category_id, limit),
+                compute,
+                recommendation_cache.general_timeout
+            )
+        
+        # Only the list is cached; every response is tracked in its own session
+        result = recommendation_service.track_recommendations(result, user=user, session_id=session_id)
         return Response(result, status=status.HTTP_200_OK)
 
     except Exception as e:
@@ -150,8 +166,14 @@ def trending_products(request):
     """
     try:
         limit = int(request.GET.get('limit', 20))
+        category_id = request.GET.get('category_id')
+        category_id = int(category_id) if category_id else None
         
-        result = recommendation_service.get_trending_products(limit=limit)
+        result = recommendation_cache.get_or_compute(
+            recommendation_cache.trending_key(limit, category_id),
+            lambda: recommendation_service.get_trending_products(limit=limit, category_id=category_id),
+            recommendation_cache.trending_timeout
+        )
         
         return Response(result, status=status.HTTP_200_OK)
         
@@ -220,19 +242,18 @@ def track_recommendation_interaction(request):
             return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
         
         # Find the recommendation result
-        try:
-            result = RecommendationResult.objects.get(
-                session_id=serializer.validated_data['session_id'],
-                product_id=serializer.validated_data['product_id']
-            )
-        except RecommendationResult.DoesNotExist:
+        action = serializer.validated_data['action']
+        result = find_recommendation_result(
+            serializer.validated_data['session_id'],
+            serializer.validated_data['product_id']
+        )
+        if result is None:
             return Response(
                 {'error': 'Recommendation not found'},
                 status=status.HTTP_404_NOT_FOUND
             )
         
         # Update interaction tracking
-        action = serializer.validated_data['action']
         timestamp = serializer.validated_data.get('timestamp', timezone.now())
         
         if action == 'click':
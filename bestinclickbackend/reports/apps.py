@@ -9,3 +9,6 @@ class ReportsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'reports'
     verbose_name = 'Reports'
+
+    def ready(self):
+        from . import signals  # noqa: F401
@@ -0,0 +1,289 @@
+"""
+Streaming exports of generated reports.
+
+A report is exported as a sequence of row sets: a 'report' row with the
+report metadata, summaries and scalar figures, then one row set per table
+in raw_data (lists of records, and mappings such as category_performance
+turned into one row per key). Every writer is a generator that yields
+encoded chunks a batch of rows at a time, so StreamingHttpResponse sends
+the file without ever building it in memory, and gzip is applied to the
+stream incrementally.
+
+CSV, JSON and JSON Lines hold every row set. Parquet and Arrow are
+columnar, one table per file: the row set is chosen with row_set (the
+largest one by default). pyarrow is only needed for those two formats.
+"""
+
+import io
+import csv
+import json
+import zlib
+import logging
+from itertools import islice
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+ROWS_PER_CHUNK = 500
+ROWS_PER_BATCH = 10000  # Parquet row group / Arrow record batch size
+
+EXPORT_FORMATS = {
+    # format: (content type, file extension)
+    'csv': ('text/csv', 'csv'),
+    'json': ('application/json', 'json'),
+    'jsonl': ('application/x-ndjson', 'jsonl'),
+    'parquet': ('application/vnd.apache.parquet', 'parquet'),
+    'arrow': ('application/vnd.apache.arrow.stream', 'arrows'),
+}
+COLUMNAR_FORMATS = {'parquet', 'arrow'}
+
+
+class RowSet:
+    """
+    A named table of flat rows with the union of their columns.
+    """
+
+    def __init__(self, name: str, rows: List[Dict]):
+        self.name = name
+        self.rows = rows
+        columns = {}
+        for row in rows:
+            columns.update(dict.fromkeys(row))
+        self.columns = list(columns)
+
+    def __len__(self):
+        return len(self.rows)
+
+    def __iter__(self) -> Iterator[Dict]:
+        for row in self.rows:
+            yield {column: _cell(row.get(column)) for column in self.columns}
+
+
+def _cell(value):
+    """Nested values are exported as JSON text."""
+    if isinstance(value, (dict, list)):
+        return json.dumps(value, ensure_ascii=False, default=str)
+    return value
+
+
+def _batched(items: Iterable, size: int) -> Iterator[List]:
+    iterator = iter(items)
+    while True:
+        batch = list(islice(iterator, size))
+        if not batch:
+            return
+        yield batch
+
+
+def report_row_sets(report) -> List[RowSet]:
+    """
+    Split a report into row sets; the first is the single 'report' row.
+    """
+    summary = {
+        'report_id': str(report.id),
+        'report_type': report.get_report_type_display(),
+        'store': report.store.name if report.store_id else None,
+        'date_from': report.date_from.isoformat(),
+        'date_to': report.date_to.isoformat(),
+        'generated_at': report.generated_at.strftime('%Y-%m-%d %H:%M'),
+    }
+    tables = []
+    for key, value in (report.raw_data or {}).items():
+        if isinstance(value, list):
+            tables.append(RowSet(key, [item if isinstance(item, dict) else {'value': item} for item in value]))
+        elif isinstance(value, dict) and value and all(isinstance(item, dict) for item in value.values()):
+            tables.append(RowSet(key, [{'key': item_key, **item} for item_key, item in value.items()]))
+        elif isinstance(value, dict):
+            tables.append(RowSet(key, [value]))
+        else:
+            summary[key] = value
+    summary['summary'] = report.ai_summary_text
+    summary['detailed_report'] = report.detailed_report_text
+    return [RowSet('report', [summary])] + tables
+
+
+# Writers
+
+def csv_chunks(row_sets: List[RowSet]) -> Iterator[bytes]:
+    """One CSV section per row set: its name, a header row, then the rows."""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+
+    def drain() -> bytes:
+        data = buffer.getvalue().encode('utf-8')
+        buffer.seek(0)
+        buffer.truncate()
+        return data
+
+    for index, row_set in enumerate(row_sets):
+        if index:
+            writer.writerow([])
+        writer.writerow([row_set.name])
+        writer.writerow(row_set.columns)
+        for batch in _batched(row_set, ROWS_PER_CHUNK):
+            writer.writerows([row[column] for column in row_set.columns] for row in batch)
+            yield drain()
+    yield drain()
+
+
+def json_chunks(row_sets: List[RowSet]) -> Iterator[bytes]:
+    """A single JSON document: {"report": {...}, "row_sets": {name: [rows]}}."""
+    report, tables = row_sets[0], row_sets[1:]
+    yield ('{"report": ' + _dumps(report.rows[0]) + ', "row_sets": {').encode('utf-8')
+    for index, row_set in enumerate(tables):
+        prefix = ', ' if index else ''
+        yield f'{prefix}{_dumps(row_set.name)}: ['.encode('utf-8')
+        for batch_index, batch in enumerate(_batched(row_set, ROWS_PER_CHUNK)):
+            separator = ', ' if batch_index else ''
+            yield (separator + ', '.join(_dumps(row) for row in batch)).encode('utf-8')
+        yield b']'
+    yield b'}}'
+
+
+def jsonl_chunks(row_sets: List[RowSet]) -> Iterator[bytes]:
+    """One JSON object per line, tagged with its row set."""
+    for row_set in row_sets:
+        for batch in _batched(row_set, ROWS_PER_CHUNK):
+            yield ''.join(_dumps({'row_set': row_set.name, **row}) + '\n' for row in batch).encode('utf-8')
+
+
+def _dumps(value) -> str:
+    return json.dumps(value, ensure_ascii=False, default=str)
+
+
+class _ChunkSink(io.RawIOBase):
+    """Write-only file whose contents are drained after every batch."""
+
+    def __init__(self):
+        self._chunks = []
+        self._position = 0
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        data = bytes(data)
+        self._chunks.append(data)
+        self._position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self._position
+
+    def drain(self) -> bytes:
+        data = b''.join(self._chunks)
+        self._chunks = []
+        return data
+
+
+def _require_pyarrow():
+    try:
+        import pyarrow
+        import pyarrow.parquet  # noqa: F401
+    except ImportError:
+        raise ValueError("Parquet and Arrow exports require pyarrow. Install it with: pip install pyarrow")
+    return pyarrow
+
+
+def _arrow_type(pa, types: set):
+    if not types:
+        return pa.null()
+    if types == {bool}:
+        return pa.bool_()
+    if types == {int}:
+        return pa.int64()
+    if types <= {int, float}:
+        return pa.float64()
+    return pa.string()
+
+
+def _arrow_schema(pa, row_set: RowSet):
+    """
+    Schema covering every row of the row set, so a later batch cannot
+    conflict with types seen in an earlier one. Report data comes from
+    JSON: columns mixing ints and floats are widened to float, and columns
+    mixing any other types are exported as text.
+    """
+    types = {column: set() for column in row_set.columns}
+    for row in row_set:
+        for column, value in row.items():
+            if value is not None:
+                types[column].add(type(value))
+    return pa.schema([(column, _arrow_type(pa, column_types)) for column, column_types in types.items()])
+
+
+def columnar_chunks(row_set: RowSet, file_format: str) -> Iterator[bytes]:
+    """
+    Parquet file or Arrow IPC stream of one row set, written one row group
+    / record batch at a time under a schema derived from all rows.
+    """
+    pa = _require_pyarrow()
+    sink = _ChunkSink()
+    schema = _arrow_schema(pa, row_set)
+    text_columns = [field.name for field in schema if pa.types.is_string(field.type)]
+
+    if file_format == 'parquet':
+        writer = pa.parquet.ParquetWriter(sink, schema)
+    else:
+        writer = pa.ipc.new_stream(sink, schema)
+    for batch in _batched(row_set, ROWS_PER_BATCH):
+        for row in batch:
+            for column in text_columns:
+                if row[column] is not None and not isinstance(row[column], str):
+                    row[column] = _dumps(row[column])
+        writer.write_table(pa.Table.from_pylist(batch, schema=schema))
+        yield sink.drain()
+    writer.close()
+    yield sink.drain()
+
+
+def gzip_chunks(chunks: Iterable[bytes], level: int = 6) -> Iterator[bytes]:
+    """Compress a byte stream into gzip format as it is produced."""
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def export_report(report, file_format: str = 'csv', row_set: Optional[str] = None,
+                  compress: Optional[str] = None) -> Tuple[Iterator[bytes], str, str]:
+    """
+    Stream a report in the given format. Returns (chunks, content type,
+    file name). Raises ValueError for unknown formats, row sets or
+    compression, or if a columnar format is requested without pyarrow.
+    """
+    if file_format not in EXPORT_FORMATS:
+        raise ValueError(f"Unsupported format '{file_format}'. Use one of: {', '.join(EXPORT_FORMATS)}")
+    if compress not in (None, '', 'gzip'):
+        raise ValueError(f"Unsupported compression '{compress}'. Use gzip")
+
+    content_type, extension = EXPORT_FORMATS[file_format]
+    row_sets = report_row_sets(report)
+    filename = f'report_{report.id}'
+
+    if file_format in COLUMNAR_FORMATS:
+        _require_pyarrow()
+        by_name = {candidate.name: candidate for candidate in row_sets}
+        if row_set is None:
+            selected = max(row_sets, key=len)
+        elif row_set in by_name:
+            selected = by_name[row_set]
+        else:
+            raise ValueError(f"Unknown row set '{row_set}'. Available: {', '.join(by_name)}")
+        chunks = columnar_chunks(selected, file_format)
+        filename = f'{filename}_{selected.name}'
+    elif file_format == 'csv':
+        chunks = csv_chunks(row_sets)
+    elif file_format == 'json':
+        chunks = json_chunks(row_sets)
+    else:
+        chunks = jsonl_chunks(row_sets)
+
+    filename = f'{filename}.{extension}'
+    if compress == 'gzip':
+        chunks = gzip_chunks(chunks)
+        content_type = 'application/gzip'
+        filename = f'{filename}.gz'
+    return chunks, content_type, filename
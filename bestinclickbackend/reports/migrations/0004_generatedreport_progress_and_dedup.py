@@ -0,0 +1,46 @@
+# Generated by Django 5.0.14 on 2026-10-17 00:29
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+def mark_completed_reports(apps, schema_editor):
+    GeneratedReport = apps.get_model('reports', 'GeneratedReport')
+    GeneratedReport.objects.filter(status='completed').update(progress=100)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0006_product_search_index'),
+        ('reports', '0003_generatedreport_detailed_report_text'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='generatedreport',
+            name='data_version',
+            field=models.PositiveIntegerField(default=0, help_text='Store data version the report was generated under'),
+        ),
+        migrations.AddField(
+            model_name='generatedreport',
+            name='error_message',
+            field=models.TextField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='generatedreport',
+            name='parameters_hash',
+            field=models.CharField(blank=True, default='', help_text='Hash of type, store, date range and parameters for deduplicating requests', max_length=64),
+        ),
+        migrations.AddField(
+            model_name='generatedreport',
+            name='progress',
+            field=models.PositiveSmallIntegerField(default=0, help_text='Generation progress (0-100)'),
+        ),
+        migrations.AddIndex(
+            model_name='generatedreport',
+            index=models.Index(fields=['generated_by', 'parameters_hash'], name='generated_r_generat_dd63ec_idx'),
+        ),
+        migrations.RunPython(mark_completed_reports, migrations.RunPython.noop),
+    ]
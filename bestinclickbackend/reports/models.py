@@ -41,6 +41,16 @@ class GeneratedReport(models.Model):
         blank=True,
         help_text="Additional report parameters and filters"
     )
+    parameters_hash = models.CharField(
+        max_length=64,
+        blank=True,
+        default='',
+        help_text="Hash of type, store, date range and parameters for deduplicating requests"
+    )
+    data_version = models.PositiveIntegerField(
+        default=0,
+        help_text="Store data version the report was generated under"
+    )
     
     # Report content
     raw_data = models.JSONField(null=True, blank=True, help_text="Raw aggregated data used in the report")
@@ -75,6 +85,8 @@ class GeneratedReport(models.Model):
         ],
         default='pending'
     )
+    progress = models.PositiveSmallIntegerField(default=0, help_text="Generation progress (0-100)")
+    error_message = models.TextField(null=True, blank=True)
     
     # Timestamps
     generated_at = models.DateTimeField(auto_now_add=True)
@@ -90,6 +102,7 @@ class GeneratedReport(models.Model):
             models.Index(fields=['generated_by', 'generated_at']),
             models.Index(fields=['store', 'report_type']),
             models.Index(fields=['status']),
+            models.Index(fields=['generated_by', 'parameters_hash']),
         ]
     
     def __str__(self):
@@ -0,0 +1,152 @@
+"""
+Executor for scheduled reports.
+
+A Celery beat task calls ReportScheduler.run_due() every minute. Due
+schedules are claimed inside a transaction with
+select_for_update(skip_locked=True), so several scheduler instances split
+the due rows between them instead of waiting on each other; the claim also
+moves next_run forward with a compare-and-set update, which keeps backends
+without row locks (SQLite) from running a schedule twice. Each claimed
+schedule queues one report through ReportGenerationService.request_report,
+so generation fans out across the Celery workers. Stores that already have
+max_per_store reports in flight are left due and picked up on a later run;
+the stores of a batch are locked while their reports are counted and
+created, so concurrent schedulers cannot both fill the last slot.
+"""
+
+import logging
+from collections import Counter
+from datetime import timedelta
+from typing import Dict, List, Optional
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count
+from django.utils import timezone
+
+from products.models import Store
+from .models import GeneratedReport, ReportSchedule
+from .services import ReportGenerationService
+
+logger = logging.getLogger(__name__)
+
+FREQUENCY_INTERVALS = {
+    'daily': timedelta(days=1),
+    'weekly': timedelta(weeks=1),
+    'monthly': timedelta(days=30),
+    'quarterly': timedelta(days=90),
+}
+
+
+def next_run_after(next_run, frequency: str, now=None):
+    """
+    The first run time after now on the schedule's grid; missed runs are
+    skipped rather than replayed.
+    """
+    now = now or timezone.now()
+    interval = FREQUENCY_INTERVALS.get(frequency, FREQUENCY_INTERVALS['daily'])
+    if next_run > now:
+        return next_run
+    missed = (now - next_run) // interval
+    return next_run + (missed + 1) * interval
+
+
+class ReportScheduler:
+    """
+    Claims due report schedules and queues their reports.
+    """
+
+    batch_size = 100
+
+    def __init__(self, max_per_store: Optional[int] = None):
+        self.max_per_store = max_per_store or getattr(settings, 'REPORT_SCHEDULE_MAX_PER_STORE', 2)
+        self.report_service = ReportGenerationService()
+
+    def _in_flight(self, now, store_ids=None) -> Dict[Optional[int], int]:
+        """Pending or processing reports per store."""
+        rows = GeneratedReport.objects.filter(
+            status__in=['pending', 'processing'],
+            generated_at__gte=now - self.report_service.in_progress_timeout
+        )
+        if store_ids is not None:
+            rows = rows.filter(store_id__in=store_ids)
+        rows = rows.values('store_id').annotate(reports=Count('id'))
+        return Counter({row['store_id']: row['reports'] for row in rows})
+
+    def claim_due(self, now=None) -> List[ReportSchedule]:
+        """
+        Lock a batch of due schedules, advance their next_run, queue their
+        reports and return the schedules this call claimed.
+        """
+        now = now or timezone.now()
+        claimed = []
+        # Only a hint to keep full stores out of the batch; recounted below
+        full_stores = [
+            store_id for store_id, reports in self._in_flight(now).items()
+            if store_id is not None and reports >= self.max_per_store
+        ]
+        with transaction.atomic():
+            due = list(
+                ReportSchedule.objects.select_for_update(skip_locked=True)
+                .filter(is_active=True, next_run__lte=now)
+                .exclude(store_id__in=full_stores)
+                .order_by('next_run')[:self.batch_size]
+            )
+            # Serializes schedulers on the same stores until their reports
+            # are committed; locked in id order to avoid deadlocks
+            store_ids = {schedule.store_id for schedule in due if schedule.store_id is not None}
+            list(Store.objects.select_for_update().filter(id__in=store_ids).order_by('id').values_list('id', flat=True))
+            in_flight = self._in_flight(now, store_ids)
+            for schedule in due:
+                if in_flight[schedule.store_id] >= self.max_per_store:
+                    continue
+                next_run = next_run_after(schedule.next_run, schedule.frequency, now)
+                updated = ReportSchedule.objects.filter(
+                    pk=schedule.pk, next_run=schedule.next_run
+                ).update(next_run=next_run)
+                if not updated:
+                    # Another scheduler claimed it first
+                    continue
+                schedule.next_run = next_run
+                try:
+                    with transaction.atomic():
+                        self.run_schedule(schedule, now)
+                except Exception as e:
+                    logger.error(f"Error queueing scheduled report {schedule.id}: {str(e)}")
+                    continue
+                in_flight[schedule.store_id] += 1
+                claimed.append(schedule)
+        return claimed
+
+    def run_schedule(self, schedule: ReportSchedule, now=None) -> GeneratedReport:
+        """
+        Queue the report covering the schedule's last period. The report row
+        is created in the caller's transaction and handed to a worker once
+        it commits.
+        """
+        interval = FREQUENCY_INTERVALS.get(schedule.frequency, FREQUENCY_INTERVALS['daily'])
+        date_to = timezone.localdate(now or timezone.now())
+        report, _ = self.report_service.request_report(
+            user=schedule.user,
+            report_type=schedule.report_type,
+            store_id=schedule.store_id,
+            date_from=date_to - timedelta(days=interval.days),
+            date_to=date_to,
+            parameters=dict(schedule.parameters or {}, schedule_id=schedule.id)
+        )
+        return report
+
+    def run_due(self, now=None) -> int:
+        """Claim and queue all due schedules; returns the number queued."""
+        now = now or timezone.now()
+        queued = 0
+        while True:
+            schedules = self.claim_due(now)
+            queued += len(schedules)
+            if len(schedules) < self.batch_size:
+                break
+        if queued:
+            logger.info(f"Queued {queued} scheduled reports")
+        return queued
+
+
+report_scheduler = ReportScheduler()
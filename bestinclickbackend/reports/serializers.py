@@ -62,11 +62,11 @@ class GeneratedReportSerializer(serializers.ModelSerializer):
         fields = [
             'id', 'report_type', 'report_type_display', 'store', 'store_name',
             'date_from', 'date_to', 'parameters', 'ai_summary_text', 'detailed_report_text',
-            'visualizations', 'status', 'generated_at', 'completed_at',
+            'visualizations', 'status', 'progress', 'generated_at', 'completed_at',
             'download_count', 'last_accessed'
         ]
         read_only_fields = [
-            'id', 'generated_at', 'completed_at', 'download_count', 'last_accessed'
+            'id', 'status', 'progress', 'generated_at', 'completed_at', 'download_count', 'last_accessed'
         ]
 
 
@@ -2,25 +2,96 @@
 Report generation services with AI-powered insights.
 """
 
+import re
+import json
+import hashlib
 import logging
-from typing import Dict, Any, List
+from decimal import Decimal
+import pandas as pd
+from typing import Dict, Any, List, Optional, Tuple
 from datetime import datetime, timedelta
-from django.db.models import Count, Avg, Sum, Q
+from django.db import transaction
+from django.db.models import Count, Avg, Sum, Q, FilteredRelation
 from django.utils import timezone
 from django.contrib.auth import get_user_model
 from products.models import Store, Product, Category
 from ai_models.models import UserBehaviorLog
 from dashboard.models import StoreAnalytics
+from dashboard.leaderboard import store_leaderboard
+from products.data_versions import store_data_versions
+from .models import GeneratedReport
 
 User = get_user_model()
 logger = logging.getLogger(__name__)
 
+# Store metrics percentiles named in a competitive analysis
+MARKET_POSITION_PERCENTILES = {
+    'rating_percentile': 'Product ratings',
+    'product_count_percentile': 'Product variety',
+    'views_percentile': 'Customer reach',
+    'conversion_percentile': 'Cart conversion',
+    'stock_percentile': 'Stock availability',
+    'review_velocity_percentile': 'Review activity',
+}
+
+
+def convert_decimal(obj):
+    """Convert Decimal values in nested dicts/lists to floats for JSON fields."""
+    if isinstance(obj, dict):
+        return {k: convert_decimal(v) for k, v in obj.items()}
+    elif isinstance(obj, list):
+        return [convert_decimal(i) for i in obj]
+    elif isinstance(obj, Decimal):
+        return float(obj)
+    else:
+        return obj
+
+
+def report_parameters_hash(report_type: str, store_id: Optional[int], date_from, date_to,
+                           parameters: Optional[Dict] = None) -> str:
+    """Stable hash identifying identical report requests."""
+    payload = json.dumps(
+        {
+            'report_type': report_type,
+            'store_id': store_id,
+            'date_from': str(date_from),
+            'date_to': str(date_to),
+            'parameters': parameters or {},
+        },
+        sort_keys=True,
+        default=str
+    )
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+def format_summary(text: str, word_limit: int = 100) -> str:
+    """
+    Shorten the AI summary to about word_limit words and separate numbers
+    from adjacent words.
+    """
+    text = re.sub(r"(\d)([A-Za-zأ-ي])", r"\1 \2", text)
+    text = re.sub(r"([A-Za-zأ-ي])(\d)", r"\1 \2", text)
+    words = text.split()
+    if len(words) > word_limit:
+        text = ' '.join(words[:word_limit])
+        text += ' ...'
+    return text
+
 
 class ReportGenerationService:
     """
     Service for generating various types of reports with AI insights.
     """
     
+    # Completed reports are reused for identical requests while the store's
+    # data is unchanged, but never for longer than this
+    reuse_max_age = timedelta(hours=6)
+    # Pending/processing reports older than this are treated as lost
+    in_progress_timeout = timedelta(minutes=30)
+    
+    # Product analysis columns and the behavior action they count
+    product_actions = {'views': 'view', 'clicks': 'click', 'cart_adds': 'add_to_cart'}
+    
     def generate_report(self, report_type: str, user: User, store_id: int = None,
                        date_from: datetime = None, date_to: datetime = None,
                        parameters: Dict = None) -> Dict[str, Any]:
@@ -49,6 +120,332 @@ class ReportGenerationService:
             logger.error(f"Error generating {report_type} report: {str(e)}")
             raise
     
+    def request_report(self, user: User, report_type: str, store_id: Optional[int],
+                       date_from, date_to, parameters: Dict = None) -> Tuple[GeneratedReport, bool]:
+        """
+        Queue a report for background generation. Returns (report, created):
+        an identical request that is still running, or completed under the
+        current store data version, is returned instead of a new report.
+        """
+        parameters = convert_decimal(parameters or {})
+        parameters_hash = report_parameters_hash(report_type, store_id, date_from, date_to, parameters)
+        data_version = store_data_versions.version(store_id)
+        now = timezone.now()
+        
+        existing = GeneratedReport.objects.filter(
+            generated_by=user,
+            parameters_hash=parameters_hash
+        ).filter(
+            Q(status='completed', data_version=data_version, completed_at__gte=now - self.reuse_max_age) |
+            Q(status__in=['pending', 'processing'], generated_at__gte=now - self.in_progress_timeout)
+        ).order_by('-generated_at').first()
+        if existing is not None:
+            return existing, False
+        
+        report = GeneratedReport.objects.create(
+            report_type=report_type,
+            generated_by=user,
+            store_id=store_id,
+            date_from=date_from,
+            date_to=date_to,
+            parameters=parameters,
+            parameters_hash=parameters_hash,
+            data_version=data_version,
+            status='pending'
+        )
+        transaction.on_commit(lambda: self.enqueue(report))
+        return report, True
+    
+    def enqueue(self, report: GeneratedReport):
+        """Hand a pending report to a Celery worker (or a thread if no broker)."""
+        from .tasks import generate_report
+        
+        try:
+            generate_report.delay(str(report.id))
+        except Exception as e:
+            from ai_models.background import run_in_background
+            
+            logger.error(f"Could not queue report {report.id}, generating in background: {str(e)}")
+            run_in_background(generate_report, str(report.id), name='report-generation')
+    
+    def _set_progress(self, report: GeneratedReport, progress: int, status: str = None):
+        report.progress = progress
+        report.status = status or report.status
+        report.save(update_fields=['progress', 'status'])
+    
+    def process_report(self, report) -> Any:
+        """
+        Generate the content of a saved GeneratedReport and mark it completed,
+        updating its progress along the way. The report is marked failed and
+        the error re-raised if generation fails. Already completed reports are
+        returned unchanged.
+        """
+        if report.status == 'completed':
+            return report
+        
+        self._set_progress(report, 10, 'processing')
+        try:
+            report_data = self.generate_report(
+                report_type=report.report_type,
+                user=report.generated_by,
+                store_id=report.store_id,
+                date_from=report.date_from,
+                date_to=report.date_to,
+                parameters=report.parameters
+            )
+            self._set_progress(report, 70)
+            
+            report.raw_data = convert_decimal(report_data['raw_data'])
+            report.ai_summary_text = format_summary(report_data['ai_summary'], word_limit=100)
+            report.detailed_report_text = self.generate_detailed_report_text(report_data['raw_data'], report.report_type)
+            report.visualizations = convert_decimal(report_data.get('visualizations', {}))
+            report.status = 'completed'
+            report.progress = 100
+            report.error_message = None
+            report.completed_at = timezone.now()
+            report.save()
+            return report
+        
+        except Exception as e:
+            report.status = 'failed'
+            report.error_message = str(e)
+            report.save(update_fields=['status', 'error_message'])
+            raise
+    
+    def generate_detailed_report_text(self, raw_data, report_type):
+        """
+        Generate a detailed text report from the raw data.
+        
+        Args:
+            raw_data: The raw data dictionary from the report
+            report_type: The type of report
+            
+        Returns:
+            A formatted string with the detailed report
+        """
+        detailed_report = []
+        
+        # Add report title
+        if report_type == 'store_performance':
+            detailed_report.append(f"# Store Performance Report: {raw_data.get('store_info', {}).get('name', '')}")
+        elif report_type == 'product_analysis':
+            detailed_report.append(f"# Product Analysis Report: {raw_data.get('store_name', '')}")
+        elif report_type == 'customer_insights':
+            detailed_report.append(f"# Customer Insights Report: {raw_data.get('store_name', '')}")
+        elif report_type == 'market_trends':
+            detailed_report.append("# Market Trends Report")
+        elif report_type == 'competitive_analysis':
+            detailed_report.append(f"# Competitive Analysis Report: {raw_data.get('target_store', '')}")
+        elif report_type == 'financial_summary':
+            detailed_report.append(f"# Order Summary Report: {raw_data.get('store_name', '')}")
+        
+        detailed_report.append(f"Report Date: {raw_data.get('period', '')}")
+        detailed_report.append("")
+        
+        # Add report sections based on report type
+        if report_type == 'store_performance':
+            # Store Information
+            detailed_report.append("## Store Information")
+            store_info = raw_data.get('store_info', {})
+            detailed_report.append(f"Store Name: {store_info.get('name', '')}")
+            detailed_report.append(f"Average Rating: {store_info.get('average_rating', 0)}")
+            detailed_report.append(f"Total Products: {store_info.get('total_products', 0)}")
+            detailed_report.append("")
+            
+            # Performance Metrics
+            detailed_report.append("## Performance Metrics")
+            metrics = raw_data.get('performance_metrics', {})
+            detailed_report.append(f"Total Views: {metrics.get('total_views', 0)}")
+            detailed_report.append(f"Average Conversion Rate: {metrics.get('avg_conversion_rate', 0)}%")
+            detailed_report.append(f"Period: {metrics.get('period', '')}")
+            detailed_report.append("")
+            
+            # Top Products
+            detailed_report.append("## Top Products")
+            for i, product in enumerate(raw_data.get('top_products', []), 1):
+                detailed_report.append(f"{i}. {product.get('name', '')}")
+                detailed_report.append(f"   Views: {product.get('views', 0)}")
+                detailed_report.append(f"   Rating: {product.get('rating', 0)}")
+                detailed_report.append("")
+            
+            # Customer Behavior
+            detailed_report.append("## Customer Behavior")
+            for behavior in raw_data.get('customer_behavior', []):
+                detailed_report.append(f"Action Type: {behavior.get('action_type', '')}")
+                detailed_report.append(f"Count: {behavior.get('count', 0)}")
+                detailed_report.append("")
+            
+        elif report_type == 'product_analysis':
+            # Store Information
+            detailed_report.append("## Store Information")
+            detailed_report.append(f"Store Name: {raw_data.get('store_name', '')}")
+            detailed_report.append(f"Analysis Period: {raw_data.get('analysis_period', '')}")
+            detailed_report.append(f"Total Products: {raw_data.get('total_products', 0)}")
+            detailed_report.append("")
+            
+            # Products Analysis
+            detailed_report.append("## Product Analysis")
+            for i, product in enumerate(raw_data.get('products', [])[:10], 1):
+                detailed_report.append(f"{i}. {product.get('name', '')}")
+                detailed_report.append(f"   Category: {product.get('category', '')}")
+                detailed_report.append(f"   Rating: {product.get('rating', 0)}")
+                detailed_report.append(f"   Views: {product.get('views', 0)}")
+                detailed_report.append(f"   Clicks: {product.get('clicks', 0)}")
+                detailed_report.append(f"   Cart Additions: {product.get('cart_adds', 0)}")
+                detailed_report.append(f"   Conversion Rate: {product.get('conversion_rate', 0)}%")
+                detailed_report.append(f"   Engagement Score: {product.get('engagement_score', 0)}")
+                detailed_report.append("")
+            
+            # Category Performance
+            detailed_report.append("## Category Performance")
+            for category, performance in raw_data.get('category_performance', {}).items():
+                detailed_report.append(f"Category: {category}")
+                detailed_report.append(f"Number of Products: {performance.get('products', 0)}")
+                detailed_report.append(f"Average Conversion Rate: {performance.get('avg_conversion', 0)}%")
+                detailed_report.append(f"Average Views: {performance.get('avg_views', 0)}")
+                detailed_report.append("")
+            
+        elif report_type == 'customer_insights':
+            # Analysis Information
+            detailed_report.append("## Analysis Information")
+            detailed_report.append(f"Analysis Period: {raw_data.get('analysis_period', '')}")
+            detailed_report.append(f"Store Name: {raw_data.get('store_name', '')}")
+            detailed_report.append(f"Total Interactions: {raw_data.get('total_interactions', 0)}")
+            detailed_report.append(f"Unique Users: {raw_data.get('unique_users', 0)}")
+            detailed_report.append("")
+            
+            # Top Users
+            detailed_report.append("## Top Users")
+            for i, user in enumerate(raw_data.get('top_users', [])[:5], 1):
+                detailed_report.append(f"{i}. User: {user.get('user', '')}")
+                detailed_report.append(f"   Total Actions: {user.get('total_actions', 0)}")
+                detailed_report.append(f"   Unique Products: {user.get('unique_products', 0)}")
+                detailed_report.append("")
+            
+            # Hourly Patterns
+            detailed_report.append("## Hourly Activity Patterns")
+            for pattern in raw_data.get('hourly_patterns', []):
+                detailed_report.append(f"Hour: {pattern.get('hour', '')}:00")
+                detailed_report.append(f"Activity Count: {pattern.get('activity_count', 0)}")
+                detailed_report.append("")
+            
+            # Action Patterns
+            detailed_report.append("## Action Patterns")
+            for pattern in raw_data.get('action_patterns', []):
+                detailed_report.append(f"Action Type: {pattern.get('action_type', '')}")
+                detailed_report.append(f"Count: {pattern.get('count', 0)}")
+                detailed_report.append("")
+            
+            # Customer Segments
+            detailed_report.append("## Customer Segments")
+            for segment in raw_data.get('customer_segments', []):
+                detailed_report.append(f"Segment: {segment.get('name', '')}")
+                detailed_report.append(f"Description: {segment.get('description', '')}")
+                detailed_report.append("Characteristics:")
+                for characteristic in segment.get('characteristics', []):
+                    detailed_report.append(f"- {characteristic}")
+                detailed_report.append("")
+            
+        elif report_type == 'market_trends':
+            # Analysis Information
+            detailed_report.append("## Analysis Information")
+            detailed_report.append(f"Analysis Period: {raw_data.get('analysis_period', '')}")
+            detailed_report.append("")
+            
+            # Trending Categories
+            detailed_report.append("## Trending Categories")
+            for i, category in enumerate(raw_data.get('trending_categories', []), 1):
+                detailed_report.append(f"{i}. {category.get('product__category__name', '')}")
+                detailed_report.append(f"   View Count: {category.get('view_count', 0)}")
+                detailed_report.append("")
+            
+            # Price Trends
+            detailed_report.append("## Price Trends")
+            for i, trend in enumerate(raw_data.get('price_trends', []), 1):
+                detailed_report.append(f"{i}. Category: {trend.get('category__name', '')}")
+                detailed_report.append(f"   Product Count: {trend.get('product_count', 0)}")
+                detailed_report.append("")
+            
+            # Popular Brands
+            detailed_report.append("## Popular Brands")
+            for i, brand in enumerate(raw_data.get('popular_brands', []), 1):
+                detailed_report.append(f"{i}. {brand.get('product__brand__name', '')}")
+                detailed_report.append(f"   Interaction Count: {brand.get('interaction_count', 0)}")
+                detailed_report.append("")
+            
+            # Market Insights
+            detailed_report.append("## Market Insights")
+            for i, insight in enumerate(raw_data.get('market_insights', []), 1):
+                detailed_report.append(f"{i}. {insight}")
+                detailed_report.append("")
+            
+        elif report_type == 'competitive_analysis':
+            # Analysis Information
+            detailed_report.append("## Analysis Information")
+            detailed_report.append(f"Target Store: {raw_data.get('target_store', '')}")
+            detailed_report.append(f"Analysis Period: {raw_data.get('analysis_period', '')}")
+            detailed_report.append("")
+            
+            # Competitor Comparison
+            detailed_report.append("## Competitor Comparison")
+            for i, competitor in enumerate(raw_data.get('competitor_comparison', []), 1):
+                detailed_report.append(f"{i}. {competitor.get('store_name', '')}")
+                detailed_report.append(f"   Target Store: {'Yes' if competitor.get('is_target', False) else 'No'}")
+                detailed_report.append(f"   Average Rating: {competitor.get('average_rating', 0)}")
+                detailed_report.append(f"   Total Products: {competitor.get('total_products', 0)}")
+                detailed_report.append(f"   Customer Service Score: {competitor.get('customer_service_score', 0)}")
+                detailed_report.append("")
+            
+            # Market Position
+            detailed_report.append("## Market Position")
+            position = raw_data.get('market_position', {})
+            detailed_report.append(f"Rating Rank: {position.get('rating_rank', '')}")
+            detailed_report.append(f"Product Variety Rank: {position.get('product_variety_rank', '')}")
+            detailed_report.append(f"Price Competitiveness: {position.get('price_competitiveness', '')}")
+            detailed_report.append("Unique Strengths:")
+            for strength in position.get('unique_strengths', []):
+                detailed_report.append(f"- {strength}")
+            detailed_report.append("Areas for Improvement:")
+            for area in position.get('improvement_areas', []):
+                detailed_report.append(f"- {area}")
+            detailed_report.append("")
+            
+            # Recommendations
+            detailed_report.append("## Recommendations")
+            for i, recommendation in enumerate(raw_data.get('recommendations', []), 1):
+                detailed_report.append(f"{i}. {recommendation}")
+                detailed_report.append("")
+            
+        elif report_type == 'financial_summary':
+            # Store Information
+            detailed_report.append("## Store Information")
+            detailed_report.append(f"Store Name: {raw_data.get('store_name', '')}")
+            detailed_report.append(f"Period: {raw_data.get('period', '')}")
+            detailed_report.append("")
+            
+            # Summary
+            detailed_report.append("## Order Summary")
+            summary = raw_data.get('summary', {})
+            detailed_report.append(f"Total Orders: {summary.get('total_orders', 0)}")
+            detailed_report.append("")
+            
+            # Monthly Breakdown
+            detailed_report.append("## Monthly Breakdown")
+            for month, data in raw_data.get('monthly_breakdown', {}).items():
+                detailed_report.append(f"Month: {month}")
+                detailed_report.append(f"Orders: {data.get('orders', 0)}")
+                detailed_report.append(f"Days: {data.get('days', 0)}")
+                detailed_report.append(f"Daily Order Average: {data.get('orders', 0) / data.get('days', 1) if data.get('days', 0) > 0 else 0:.2f}")
+                detailed_report.append("")
+            
+            # Order Insights
+            detailed_report.append("## Order Insights")
+            for i, insight in enumerate(raw_data.get('order_insights', []), 1):
+                detailed_report.append(f"{i}. {insight}")
+                detailed_report.append("")
+        
+        return "\n".join(detailed_report)
+    
     def _calculate_smart_revenue_estimate(self, product: Product, store: Store) -> float:
         """
         Calculate a smart revenue estimate for a product based on views and store performance.
@@ -162,46 +559,17 @@ class ReportGenerationService:
         Generate product analysis report.
         """
         store = Store.objects.get(id=store_id)
-        products = store.products.filter(is_active=True)
-        
-        # Analyze product performance
-        product_data = []
-        for product in products:
-            behavior = UserBehaviorLog.objects.filter(
-                product=product,
-                timestamp__range=[date_from, date_to]
-            )
-            
-            views = behavior.filter(action_type='view').count()
-            clicks = behavior.filter(action_type='click').count()
-            cart_adds = behavior.filter(action_type='add_to_cart').count()
-            
-            # We still calculate revenue estimate for internal use but won't display it
-            revenue_estimate = self._calculate_smart_revenue_estimate(product, store)
-            
-            product_data.append({
-                'id': product.id,
-                'name': product.name,
-                'category': product.category.name,
-                # Remove price information as requested
-                'rating': product.average_rating,
-                'views': views,
-                'clicks': clicks,
-                'cart_adds': cart_adds,
-                'conversion_rate': (cart_adds / views * 100) if views > 0 else 0,
-                # Remove revenue estimate as requested
-                'engagement_score': self._calculate_engagement_score(views, clicks, cart_adds)
-            })
+        performance = self._product_performance_frame(store_id, date_from, date_to)
         
-        # Sort by performance
-        product_data.sort(key=lambda x: x['conversion_rate'], reverse=True)
+        # Prices are not shown in the report
+        product_data = performance.drop(columns=['price']).to_dict('records')
         
         raw_data = {
             'store_name': store.name,
             'analysis_period': f"{date_from} to {date_to}",
             'total_products': len(product_data),
             'products': product_data,
-            'category_performance': self._analyze_category_performance(product_data),
+            'category_performance': self._analyze_category_performance(performance),
             # Remove price analysis as requested
         }
         
@@ -213,6 +581,41 @@ class ReportGenerationService:
             'visualizations': self._generate_product_visualizations(raw_data)
         }
     
+    def _product_performance_frame(self, store_id: int, date_from: datetime,
+                                   date_to: datetime) -> pd.DataFrame:
+        """
+        Views, clicks and cart additions in the period for every active
+        product of the store, from one grouped query, with conversion rate
+        and engagement score. Sorted by conversion rate, best first.
+        """
+        period_logs = FilteredRelation(
+            'userbehaviorlog',
+            condition=Q(
+                userbehaviorlog__timestamp__range=[date_from, date_to],
+                userbehaviorlog__action_type__in=list(self.product_actions.values())
+            )
+        )
+        rows = (
+            Product.objects.filter(store_id=store_id, is_active=True)
+            .annotate(period_logs=period_logs)
+            .annotate(**{
+                column: Count('period_logs', filter=Q(period_logs__action_type=action))
+                for column, action in self.product_actions.items()
+            })
+            .order_by('id')
+            .values_list('id', 'name', 'category__name', 'average_rating', 'price', *self.product_actions)
+        )
+        columns = ['id', 'name', 'category', 'rating', 'price', *self.product_actions]
+        # Explicit dtypes keep the arithmetic below valid for a store without products
+        frame = pd.DataFrame.from_records(list(rows), columns=columns).astype({
+            'rating': float, 'price': float, **dict.fromkeys(self.product_actions, 'int64')
+        })
+        
+        viewed = frame['views'].where(frame['views'] > 0)
+        frame['conversion_rate'] = (frame['cart_adds'] / viewed * 100).fillna(0.0)
+        frame['engagement_score'] = self._calculate_engagement_score(frame['views'], frame['clicks'], frame['cart_adds'])
+        return frame.sort_values('conversion_rate', ascending=False, kind='stable').reset_index(drop=True)
+    
     def _generate_customer_insights_report(self, store_id: int, date_from: datetime,
                                          date_to: datetime, parameters: Dict) -> Dict[str, Any]:
         """
@@ -319,37 +722,33 @@ class ReportGenerationService:
                                             date_to: datetime, parameters: Dict) -> Dict[str, Any]:
         """
         Generate competitive analysis report.
+        
+        Metrics and percentile ranks are read from the materialized store
+        metrics table. If the store is not in it yet, a refresh is queued and
+        the report says the metrics are not available.
         """
         target_store = Store.objects.get(id=store_id)
+        target_metrics = store_leaderboard.get(store_id)
+        metrics_pending = target_metrics is None and target_store.is_active
+        if metrics_pending:
+            self._queue_store_metrics_refresh(store_id)
         
-        # Find competitor stores in same categories
-        target_categories = target_store.products.values_list('category', flat=True).distinct()
-        competitor_stores = Store.objects.filter(
-            products__category__in=target_categories,
-            is_active=True,
-            is_verified=True
-        ).exclude(id=store_id).distinct()[:5]
+        # Healthiest active, verified stores in the same categories
+        competitor_metrics = store_leaderboard.competitors(store_id, limit=5)
         
         # Compare metrics
-        comparison_data = []
-        for store in [target_store] + list(competitor_stores):
-            store_metrics = {
-                'store_name': store.name,
-                'is_target': store.id == store_id,
-                'average_rating': store.average_rating,
-                'total_products': store.products.filter(is_active=True).count(),
-                'avg_price': store.products.filter(is_active=True).aggregate(
-                    avg_price=Avg('price')
-                )['avg_price'] or 0,
-                'customer_service_score': store.customer_service_score
-            }
-            comparison_data.append(store_metrics)
+        comparison_data = [self._competitor_entry(target_store, target_metrics, is_target=True)]
+        comparison_data += [
+            self._competitor_entry(metrics.store, metrics, is_target=False)
+            for metrics in competitor_metrics
+        ]
         
         raw_data = {
             'target_store': target_store.name,
             'analysis_period': f"{date_from} to {date_to}",
+            'metrics_available': not metrics_pending,
             'competitor_comparison': comparison_data,
-            'market_position': self._analyze_market_position(target_store, competitor_stores),
+            'market_position': self._analyze_market_position(target_metrics, comparison_data),
             'recommendations': self._generate_competitive_recommendations(target_store, comparison_data)
         }
         
@@ -361,6 +760,23 @@ class ReportGenerationService:
             'visualizations': self._generate_competitive_visualizations(raw_data)
         }
     
+    def _queue_store_metrics_refresh(self, store_id: int):
+        """
+        Queue the locked metrics refresh instead of recomputing every store
+        inside a report, and bump the store's data version so the report
+        built without metrics is not reused.
+        """
+        from dashboard.tasks import refresh_store_metrics
+        
+        try:
+            refresh_store_metrics.delay()
+        except Exception as e:
+            from ai_models.background import run_in_background
+            
+            logger.error(f"Could not queue store metrics refresh, running in background: {str(e)}")
+            run_in_background(refresh_store_metrics, name='store-metrics-refresh')
+        store_data_versions.invalidate([store_id])
+    
     def _generate_financial_summary_report(self, store_id: int, date_from: datetime,
                                          date_to: datetime, parameters: Dict) -> Dict[str, Any]:
         """
@@ -512,6 +928,9 @@ class ReportGenerationService:
         
         summary = f"Competitive Analysis for {target_store}\n\n"
         
+        if not data.get('metrics_available', True):
+            summary += "Store metrics are still being computed; generate this report again shortly.\n\n"
+        
         target_data = next(c for c in comparison if c['is_target'])
         competitors = [c for c in comparison if not c['is_target']]
         
@@ -548,56 +967,16 @@ class ReportGenerationService:
     
     # Helper methods for data analysis
     
-    def _analyze_category_performance(self, product_data: List[Dict]) -> Dict:
+    def _analyze_category_performance(self, products: pd.DataFrame) -> Dict:
         """Analyze performance by category."""
-        category_stats = {}
-        for product in product_data:
-            category = product['category']
-            if category not in category_stats:
-                category_stats[category] = {
-                    'products': 0,
-                    'total_conversion': 0,
-                    'total_views': 0
-                }
-            category_stats[category]['products'] += 1
-            category_stats[category]['total_conversion'] += product['conversion_rate']
-            category_stats[category]['total_views'] += product['views']
-        
-        # Calculate averages
-        for category, stats in category_stats.items():
-            stats['avg_conversion'] = stats['total_conversion'] / stats['products']
-            stats['avg_views'] = stats['total_views'] / stats['products']
-        
-        return category_stats
-    
-    def _analyze_price_performance(self, product_data: List[Dict]) -> Dict:
-        """Analyze performance by price range."""
-        price_ranges = {
-            'under_50': {'products': [], 'avg_conversion': 0},
-            '50_100': {'products': [], 'avg_conversion': 0},
-            '100_200': {'products': [], 'avg_conversion': 0},
-            'over_200': {'products': [], 'avg_conversion': 0}
-        }
-        
-        for product in product_data:
-            price = product['price']
-            if price < 50:
-                price_ranges['under_50']['products'].append(product)
-            elif price < 100:
-                price_ranges['50_100']['products'].append(product)
-            elif price < 200:
-                price_ranges['100_200']['products'].append(product)
-            else:
-                price_ranges['over_200']['products'].append(product)
-        
-        # Calculate averages
-        for range_name, range_data in price_ranges.items():
-            if range_data['products']:
-                range_data['avg_conversion'] = sum(
-                    p['conversion_rate'] for p in range_data['products']
-                ) / len(range_data['products'])
-        
-        return price_ranges
+        stats = products.groupby('category', sort=False).agg(
+            products=('id', 'size'),
+            total_conversion=('conversion_rate', 'sum'),
+            total_views=('views', 'sum')
+        )
+        stats['avg_conversion'] = stats['total_conversion'] / stats['products']
+        stats['avg_views'] = stats['total_views'] / stats['products']
+        return stats.to_dict('index')
     
     def _identify_customer_segments(self, behavior_query) -> List[Dict]:
         """Identify customer segments based on behavior."""
@@ -631,14 +1010,55 @@ class ReportGenerationService:
             "Personalized recommendations drive higher engagement"
         ]
     
-    def _analyze_market_position(self, target_store: Store, competitors: List[Store]) -> Dict:
-        """Analyze market position relative to competitors."""
+    def _competitor_entry(self, store: Store, metrics, is_target: bool) -> Dict:
+        """One store's row of the competitor comparison."""
         return {
-            'rating_rank': 1,  # Simplified
-            'product_variety_rank': 2,
-            'price_competitiveness': 'moderate',
-            'unique_strengths': ['Customer service', 'Product quality'],
-            'improvement_areas': ['Marketing reach', 'Product diversity']
+            'store_name': store.name,
+            'is_target': is_target,
+            'average_rating': store.average_rating,
+            'total_products': metrics.product_count if metrics else 0,
+            'avg_price': float(metrics.average_price) if metrics else 0,
+            'customer_service_score': store.customer_service_score,
+            'health_score': metrics.health_score if metrics else 0.0,
+        }
+    
+    def _analyze_market_position(self, target_metrics, comparison_data: List[Dict]) -> Dict:
+        """
+        Analyze market position relative to competitors: ranks within the
+        comparison, and strengths and weaknesses from the store's
+        percentiles among all stores.
+        """
+        target = next(c for c in comparison_data if c['is_target'])
+        competitors = [c for c in comparison_data if not c['is_target']]
+        
+        def rank(key):
+            return 1 + sum(1 for c in competitors if c[key] > target[key])
+        
+        competitor_prices = [c['avg_price'] for c in competitors if c['avg_price']]
+        price_competitiveness = 'moderate'
+        if competitor_prices and target['avg_price']:
+            price_ratio = target['avg_price'] / (sum(competitor_prices) / len(competitor_prices))
+            if price_ratio < 0.9:
+                price_competitiveness = 'high'
+            elif price_ratio > 1.1:
+                price_competitiveness = 'low'
+        
+        strengths, improvement_areas = [], []
+        if target_metrics is not None:
+            for field, label in MARKET_POSITION_PERCENTILES.items():
+                percentile = getattr(target_metrics, field)
+                if percentile >= 75:
+                    strengths.append(label)
+                elif percentile <= 25:
+                    improvement_areas.append(label)
+        
+        return {
+            'rating_rank': rank('average_rating'),
+            'product_variety_rank': rank('total_products'),
+            'price_competitiveness': price_competitiveness,
+            'health_percentile': target_metrics.health_percentile if target_metrics else 0.0,
+            'unique_strengths': strengths,
+            'improvement_areas': improvement_areas
         }
     
     def _generate_competitive_recommendations(self, target_store: Store, comparison_data: List[Dict]) -> List[str]:
@@ -783,9 +1203,9 @@ class ReportGenerationService:
             }
         }
         
-    def _calculate_engagement_score(self, views: int, clicks: int, cart_adds: int) -> float:
+    def _calculate_engagement_score(self, views: pd.Series, clicks: pd.Series, cart_adds: pd.Series) -> pd.Series:
         """
-        Calculate an engagement score based on user interactions.
+        Calculate engagement scores based on user interactions.
         
         Args:
             views: Number of product views
@@ -793,21 +1213,18 @@ class ReportGenerationService:
             cart_adds: Number of times product was added to cart
             
         Returns:
-            Engagement score as a float
+            Engagement score per product (0 for products without views)
         """
         # Simple weighted scoring
         # Views are worth 1 point, clicks 3 points, cart adds 10 points
-        if views == 0:
-            return 0
-            
         base_score = views + (clicks * 3) + (cart_adds * 10)
         
         # Normalize by views to get a per-view engagement score
-        normalized_score = base_score / views
+        normalized_score = base_score / views.where(views > 0)
         
         # Scale to a 0-100 range for easier interpretation
         # Assuming a "perfect" score would be if every view resulted in a cart add
         # which would give a normalized score of 11 (1 + 0 + 10)
-        scaled_score = min(100, normalized_score * 9)
+        scaled_score = (normalized_score * 9).clip(upper=100)
         
-        return round(scaled_score, 2)
+        return scaled_score.round(2).fillna(0.0)
@@ -0,0 +1,62 @@
+"""
+Signal handlers for reports app.
+
+These are the only receivers bumping store data versions on model
+changes; generated reports are reused while their version is current.
+"""
+
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+from ai_models.event_pipeline import behavior_logs_written
+from comments.models import Comment
+from dashboard.models import StoreAnalytics
+from products.models import Product, ProductReview, Store
+from products.data_versions import store_data_versions
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+def _invalidate(*store_ids):
+    try:
+        store_data_versions.invalidate(store_ids)
+    except Exception as e:
+        logger.error(f"Error invalidating data versions of stores {store_ids}: {str(e)}")
+
+
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+@receiver(post_save, sender=StoreAnalytics)
+def invalidate_store_reports(sender, instance, **kwargs):
+    """
+    Stop reusing a store's reports when its products or analytics change.
+    """
+    _invalidate(instance.store_id)
+
+
+@receiver(post_save, sender=Store)
+def invalidate_reports_on_store_change(sender, instance, **kwargs):
+    """
+    Stop reusing a store's reports when the store itself is edited.
+    """
+    _invalidate(instance.pk)
+
+
+@receiver(post_save, sender=Comment)
+@receiver(post_delete, sender=Comment)
+@receiver(post_save, sender=ProductReview)
+@receiver(post_delete, sender=ProductReview)
+def invalidate_reports_on_review(sender, instance, **kwargs):
+    """
+    Stop reusing reports of the store whose product was reviewed.
+    """
+    store_id = Product.objects.filter(id=instance.product_id).values_list('store_id', flat=True).first()
+    _invalidate(store_id)
+
+
+@receiver(behavior_logs_written)
+def invalidate_reports_on_behavior(sender, store_ids, **kwargs):
+    """
+    Stop reusing reports of stores whose products got new behavior logs.
+    """
+    _invalidate(*store_ids)
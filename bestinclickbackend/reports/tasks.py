@@ -0,0 +1,35 @@
+"""
+Celery tasks for report generation.
+"""
+
+import logging
+from celery import shared_task
+
+from .models import GeneratedReport
+from .services import ReportGenerationService
+
+logger = logging.getLogger(__name__)
+
+
+@shared_task
+def generate_report(report_id: int):
+    """
+    Generate the content of a pending report. Completed reports are left
+    unchanged, so a retried or duplicated task does not regenerate them.
+    """
+    try:
+        report = GeneratedReport.objects.select_related('generated_by').get(id=report_id)
+    except GeneratedReport.DoesNotExist:
+        logger.warning(f"Report {report_id} no longer exists")
+        return None
+
+    ReportGenerationService().process_report(report)
+    return report.status
+
+
+@shared_task
+def run_report_schedules():
+    """Queue the reports of all due schedules; returns the number queued."""
+    from .scheduler import report_scheduler
+
+    return report_scheduler.run_due()
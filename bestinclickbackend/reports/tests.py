@@ -2,15 +2,25 @@
 Tests for reports app.
 """
 
-from django.test import TestCase
+from django.core.cache import cache
+from django.test import TestCase, override_settings
 from django.contrib.auth import get_user_model
 from rest_framework.test import APITestCase
 from rest_framework import status
 from django.urls import reverse
+from django.utils import timezone
+import importlib.util
 from datetime import date, timedelta
-from products.models import Store, Category, Brand
-from .models import GeneratedReport
+from unittest import mock, skipUnless
+from ai_models.event_pipeline import BehaviorEventPipeline
+from ai_models.models import UserBehaviorLog
+from dashboard.leaderboard import store_leaderboard
+from products.models import Store, Category, Brand, Product
+from products.data_versions import store_data_versions
+from .models import GeneratedReport, ReportSchedule
+from .scheduler import ReportScheduler, next_run_after
 from .services import ReportGenerationService
+from .tasks import generate_report
 
 User = get_user_model()
 
@@ -94,6 +104,120 @@ class ReportServiceTest(TestCase):
         self.assertIn('raw_data', report_data)
         self.assertIn('ai_summary', report_data)
         self.assertIn('visualizations', report_data)
+    
+    def test_product_analysis_uses_one_grouped_query(self):
+        """Test that product analysis counts are computed in one query regardless of product count."""
+        phones = Category.objects.create(name='Phones')
+        audio = Category.objects.create(name='Audio')
+        brand = Brand.objects.create(name='Test Brand')
+        products = [
+            Product.objects.create(
+                store=self.store, category=category, brand=brand, name=f'Product {i}',
+                description='Test', sku=f'PA{i:03d}', price=price
+            )
+            for i, (category, price) in enumerate([(phones, 30), (phones, 150), (audio, 80)])
+        ]
+        in_period = timezone.now() - timedelta(days=2)
+        logs = [('view', 4), ('click', 2), ('add_to_cart', 1)]
+        for action_type, count in logs:
+            for _ in range(count):
+                UserBehaviorLog.objects.create(user=self.user, product=products[1], action_type=action_type, timestamp=in_period)
+        UserBehaviorLog.objects.create(user=self.user, product=products[2], action_type='view', timestamp=in_period)
+        UserBehaviorLog.objects.create(
+            user=self.user, product=products[2], action_type='add_to_cart',
+            timestamp=timezone.now() - timedelta(days=60)
+        )
+        
+        with self.assertNumQueries(2):
+            report_data = self.report_service.generate_report(
+                report_type='product_analysis',
+                user=self.store_owner,
+                store_id=self.store.id,
+                date_from=date.today() - timedelta(days=30),
+                date_to=date.today()
+            )
+        raw = report_data['raw_data']
+        self.assertEqual([p['id'] for p in raw['products']], [products[1].id, products[0].id, products[2].id])
+        top = raw['products'][0]
+        self.assertEqual((top['views'], top['clicks'], top['cart_adds']), (4, 2, 1))
+        self.assertEqual(top['conversion_rate'], 25.0)
+        self.assertEqual(top['engagement_score'], round((4 + 6 + 10) / 4 * 9, 2))
+        self.assertEqual(raw['products'][2]['cart_adds'], 0)
+        self.assertNotIn('price', top)
+        self.assertEqual(raw['category_performance']['Phones']['products'], 2)
+        self.assertEqual(raw['category_performance']['Phones']['avg_conversion'], 12.5)
+        self.assertEqual(raw['category_performance']['Audio']['avg_views'], 1.0)
+    
+    def test_product_analysis_of_store_without_products(self):
+        """Test that a store without active products gets an empty report."""
+        report = GeneratedReport.objects.create(
+            report_type='product_analysis',
+            generated_by=self.store_owner,
+            store=self.store,
+            date_from=date.today() - timedelta(days=30),
+            date_to=date.today()
+        )
+        self.report_service.process_report(report)
+        
+        report.refresh_from_db()
+        self.assertEqual(report.status, 'completed')
+        self.assertEqual(report.raw_data['total_products'], 0)
+        self.assertEqual(report.raw_data['products'], [])
+    
+    def test_competitive_analysis_reads_store_metrics(self):
+        """Test that competitive analysis is looked up from the materialized store metrics."""
+        category = Category.objects.create(name='Phones')
+        brand = Brand.objects.create(name='Test Brand')
+        rival = Store.objects.create(
+            owner=self.user, name='Rival Store', email='rival@example.com',
+            phone='1234567890', address='Test Address', is_verified=True
+        )
+        for i, (store, price, rating) in enumerate([(self.store, 50, 4.8), (self.store, 70, 4.8), (rival, 100, 3.0)]):
+            Product.objects.create(
+                store=store, category=category, brand=brand, name=f'Product {i}',
+                description='Test', sku=f'CA{i:03d}', price=price, average_rating=rating
+            )
+        
+        def generate():
+            return self.report_service.generate_report(
+                report_type='competitive_analysis',
+                user=self.store_owner,
+                store_id=self.store.id,
+                date_from=date.today() - timedelta(days=30),
+                date_to=date.today()
+            )['raw_data']
+        
+        # Missing metrics are left to the locked refresh task
+        with mock.patch('dashboard.tasks.refresh_store_metrics.delay') as refresh:
+            self.assertFalse(generate()['metrics_available'])
+        refresh.assert_called_once()
+        
+        store_leaderboard.refresh()
+        with self.assertNumQueries(3):
+            raw = generate()
+        self.assertEqual([c['store_name'] for c in raw['competitor_comparison']], ['Test Store', 'Rival Store'])
+        self.assertEqual(raw['competitor_comparison'][0]['total_products'], 2)
+        self.assertEqual(raw['competitor_comparison'][0]['avg_price'], 60.0)
+        position = raw['market_position']
+        self.assertEqual(position['product_variety_rank'], 1)
+        self.assertEqual(position['price_competitiveness'], 'high')
+        self.assertIn('Product ratings', position['unique_strengths'])
+    
+    def test_generate_report_task_completes_pending_report(self):
+        """Test that the report task fills in a pending report."""
+        report = GeneratedReport.objects.create(
+            report_type='store_performance',
+            generated_by=self.store_owner,
+            store=self.store,
+            date_from=date.today() - timedelta(days=30),
+            date_to=date.today()
+        )
+        self.assertEqual(generate_report.apply(args=(report.id,)).get(), 'completed')
+        
+        report.refresh_from_db()
+        self.assertEqual(report.status, 'completed')
+        self.assertIsNotNone(report.completed_at)
+        self.assertTrue(report.detailed_report_text.startswith('# Store Performance Report'))
 
 
 class ReportAPITest(APITestCase):
@@ -130,6 +254,189 @@ class ReportAPITest(APITestCase):
         self.assertEqual(response.status_code, status.HTTP_201_CREATED)
         self.assertTrue(GeneratedReport.objects.filter(generated_by=self.store_owner).exists())
     
+    @override_settings(
+        CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}},
+        CELERY_TASK_ALWAYS_EAGER=True,
+        CELERY_TASK_EAGER_PROPAGATES=True
+    )
+    def test_report_is_generated_in_background_and_reused(self):
+        """Test that reports are queued, then reused until the store's data changes."""
+        cache.clear()
+        self.client.force_authenticate(user=self.store_owner)
+        url = reverse('reports:generate_report')
+        data = {
+            'report_type': 'store_performance',
+            'store_id': self.store.id,
+            'date_from': '2024-01-01',
+            'date_to': '2024-01-31'
+        }
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(url, data)
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.data['status'], 'pending')
+        
+        report = GeneratedReport.objects.get(id=response.data['id'])
+        self.assertEqual(report.status, 'completed')
+        self.assertEqual(report.progress, 100)
+        status_response = self.client.get(reverse('reports:report_status', args=[report.id]))
+        self.assertEqual(status_response.data['progress'], 100)
+        
+        # Identical request: the completed report is returned
+        response = self.client.post(url, data)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['id'], str(report.id))
+        
+        # The store's data changed: a new report is generated
+        Product.objects.create(
+            store=self.store,
+            category=Category.objects.create(name='Test Category'),
+            brand=Brand.objects.create(name='Test Brand'),
+            name='New Product',
+            description='New product',
+            sku='NEW001',
+            price=10
+        )
+        response = self.client.post(url, data)
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertNotEqual(response.data['id'], str(report.id))
+    
+    @override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+    def test_new_behavior_logs_make_reports_stale(self):
+        """Test that flushed behavior logs bump the data version of their store."""
+        cache.clear()
+        product = Product.objects.create(
+            store=self.store,
+            category=Category.objects.create(name='Test Category'),
+            brand=Brand.objects.create(name='Test Brand'),
+            name='Viewed Product',
+            description='Viewed product',
+            sku='VIEW001',
+            price=10
+        )
+        version = store_data_versions.version(self.store.id)
+        pipeline = BehaviorEventPipeline()
+        pipeline.log_behavior('view', user=self.store_owner, product=product)
+        pipeline.flush()
+        self.assertGreater(store_data_versions.version(self.store.id), version)
+    
+    @override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+    def test_identical_pending_requests_are_deduplicated(self):
+        """Test that a request identical to a queued one returns the queued report."""
+        self.client.force_authenticate(user=self.store_owner)
+        url = reverse('reports:generate_report')
+        data = {
+            'report_type': 'store_performance',
+            'store_id': self.store.id,
+            'date_from': '2024-01-01',
+            'date_to': '2024-01-31'
+        }
+        first = self.client.post(url, data, format='json')
+        second = self.client.post(url, data, format='json')
+        self.assertEqual(second.status_code, status.HTTP_200_OK)
+        self.assertEqual(first.data['id'], second.data['id'])
+        
+        data['parameters'] = {'include_competitors': True}
+        third = self.client.post(url, data, format='json')
+        self.assertEqual(third.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(GeneratedReport.objects.filter(status='pending').count(), 2)
+    
+    def _completed_report(self):
+        return GeneratedReport.objects.create(
+            report_type='product_analysis',
+            generated_by=self.store_owner,
+            store=self.store,
+            date_from=date(2024, 1, 1),
+            date_to=date(2024, 1, 31),
+            raw_data={
+                'store_name': 'Test Store',
+                'total_products': 2,
+                'products': [
+                    {'id': 1, 'name': 'Phone, "Pro"', 'views': 10, 'conversion_rate': 20.0},
+                    {'id': 2, 'name': 'هاتف', 'views': 0, 'conversion_rate': 0.0},
+                ],
+                'category_performance': {'Phones': {'products': 2, 'avg_conversion': 10.0}},
+            },
+            ai_summary_text='Summary',
+            status='completed'
+        )
+    
+    def _download(self, report, **params):
+        self.client.force_authenticate(user=self.store_owner)
+        return self.client.get(reverse('reports:download_report', args=[report.id]), params)
+    
+    def test_download_streams_csv_sections(self):
+        """Test that the CSV export streams one section per row set."""
+        import csv
+        import io
+        report = self._completed_report()
+        response = self._download(report)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(response.streaming)
+        rows = list(csv.reader(io.StringIO(b''.join(response.streaming_content).decode('utf-8'))))
+        self.assertEqual(rows[0], ['report'])
+        products = rows.index(['products'])
+        self.assertEqual(rows[products + 1], ['id', 'name', 'views', 'conversion_rate'])
+        self.assertEqual(rows[products + 2], ['1', 'Phone, "Pro"', '10', '20.0'])
+        self.assertIn(['category_performance'], rows)
+        report.refresh_from_db()
+        self.assertEqual(report.download_count, 1)
+    
+    def test_download_json_and_json_lines_are_valid(self):
+        """Test that JSON exports parse and keep every row set."""
+        import json
+        report = self._completed_report()
+        document = json.loads(b''.join(self._download(report, format='json').streaming_content))
+        self.assertEqual(document['report']['total_products'], 2)
+        self.assertEqual(document['row_sets']['products'][1]['name'], 'هاتف')
+        self.assertEqual(document['row_sets']['category_performance'], [{'key': 'Phones', 'products': 2, 'avg_conversion': 10.0}])
+        
+        response = self._download(report, format='jsonl')
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        lines = [json.loads(line) for line in b''.join(response.streaming_content).decode('utf-8').splitlines()]
+        self.assertEqual([line['row_set'] for line in lines], ['report', 'products', 'products', 'category_performance'])
+    
+    def test_download_gzip_and_invalid_options(self):
+        """Test gzip-compressed exports and rejected formats."""
+        import gzip
+        import json
+        report = self._completed_report()
+        response = self._download(report, format='jsonl', compress='gzip')
+        self.assertTrue(response['Content-Disposition'].endswith('.jsonl.gz"'))
+        lines = gzip.decompress(b''.join(response.streaming_content)).decode('utf-8').splitlines()
+        self.assertEqual(json.loads(lines[1])['id'], 1)
+        
+        self.assertEqual(self._download(report, format='xml').status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(self._download(report, compress='zip').status_code, status.HTTP_400_BAD_REQUEST)
+    
+    @skipUnless(importlib.util.find_spec('pyarrow'), 'pyarrow is not installed')
+    def test_download_parquet_row_set(self):
+        """Test that the columnar export writes the selected row set."""
+        import io
+        import pyarrow.parquet as pq
+        report = self._completed_report()
+        response = self._download(report, format='parquet')
+        table = pq.read_table(io.BytesIO(b''.join(response.streaming_content)))
+        self.assertEqual(table.column('name').to_pylist(), ['Phone, "Pro"', 'هاتف'])
+        
+        response = self._download(report, format='arrow', row_set='missing')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+    
+    @skipUnless(importlib.util.find_spec('pyarrow'), 'pyarrow is not installed')
+    def test_columnar_schema_covers_all_batches(self):
+        """Test that types first seen after the first batch are exported."""
+        import io
+        import pyarrow.parquet as pq
+        from .exports import RowSet, columnar_chunks
+        row_set = RowSet('products', [
+            {'name': None, 'price': 10},
+            {'name': 'Phone', 'price': 12.5},
+            {'name': 7, 'price': 3},
+        ])
+        with mock.patch('reports.exports.ROWS_PER_BATCH', 1):
+            table = pq.read_table(io.BytesIO(b''.join(columnar_chunks(row_set, 'parquet'))))
+        self.assertEqual(table.column('name').to_pylist(), [None, 'Phone', '7'])
+        self.assertEqual(table.column('price').to_pylist(), [10.0, 12.5, 3.0])
+    
     def test_list_reports(self):
         """Test listing user's reports."""
         GeneratedReport.objects.create(
@@ -147,3 +454,108 @@ class ReportAPITest(APITestCase):
         response = self.client.get(url)
         self.assertEqual(response.status_code, status.HTTP_200_OK)
         self.assertEqual(len(response.data['results']), 1)
+
+
+class ReportSchedulerTest(TestCase):
+    """
+    Test cases for the report schedule executor.
+    """
+    
+    def setUp(self):
+        self.store_owner = User.objects.create_user(
+            username='storeowner',
+            email='owner@example.com',
+            password='testpass123',
+            role='store_owner'
+        )
+        self.store = Store.objects.create(
+            owner=self.store_owner,
+            name='Test Store',
+            email='store@example.com',
+            phone='1234567890',
+            address='Test Address'
+        )
+        self.now = timezone.now()
+        self.scheduler = ReportScheduler(max_per_store=2)
+    
+    def _schedule(self, report_type='store_performance', frequency='daily', next_run=None):
+        return ReportSchedule.objects.create(
+            user=self.store_owner,
+            store=self.store,
+            report_type=report_type,
+            frequency=frequency,
+            next_run=next_run or self.now - timedelta(minutes=5)
+        )
+    
+    def test_next_run_skips_missed_periods(self):
+        """Test that next_run moves to the first slot after now on the same grid."""
+        three_days_ago = self.now - timedelta(days=3, hours=1)
+        self.assertEqual(next_run_after(three_days_ago, 'daily', self.now), three_days_ago + timedelta(days=4))
+        later = self.now + timedelta(hours=1)
+        self.assertEqual(next_run_after(later, 'weekly', self.now), later)
+    
+    def test_due_schedules_are_claimed_once(self):
+        """Test that due schedules queue a report and are not run again."""
+        due = self._schedule(frequency='weekly')
+        self._schedule(report_type='product_analysis', next_run=self.now + timedelta(hours=1))
+        
+        self.assertEqual(self.scheduler.run_due(self.now), 1)
+        due.refresh_from_db()
+        self.assertEqual(due.next_run, next_run_after(self.now - timedelta(minutes=5), 'weekly', self.now))
+        report = GeneratedReport.objects.get()
+        self.assertEqual(report.report_type, 'store_performance')
+        self.assertEqual((report.date_to - report.date_from).days, 7)
+        
+        # A second scheduler instance finds nothing left to run
+        self.assertEqual(ReportScheduler().run_due(self.now), 0)
+        self.assertEqual(GeneratedReport.objects.count(), 1)
+    
+    def test_schedule_advanced_by_another_scheduler_is_skipped(self):
+        """Test that the compare-and-set claim loses to a concurrent scheduler."""
+        schedule = self._schedule()
+        
+        def claimed_elsewhere(next_run, frequency, now):
+            # Another instance advances the row between our read and our update
+            ReportSchedule.objects.filter(pk=schedule.pk).update(next_run=now + timedelta(days=1))
+            return next_run_after(next_run, frequency, now)
+        
+        with mock.patch('reports.scheduler.next_run_after', side_effect=claimed_elsewhere):
+            self.assertEqual(self.scheduler.claim_due(self.now), [])
+        self.assertFalse(GeneratedReport.objects.exists())
+    
+    def test_concurrency_is_bounded_per_store(self):
+        """Test that a store never has more than max_per_store reports in flight."""
+        for report_type in ['store_performance', 'product_analysis', 'customer_insights']:
+            self._schedule(report_type=report_type)
+        
+        self.assertEqual(self.scheduler.run_due(self.now), 2)
+        self.assertEqual(ReportSchedule.objects.filter(next_run__lte=self.now).count(), 1)
+        
+        GeneratedReport.objects.update(status='completed')
+        self.assertEqual(self.scheduler.run_due(self.now), 1)
+        self.assertFalse(ReportSchedule.objects.filter(next_run__lte=self.now).exists())
+    
+    def test_reports_queued_by_another_scheduler_are_counted(self):
+        """Test that in-flight reports are counted after the store is locked."""
+        self._schedule()
+        in_flight = self.scheduler._in_flight
+        
+        def other_scheduler_queues(now, store_ids=None):
+            counts = in_flight(now, store_ids)
+            if store_ids is None:
+                # Another scheduler fills the store after our first look
+                for report_type in ['product_analysis', 'customer_insights']:
+                    GeneratedReport.objects.create(
+                        report_type=report_type,
+                        generated_by=self.store_owner,
+                        store=self.store,
+                        date_from=self.now.date(),
+                        date_to=self.now.date(),
+                        status='pending'
+                    )
+            return counts
+        
+        with mock.patch.object(self.scheduler, '_in_flight', side_effect=other_scheduler_queues):
+            self.assertEqual(self.scheduler.run_due(self.now), 0)
+        self.assertEqual(GeneratedReport.objects.count(), 2)
+        self.assertTrue(ReportSchedule.objects.filter(next_run__lte=self.now).exists())